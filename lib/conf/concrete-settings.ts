@@ -1,5 +1,7 @@
 import { Features } from "../enums/features";
 import { Regions } from "../enums/regions";
+import { FeatureExecutionModes } from "../enums/feature-execution-modes";
+import { StateMachineTypes } from "../enums/state-machine-types";
 
 
 export interface IConcreteSettings extends Record<string, any> {
@@ -30,4 +32,90 @@ export interface IConcreteSettings extends Record<string, any> {
 
     applyTransitionsToMainBuckets: boolean
 
+    featureRegistryCacheTtlSeconds: number
+
+    requestBuilderBatchSize: number
+
+    requestBuilderMaxBatchingWindowSeconds: number
+
+    requestBuilderMaxConcurrentExecutionStarts: number
+
+    inlineDispatchMaxObjectKiloBytes: number
+
+    inlineDispatchMaxWorkers: number
+
+    inlineDispatchMemorySize: number
+
+    hashTagAlgorithms: Array<string>
+
+    hashTagBufferSizeMegaBytes: number
+
+    hashTagObjectHeaderKiloBytes: number
+
+    hashTagFunctionMemorySize: number
+
+    rekogBytesMode: boolean
+
+    rekogTargetLongEdge: number
+
+    rekogImageLibraryLayerArn: string
+
+    rekogMaxTransactionsPerSecond: number
+
+    enableSharedRateLimit: boolean
+
+    logLevel: string
+
+    metricsNamespace: string
+
+    coalesceFeatureTagWrites: boolean
+
+    featureExecutionMode: FeatureExecutionModes
+
+    featureBatchSize: number
+
+    featureBatchMaxWorkers: number
+
+    stateMachineType: StateMachineTypes
+
+    syncExpressExecutions: boolean
+
+    syncExecutionMaxAttempts: number
+
+    stateMachineLogLevel: string
+
+    stateMachineTracingEnabled: boolean
+
+    stateMachineTracingSampleRate: number
+
+    dynamoMetricsBatchSize: number
+
+    dynamoMetricsMaxBatchingWindowSeconds: number
+
+    metricsFeatureDataMaxKiloBytes: number
+
+    skipUnchangedObjects: boolean
+
+    sniffContentFormats: boolean
+
+    enableContentIndex: boolean
+
+    storeEventMeta: boolean
+
+    eventMetaRetentionDays: number
+
+    backfillMaxObjectsPerSecond: number
+
+    backfillStorageClasses: Array<string>
+
+    deferArchivedObjects: boolean
+
+    restoreDays: number
+
+    restoreTier: string
+
+    restoreBatchSize: number
+
+    restoreMaxConcurrency: number
+
 }
\ No newline at end of file
@@ -1,5 +1,7 @@
 import { Features } from "../enums/features";
 import { Regions } from "../enums/regions";
+import { FeatureExecutionModes } from "../enums/feature-execution-modes";
+import { StateMachineTypes } from "../enums/state-machine-types";
 import { AbstractConfiguration } from "./abstract-configuration";
 import { IConcreteSettings } from "./concrete-settings";
 import { ISettings } from "./settings";
@@ -46,6 +48,118 @@ export class DefaultConfiguration extends AbstractConfiguration {
              * DynamoDB Metrics Table Feature
              */
             enableDynamoMetricsTable: false,
+
+            /**
+             * Feature settings cache duration in the lambdas
+             */
+            featureRegistryCacheTtlSeconds: 300,
+
+            /**
+             * Request builder batching defaults
+             */
+            requestBuilderBatchSize: 100,
+            requestBuilderMaxBatchingWindowSeconds: 5,
+            requestBuilderMaxConcurrentExecutionStarts: 10,
+
+            /**
+             * Every object is processed by the state machine
+             */
+            inlineDispatchMaxObjectKiloBytes: 0,
+            inlineDispatchMaxWorkers: 8,
+            inlineDispatchMemorySize: 1024,
+
+            /**
+             * Hash tag feature defaults
+             */
+            hashTagAlgorithms: [ "md5", "sha1", "sha256", "sha512" ],
+            hashTagBufferSizeMegaBytes: 8,
+            hashTagObjectHeaderKiloBytes: 8,
+            hashTagFunctionMemorySize: 1024,
+
+            /**
+             * Photo rekognition feature defaults
+             */
+            rekogBytesMode: false,
+            rekogTargetLongEdge: 2048,
+            rekogImageLibraryLayerArn: "",
+            rekogMaxTransactionsPerSecond: 5,
+            enableSharedRateLimit: false,
+
+            /**
+             * Logging and timing metrics defaults
+             */
+            logLevel: "INFO",
+            metricsNamespace: "PhotoArchive",
+
+            /**
+             * Every feature applies its own tags, except in PARALLEL execution mode where a final tag writer step applies them
+             */
+            coalesceFeatureTagWrites: false,
+
+            /**
+             * Features run one after another in the state machine
+             */
+            featureExecutionMode: FeatureExecutionModes.SEQUENTIAL,
+
+            /**
+             * One object per state machine execution
+             */
+            featureBatchSize: 1,
+            featureBatchMaxWorkers: 8,
+
+            /**
+             * Standard workflow, every state transition is logged. Executions are not traced
+             */
+            stateMachineType: StateMachineTypes.STANDARD,
+            syncExpressExecutions: true,
+            syncExecutionMaxAttempts: 2,
+            stateMachineLogLevel: "ALL",
+            stateMachineTracingEnabled: false,
+            stateMachineTracingSampleRate: 0.05,
+
+            /**
+             * DynamoDB metrics writer batching defaults
+             */
+            dynamoMetricsBatchSize: 100,
+            dynamoMetricsMaxBatchingWindowSeconds: 10,
+            metricsFeatureDataMaxKiloBytes: 64,
+
+            /**
+             * Every notified object is processed, even if its content is unchanged since it was processed
+             */
+            skipUnchangedObjects: false,
+
+            /**
+             * The photo features detect the format of the objects from their content themselves
+             */
+            sniffContentFormats: false,
+
+            /**
+             * Results are computed for every photo, rather then copied from the content index for identical photos
+             */
+            enableContentIndex: false,
+
+            /**
+             * Event metadata is kept out of the state machine payload, which only references the event by its SQS messageId and S3 sequencer.
+             * When stored, the event meta store keeps it for a week
+             */
+            storeEventMeta: false,
+            eventMetaRetentionDays: 7,
+
+            /**
+             * Backfill defaults. Archived storage classes are left out, their objects need to be restored first
+             */
+            backfillMaxObjectsPerSecond: 50,
+            backfillStorageClasses: [ "STANDARD", "STANDARD_IA", "ONEZONE_IA", "INTELLIGENT_TIERING", "GLACIER_IR", "REDUCED_REDUNDANCY" ],
+
+            /**
+             * Archived photos are skipped by the features. When deferred, they are restored with the Bulk tier, a few at a time, and processed once restored
+             */
+            deferArchivedObjects: false,
+            restoreDays: 7,
+            restoreTier: "Bulk",
+            restoreBatchSize: 10,
+            restoreMaxConcurrency: 2,
     
              /**
               * List of features enabled - REQUIRED parameter so this should be overrided
@@ -77,6 +191,12 @@ export class DefaultConfiguration extends AbstractConfiguration {
             }
         }
 
+        // The parallel branches would each read and write the tags of the same photo at the same time, overwriting the
+        // tags of one another, so their tags are always applied by the tag writer step
+        if(concreteSettings.featureExecutionMode == FeatureExecutionModes.PARALLEL){
+            concreteSettings.coalesceFeatureTagWrites = true
+        }
+
         return concreteSettings as IConcreteSettings
 
     }
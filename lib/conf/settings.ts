@@ -1,5 +1,7 @@
 import { Features } from "../enums/features";
 import { Regions } from "../enums/regions";
+import { FeatureExecutionModes } from "../enums/feature-execution-modes";
+import { StateMachineTypes } from "../enums/state-machine-types";
 
 
 export interface ISettings extends Record<string, any> {
@@ -97,4 +99,314 @@ export interface ISettings extends Record<string, any> {
      */
     applyTransitionsToMainBuckets?: boolean
 
+    /**
+     * Specify how many seconds the feature lambdas and request builder cache the feature settings loaded from
+     * SSM Parameter Store before reloading them. Warm lambda invocations within this window do not call SSM at all.
+     * Leave undefined for default value. Default value is 300 seconds
+     */
+    featureRegistryCacheTtlSeconds?: number
+
+    /**
+     * Specify the maximum number of bucket event messages the request builder lambda receives per invocation. Values larger
+     * then 10 also enable the batching window set by requestBuilderMaxBatchingWindowSeconds.
+     * Leave undefined for default value. Default value is 100
+     */
+    requestBuilderBatchSize?: number
+
+    /**
+     * Specify the maximum number of seconds the request builder lambda waits to gather a full batch of bucket event messages.
+     * Only applies when requestBuilderBatchSize is larger then 10. Leave undefined for default value. Default value is 5 seconds
+     */
+    requestBuilderMaxBatchingWindowSeconds?: number
+
+    /**
+     * Specify how many state machine executions the request builder lambda starts concurrently.
+     * Leave undefined for default value. Default value is 10
+     */
+    requestBuilderMaxConcurrentExecutionStarts?: number
+
+    /**
+     * Specify the size in KB under which objects are processed by the request builder itself instead of by an execution of the photo
+     * processing state machine. The request builder is deployed with the code of the features and runs them in-process on a pool of
+     * worker threads, then applies the tags of all features to the object in a single round-trip. For small photos this saves the
+     * state transitions and feature lambda invocations, which take longer then the features themselves. A value of 0 disables it.
+     * Leave undefined for default value. Default value is 0
+     */
+    inlineDispatchMaxObjectKiloBytes?: number
+
+    /**
+     * Specify the number of objects the request builder processes concurrently when processing them inline. Only applies when
+     * inlineDispatchMaxObjectKiloBytes is greater than 0. Leave undefined for default value. Default value is 8
+     */
+    inlineDispatchMaxWorkers?: number
+
+    /**
+     * Specify the memory size in MB of the request builder lambda when it processes objects inline. Only applies when
+     * inlineDispatchMaxObjectKiloBytes is greater than 0. Leave undefined for default value. Default value is 1024
+     */
+    inlineDispatchMemorySize?: number
+
+    /**
+     * Specify which hash algorithms the hash tag feature generates and tags. Valid values are "md5", "sha1", "sha256" and "sha512".
+     * Leave undefined for default value. Default value is all of them
+     */
+    hashTagAlgorithms?: Array<string>
+
+    /**
+     * Specify the size in MB of the buffers the hash tag feature reads the photo into. Two buffers of this size are allocated.
+     * Leave undefined for default value. Default value is 8 MB
+     */
+    hashTagBufferSizeMegaBytes?: number
+
+    /**
+     * Specify the size in KB of the header of the photo the hash tag feature passes on to the photo meta feature, which reads the EXIF
+     * data from it instead of fetching it from S3 again. Only applies to SEQUENTIAL execution mode. Set to 0 to disable. The header
+     * is carried in the state machine payload, so it is reduced for batches to keep the payload within the Step Functions limit.
+     * Leave undefined for default value. Default value is 8 KB
+     */
+    hashTagObjectHeaderKiloBytes?: number
+
+    /**
+     * Specify the memory size in MB of the hash tag feature lambda. Lambda allocates more then one vCPU above 1769 MB, which allows
+     * the hash algorithms to be computed in parallel. Leave undefined for default value. Default value is 1024 MB
+     */
+    hashTagFunctionMemorySize?: number
+
+    /**
+     * Enable/Disable bytes mode of the photo rekognition feature. Rekognition only reads JPEG and PNG photos of up to 15 MB from S3.
+     * In bytes mode larger photos, and DNG photos, are sent to Rekognition as the bytes of their embedded JPEG preview, or of a
+     * copy downscaled to rekogTargetLongEdge when rekogImageLibraryLayerArn provides Pillow.
+     * Leave undefined for default value. Default value is FALSE
+     */
+    rekogBytesMode?: boolean
+
+    /**
+     * Specify the size in pixels of the long edge photos are downscaled to in bytes mode.
+     * Leave undefined for default value. Default value is 2048
+     */
+    rekogTargetLongEdge?: number
+
+    /**
+     * Specify the ARN of a lambda layer providing Pillow (PIL) for Python 3.8, used to downscale photos in bytes mode.
+     * Leave undefined for default value. Default value is none, only embedded previews are used
+     */
+    rekogImageLibraryLayerArn?: string
+
+    /**
+     * Specify the maximum number of Rekognition DetectLabels calls per second made by the photo rekognition feature. Should be set
+     * to the DetectLabels quota of the account, see https://docs.aws.amazon.com/rekognition/latest/dg/limits.html. Stored as the
+     * REKOG_MAX_TPS setting of the feature, so it can be changed without a deployment.
+     * Leave undefined for default value. Default value is 5
+     */
+    rekogMaxTransactionsPerSecond?: number
+
+    /**
+     * Enable/Disable the shared rate limit. When enabled, the concurrent executions of the photo rekognition feature count their calls
+     * in a DynamoDB table so that together they stay under rekogMaxTransactionsPerSecond. When disabled, every execution limits
+     * itself and relies on backing off when throttled.
+     * Leave undefined for default value. Default value is FALSE
+     */
+    enableSharedRateLimit?: boolean
+
+    /**
+     * Specify the log level of the feature and tag writer lambdas. Valid values are DEBUG, INFO, WARNING and ERROR. Requests
+     * are only logged in full at DEBUG, at other levels a one line summary is logged instead.
+     * Leave undefined for default value. Default value is INFO
+     */
+    logLevel?: string
+
+    /**
+     * Specify the CloudWatch namespace of the timing metrics of the feature and tag writer lambdas. The metrics are written to the
+     * logs in CloudWatch Embedded Metric Format, see https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format.html
+     * Leave undefined for default value. Default value is PhotoArchive
+     */
+    metricsNamespace?: string
+
+    /**
+     * Enable/Disable coalesced tag writes. When enabled, the features pass their tags along in the processing request
+     * and a final tag writer step applies the tags of all features to the photo in a single S3 tagging round-trip, instead
+     * of every feature reading and writing the tags of the photo itself. Always enabled in PARALLEL featureExecutionMode, where
+     * the features would otherwise overwrite the tags the others write at the same time. Leave undefined for default value.
+     * Default value is FALSE
+     */
+    coalesceFeatureTagWrites?: boolean
+
+    /**
+     * Specify how the features are executed by the photo processing state machine. SEQUENTIAL runs the features one after
+     * another. PARALLEL runs all features at the same time in a Parallel state and merges their results, so the processing time
+     * of a photo is that of the slowest feature instead of the sum of all of them. See /lib/enums/feature-execution-modes.ts
+     * Leave undefined for default value. Default value is SEQUENTIAL
+     */
+    featureExecutionMode?: FeatureExecutionModes
+
+    /**
+     * Specify the maximum number of objects processed by a single state machine execution. Objects of the same request builder
+     * invocation are grouped into batches and every feature processes all objects of the batch in one invocation, which cuts the
+     * number of executions, state transitions and Lambda invocations for large uploads. A value of 1 disables batching.
+     * Leave undefined for default value. Default value is 1
+     */
+    featureBatchSize?: number
+
+    /**
+     * Specify the number of objects of a batch each feature processes concurrently. Only applies when featureBatchSize is
+     * greater than 1. Leave undefined for default value. Default value is 8
+     */
+    featureBatchMaxWorkers?: number
+
+    /**
+     * Specify the workflow type of the photo processing state machine. STANDARD executions are billed per state transition. EXPRESS
+     * executions are billed by duration and memory, which costs far less at high volume, but run for at most 5 minutes, so all the
+     * features of an execution, or of a batch execution, have to complete within that time. The names of EXPRESS executions are not
+     * unique, so the executions of redelivered event messages are not deduplicated. See /lib/enums/state-machine-types.ts
+     * Leave undefined for default value. Default value is STANDARD
+     */
+    stateMachineType?: StateMachineTypes
+
+    /**
+     * Enable/Disable synchronous executions. Only applies when stateMachineType is EXPRESS. When enabled, the request builder starts
+     * the executions with StartSyncExecution and waits for their result. Objects whose execution failed, or that are in the batchFailures
+     * of a batch execution, are run again up to syncExecutionMaxAttempts times, and their event messages are returned to the event queue
+     * when they still fail. The request builder receives at most requestBuilderMaxConcurrentExecutionStarts times featureBatchSize
+     * messages per invocation, and returns the objects it has no time left to wait for to the event queue. When disabled, the executions are started asynchronously and their failures are only reported in the logs
+     * of the state machine. Leave undefined for default value. Default value is TRUE
+     */
+    syncExpressExecutions?: boolean
+
+    /**
+     * Specify the number of times the request builder runs the synchronous execution of an object before returning its event message
+     * to the event queue. Every attempt can take up to 5 minutes, all of them have to fit in the timeout of the request builder.
+     * Leave undefined for default value. Default value is 2
+     */
+    syncExecutionMaxAttempts?: number
+
+    /**
+     * Specify the log level of the photo processing state machine. Valid values are ALL, ERROR, FATAL and OFF, see
+     * https://docs.aws.amazon.com/step-functions/latest/dg/cloudwatch-log-level.html. ALL logs every state transition, which at high
+     * volume can cost more than the processing itself. Leave undefined for default value. Default value is ALL
+     */
+    stateMachineLogLevel?: string
+
+    /**
+     * Enable/Disable X-Ray tracing of the photo processing state machine. The X-Ray sampling rule it creates is named after namePrefix,
+     * which has to be unique per account and region when enabled.
+     * Leave undefined for default value. Default value is FALSE
+     */
+    stateMachineTracingEnabled?: boolean
+
+    /**
+     * Specify the fraction of the executions of the photo processing state machine that are traced, from 0 to 1, on top of the first
+     * execution of every second, which is always traced. Only applies when stateMachineTracingEnabled is TRUE.
+     * Leave undefined for default value. Default value is 0.05
+     */
+    stateMachineTracingSampleRate?: number
+
+    /**
+     * Specify the maximum number of metrics messages the DynamoDB metrics lambda receives per invocation. Messages of the same
+     * photo are written to its entry with a single request. Values larger then 10 also enable the batching window set by
+     * dynamoMetricsMaxBatchingWindowSeconds. Leave undefined for default value. Default value is 100
+     */
+    dynamoMetricsBatchSize?: number
+
+    /**
+     * Specify the maximum number of seconds the DynamoDB metrics lambda waits to gather a full batch of metrics messages.
+     * Only applies when dynamoMetricsBatchSize is larger then 10. Leave undefined for default value. Default value is 10 seconds
+     */
+    dynamoMetricsMaxBatchingWindowSeconds?: number
+
+    /**
+     * Specify the maximum size in KB of the feature data each feature stores in the DynamoDB metrics table. Feature data is
+     * serialized with a compact schema per feature and truncated to this size, so the entry of a photo stays under the DynamoDB
+     * item size limit of 400 KB. The fields kept can be restricted further with the optional METRICS_FIELDS setting of a feature
+     * (a comma separated allowlist under /{namePrefix}/features/{featureName}/settings/METRICS_FIELDS in SSM).
+     * Leave undefined for default value. Default value is 64 KB
+     */
+    metricsFeatureDataMaxKiloBytes?: number
+
+    /**
+     * Enable/Disable skipping unchanged objects. Photos are tagged with a fingerprint of their ETag and size and of the features
+     * applied to them. The request builder reads the fingerprint and does not start an execution for photos whose content has not
+     * changed since all enabled features were applied, such as re-uploaded or copied photos and replayed S3 events. Features already
+     * applied to the content are skipped for the other photos. Leave undefined for default value. Default value is FALSE
+     */
+    skipUnchangedObjects?: boolean
+
+    /**
+     * Enable/Disable content format sniffing in the request builder. The format of every object (JPEG, PNG, HEIC, TIFF, NEF, CR2, ARW or DNG)
+     * is detected from its first kilobyte with a ranged GET, rather then from the extension of its key, and passed on in the payload. Features
+     * that do not apply to the format, such as the photo features for files that are not photos, are marked as completed and return without
+     * reading the object, objects no feature applies to are not processed at all. When disabled, the photo features sniff the format themselves.
+     * Leave undefined for default value. Default value is FALSE
+     */
+    sniffContentFormats?: boolean
+
+    /**
+     * Enable/Disable the content index. The results of the photo meta and rekognition features are stored in a DynamoDB table keyed
+     * by the SHA256 of the photo computed by the hash feature, and copied for photos with identical content instead of being computed
+     * again. Requires the hash feature, with the sha256 algorithm, to run before the other features (SEQUENTIAL execution mode).
+     * Leave undefined for default value. Default value is FALSE
+     */
+    enableContentIndex?: boolean
+
+    /**
+     * Enable/Disable the event meta store. The state machine payload only holds the fields the pipeline uses. When enabled, the
+     * full S3, SNS, SQS and Lambda event metadata of every photo is stored in a DynamoDB table and referenced from the payload by
+     * its metaId, when disabled it is not kept and the payload only references the event by its SQS messageId and S3 sequencer.
+     * Leave undefined for default value. Default value is FALSE
+     */
+    storeEventMeta?: boolean
+
+    /**
+     * Specify the number of days the event metadata is kept in the event meta store.
+     * Leave undefined for default value. Default value is 7
+     */
+    eventMetaRetentionDays?: number
+
+    /**
+     * Specify the maximum number of photos per second the backfill function feeds to the processing pipeline. The backfill function
+     * reads the S3 Inventory reports of the archive buckets, so it requires enableInventoryOfArchiveBuckets.
+     * Leave undefined for default value. Default value is 50
+     */
+    backfillMaxObjectsPerSecond?: number
+
+    /**
+     * Specify the storage classes of the photos the backfill function processes when the backfill request does not specify them.
+     * Leave undefined for default value. Default value is all storage classes that can be read without a restore
+     */
+    backfillStorageClasses?: Array<string>
+
+    /**
+     * Enable/Disable deferring archived photos. Photos in the GLACIER and DEEP_ARCHIVE storage classes, or in the archive tiers of
+     * INTELLIGENT_TIERING, can not be read until they are restored. When enabled, the request builder checks the storage class of every
+     * photo and sends the archived ones to a deferred restore queue. Their restore is requested in batches and they are processed when
+     * S3 reports the restore as completed.
+     * Leave undefined for default value. Default value is FALSE
+     */
+    deferArchivedObjects?: boolean
+
+    /**
+     * Specify the number of days restored copies of archived photos are kept. Does not apply to INTELLIGENT_TIERING.
+     * Leave undefined for default value. Default value is 7
+     */
+    restoreDays?: number
+
+    /**
+     * Specify the retrieval tier of restore requests. Valid values are Bulk, Standard and Expedited, see
+     * https://docs.aws.amazon.com/AmazonS3/latest/userguide/restoring-objects-retrieval-options.html.
+     * Leave undefined for default value. Default value is Bulk
+     */
+    restoreTier?: string
+
+    /**
+     * Specify the number of deferred photos the restore function requests the restore of per invocation.
+     * Leave undefined for default value. Default value is 10
+     */
+    restoreBatchSize?: number
+
+    /**
+     * Specify the maximum number of concurrent executions of the restore function. Bounds the rate of restore requests
+     * during backfills over archived photos. Minimum value is 2.
+     * Leave undefined for default value. Default value is 2
+     */
+    restoreMaxConcurrency?: number
+
 }
\ No newline at end of file
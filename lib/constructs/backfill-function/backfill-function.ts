@@ -0,0 +1,101 @@
+import { Construct } from "constructs";
+import { Duration, Stack } from "aws-cdk-lib"
+import {
+    aws_lambda as lambda,
+    aws_iam as iam,
+    aws_sqs as sqs,
+} from "aws-cdk-lib"
+import * as path from 'path'
+import { ManagedPolicies, ServicePrincipals } from "cdk-constants";
+import { LayerTypes } from "../lambda-layers/lambda-layers";
+import { ConfigurationSingletonFactory } from "../../conf/configuration-singleton-factory";
+
+export interface BackfillFunctionProps{
+    mainBucketNames: Array<string>,
+    loggingBucketName: string,
+    eventQueue: sqs.Queue,
+    onLayerRequestListener: (layerTypes: Array<LayerTypes>) => Array<lambda.LayerVersion>
+}
+
+/**
+ * Backfill Function. Feeds the existing objects of a main bucket, as listed by its S3 Inventory report, to the bucket
+ * event queue so they are processed like new uploads. Invoked manually, see the event shape in ./res/lambda_function.py
+ */
+export class BackfillFunction extends Construct{
+
+    public readonly backfillFunction: lambda.Function
+
+    constructor(scope: Construct, id:string, props: BackfillFunctionProps){
+        super(scope, id)
+
+        const settings = ConfigurationSingletonFactory.getConcreteSettings()
+        const functionName = `${settings.namePrefix}-backfill-function`
+
+        const backfillFunctionRole = new iam.Role(this, "BFServiceRole", {
+            roleName: `${settings.namePrefix}-bf-service-role`,
+            description: "Service Role For Backfill Function",
+            assumedBy: new iam.ServicePrincipal(ServicePrincipals.LAMBDA)
+          })
+
+        backfillFunctionRole.addManagedPolicy(
+          iam.ManagedPolicy.fromAwsManagedPolicyName(
+            ManagedPolicies.AWS_LAMBDA_BASIC_EXECUTION_ROLE
+          )
+        )
+
+        const loggingBucketArn = `arn:aws:s3:::${props.loggingBucketName}`
+        const backfillFunctionRolePolicy = new iam.Policy(this, "BFServiceRolePolicy", {
+          policyName: `${settings.namePrefix}-bf-service-role-policy`,
+          roles:[
+            backfillFunctionRole
+          ],
+          statements: [
+            // Inventory reports and checkpoints
+            new iam.PolicyStatement({
+              actions:[
+                "s3:ListBucket",
+              ],
+              resources: [ loggingBucketArn ]
+            }),
+            new iam.PolicyStatement({
+              actions:[
+                "s3:GetObject",
+                "s3:PutObject"
+              ],
+              resources: props.mainBucketNames.map((mainBucketName) => `${loggingBucketArn}/${mainBucketName}-*`)
+            }),
+            new iam.PolicyStatement({
+              actions:[
+                "sqs:SendMessage"
+              ],
+              resources: [ props.eventQueue.queueArn ]
+            }),
+            // Continues itself when running out of time
+            new iam.PolicyStatement({
+              actions:[
+                "lambda:InvokeFunction"
+              ],
+              resources: [ `arn:aws:lambda:${Stack.of(this).region}:${Stack.of(this).account}:function:${functionName}` ]
+            })
+          ],
+        })
+
+        this.backfillFunction = new lambda.Function(this, `BFFunction`, {
+          functionName: functionName,
+          description: 'Backfill Function. Feeds the existing photos of an archive bucket, from its S3 Inventory, to the processing pipeline.',
+          runtime: lambda.Runtime.PYTHON_3_8,
+          memorySize: 256,
+          handler: 'lambda_function.lambda_handler',
+          code: lambda.Code.fromAsset(path.join(__dirname, './res')),
+          timeout: Duration.minutes(15),
+          role: backfillFunctionRole,
+          layers: props.onLayerRequestListener([LayerTypes.COMMONLIBLAYER]),
+          environment:{
+            EVENT_QUEUE_URL: props.eventQueue.queueUrl,
+            LOGGING_BUCKET_NAME: props.loggingBucketName,
+            BACKFILL_MAX_OBJECTS_PER_SECOND: settings.backfillMaxObjectsPerSecond.toString(),
+            BACKFILL_STORAGE_CLASSES: settings.backfillStorageClasses.join(",")
+          }
+        })
+    }
+}
@@ -0,0 +1,167 @@
+import json
+import time
+from os import environ
+from inventory_reader import get_inventory_prefix, find_latest_manifest_key, read_manifest, iterate_records
+from s3_events import create_s3_event_record, send_s3_event_records
+from aws_clients import lazy_client
+
+'''
+    Backfill Event Shape:
+
+    {
+        bucketName: string - main bucket to backfill
+        manifestKey?: string - key of the inventory manifest to read. Defaults to the latest inventory report
+        prefix?: string - only objects with keys starting with the prefix
+        extensions?: Array<string> - only objects with these file extensions (case insensitive)
+        storageClasses?: Array<string> - only objects in these storage classes. Defaults to BACKFILL_STORAGE_CLASSES
+        maxObjectsPerSecond?: number - defaults to BACKFILL_MAX_OBJECTS_PER_SECOND
+        force?: boolean - process the objects even if their content is unchanged since they were last processed,
+                          or identical to content processed before, for example to re-tag them after a feature
+                          has changed
+        resume?: boolean - continue from the stored checkpoint of the bucket
+        checkpoint?: { manifestKey, fileIndex, rowIndex } - set when the function continues itself
+    }
+
+    Enumerates the objects of a main bucket from its weekly S3 Inventory report, instead of listing the bucket,
+    and feeds the ones matching the filters to the bucket event queue as S3 event notifications. The request
+    builder then processes them like new uploads.
+
+    Progress is stored as a checkpoint in the logging bucket after every batch. Before the lambda runs out of
+    time it invokes itself asynchronously to continue from the checkpoint
+'''
+
+EVENT_QUEUE_URL = environ.get("EVENT_QUEUE_URL")
+LOGGING_BUCKET_NAME = environ.get("LOGGING_BUCKET_NAME")
+BACKFILL_MAX_OBJECTS_PER_SECOND = float(environ.get("BACKFILL_MAX_OBJECTS_PER_SECOND", "50"))
+BACKFILL_STORAGE_CLASSES = [ x for x in environ.get("BACKFILL_STORAGE_CLASSES", "").split(",") if x != "" ]
+
+# Time left when the function stops and continues in a new invocation
+CONTINUATION_MARGIN_MILLIS = 60 * 1000
+
+s3 = lazy_client("s3")
+sqs = lazy_client("sqs")
+lambda_client = lazy_client("lambda")
+
+
+def get_checkpoint_key(bucket_name:str) -> str:
+    return "{}-backfill/checkpoint.json".format(bucket_name)
+
+def save_checkpoint(bucket_name:str, checkpoint:dict) -> None:
+    s3.put_object(
+        Bucket=LOGGING_BUCKET_NAME,
+        Key=get_checkpoint_key(bucket_name),
+        Body=json.dumps(checkpoint).encode("utf-8")
+    )
+
+def load_checkpoint(bucket_name:str) -> dict:
+    try:
+        response = s3.get_object(Bucket=LOGGING_BUCKET_NAME, Key=get_checkpoint_key(bucket_name))
+        return json.loads(response["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        return None
+
+def matches_filters(record:dict, prefix:str, extensions:list, storage_classes:list) -> bool:
+    key = record["Key"]
+    if prefix is not None and not key.startswith(prefix):
+        return False
+    if extensions is not None and key.split(".")[-1].lower() not in extensions:
+        return False
+    if storage_classes is not None and len(storage_classes) > 0 and record.get("StorageClass") not in storage_classes:
+        return False
+    return True
+
+def lambda_handler(event, context):
+    print(event)
+
+    bucket_name = event["bucketName"]
+    prefix = event.get("prefix")
+    extensions = [ x.lower().lstrip(".") for x in event["extensions"] ] if event.get("extensions") is not None else None
+    storage_classes = event.get("storageClasses", BACKFILL_STORAGE_CLASSES)
+    max_objects_per_second = float(event.get("maxObjectsPerSecond", BACKFILL_MAX_OBJECTS_PER_SECOND))
+    force = event.get("force", False)
+
+    checkpoint = event.get("checkpoint")
+    if checkpoint is None and event.get("resume", False):
+        checkpoint = load_checkpoint(bucket_name)
+        if checkpoint is not None and checkpoint.get("completed", False):
+            print("Backfill Of Bucket {} Has Already Completed. Nothing To Resume".format(bucket_name))
+            return checkpoint
+
+    manifest_key = checkpoint["manifestKey"] if checkpoint is not None else event.get("manifestKey")
+    if manifest_key is None:
+        inventory_prefix = get_inventory_prefix("{}-inventory".format(bucket_name), bucket_name, "{}-inventory-configuration".format(bucket_name))
+        manifest_key = find_latest_manifest_key(s3, LOGGING_BUCKET_NAME, inventory_prefix)
+        if manifest_key is None:
+            raise Exception("No Inventory Report Found For Bucket {} Under {}".format(bucket_name, inventory_prefix))
+
+    print("Backfilling Bucket {} From Inventory Manifest {}".format(bucket_name, manifest_key))
+    manifest = read_manifest(s3, LOGGING_BUCKET_NAME, manifest_key)
+
+    file_index = checkpoint["fileIndex"] if checkpoint is not None else 0
+    row_index = checkpoint["rowIndex"] if checkpoint is not None else 0
+    sent_count = checkpoint.get("sentCount", 0) if checkpoint is not None else 0
+
+    # Objects are sent in batches of one second worth of objects, paced to max_objects_per_second
+    batch_size = max(int(max_objects_per_second), 1)
+    batch = []
+    start_time = time.time()
+    invocation_sent_count = 0
+
+    def send_batch(next_file_index:int, next_row_index:int) -> dict:
+        nonlocal batch, sent_count, invocation_sent_count
+        if len(batch) > 0:
+            send_s3_event_records(sqs, EVENT_QUEUE_URL, batch, "Photo Archive Backfill")
+            sent_count += len(batch)
+            invocation_sent_count += len(batch)
+            batch = []
+
+        updated_checkpoint = {
+            "manifestKey": manifest_key,
+            "fileIndex": next_file_index,
+            "rowIndex": next_row_index,
+            "sentCount": sent_count,
+            "completed": False
+        }
+        save_checkpoint(bucket_name, updated_checkpoint)
+
+        # Wait until the rate allows the next batch
+        wait_seconds = (invocation_sent_count / max_objects_per_second) - (time.time() - start_time)
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return updated_checkpoint
+
+    for record_file_index, record_row_index, record in iterate_records(s3, LOGGING_BUCKET_NAME, manifest, file_index, row_index):
+        if context.get_remaining_time_in_millis() < CONTINUATION_MARGIN_MILLIS:
+            # The current record has not been processed yet, so the continuation starts from it
+            checkpoint = send_batch(record_file_index, record_row_index)
+            print("Running Out Of Time. Continuing In A New Invocation From {}".format(checkpoint))
+            continuation_event = dict(event)
+            continuation_event["checkpoint"] = checkpoint
+            lambda_client.invoke(
+                FunctionName=context.invoked_function_arn,
+                InvocationType="Event",
+                Payload=json.dumps(continuation_event).encode("utf-8")
+            )
+            return checkpoint
+
+        if record.get("Bucket", bucket_name) != bucket_name or not matches_filters(record, prefix, extensions, storage_classes):
+            continue
+
+        batch.append(create_s3_event_record(
+            bucket_name,
+            record["Key"],
+            etag=record.get("ETag"),
+            size=int(record["Size"]) if record.get("Size", "") != "" else None,
+            force=force
+        ))
+
+        if len(batch) >= batch_size:
+            send_batch(record_file_index, record_row_index + 1)
+            print("Sent {} Objects Of Bucket {} To The Event Queue".format(sent_count, bucket_name))
+
+    checkpoint = send_batch(len(manifest["files"]), 0)
+    checkpoint["completed"] = True
+    save_checkpoint(bucket_name, checkpoint)
+
+    print("Backfill Of Bucket {} Complete. {} Objects Sent To The Event Queue".format(bucket_name, sent_count))
+    return checkpoint
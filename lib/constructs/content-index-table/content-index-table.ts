@@ -0,0 +1,31 @@
+import { Construct } from "constructs";
+import {
+    aws_dynamodb as dynamodb,
+} from 'aws-cdk-lib'
+import { RemovalPolicy } from "aws-cdk-lib";
+
+export interface ContentIndexTableProps {
+    namePrefix: string
+}
+
+/**
+ * Index of the results of the features per photo content (SHA256). Photos uploaded more then once, to any of the
+ * buckets, have their tags copied from the index instead of being processed again
+ */
+export class ContentIndexTable extends Construct {
+
+    public readonly contentIndexTable: dynamodb.Table
+
+    constructor(scope: Construct, id: string, props: ContentIndexTableProps){
+        super(scope, id)
+
+        this.contentIndexTable = new dynamodb.Table(this, 'ContentIndexTable', {
+            tableName: `${props.namePrefix}-content-index`,
+            partitionKey: { name: 'contentHash', type: dynamodb.AttributeType.STRING },
+            sortKey: { name: 'resultKey', type: dynamodb.AttributeType.STRING },
+            billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+            encryption: dynamodb.TableEncryption.DEFAULT,
+            removalPolicy: RemovalPolicy.RETAIN
+        })
+    }
+}
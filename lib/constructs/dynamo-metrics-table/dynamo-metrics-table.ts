@@ -13,7 +13,9 @@ import { SqsEventSource } from "aws-cdk-lib/aws-lambda-event-sources";
 
 export interface DynamoMetricsTableProps {
     lambdaTimeout: Duration,
-    namePrefix: string
+    namePrefix: string,
+    batchSize: number,
+    maxBatchingWindowSeconds: number
 }
 
 export class DynamoMetricsTable  extends Construct {
@@ -109,6 +111,7 @@ export class DynamoMetricsTable  extends Construct {
             handler: 'lambda_function.lambda_handler',
             code: lambda.Code.fromAsset(path.join(__dirname, './res')),
             role: dynamoLambdaRole,
+            timeout: props.lambdaTimeout,
             environment:{
                 DYNAMODB_TABLE_NAME: tableName,
                 DYNAMODB_PARTITION_KEY: partitionKey.name
@@ -116,7 +119,9 @@ export class DynamoMetricsTable  extends Construct {
         })
 
         this.dynamoLambda.addEventSource(new SqsEventSource(this.dynamoQueue, {
-            batchSize: 1
+            batchSize: props.batchSize,
+            maxBatchingWindow: props.batchSize > 10 ? Duration.seconds(props.maxBatchingWindowSeconds) : undefined,
+            reportBatchItemFailures: true
         }))
     }
 
@@ -1,105 +1,242 @@
-
 import boto3
 from os import environ
 from botocore.exceptions import ClientError
 from hashlib import sha1
+from decimal import Decimal
 import base64
+import gzip
 import json
 
 DYNAMODB_TABLE_NAME = environ.get('DYNAMODB_TABLE_NAME')
-DYNAMODB_PARTITION_KEY = environ.get('DYNAMODB_PARTITION_KEY')
+DYNAMODB_PARTITION_KEY = environ.get('DYNAMODB_PARTITION_KEY', 'hash')
+
+# Must match the encoding of dynamo_helper in the commonlib layer
+CONTENT_ENCODING_ATTRIBUTE = "ContentEncoding"
+GZIP_BASE64_ENCODING = "gzip+base64"
+
+dynamodb = boto3.resource('dynamodb')
+table = dynamodb.Table(DYNAMODB_TABLE_NAME)
+
+'''
+    Event Shape
+
+    {
+        bucket: string
+        key: string
+        bucketArn: string
+        featureName: string
+        featureData: object
+        eTag: string
+        processedAt: number (epoch milliseconds the feature processed the object at)
+    }
+
+    DynamoDB Entry Shape
+
+    {
+        hash: string (sha1 of bucket+key)
+        bucket: string
+        key: string
+        bucketArn: string
+        featuresApplied: Array<string>
+        featureData_<featureName>: object (one attribute per feature)
+        featureVersion_<featureName>: string (version of the feature data, see get_feature_version)
+    }
+
+    The messages of a batch are grouped by object, and every object is written with a single conditional
+    update_item. No read is needed before the write: the entry is created by the same update if it does not
+    exist yet. The update is conditional on none of its features being in featuresApplied already. When
+    some of them are, the features are written one at a time: new features are appended to featuresApplied,
+    features already applied have their data overwritten when the message is a later processing of the object
+    than the one stored. A duplicate delivery of a message carries the version already stored and is skipped
+'''
+
+def get_object_hash(bucket:str, key:str) -> str:
+    bucket_key_string = bucket + key
+    return base64.urlsafe_b64encode(sha1(bucket_key_string.encode('utf-8')).digest()).decode('utf-8')
+
+def get_feature_version(dynamodb_event:dict) -> str:
+    '''
+    Returns the version of the feature data of a message. Versions sort by the time the object was processed,
+    the zero padding keeps the string order of the versions in line with it
+    '''
+    return "{:015d}:{}".format(int(dynamodb_event.get("processedAt", 0)), dynamodb_event.get("eTag") or "")
+
+def decode_message_body(sqs_record:dict) -> str:
+    '''
+    Large metrics entries are sent gzipped and base64 encoded, flagged by the ContentEncoding attribute
+    '''
+    content_encoding = sqs_record.get("messageAttributes", {}).get(CONTENT_ENCODING_ATTRIBUTE, {}).get("stringValue")
+    if content_encoding == GZIP_BASE64_ENCODING:
+        return gzip.decompress(base64.b64decode(sqs_record["body"])).decode('utf-8')
+    return sqs_record["body"]
+
+def group_messages(sqs_records:list, failed_message_ids:list) -> dict:
+    '''
+    Groups the messages by object hash. Returns a dict of hash to a dict with the object attributes, the
+    feature data and version of each feature and the ids of the messages that carried them. Ids of messages that can
+    not be parsed are added to failed_message_ids
+    '''
+    objects = dict()
+    for sqs_record in sqs_records:
+        try:
+            # DynamoDB does not accept floats, numbers are parsed as Decimals
+            dynamodb_event = json.loads(decode_message_body(sqs_record), parse_float=Decimal)
+            object_hash = get_object_hash(dynamodb_event['bucket'], dynamodb_event['key'])
+        except Exception as e:
+            print("Failed To Parse Message {}".format(sqs_record.get("messageId")))
+            print(e)
+            failed_message_ids.append(sqs_record["messageId"])
+            continue
+
+        if object_hash not in objects:
+            objects[object_hash] = {
+                "bucket": dynamodb_event['bucket'],
+                "key": dynamodb_event['key'],
+                "bucketArn": dynamodb_event['bucketArn'],
+                "featureData": dict(),
+                "featureVersions": dict(),
+                "messageIds": []
+            }
+
+        # a feature delivered more than once within the batch is only written once, with its latest data
+        feature_name = dynamodb_event["featureName"]
+        feature_version = get_feature_version(dynamodb_event)
+        if feature_version >= objects[object_hash]["featureVersions"].get(feature_name, ""):
+            objects[object_hash]["featureData"][feature_name] = dynamodb_event["featureData"]
+            objects[object_hash]["featureVersions"][feature_name] = feature_version
+        objects[object_hash]["messageIds"].append(sqs_record["messageId"])
+
+    return objects
+
+def create_expression_attributes(object_entry:dict) -> tuple:
+    '''
+    Returns the attribute names, values and SET actions of the attributes of the object
+    '''
+    expression_attribute_names = {
+        '#hash': DYNAMODB_PARTITION_KEY,
+        '#bucket': 'bucket',
+        '#key': 'key',
+        '#bucketArn': 'bucketArn',
+        '#featuresApplied': 'featuresApplied'
+    }
+    expression_attribute_values = {
+        ':bucket': object_entry['bucket'],
+        ':key': object_entry['key'],
+        ':bucketArn': object_entry['bucketArn']
+    }
+    update_expressions = [
+        '#bucket = :bucket',
+        '#key = :key',
+        '#bucketArn = :bucketArn'
+    ]
+    return expression_attribute_names, expression_attribute_values, update_expressions
+
+def add_feature_attributes(index:int, feature_name:str, object_entry:dict, expression_attribute_names:dict,
+    expression_attribute_values:dict, update_expressions:list) -> None:
+    expression_attribute_names['#fd{}'.format(index)] = 'featureData_{}'.format(feature_name)
+    expression_attribute_names['#fv{}'.format(index)] = 'featureVersion_{}'.format(feature_name)
+    expression_attribute_values[':fd{}'.format(index)] = object_entry["featureData"][feature_name]
+    expression_attribute_values[':fv{}'.format(index)] = object_entry["featureVersions"][feature_name]
+    expression_attribute_values[':fn{}'.format(index)] = feature_name
+    update_expressions.append('#fd{0} = :fd{0}'.format(index))
+    update_expressions.append('#fv{0} = :fv{0}'.format(index))
+
+def upsert_features(object_hash:str, object_entry:dict, feature_names:list) -> None:
+    '''
+    Creates or updates the entry of the object with the data of the features, in one request. Raises a
+    ConditionalCheckFailedException if any of the features has already been applied
+    '''
+    expression_attribute_names, expression_attribute_values, update_expressions = create_expression_attributes(object_entry)
+    expression_attribute_values[':emptyList'] = []
+    expression_attribute_values[':featuresApplied'] = feature_names
+    update_expressions.append('#featuresApplied = list_append(if_not_exists(#featuresApplied, :emptyList), :featuresApplied)')
+
+    condition_expressions = []
+    for index, feature_name in enumerate(feature_names):
+        add_feature_attributes(index, feature_name, object_entry, expression_attribute_names, expression_attribute_values, update_expressions)
+        condition_expressions.append('contains(#featuresApplied, :fn{})'.format(index))
+
+    table.update_item(
+        Key={
+            DYNAMODB_PARTITION_KEY: object_hash
+        },
+        UpdateExpression="SET " + ", ".join(update_expressions),
+        ConditionExpression="attribute_not_exists(#hash) OR NOT ({})".format(" OR ".join(condition_expressions)),
+        ExpressionAttributeNames=expression_attribute_names,
+        ExpressionAttributeValues=expression_attribute_values
+    )
+
+def overwrite_feature(object_hash:str, object_entry:dict, feature_name:str) -> None:
+    '''
+    Overwrites the data of a feature already applied to the object. Raises a ConditionalCheckFailedException
+    if the feature has not been applied, or if the data stored is from the same or a later processing
+    '''
+    expression_attribute_names, expression_attribute_values, update_expressions = create_expression_attributes(object_entry)
+    add_feature_attributes(0, feature_name, object_entry, expression_attribute_names, expression_attribute_values, update_expressions)
+
+    table.update_item(
+        Key={
+            DYNAMODB_PARTITION_KEY: object_hash
+        },
+        UpdateExpression="SET " + ", ".join(update_expressions),
+        ConditionExpression="contains(#featuresApplied, :fn0) AND (attribute_not_exists(#fv0) OR #fv0 < :fv0)",
+        ExpressionAttributeNames=expression_attribute_names,
+        ExpressionAttributeValues=expression_attribute_values
+    )
+
+def is_conditional_check_failure(ce:ClientError) -> bool:
+    return ce.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+def write_feature(object_hash:str, object_entry:dict, feature_name:str) -> None:
+    try:
+        upsert_features(object_hash, object_entry, [ feature_name ])
+        return
+    except ClientError as ce:
+        if not is_conditional_check_failure(ce):
+            raise ce
 
-dynamodb = boto3.client('dynamodb')
+    try:
+        overwrite_feature(object_hash, object_entry, feature_name)
+        print("Overwrote Feature {} Of Entry {} With A Later Processing".format(feature_name, object_hash))
+        return
+    except ClientError as ce:
+        if not is_conditional_check_failure(ce):
+            raise ce
+    print("Feature {} Already Applied To Entry {}. Skipping Duplicate".format(feature_name, object_hash))
+
+def write_object(object_hash:str, object_entry:dict) -> None:
+    feature_names = list(object_entry["featureData"].keys())
+    try:
+        upsert_features(object_hash, object_entry, feature_names)
+        print("Applied Features {} To Entry {}".format(feature_names, object_hash))
+        return
+    except ClientError as ce:
+        if not is_conditional_check_failure(ce):
+            raise ce
 
-def lambda_handler(event, context):
-    print("Processing Event For DynamoDB Metrics")
-    print(event)
+    # Some of the features were already applied, by a redelivery of the messages or an earlier processing of
+    # the object. Write the features one at a time so only the duplicates are skipped
+    print("Some Features Already Applied To Entry {}. Applying Features Individually".format(object_hash))
+    for feature_name in feature_names:
+        write_feature(object_hash, object_entry, feature_name)
 
+def lambda_handler(event, context):
     sqs_records = event["Records"]
-    for sqs_record in sqs_records:
-        dynamodb_event = json.loads(sqs_record["body"])
-
-        '''
-        Event Shape
-
-        {
-            bucket: string
-            key: string
-            bucketArn: string
-            featureName: string
-            featureData: object
-        }
-
-        DynamoDB Entry Shape
-
-        {
-            id: number
-            hash: string (sha1 of bucket+key)
-            bucket: string
-            key: string
-            bucketArn: string
-            featuresApplied: Array<string>
-            featureData: Dict<string, object> (key is featureName)
-        }
-        '''
-
-        # query whether an entry exists
-        hash = dynamodb_event['hash']
-        event_bucket = dynamodb_event['bucket']
-        event_bucket_arn = dynamodb_event['bucketArn']
-        event_key = dynamodb_event['key']
-        bucket_key_string = event_bucket + event_key
-        feature_name = dynamodb_event["featureName"]
-        feature_data = dynamodb_event["featureData"]
-        hash = base64.urlsafe_b64encode(sha1().update(bucket_key_string).digest()).decode('utf-8')
-        table = dynamodb.Table(DYNAMODB_TABLE_NAME)
-
-        print("Tables Found. Hashes Generated")
+    print("Processing {} Messages For DynamoDB Metrics".format(len(sqs_records)))
 
+    failed_message_ids = []
+    objects = group_messages(sqs_records, failed_message_ids)
+    for object_hash, object_entry in objects.items():
         try:
-            response = table.get_item(Key={
-                hash: hash
-            })
-            print("Retrieved Possible Entry")
-            print(response)
-
-            if "Item" in response:
-                # Entry exists
-                print("E ntry Exists. Updating")
-                entry_data = dict()
-                entry_data[ feature_name ] = feature_data
-
-                table.update_item(
-                    Key={
-                        'hash': hash
-                    },
-                    UpdateExpression="SET featureData.{} = :fd, featuresApplied = list_append(:fa, featuresApplied)".format(feature_name),
-                    ExpressionAttributeValues={
-                        ':fd': entry_data,
-                        ':fa': feature_name
-                    },
-                    ReturnValues="UPDATED_NEW"
-                )
-
-            else:
-                # Entry does not exist
-                print("Entry Does Not Exist. Inserting")
-                entry_data = dict()
-                entry_data[ feature_name ] = feature_data
-                features_applied = [ feature_name ]
-                table.put_item(
-                    Item={
-                        'hash': hash,
-                        'bucket': event_bucket,
-                        'key': event_key,
-                        'bucketArn': event_bucket_arn,
-                        'featuresApplied': features_applied,
-                        'featureData': feature_data
-                    }
-                )
-
-        except ClientError as ce:
-            print(ce.response['Error']['Message'])
-            print(ce)
-            raise ce
-    
+            write_object(object_hash, object_entry)
+        except Exception as e:
+            print("Failed To Write Entry {} For File: {} in Bucket: {}".format(object_hash, object_entry["key"], object_entry["bucket"]))
+            print(e)
+            failed_message_ids.extend(object_entry["messageIds"])
+
+    print("Processing Complete. {} Objects Written, {} Messages Failed".format(len(objects), len(failed_message_ids)))
+
+    # Only the failed messages are returned to the queue for redelivery
+    return {
+        "batchItemFailures": [ { "itemIdentifier": message_id } for message_id in failed_message_ids ]
+    }
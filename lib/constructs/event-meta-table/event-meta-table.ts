@@ -0,0 +1,32 @@
+import { Construct } from "constructs";
+import {
+    aws_dynamodb as dynamodb,
+} from 'aws-cdk-lib'
+import { RemovalPolicy } from "aws-cdk-lib";
+
+export interface EventMetaTableProps {
+    namePrefix: string
+}
+
+/**
+ * Full S3, SNS, SQS and Lambda event metadata of the photos processed, referenced by metaId from the state machine
+ * payloads, which only carry the fields the pipeline uses. Entries expire through the table TTL
+ */
+export class EventMetaTable extends Construct {
+
+    public readonly eventMetaTable: dynamodb.Table
+
+    constructor(scope: Construct, id: string, props: EventMetaTableProps){
+        super(scope, id)
+
+        this.eventMetaTable = new dynamodb.Table(this, 'EventMetaTable', {
+            tableName: `${props.namePrefix}-event-meta`,
+            partitionKey: { name: 'metaId', type: dynamodb.AttributeType.STRING },
+            billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+            encryption: dynamodb.TableEncryption.DEFAULT,
+            timeToLiveAttribute: 'expiresAt',
+            // Only holds metadata of recent events
+            removalPolicy: RemovalPolicy.DESTROY
+        })
+    }
+}
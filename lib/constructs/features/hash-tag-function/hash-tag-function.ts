@@ -12,8 +12,10 @@ import { Duration } from 'aws-cdk-lib'
 import * as path from 'path'
 import { ManagedPolicies, ServicePrincipals } from "cdk-constants";
 import { Features } from "../../../enums/features";
+import { FeatureExecutionModes } from "../../../enums/feature-execution-modes";
 import { LayerTypes } from "../../lambda-layers/lambda-layers";
 import { ConfigurationSingletonFactory } from "../../../conf/configuration-singleton-factory";
+import { InlineFeature } from "../inline-feature";
 
 export interface HashTagFunctionProps {
     bucketArns: Array<string>
@@ -25,6 +27,7 @@ export interface HashTagFunctionProps {
 export class HashTagFunction extends Construct{
 
     public readonly hashTagFunction : lambda.Function
+    public readonly inlineFeature: InlineFeature
 
     constructor(scope:Construct, id:string, props: HashTagFunctionProps){
         super(scope, id)
@@ -71,30 +74,65 @@ export class HashTagFunction extends Construct{
           statements: [
             new iam.PolicyStatement({
               actions:[
-                "ssm:GetParameter"
+                "ssm:GetParameter",
+                "ssm:GetParametersByPath"
               ],
               resources: [
-                `arn:aws:ssm:${Stack.of(this).region}:${Stack.of(this).account}:parameter/${settings.namePrefix}/features/${Features.HASH_TAG}/*`
+                `arn:aws:ssm:${Stack.of(this).region}:${Stack.of(this).account}:parameter/${settings.namePrefix}/features`,
+                `arn:aws:ssm:${Stack.of(this).region}:${Stack.of(this).account}:parameter/${settings.namePrefix}/features/*`
               ]
             })
           ]
         })
 
+        // The header of the photo is only of use to the photo meta feature when it runs after this feature
+        const passObjectHeader = settings.features.includes(Features.PHOTO_META_TAG) &&
+          settings.featureExecutionMode == FeatureExecutionModes.SEQUENTIAL
+
+        const hashTagFunctionEnvironment: { [key: string]: string } = {
+          FEATURE_NAME: Features.HASH_TAG,
+          SETTINGS_PREFIX: settings.namePrefix,
+          DYNAMODB_METRICS_QUEUE_URL: props.dynamoMetricsQueue?.queueUrl ?? "Invalid",
+          FEATURE_REGISTRY_TTL_SECONDS: settings.featureRegistryCacheTtlSeconds.toString(),
+          COALESCE_TAG_WRITES: settings.coalesceFeatureTagWrites ? "TRUE" : "FALSE",
+          SKIP_UNCHANGED_OBJECTS: settings.skipUnchangedObjects ? "TRUE" : "FALSE",
+          FEATURE_BATCH_MAX_WORKERS: settings.featureBatchMaxWorkers.toString(),
+          LOG_LEVEL: settings.logLevel,
+          METRICS_NAMESPACE: settings.metricsNamespace,
+          METRICS_FEATURE_DATA_MAX_BYTES: (settings.metricsFeatureDataMaxKiloBytes * 1024).toString(),
+          HASH_BUFFER_SIZE_BYTES: (settings.hashTagBufferSizeMegaBytes * 1024 * 1024).toString(),
+          OBJECT_HEADER_SIZE_BYTES: passObjectHeader ? (settings.hashTagObjectHeaderKiloBytes * 1024).toString() : "0"
+        }
+
         this.hashTagFunction = new lambda.Function(this, `HTFFunction`, {
           functionName: `${settings.namePrefix}-${Features.HASH_TAG}-function`,
           description: 'Hash Tag Function. Tagging S3 resources with MD5, SHA1, SHA256 and SHA512 hashes',
           runtime: lambda.Runtime.PYTHON_3_8,
-          memorySize: 1024,
+          memorySize: settings.hashTagFunctionMemorySize,
           handler: 'lambda_function.lambda_handler',
           code: lambda.Code.fromAsset(path.join(__dirname, './res')),
           timeout: props.lambdaTimeout,
           role: hashingFunctionRole,
           layers: props.onLayerRequestListener([LayerTypes.COMMONLIBLAYER]),
-          environment:{
-            FEATURE_NAME: Features.HASH_TAG,
-            SETTINGS_PREFIX: settings.namePrefix,
-            DYNAMODB_METRICS_QUEUE_URL: props.dynamoMetricsQueue?.queueUrl ?? "Invalid"
+          environment: hashTagFunctionEnvironment
+        })
+
+        this.inlineFeature = {
+          featureName: Features.HASH_TAG,
+          codePath: path.join(__dirname, './res'),
+          environment: hashTagFunctionEnvironment,
+          layers: props.onLayerRequestListener([LayerTypes.COMMONLIBLAYER]),
+          grantPermissions: (role: iam.IRole) => {
+            hashingFunctionRoleS3Policy.attachToRole(role)
+            hashingFunctionRoleSSMPolicy.attachToRole(role)
           }
+        }
+
+        new ssm.StringParameter(this, `FeatureHashTagSettingsHASHALGORITHMS`, {
+          parameterName: `/${settings.namePrefix}/features/${Features.HASH_TAG}/settings/HASH_ALGORITHMS`,
+          description: `Comma separated list of hash algorithms to generate and tag`,
+          stringValue: settings.hashTagAlgorithms.join(","),
+          tier: ssm.ParameterTier.STANDARD
         })
 
         new ssm.StringParameter(this, `FeatureHashTagEnabled`, {
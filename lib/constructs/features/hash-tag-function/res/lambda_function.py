@@ -1,103 +1,54 @@
-import boto3
-from hashlib import md5, sha1, sha256, sha512
-import base64
 from os import environ
-from feature_processing import FeatureProcessing
-from dynamo_helper import DynamoHelper, DynamoEvent
-import common
+from hashing_engine import HashingEnginePool, SUPPORTED_ALGORITHMS, DEFAULT_BUFFER_SIZE_BYTES, encode_digests, parse_algorithms
+from batch_processing import DEFAULT_MAX_WORKERS
+from feature_runner import Feature, FeatureResult, ObjectAccess, ObjectView, STREAM_ACCESS, register_feature
+from object_scan import scan_stream, get_header_size
+from metrics_serialization import serialize_hashes
 
-s3 = boto3.client('s3')
-sqs = boto3.client('sqs')
-ssm = boto3.client('ssm')
+# Tag keys of every supported algorithm. Tags of algorithms that have since been disabled are removed
+HASH_TAG_KEYS = [ x.upper() for x in SUPPORTED_ALGORITHMS ]
 
-FEATURE_NAME = environ.get("FEATURE_NAME")
-SETTINGS_PREFIX = environ.get("SETTINGS_PREFIX")
-DYNAMODB_METRICS_QUEUE_URL = environ.get("DYNAMODB_METRICS_QUEUE_URL", "Invalid")
 
-def lambda_handler(event, context):
+class HashFeature(Feature):
 
-    if not common.is_feature_enabled(ssm, SETTINGS_PREFIX, FEATURE_NAME):
-        print("{} Has Been Disabled. Skipping Execution".format(FEATURE_NAME))
-        return event
+    object_access = ObjectAccess(STREAM_ACCESS)
 
-    # Get the object from the event and show its content type
-    print(event)
+    def __init__(self, name:str, settings_prefix:str, environment:dict = None) -> None:
+        super().__init__(name, settings_prefix, environment)
+        # Size of the header of the object passed on to the photo meta feature. 0 when it does not run after this feature
+        self.object_header_size = int(self.environment.get("OBJECT_HEADER_SIZE_BYTES", "0"))
+        # An engine is not safe for concurrent use, so one is kept for every batch worker
+        self.hashing_engines = HashingEnginePool(
+            int(self.environment.get("HASH_BUFFER_SIZE_BYTES", str(DEFAULT_BUFFER_SIZE_BYTES))),
+            int(self.environment.get("FEATURE_BATCH_MAX_WORKERS", str(DEFAULT_MAX_WORKERS)))
+        )
 
-    bucket = event["bucketName"]
-    bucketArn = event["bucketArn"]
-    key = event["key"]
-    print("Processing Tagging For File: {} in Bucket: {}".format(key, bucket))
-    
-    response = s3.get_object(Bucket=bucket, Key=key)
-    content_stream = response['Body']
-    
-    # Init Buffer
-    buffer_size_bytes = 1024 * 100 # 100 MB
-    buffer = content_stream.read(buffer_size_bytes)
-    
-    # Init Hashes
-    md5_hash = md5()
-    sha1_hash = sha1()
-    sha256_hash = sha256()
-    sha512_hash = sha512()
-    
-    # Process Buffer and Generate Hashes
-    while buffer:
-        md5_hash.update(buffer)
-        sha1_hash.update(buffer)
-        sha256_hash.update(buffer)
-        sha512_hash.update(buffer)
-        
-        buffer = content_stream.read(buffer_size_bytes)
-        
-    print("Hash Generation Complete. Putting Tagging")
-    print("Now Fetching And Updating Tags")
-    get_object_tagging_response = s3.get_object_tagging(
-        Bucket=bucket,
-        Key=key,
-    )
-    tagset = list(filter(lambda tagset: tagset['Key'] not in ['MD5', 'SHA1', 'SHA256', 'SHA512'], get_object_tagging_response['TagSet']))
+    def get_algorithms(self) -> list:
+        return parse_algorithms(self.get_setting("HASH_ALGORITHMS", ",".join(SUPPORTED_ALGORITHMS)))
 
-    tagset.extend([
-        {
-            'Key': 'MD5',
-            'Value': base64.urlsafe_b64encode(md5_hash.digest()).decode('utf-8')
-        },
-        {
-            'Key': 'SHA1',
-            'Value': base64.urlsafe_b64encode(sha1_hash.digest()).decode('utf-8')
-        },
-        {
-            'Key': 'SHA256',
-            'Value': base64.urlsafe_b64encode(sha256_hash.digest()).decode('utf-8')
-        },
-        {
-            'Key': 'SHA512',
-            'Value': base64.urlsafe_b64encode(sha512_hash.digest()).decode('utf-8')
-        }
-    ])
+    def serialize_feature_data(self, feature_data, allowlist:list = None):
+        return serialize_hashes(feature_data, allowlist)
 
-    response = s3.put_object_tagging(
-        Bucket=bucket,
-        Key=key,
-        Tagging={
-            'TagSet': tagset
-        }
-    )
+    def process(self, view:ObjectView) -> FeatureResult:
+        # The headers of all the objects of the batch have to fit in the request together
+        header_size = get_header_size(self.object_header_size, view.batch_size)
 
-    print("Tags Applied. Evaluating Event Features")
+        # Process Stream and Generate Hashes. The header of the object is captured in the same pass
+        with self.hashing_engines.engine(self.get_algorithms()) as hashing_engine:
+            scan = scan_stream(view.body, hashing_engine, header_size)
 
-    fp = FeatureProcessing(event)
-    updated_fp = fp.generate_updated_request_queue_object(FEATURE_NAME)
+        print("Hash Generation Complete. Putting Tagging")
+        hash_tags = encode_digests(scan["digests"])
+        return FeatureResult(
+            tags=hash_tags,
+            owned_keys=HASH_TAG_KEYS,
+            feature_data=hash_tags,
+            content_hash=hash_tags.get("SHA256"),
+            object_header=scan["header"]
+        )
 
-    de = DynamoEvent()
-    de.bucket = bucket
-    de.key = key
-    de.bucketArn = bucketArn
-    de.featureName = FEATURE_NAME
-    de.featureData = { x["Key"]:x["Value"] for x in tagset }
-    DynamoHelper(DYNAMODB_METRICS_QUEUE_URL, sqs).create_entry(de)
-        
-    print("Processing Complete. Terminating")
 
-    return updated_fp.get_request_queue_object()
\ No newline at end of file
+def create_feature(environment:dict) -> HashFeature:
+    return HashFeature(environment.get("FEATURE_NAME"), environment.get("SETTINGS_PREFIX"), environment)
+
+lambda_handler = register_feature(create_feature(environ)).lambda_handler
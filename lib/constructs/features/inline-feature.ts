@@ -0,0 +1,28 @@
+import {
+    aws_iam as iam,
+    aws_lambda as lambda,
+} from 'aws-cdk-lib'
+
+/**
+ * A feature as the request builder runs it in-process for small objects, see inlineDispatchMaxObjectKiloBytes
+ * in /lib/conf/settings.ts
+ */
+export interface InlineFeature {
+    featureName: string
+    /**
+     * res directory of the feature lambda, bundled with the request builder
+     */
+    codePath: string
+    /**
+     * Environment of the feature lambda
+     */
+    environment: { [key: string]: string }
+    /**
+     * Layers of the feature lambda
+     */
+    layers: Array<lambda.ILayerVersion>
+    /**
+     * Grants the permissions of the feature lambda to the role
+     */
+    grantPermissions: (role: iam.IRole) => void
+}
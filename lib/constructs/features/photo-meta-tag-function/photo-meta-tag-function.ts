@@ -11,19 +11,23 @@ import {
 import * as path from 'path'
 import { ManagedPolicies, ServicePrincipals } from "cdk-constants";
 import { Features } from "../../../enums/features";
+import { ContentFormats } from "../../../enums/content-formats";
 import { LayerTypes } from "../../lambda-layers/lambda-layers";
 import { ConfigurationSingletonFactory } from "../../../conf/configuration-singleton-factory";
+import { InlineFeature } from "../inline-feature";
 
 export interface PhotoMetaTagFunctionProps{
     bucketArns: Array<string>,
     lambdaTimeout: Duration,
     dynamoMetricsQueue?: sqs.Queue,
+    contentIndexTable?: dynamodb.Table,
     onLayerRequestListener: (layerTypes: Array<LayerTypes>) => Array<lambda.LayerVersion>
 }
 
 export class PhotoMetaTagFunction extends Construct{
 
     public readonly photoMetaFunction: lambda.Function
+    public readonly inlineFeature: InlineFeature
 
     constructor(scope: Construct, id:string, props: PhotoMetaTagFunctionProps){
         super(scope, id)
@@ -69,15 +73,34 @@ export class PhotoMetaTagFunction extends Construct{
           statements: [
             new iam.PolicyStatement({
               actions:[
-                "ssm:GetParameter"
+                "ssm:GetParameter",
+                "ssm:GetParametersByPath"
               ],
               resources: [
-                `arn:aws:ssm:${Stack.of(this).region}:${Stack.of(this).account}:parameter/${settings.namePrefix}/features/${Features.PHOTO_META_TAG}/*`
+                `arn:aws:ssm:${Stack.of(this).region}:${Stack.of(this).account}:parameter/${settings.namePrefix}/features`,
+                `arn:aws:ssm:${Stack.of(this).region}:${Stack.of(this).account}:parameter/${settings.namePrefix}/features/*`
               ]
             })
           ]
         })
 
+        const photoMetaFunctionEnvironment: { [key: string]: string } = {
+          FEATURE_NAME: Features.PHOTO_META_TAG,
+          SETTINGS_PREFIX: settings.namePrefix,
+          DYNAMODB_METRICS_QUEUE_URL: props.dynamoMetricsQueue?.queueUrl ?? "Invalid",
+          FEATURE_REGISTRY_TTL_SECONDS: settings.featureRegistryCacheTtlSeconds.toString(),
+          COALESCE_TAG_WRITES: settings.coalesceFeatureTagWrites ? "TRUE" : "FALSE",
+          SKIP_UNCHANGED_OBJECTS: settings.skipUnchangedObjects ? "TRUE" : "FALSE",
+          FEATURE_BATCH_MAX_WORKERS: settings.featureBatchMaxWorkers.toString(),
+          LOG_LEVEL: settings.logLevel,
+          METRICS_NAMESPACE: settings.metricsNamespace,
+          METRICS_FEATURE_DATA_MAX_BYTES: (settings.metricsFeatureDataMaxKiloBytes * 1024).toString()
+        }
+        if(props.contentIndexTable != undefined){
+          props.contentIndexTable.grantReadWriteData(photoMetaFunctionRole)
+          photoMetaFunctionEnvironment["CONTENT_INDEX_TABLE_NAME"] = props.contentIndexTable.tableName
+        }
+
         this.photoMetaFunction = new lambda.Function(this, `PMTFFunction`, {
           functionName: `${settings.namePrefix}-${Features.PHOTO_META_TAG}-function`,
           description: 'Photo Meta Tag Function. Tagging S3 photo resources with photo metrics.',
@@ -88,13 +111,21 @@ export class PhotoMetaTagFunction extends Construct{
           code: lambda.Code.fromAsset(path.join(__dirname, './res')),
           timeout: props.lambdaTimeout,
           role: photoMetaFunctionRole,
-          environment:{
-            FEATURE_NAME: Features.PHOTO_META_TAG,
-            SETTINGS_PREFIX: settings.namePrefix,
-            DYNAMODB_METRICS_QUEUE_URL: props.dynamoMetricsQueue?.queueUrl ?? "Invalid"
-          }
+          environment: photoMetaFunctionEnvironment
         })
 
+        this.inlineFeature = {
+          featureName: Features.PHOTO_META_TAG,
+          codePath: path.join(__dirname, './res'),
+          environment: photoMetaFunctionEnvironment,
+          layers: props.onLayerRequestListener([LayerTypes.EXIFREADLAYER, LayerTypes.COMMONLIBLAYER]),
+          grantPermissions: (role: iam.IRole) => {
+            photoMetaFunctionRoleS3Policy.attachToRole(role)
+            photoMetaFunctionRoleSSMPolicy.attachToRole(role)
+            props.contentIndexTable?.grantReadWriteData(role)
+          }
+        }
+
         new ssm.StringParameter(this, `FeaturePhotMetaTagEnabled`, {
           parameterName: `/${settings.namePrefix}/features/${Features.PHOTO_META_TAG}/enabled`,
           description: `Parameter stating whether Feature PhotoMetaTag is Enabled`,
@@ -102,6 +133,14 @@ export class PhotoMetaTagFunction extends Construct{
           tier: ssm.ParameterTier.STANDARD
       })
 
+      // As PHOTO_CONTENT_FORMATS of the feature. The request builder does not start the feature for other formats
+      new ssm.StringParameter(this, `FeaturePhotoMetaTagContentFormats`, {
+          parameterName: `/${settings.namePrefix}/features/${Features.PHOTO_META_TAG}/contentFormats`,
+          description: `Parameter stating the content formats Feature PhotoMetaTag applies to`,
+          stringValue: [ ContentFormats.JPEG, ContentFormats.TIFF, ContentFormats.NEF, ContentFormats.CR2, ContentFormats.ARW, ContentFormats.DNG ].join(","),
+          tier: ssm.ParameterTier.STANDARD
+      })
+
       new ssm.StringParameter(this, `FeaturePhotoMetaTagLambdaArn`, {
           parameterName: `/${settings.namePrefix}/features/${Features.PHOTO_META_TAG}/lambda/arn`,
           description: `Parameter stating Lambda ARN to execute by Dispatcher for Feature HashTag`,
@@ -1,19 +1,12 @@
 import exifread
-import boto3
-import urllib.parse
-import json
 import math
 import enum
-import time
 from os import environ
-from io import BytesIO
-from feature_processing import FeatureProcessing
-from dynamo_helper import DynamoHelper, DynamoEvent
-import common
-
-s3 = boto3.client("s3")
-sqs = boto3.client("sqs")
-ssm = boto3.client("ssm")
+from s3_range_file import DEFAULT_BLOCK_SIZE_BYTES
+from metrics_serialization import serialize_exif
+from content_sniffer import JPEG, TIFF, NEF, CR2, ARW, DNG
+from feature_runner import Feature, FeatureResult, ObjectAccess, ObjectView, RANGE_ACCESS, register_feature
+from instrumentation import timer, put_metric
 
 class ExifTagNames(enum.Enum):
     CAMERA_MAKE = "Image Make"
@@ -32,11 +25,9 @@ class TagKeys(enum.Enum):
     PHOTO_INFORMATION = 'Photo Information'
     PHOTO_DATE = "Photo Date"
 
-PHOTO_FILE_TYPES = ["jpg", "jpeg", "png", "dng"]
-
-FEATURE_NAME = environ.get("FEATURE_NAME")
-SETTINGS_PREFIX = environ.get("SETTINGS_PREFIX")
-DYNAMODB_METRICS_QUEUE_URL = environ.get("DYNAMODB_METRICS_QUEUE_URL", "Invalid")
+# Formats the exifread of the layer (2.3.2) reads the EXIF data of. It has no PNG support and only reads HEIC files
+# of the heic major brand, while the sniffed HEIC format also covers mif1 and heix files
+PHOTO_CONTENT_FORMATS = [ JPEG, TIFF, NEF, CR2, ARW, DNG ]
 
 def convert_exif_shutter_speed(exif_shutter_speed_value:str) -> str:
     top_number = int(exif_shutter_speed_value.split("/")[0])
@@ -59,94 +50,62 @@ def convert_exif_aperture_speed(exif_aperture_value:str) -> str:
     return shutter_speed_string
 
 
-def lambda_handler(event, context):
-
-    if not common.is_feature_enabled(ssm, SETTINGS_PREFIX, FEATURE_NAME):
-        print("{} Has Been Disabled. Skipping Execution".format(FEATURE_NAME))
-        return event
-    
-    bucket = event["bucketName"]
-    bucketArn = event["bucketArn"]
-    key = event["key"]
-    key_file_format = (key.split(".")[len(key.split("."))-1]).strip()
-
-    if key_file_format.lower() not in PHOTO_FILE_TYPES:
-        print("File {} Is Not A Valid Photo Image. Can Not Process".format(key))
-        print("Invalid File: {} in Bucket: {}".format(key, bucket))
-    else:
-        print("File {} Is A Valid Photo Image. Processing Its Meta".format(key))
-        print("Processing Photo Information For File: {} in Bucket: {}".format(key, bucket))
-        
-        response = s3.get_object(Bucket=bucket, Key=key)
-        content_stream = response['Body']
-        bs = BytesIO(content_stream.read())
-
-        exif = exifread.process_file(bs)
-
-        print("EXIF Information Fetched. Loading Tags")
-        print("Now Fetching And Updating Tags")
-
-        # Fetch the current tagging of the photo
-        get_object_tagging_response = s3.get_object_tagging(
-            Bucket=bucket,
-            Key=key,
+class PhotoMetaFeature(Feature):
+
+    content_formats = PHOTO_CONTENT_FORMATS
+    content_indexed = True
+    # No other feature reads the header, so it is not carried any further
+    clears_object_header = True
+
+    def __init__(self, name:str, settings_prefix:str, environment:dict = None) -> None:
+        super().__init__(name, settings_prefix, environment)
+        self.object_access = ObjectAccess(RANGE_ACCESS, int(self.environment.get("EXIF_BLOCK_SIZE_BYTES", str(DEFAULT_BLOCK_SIZE_BYTES))))
+
+    def serialize_feature_data(self, feature_data, allowlist:list = None):
+        return serialize_exif(feature_data, allowlist)
+
+    def process(self, view:ObjectView) -> FeatureResult:
+        print("File {} Is A Valid Photo Image. Processing Its Meta".format(view.key))
+
+        # Only the byte ranges exifread actually reads are fetched from S3, starting with the header captured by
+        # the hash feature. details=False skips the MakerNote and thumbnail, which are the only parts that can
+        # require reading further into the file
+        photo_file = view.body
+        with timer("ExifParse"):
+            exif = exifread.process_file(photo_file, details=False)
+
+        print("EXIF Information Read With {} Requests ({} Bytes). Loading Tags".format(photo_file.request_count, photo_file.bytes_fetched))
+        put_metric("ExifS3Requests", photo_file.request_count)
+        put_metric("ExifS3Bytes", photo_file.bytes_fetched, "Bytes")
+
+        tags = {
+            TagKeys.CAMERA_AND_LENSE_INFO.value: '{} {} - {}'.format(
+                exif.get(ExifTagNames.CAMERA_MAKE.value, 'Unknown'),
+                exif.get(ExifTagNames.CAMERA_MODEL.value, 'Unknown'),
+                exif.get(ExifTagNames.LENSE_MODEL.value, 'Unknown')
+            ),
+            TagKeys.PHOTO_INFORMATION.value: 'Shutter: {} Aperature: {} ISO: {} Resolution: {}x{} Focal Length: {}'.format(
+                exif.get(ExifTagNames.IMG_SHUTTER_SPEED.value, 'Unknown'),
+                exif.get(ExifTagNames.IMG_APERATURE.value, 'Unknown'),
+                exif.get(ExifTagNames.IMG_ISO.value, 'Unknown'),
+                exif.get(ExifTagNames.IMG_X_RESOLUTION.value, 'Unknown'),
+                exif.get(ExifTagNames.IMG_Y_RESOLUTION.value, 'Unknown'),
+                exif.get(ExifTagNames.LENSE_FOCAL_LENGTH.value, 'Unknown')
+            ),
+            TagKeys.PHOTO_DATE.value: '{}'.format(
+                exif.get(ExifTagNames.IMG_DATETIME.value, 'Unknown')
+            )
+        }
+
+        return FeatureResult(
+            tags=tags,
+            owned_keys=[ x.value for x in TagKeys ],
+            feature_data={ key:value for key, value in exif.items() },
+            index_data=serialize_exif(exif)
         )
-        tagset = list(filter(lambda tagset: tagset['Key'] not in [
-            TagKeys.CAMERA_AND_LENSE_INFO.value,
-            TagKeys.PHOTO_INFORMATION.value,
-            TagKeys.PHOTO_DATE.value
-        ], get_object_tagging_response['TagSet']))
-
-        # Extend with new values
-        tagset.extend([
-            {
-                'Key': TagKeys.CAMERA_AND_LENSE_INFO.value,
-                'Value': '{} {} - {}'.format(
-                    exif.get(ExifTagNames.CAMERA_MAKE.value, 'Unknown'),
-                    exif.get(ExifTagNames.CAMERA_MODEL.value, 'Unknown'),
-                    exif.get(ExifTagNames.LENSE_MODEL.value, 'Unknown')
-                )
-            },
-            {
-                'Key': TagKeys.PHOTO_INFORMATION.value,
-                'Value': 'Shutter: {} Aperature: {} ISO: {} Resolution: {}x{} Focal Length: {}'.format(
-                    exif.get(ExifTagNames.IMG_SHUTTER_SPEED.value, 'Unknown'),
-                    exif.get(ExifTagNames.IMG_APERATURE.value, 'Unknown'),
-                    exif.get(ExifTagNames.IMG_ISO.value, 'Unknown'),
-                    exif.get(ExifTagNames.IMG_X_RESOLUTION.value, 'Unknown'),
-                    exif.get(ExifTagNames.IMG_Y_RESOLUTION.value, 'Unknown'),
-                    exif.get(ExifTagNames.LENSE_FOCAL_LENGTH.value, 'Unknown')
-                )
-            },
-            {
-                'Key': TagKeys.PHOTO_DATE.value,
-                'Value': '{}'.format(
-                    exif.get(ExifTagNames.IMG_DATETIME.value, 'Unknown')
-                )
-            }
-        ])
-
-        # Put new tag values
-        s3.put_object_tagging(
-            Bucket=bucket,
-            Key=key,
-            Tagging={
-                'TagSet': tagset
-            }
-        )
-        print("Tags Applied. Evaluating Event Features")
-
-    fp = FeatureProcessing(event)
-    updated_fp = fp.generate_updated_request_queue_object(FEATURE_NAME)
 
-    de = DynamoEvent()
-    de.bucket = bucket
-    de.key = key
-    de.bucketArn = bucketArn
-    de.featureName = FEATURE_NAME
-    de.featureData = { key:value for key, value in exif.items() }
-    DynamoHelper(DYNAMODB_METRICS_QUEUE_URL, sqs).create_entry(de)
 
-    print("Feature Processing Complete. Terminating")
+def create_feature(environment:dict) -> PhotoMetaFeature:
+    return PhotoMetaFeature(environment.get("FEATURE_NAME"), environment.get("SETTINGS_PREFIX"), environment)
 
-    return updated_fp.get_request_queue_object()
\ No newline at end of file
+lambda_handler = register_feature(create_feature(environ)).lambda_handler
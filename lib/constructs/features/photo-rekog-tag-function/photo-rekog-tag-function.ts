@@ -11,19 +11,24 @@ import {
 import * as path from 'path'
 import { ManagedPolicies, ServicePrincipals } from "cdk-constants";
 import { Features } from "../../../enums/features";
+import { ContentFormats } from "../../../enums/content-formats";
 import { LayerTypes } from "../../lambda-layers/lambda-layers";
 import { ConfigurationSingletonFactory } from "../../../conf/configuration-singleton-factory";
+import { InlineFeature } from "../inline-feature";
 
 export interface PhotoRekogTagFunctionProps{
     bucketArns: Array<string>,
     lambdaTimeout: Duration,
     dynamoMetricsQueue?: sqs.Queue,
+    contentIndexTable?: dynamodb.Table,
+    rateLimitTable?: dynamodb.Table,
     onLayerRequestListener: (layerTypes: Array<LayerTypes>) => Array<lambda.LayerVersion>
 }
 
 export class PhotoRekogTagFunction extends Construct{
 
     public readonly rekogFunction: lambda.Function
+    public readonly inlineFeature: InlineFeature
 
     constructor(scope: Construct, id:string, props: PhotoRekogTagFunctionProps){
         super(scope, id)
@@ -86,39 +91,82 @@ export class PhotoRekogTagFunction extends Construct{
           statements: [
             new iam.PolicyStatement({
               actions:[
-                "ssm:GetParameter"
+                "ssm:GetParameter",
+                "ssm:GetParametersByPath"
               ],
               resources: [
-                `arn:aws:ssm:${Stack.of(this).region}:${Stack.of(this).account}:parameter/${settings.namePrefix}/features/${Features.PHOTO_REKOG_TAG}/*`
+                `arn:aws:ssm:${Stack.of(this).region}:${Stack.of(this).account}:parameter/${settings.namePrefix}/features`,
+                `arn:aws:ssm:${Stack.of(this).region}:${Stack.of(this).account}:parameter/${settings.namePrefix}/features/*`
               ]
             })
           ]
         })
 
+        // Pillow is not bundled. Without its layer, bytes mode can only send the embedded previews of the photos
+        const rekogLayers: Array<lambda.ILayerVersion> = [ ...props.onLayerRequestListener([LayerTypes.COMMONLIBLAYER]) ]
+        if(settings.rekogBytesMode && settings.rekogImageLibraryLayerArn != ""){
+          rekogLayers.push(lambda.LayerVersion.fromLayerVersionArn(this, "PRTFImageLibraryLayer", settings.rekogImageLibraryLayerArn))
+        }
+
+        const rekogFunctionEnvironment: { [key: string]: string } = {
+          FEATURE_NAME: Features.PHOTO_REKOG_TAG,
+          SETTINGS_PREFIX: settings.namePrefix,
+          DYNAMODB_METRICS_QUEUE_URL: props.dynamoMetricsQueue?.queueUrl ?? "Invalid",
+          FEATURE_REGISTRY_TTL_SECONDS: settings.featureRegistryCacheTtlSeconds.toString(),
+          COALESCE_TAG_WRITES: settings.coalesceFeatureTagWrites ? "TRUE" : "FALSE",
+          SKIP_UNCHANGED_OBJECTS: settings.skipUnchangedObjects ? "TRUE" : "FALSE",
+          FEATURE_BATCH_MAX_WORKERS: settings.featureBatchMaxWorkers.toString(),
+          LOG_LEVEL: settings.logLevel,
+          METRICS_NAMESPACE: settings.metricsNamespace,
+          METRICS_FEATURE_DATA_MAX_BYTES: (settings.metricsFeatureDataMaxKiloBytes * 1024).toString(),
+          REKOG_BYTES_MODE: settings.rekogBytesMode ? "TRUE" : "FALSE",
+          REKOG_TARGET_LONG_EDGE: settings.rekogTargetLongEdge.toString(),
+          REKOG_MAX_TPS: settings.rekogMaxTransactionsPerSecond.toString()
+        }
+        if(props.contentIndexTable != undefined){
+          props.contentIndexTable.grantReadWriteData(rekogFunctionRole)
+          rekogFunctionEnvironment["CONTENT_INDEX_TABLE_NAME"] = props.contentIndexTable.tableName
+        }
+        if(props.rateLimitTable != undefined){
+          props.rateLimitTable.grantReadWriteData(rekogFunctionRole)
+          rekogFunctionEnvironment["RATE_LIMIT_TABLE_NAME"] = props.rateLimitTable.tableName
+        }
+
         this.rekogFunction = new lambda.Function(this, `PRTFFunction`, {
           functionName: `${settings.namePrefix}-${Features.PHOTO_REKOG_TAG}-function`,
           description: 'Photo Rekognition Tag Function. Tagging S3 Photos with Contents Labels Using AWS Rekognition',
           runtime: lambda.Runtime.PYTHON_3_8,
-          memorySize: 128,
+          // Bytes mode decodes and downscales photos in memory
+          memorySize: settings.rekogBytesMode ? 1024 : 128,
           handler: 'lambda_function.lambda_handler',
           code: lambda.Code.fromAsset(path.join(__dirname, './res')),
           timeout: props.lambdaTimeout,
           role: rekogFunctionRole,
-          layers: props.onLayerRequestListener([LayerTypes.COMMONLIBLAYER]),
-          environment:{
-            FEATURE_NAME: Features.PHOTO_REKOG_TAG,
-            SETTINGS_PREFIX: settings.namePrefix,
-            DYNAMODB_METRICS_QUEUE_URL: props.dynamoMetricsQueue?.queueUrl ?? "Invalid"
-          }
+          layers: rekogLayers,
+          environment: rekogFunctionEnvironment
         })
 
+        this.inlineFeature = {
+          featureName: Features.PHOTO_REKOG_TAG,
+          codePath: path.join(__dirname, './res'),
+          environment: rekogFunctionEnvironment,
+          layers: rekogLayers,
+          grantPermissions: (role: iam.IRole) => {
+            rekogFunctionRoleRekognitionPolicy.attachToRole(role)
+            rekogFunctionRoleS3Policy.attachToRole(role)
+            rekogFunctionRoleSSMPolicy.attachToRole(role)
+            props.contentIndexTable?.grantReadWriteData(role)
+            props.rateLimitTable?.grantReadWriteData(role)
+          }
+        }
+
         let rekogMinConfidence = "75.0"
         if(props.dynamoMetricsQueue?.queueUrl != undefined){
           rekogMinConfidence = "55.0"
         }
 
         new ssm.StringParameter(this, `FeaturePhotoRekogSettingsREKOGMINCONFIDENCE`, {
-          parameterName: `/${settings.namePrefix}/features/${Features.PHOTO_REKOG_TAG}/setting/REKOG_MIN_CONFIDENCE`,
+          parameterName: `/${settings.namePrefix}/features/${Features.PHOTO_REKOG_TAG}/settings/REKOG_MIN_CONFIDENCE`,
           description: `REKOG Minimum Confidence to provide as a possible guess`,
           stringValue: rekogMinConfidence,
           tier: ssm.ParameterTier.STANDARD
@@ -131,6 +179,13 @@ export class PhotoRekogTagFunction extends Construct{
           tier: ssm.ParameterTier.STANDARD
         })
         
+        new ssm.StringParameter(this, `FeaturePhotoRekogSettingsREKOGMAXTPS`, {
+          parameterName: `/${settings.namePrefix}/features/${Features.PHOTO_REKOG_TAG}/settings/REKOG_MAX_TPS`,
+          description: `Maximum number of Rekognition DetectLabels calls per second, across all executions`,
+          stringValue: settings.rekogMaxTransactionsPerSecond.toString(),
+          tier: ssm.ParameterTier.STANDARD
+        })
+
         new ssm.StringParameter(this, `FeaturePhotoRekogEnabled`, {
           parameterName: `/${settings.namePrefix}/features/${Features.PHOTO_REKOG_TAG}/enabled`,
           description: `Parameter stating whether Feature PhotoRekog is Enabled`,
@@ -138,6 +193,18 @@ export class PhotoRekogTagFunction extends Construct{
           tier: ssm.ParameterTier.STANDARD
         })
 
+        // As get_content_formats of the feature. Formats with a JPEG preview are only supported in bytes mode
+        const rekogContentFormats = [ ContentFormats.JPEG, ContentFormats.PNG ]
+        if(settings.rekogBytesMode){
+          rekogContentFormats.push(ContentFormats.TIFF, ContentFormats.NEF, ContentFormats.CR2, ContentFormats.ARW, ContentFormats.DNG)
+        }
+        new ssm.StringParameter(this, `FeaturePhotoRekogContentFormats`, {
+            parameterName: `/${settings.namePrefix}/features/${Features.PHOTO_REKOG_TAG}/contentFormats`,
+            description: `Parameter stating the content formats Feature PhotoRekog applies to`,
+            stringValue: rekogContentFormats.join(","),
+            tier: ssm.ParameterTier.STANDARD
+        })
+
         new ssm.StringParameter(this, `FeaturePhotoRekogLambdaArn`, {
             parameterName: `/${settings.namePrefix}/features/${Features.PHOTO_REKOG_TAG}/lambda/arn`,
             description: `Parameter stating Lambda ARN to execute by Dispatcher for Feature PhotoRekog`,
@@ -1,63 +1,134 @@
 import json
-import boto3
 from os import environ
-from feature_processing import FeatureProcessing
-from dynamo_helper import DynamoHelper, DynamoEvent
-from ssm_helper import SSMHelper
-import common
-
-s3 = boto3.client('s3')
-sqs = boto3.client('sqs')
-rekog = boto3.client('rekognition')
-ssm = boto3.client('ssm')
+from image_preview import prepare_image, DEFAULT_TARGET_LONG_EDGE, DEFAULT_MAX_IMAGE_BYTES
+from rate_limiter import RateLimiter, RateLimitedClient, create_shared_counter
+from metrics_serialization import serialize_labels
+from content_sniffer import JPEG, PNG, TIFF, NEF, CR2, ARW, DNG
+from feature_runner import Feature, FeatureResult, ObjectAccess, ObjectUnreadable, ObjectView, RANGE_ACCESS, register_feature
+from aws_clients import lazy_client
+from instrumentation import timer, put_metric
 
 # As of writing Rekognition only works for JPG/JPEG and PNG photos
-PHOTO_FILE_TYPES = ["jpg", "jpeg", "png"]
-
-FEATURE_NAME = environ.get("FEATURE_NAME")
-SETTINGS_PREFIX = environ.get("SETTINGS_PREFIX")
-
-DYNAMODB_METRICS_QUEUE_URL = environ.get("DYNAMODB_METRICS_QUEUE_URL", "Invalid")
-
-
-ssm_helper = SSMHelper(ssm)
-
-REKOG_MIN_CONFIDENCE_SSM_KEY = "/{}/features/{}/settings/REKOG_MIN_CONFIDENCE".format(SETTINGS_PREFIX, FEATURE_NAME)
-REKOG_MIN_CONFIDENCE = float(ssm_helper.get_parameter(REKOG_MIN_CONFIDENCE_SSM_KEY) if ssm_helper.parameter_exists(REKOG_MIN_CONFIDENCE_SSM_KEY) else '75.0')
-
-REKOG_MAX_LABELS_SSM_KEY = "/{}/features/{}/settings/REKOG_MAX_LABELS".format(SETTINGS_PREFIX, FEATURE_NAME)
-REKOG_MAX_LABELS = int(ssm_helper.get_parameter(REKOG_MAX_LABELS_SSM_KEY) if ssm_helper.parameter_exists(REKOG_MAX_LABELS_SSM_KEY) else '10')
-
-def lambda_handler(event, context):
-
-    print(event)
-
-    if not common.is_feature_enabled(ssm, SETTINGS_PREFIX, FEATURE_NAME):
-        print("{} Has Been Disabled. Skipping Execution".format(FEATURE_NAME))
-        return event
-
-    bucket = event["bucketName"]
-    bucketArn = event["bucketArn"]
-    key = event["key"]
-    key_file_format = (key.split(".")[len(key.split("."))-1]).strip()
+PHOTO_CONTENT_FORMATS = [ JPEG, PNG ]
+# TIFF based formats with an embedded JPEG preview that can be sent in bytes mode, see image_preview
+PREVIEW_CONTENT_FORMATS = [ TIFF, NEF, CR2, ARW, DNG ]
+
+# Largest photo Rekognition reads from S3. Larger ones are sent as Bytes in bytes mode
+MAX_S3_OBJECT_BYTES = 1024 * 1024 * 15 # 15 MB
+# Bytes mode reads the photo in large blocks and keeps few of them, bounding the memory used
+BYTES_MODE_BLOCK_SIZE_BYTES = 1024 * 1024 # 1 MB
+BYTES_MODE_MAX_CACHED_BLOCKS = 4
+
+
+class PhotoRekogFeature(Feature):
+
+    content_indexed = True
+
+    def __init__(self, name:str, settings_prefix:str, environment:dict = None) -> None:
+        super().__init__(name, settings_prefix, environment)
+        self.bytes_mode = self.environment.get("REKOG_BYTES_MODE", "FALSE") == "TRUE"
+        self.target_long_edge = int(self.environment.get("REKOG_TARGET_LONG_EDGE", str(DEFAULT_TARGET_LONG_EDGE)))
+        # Account quota of DetectLabels calls per second, shared by all the concurrent executions of this function.
+        # Overridden by the REKOG_MAX_TPS setting of the feature
+        self.max_tps = float(self.environment.get("REKOG_MAX_TPS", "5"))
+        self.rate_limiter = RateLimiter(self.max_tps,
+            create_shared_counter("rekognition-detect-labels", self.environment.get("RATE_LIMIT_TABLE_NAME")))
+        # Throttled calls, and those failing with transient errors, are retried by the rate limited client, which backs off
+        # the whole function, not by botocore
+        self.rekog = RateLimitedClient(
+            lazy_client('rekognition', retries={ "mode": "standard", "total_max_attempts": 1 }),
+            self.rate_limiter,
+            [ "detect_labels" ]
+        )
 
-    if key_file_format.lower() not in PHOTO_FILE_TYPES:
-        print("File {} Is Not A Valid Photo Image. Can Not Process".format(key))
-        print("Invalid File: {} in Bucket: {}".format(key, bucket))
-    else:
-        print("Running Rekognition For File: {} in Bucket: {}".format(key, bucket))
-        
-        rekog_response = rekog.detect_labels(
-            Image={
+    def is_read_by_rekognition(self, view:ObjectView) -> bool:
+        '''
+        Photos Rekognition can read from S3 are referenced as an S3Object. In bytes mode, the others are sent as Bytes
+        of their embedded preview or of a downscaled copy
+        '''
+        return not self.bytes_mode or (view.get_content_format() in PHOTO_CONTENT_FORMATS and (view.size is None or view.size <= MAX_S3_OBJECT_BYTES))
+
+    def get_rekognition_image(self, view:ObjectView) -> dict:
+        '''
+        Returns the Image parameter of detect_labels, see is_read_by_rekognition. Returns None when the photo can
+        not be prepared
+        '''
+        if self.is_read_by_rekognition(view):
+            return {
                 "S3Object":{
-                    "Bucket": bucket,
-                    "Name": key
+                    "Bucket": view.bucket,
+                    "Name": view.key
                 }
-            },
-            MinConfidence=REKOG_MIN_CONFIDENCE,
-            MaxLabels=REKOG_MAX_LABELS
+            }
+
+        print("Preparing Image Bytes Of File: {} in Bucket: {}".format(view.key, view.bucket))
+        photo_file = view.body
+        with timer("PrepareImage"):
+            image_bytes = prepare_image(photo_file, self.target_long_edge, DEFAULT_MAX_IMAGE_BYTES)
+        print("Image Bytes Prepared With {} Requests ({} Bytes Read)".format(photo_file.request_count, photo_file.bytes_fetched))
+        if image_bytes is None:
+            return None
+        return {
+            "Bytes": image_bytes
+        }
+
+    def get_rekog_settings(self) -> tuple:
+        '''
+        Returns (min confidence, max labels). Read from the feature registry on first use rather then at import,
+        and refreshed with it
+        '''
+        return (
+            float(self.get_setting("REKOG_MIN_CONFIDENCE", "75.0")),
+            int(self.get_setting("REKOG_MAX_LABELS", "10"))
         )
 
+    def get_object_access(self, view:ObjectView) -> ObjectAccess:
+        if self.is_read_by_rekognition(view):
+            return None
+        return ObjectAccess(RANGE_ACCESS, BYTES_MODE_BLOCK_SIZE_BYTES, BYTES_MODE_MAX_CACHED_BLOCKS)
+
+    def get_content_formats(self) -> list:
+        return PHOTO_CONTENT_FORMATS + PREVIEW_CONTENT_FORMATS if self.bytes_mode else PHOTO_CONTENT_FORMATS
+
+    def get_content_index_variant(self) -> str:
+        # The labels depend on the settings, so results are indexed per combination of them
+        return "{}:{}".format(*self.get_rekog_settings())
+
+    def serialize_feature_data(self, feature_data, allowlist:list = None):
+        return serialize_labels(feature_data, allowlist)
+
+    def get_empty_feature_data(self):
+        return list()
+
+    def before_invocation(self) -> None:
+        self.rate_limiter.set_max_tps(float(self.get_setting("REKOG_MAX_TPS", str(self.max_tps))))
+
+    def after_invocation(self) -> None:
+        # Reset so every invocation reports its own calls
+        rate_limiter_metrics = self.rate_limiter.get_metrics(reset=True)
+        print("Rekognition Rate Limiter Metrics: {}".format(json.dumps(rate_limiter_metrics)))
+        put_metric("RekognitionThrottles", rate_limiter_metrics["throttles"])
+        put_metric("RekognitionRateLimitWait", rate_limiter_metrics["waitSeconds"], "Seconds")
+
+    def process(self, view:ObjectView) -> FeatureResult:
+        min_confidence, max_labels = self.get_rekog_settings()
+        print("Running Rekognition For File: {} in Bucket: {}".format(view.key, view.bucket))
+
+        try:
+            rekog_image = self.get_rekognition_image(view)
+            if rekog_image is None:
+                print("File: {} in Bucket: {} Could Not Be Prepared For Rekognition. Skipping".format(view.key, view.bucket))
+                return FeatureResult(feature_data=list())
+
+            with timer("DetectLabels"):
+                rekog_response = self.rekog.detect_labels(
+                    Image=rekog_image,
+                    MinConfidence=min_confidence,
+                    MaxLabels=max_labels
+                )
+        except self.rekog.exceptions.InvalidS3ObjectException as e:
+            raise ObjectUnreadable() from e
+
         print("Rekognition Complete. Applying Tagging")
 
         # Grab the labels
@@ -65,45 +136,14 @@ def lambda_handler(event, context):
         # Sort them from highest confidence to lowest
         labels.sort(key=lambda x: x.get("Confidence"), reverse=True)
         # Grab all the names, but only as many as the REKOG_MAX_LABELS amount. This is the amount that will be tagged onto the S3 blob
-        label_names = [ x["Name"] for x in labels[:REKOG_MAX_LABELS]]
+        label_names = [ x["Name"] for x in labels[:max_labels]]
         # Merge the tags into a single string
         labels_string = ':'.join(label_names)
 
-        # Grab the current tagging for the S3 object
-        get_object_tagging_response = s3.get_object_tagging(
-            Bucket=bucket,
-            Key=key,
-        )
-        # Keep all tag values except for the DetectedInPhoto tag value
-        tagset = list(filter(lambda tagset: tagset['Key'] not in ['DetectedInPhoto'], get_object_tagging_response['TagSet']))
-        tagset.extend([
-            {
-                'Key': 'DetectedInPhoto',
-                'Value': labels_string
-            }
-        ])
-
-        print(tagset)
-        # Update the tags
-        response = s3.put_object_tagging(
-            Bucket=bucket,
-            Key=key,
-            Tagging={
-                'TagSet': tagset
-            }
-        )
+        return FeatureResult(tags={ 'DetectedInPhoto': labels_string }, feature_data=labels)
 
-    fp = FeatureProcessing(event)
-    updated_fp = fp.generate_updated_request_queue_object(FEATURE_NAME)
 
-    de = DynamoEvent()
-    de.bucket = bucket
-    de.key = key
-    de.bucketArn = bucketArn
-    de.featureName = FEATURE_NAME
-    de.featureData = rekog_response["Labels"]
-    DynamoHelper(DYNAMODB_METRICS_QUEUE_URL, sqs).create_entry(de)
-    
-    print("Feature Processing Complete. Terminating")
+def create_feature(environment:dict) -> PhotoRekogFeature:
+    return PhotoRekogFeature(environment.get("FEATURE_NAME"), environment.get("SETTINGS_PREFIX"), environment)
 
-    return updated_fp.get_request_queue_object()
\ No newline at end of file
+lambda_handler = register_feature(create_feature(environ)).lambda_handler
@@ -0,0 +1,119 @@
+import threading
+from os import environ
+
+'''
+    Shared, lazily constructed boto3 clients and resources.
+
+    Importing boto3 and creating clients account for most of the cold start of the lambdas, and a lambda often
+    does not use all of the clients it declares (a skipped object never reaches S3, a feature whose result is in
+    the content index never calls its service). lazy_client returns a proxy that can be declared in module scope
+    like a client, and only imports boto3 and creates the client the first time one of its attributes is used.
+
+    Clients are created once per service and configuration and shared by all the modules of the lambda. They
+    are created from a single session under a lock, as creating clients is not thread safe, and are themselves
+    safe to share between threads. For local runs and tests, register_client and register_resource replace the
+    clients of a service with stand-ins, they have to be registered before the proxies are first used
+'''
+
+DEFAULT_MAX_POOL_CONNECTIONS = int(environ.get("AWS_CLIENT_MAX_POOL_CONNECTIONS", "32"))
+DEFAULT_CONNECT_TIMEOUT_SECONDS = int(environ.get("AWS_CLIENT_CONNECT_TIMEOUT_SECONDS", "5"))
+DEFAULT_READ_TIMEOUT_SECONDS = int(environ.get("AWS_CLIENT_READ_TIMEOUT_SECONDS", "60"))
+DEFAULT_MAX_ATTEMPTS = int(environ.get("AWS_CLIENT_MAX_ATTEMPTS", "3"))
+
+_session = None
+_clients = dict()
+_resources = dict()
+_registered_clients = dict()
+_registered_resources = dict()
+_lock = threading.RLock()
+
+
+def get_default_config():
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=DEFAULT_READ_TIMEOUT_SECONDS,
+        # Standard mode retries throttling and transient errors with exponential backoff, unlike the legacy default
+        retries={ "mode": "standard", "max_attempts": DEFAULT_MAX_ATTEMPTS },
+        tcp_keepalive=True
+    )
+
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            import boto3
+            _session = boto3.session.Session()
+        return _session
+
+def get_client(service_name:str, **config_overrides):
+    '''
+    Returns the shared client of the service. config_overrides are botocore Config parameters replacing those
+    of the default configuration, clients with different overrides are not shared
+    '''
+    if service_name in _registered_clients:
+        return _registered_clients[service_name]
+
+    client_key = (service_name, repr(sorted(config_overrides.items())))
+    client = _clients.get(client_key)
+    if client is not None:
+        return client
+
+    with _lock:
+        if client_key not in _clients:
+            from botocore.config import Config
+            config = get_default_config().merge(Config(**config_overrides)) if len(config_overrides) > 0 else get_default_config()
+            _clients[client_key] = get_session().client(service_name, config=config)
+        return _clients[client_key]
+
+def get_resource(service_name:str):
+    if service_name in _registered_resources:
+        return _registered_resources[service_name]
+
+    resource = _resources.get(service_name)
+    if resource is not None:
+        return resource
+
+    with _lock:
+        if service_name not in _resources:
+            _resources[service_name] = get_session().resource(service_name, config=get_default_config())
+        return _resources[service_name]
+
+def register_client(service_name:str, client) -> None:
+    '''
+    Returns client for the service from then on, whatever the configuration requested
+    '''
+    with _lock:
+        _registered_clients[service_name] = client
+
+def register_resource(service_name:str, resource) -> None:
+    with _lock:
+        _registered_resources[service_name] = resource
+
+
+class LazyProxy:
+    '''
+    Stands in for the object returned by factory, which is only called the first time an attribute is used
+    '''
+
+    def __init__(self, factory) -> None:
+        self._factory = factory
+        self._target = None
+
+    def _get_target(self):
+        if self._target is None:
+            with _lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return self._target
+
+    def __getattr__(self, name:str):
+        return getattr(self._get_target(), name)
+
+
+def lazy_client(service_name:str, **config_overrides) -> LazyProxy:
+    return LazyProxy(lambda: get_client(service_name, **config_overrides))
+
+def lazy_table(table_name:str) -> LazyProxy:
+    return LazyProxy(lambda: get_resource("dynamodb").Table(table_name))
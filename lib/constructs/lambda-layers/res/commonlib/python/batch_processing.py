@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+
+'''
+    Batch Request Shape:
+
+    {
+        batch: Array<request> - a request per object, each shaped as the single object request
+        batchFailures: Array<{
+            bucketName: string
+            key: string
+            featureName: string
+            error: string
+        }>
+    }
+
+    Objects that fail in a feature are moved from batch to batchFailures, so the following features
+    and the tag writer only process the objects that are still healthy
+'''
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def is_batch(event) -> bool:
+    return isinstance(event, dict) and "batch" in event
+
+def create_batch(requests:list) -> dict:
+    return {
+        "batch": requests,
+        "batchFailures": []
+    }
+
+def process_batch(event:dict, feature_name:str, process_object, max_workers:int = DEFAULT_MAX_WORKERS) -> dict:
+    '''
+    Runs process_object on every request of the batch with a bounded pool of worker threads. Returns the updated
+    batch with the result of each successful object, in the original order, and a failure entry for every object
+    that raised an exception
+    '''
+    requests = event["batch"]
+    batch_failures = list(event.get("batchFailures", []))
+    print("Processing Batch Of {} Objects With {} Workers".format(len(requests), max_workers))
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(requests)))) as executor:
+        futures = [ executor.submit(process_object, request) for request in requests ]
+        for request, future in zip(requests, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print("Failed To Process File: {} in Bucket: {}".format(request.get("key"), request.get("bucketName")))
+                print(e)
+                batch_failures.append({
+                    "bucketName": request.get("bucketName"),
+                    "key": request.get("key"),
+                    "featureName": feature_name,
+                    "error": str(e)
+                })
+
+    print("Batch Processing Complete. {} Succeeded, {} Failed".format(len(results), len(batch_failures)))
+
+    updated_event = dict(event)
+    updated_event["batch"] = results
+    updated_event["batchFailures"] = batch_failures
+    return updated_event
+
+def merge_batch_branch_outputs(branch_outputs:list, merge_requests) -> dict:
+    '''
+    Merges the batch outputs of features that were run in parallel. Objects are matched on their bucket and key,
+    and an object that failed in any branch is only reported as a failure. merge_requests merges the list of
+    outputs of a single object
+    '''
+    batch_failures = []
+    for branch_output in branch_outputs:
+        for batch_failure in branch_output.get("batchFailures", []):
+            if batch_failure not in batch_failures:
+                batch_failures.append(batch_failure)
+    failed_objects = set([ (x["bucketName"], x["key"]) for x in batch_failures ])
+
+    object_outputs = dict()
+    for branch_output in branch_outputs:
+        for request in branch_output["batch"]:
+            object_id = (request["bucketName"], request["key"])
+            if object_id not in failed_objects:
+                object_outputs.setdefault(object_id, []).append(request)
+
+    merged = dict(branch_outputs[0])
+    merged["batch"] = [ merge_requests(requests) for requests in object_outputs.values() ]
+    merged["batchFailures"] = batch_failures
+    return merged
@@ -1,13 +1,22 @@
+from feature_registry import get_feature_registry
+from metrics_serialization import parse_allowlist
 
 
 def is_feature_enabled(ssm_client, settings_prefix: str, feature_name:str) -> bool:
     try:
-        FEATURE_ENABLED_SSM_KEY = "/{}/features/{}/enabled".format(settings_prefix, feature_name)
-        print("common.is_feature_enabled - Fetching {}".format(FEATURE_ENABLED_SSM_KEY))
-        response = ssm_client.get_parameter(
-            Name=FEATURE_ENABLED_SSM_KEY
-        )
+        registry = get_feature_registry(ssm_client, settings_prefix)
+        print("common.is_feature_enabled - Checking {} in {}".format(feature_name, registry.features_path))
+        return registry.is_feature_enabled(feature_name)
+    except Exception as e:
+        # The feature is skipped when the registry can not be read
+        print("common.is_feature_enabled - Could Not Read The Feature Registry. {} Is Considered Disabled".format(feature_name))
+        print(e)
+        return False
 
-        return response['Parameter']['Value'] == 'TRUE'
-    except:
-        return False
\ No newline at end of file
+def get_metrics_allowlist(ssm_client, settings_prefix: str, feature_name:str) -> list:
+    '''
+    Fields of the feature data kept in the metrics entries, from the optional METRICS_FIELDS setting of
+    the feature (comma separated). None when the setting does not exist
+    '''
+    registry = get_feature_registry(ssm_client, settings_prefix)
+    return parse_allowlist(registry.get_feature_setting(feature_name, "METRICS_FIELDS", None))
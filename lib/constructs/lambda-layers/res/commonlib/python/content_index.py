@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time
+from os import environ
+from aws_clients import lazy_table
+
+'''
+    Content Index Entry Shape:
+
+    {
+        contentHash: string - SHA256 of the object content (as tagged by the hash feature)
+        resultKey: string - featureName, or featureName#variant for features whose result depends on their settings
+        result: string - JSON of {
+            tags: Dict<string, string> - tag delta of the feature, see tag_merge
+            featureData: object - feature data of the metrics entry
+        }
+        createdAt: number - epoch seconds
+    }
+
+    Maps identical content to the results a feature computed for it, so that a photo uploaded again under
+    another key or bucket gets its tags copied instead of recomputed. The hash feature adds the SHA256 of the
+    object to the request as contentSha256, so the index can only be used by features that run after it
+'''
+
+CONTENT_INDEX_TABLE_NAME = environ.get("CONTENT_INDEX_TABLE_NAME")
+CONTENT_INDEX_LOCAL_PATH = environ.get("CONTENT_INDEX_LOCAL_PATH")
+
+
+def get_result_key(feature_name:str, variant:str = None) -> str:
+    return feature_name if variant is None else "{}#{}".format(feature_name, variant)
+
+def create_result(tags:dict, feature_data) -> dict:
+    return {
+        "tags": tags,
+        "featureData": feature_data
+    }
+
+
+class DynamoContentIndex:
+    '''
+    Content index backed by a DynamoDB table with contentHash as partition key and resultKey as sort key
+    '''
+
+    def __init__(self, table) -> None:
+        self.table = table
+
+    def get_result(self, content_hash:str, feature_name:str, variant:str = None) -> dict:
+        response = self.table.get_item(Key={
+            "contentHash": content_hash,
+            "resultKey": get_result_key(feature_name, variant)
+        })
+        if "Item" not in response:
+            return None
+        return json.loads(response["Item"]["result"])
+
+    def put_result(self, content_hash:str, feature_name:str, result:dict, variant:str = None) -> None:
+        # Stored as a JSON string, DynamoDB does not accept the floats feature data may contain
+        self.table.put_item(Item={
+            "contentHash": content_hash,
+            "resultKey": get_result_key(feature_name, variant),
+            "result": json.dumps(result, default=str),
+            "createdAt": int(time.time())
+        })
+
+
+class LocalContentIndex:
+    '''
+    In memory stand-in for the DynamoContentIndex, for local runs and tests. When a path is given, the index
+    is loaded from and saved to that JSON file
+    '''
+
+    def __init__(self, path:str = None) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = dict()
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as index_file:
+                self.entries = json.load(index_file)
+
+    def get_result(self, content_hash:str, feature_name:str, variant:str = None) -> dict:
+        with self.lock:
+            result = self.entries.get(content_hash, {}).get(get_result_key(feature_name, variant))
+        return json.loads(result) if result is not None else None
+
+    def put_result(self, content_hash:str, feature_name:str, result:dict, variant:str = None) -> None:
+        with self.lock:
+            self.entries.setdefault(content_hash, dict())[get_result_key(feature_name, variant)] = json.dumps(result, default=str)
+            if self.path is not None:
+                with open(self.path, "w") as index_file:
+                    json.dump(self.entries, index_file)
+
+
+def create_content_index(table_name:str = CONTENT_INDEX_TABLE_NAME, local_path:str = CONTENT_INDEX_LOCAL_PATH):
+    '''
+    Returns the content index configured through the environment: a DynamoContentIndex when
+    CONTENT_INDEX_TABLE_NAME is set, a LocalContentIndex when CONTENT_INDEX_LOCAL_PATH is set, otherwise None
+    '''
+    if table_name is not None:
+        return DynamoContentIndex(lazy_table(table_name))
+    if local_path is not None:
+        return LocalContentIndex(local_path)
+    return None
+
+def find_result(content_index, content_hash:str, feature_name:str, variant:str = None) -> dict:
+    '''
+    Looks up the result of the feature for the content. Returns None when there is no index, no content
+    hash or no result, and when the lookup fails, in which case the feature simply computes the result
+    '''
+    if content_index is None or content_hash is None:
+        return None
+    try:
+        return content_index.get_result(content_hash, feature_name, variant)
+    except Exception as e:
+        print("Content Index Lookup Failed For {}. Computing Result".format(content_hash))
+        print(e)
+        return None
+
+def store_result(content_index, content_hash:str, feature_name:str, result:dict, variant:str = None) -> None:
+    if content_index is None or content_hash is None:
+        return
+    try:
+        content_index.put_result(content_hash, feature_name, result, variant)
+    except Exception as e:
+        print("Failed To Store Result In Content Index For {}".format(content_hash))
+        print(e)
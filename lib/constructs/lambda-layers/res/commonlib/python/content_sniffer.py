@@ -0,0 +1,131 @@
+import struct
+from instrumentation import timer
+
+'''
+    Detects the format of an object from its first bytes (magic bytes) rather then from the extension of its key.
+    Mis-named files are routed by their actual content, and formats without a photo extension (HEIC and the TIFF
+    based raw formats) are recognized
+
+    TIFF based formats share the TIFF signature and are told apart by IFD0: CR2 carries its own signature after
+    the TIFF header, DNG has a DNGVersion tag, NEF and ARW are identified by the Make tag. The first kilobyte holds
+    IFD0 and its values for the cameras seen so far, a TIFF whose IFD0 is cut off is reported as TIFF
+'''
+
+JPEG = "jpeg"
+PNG = "png"
+HEIC = "heic"
+TIFF = "tiff"
+NEF = "nef"
+CR2 = "cr2"
+ARW = "arw"
+DNG = "dng"
+UNKNOWN = "unknown"
+
+CONTENT_FORMATS = [ JPEG, PNG, HEIC, TIFF, NEF, CR2, ARW, DNG ]
+
+DEFAULT_SNIFF_BYTES = 1024
+
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+TIFF_LITTLE_ENDIAN_SIGNATURE = b"II*\x00"
+TIFF_BIG_ENDIAN_SIGNATURE = b"MM\x00*"
+CR2_SIGNATURE = b"CR\x02\x00"
+# ISO base media file brands of HEIF images encoded with HEVC. mif1 is also used by AVIF, so it only counts with one of these
+HEIC_BRANDS = [ b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx" ]
+
+TIFF_TAG_MAKE = 0x010F
+TIFF_TAG_DNG_VERSION = 0xC612
+TIFF_TYPE_ASCII = 2
+
+# Make of the cameras of the raw formats sharing the TIFF signature
+RAW_MAKES = [
+    (b"NIKON", NEF),
+    (b"SONY", ARW)
+]
+
+
+def get_ftyp_brands(header:bytes) -> list:
+    '''
+    Returns the major and compatible brands of the ftyp box the file starts with
+    '''
+    if len(header) < 12 or header[4:8] != b"ftyp":
+        return []
+    box_size = min(struct.unpack(">I", header[0:4])[0], len(header))
+    brands = [ header[8:12] ]
+    # Skips the minor version
+    for offset in range(16, box_size - 3, 4):
+        brands.append(header[offset:offset + 4])
+    return brands
+
+def read_ifd0(header:bytes) -> dict:
+    '''
+    Returns the entries of IFD0 that fit in the header, as a dict of tag to (type, count, value offset field).
+    The value offset field is the raw 4 bytes of the entry
+    '''
+    byte_order = "<" if header[0:2] == b"II" else ">"
+    ifd_offset = struct.unpack(byte_order + "I", header[4:8])[0]
+    if ifd_offset + 2 > len(header):
+        return dict()
+
+    entry_count = struct.unpack(byte_order + "H", header[ifd_offset:ifd_offset + 2])[0]
+    entries = dict()
+    for index in range(entry_count):
+        entry_offset = ifd_offset + 2 + (index * 12)
+        if entry_offset + 12 > len(header):
+            break
+        tag, value_type, count = struct.unpack(byte_order + "HHI", header[entry_offset:entry_offset + 8])
+        entries[tag] = (value_type, count, header[entry_offset + 8:entry_offset + 12])
+    return entries
+
+def read_ascii_value(header:bytes, entry:tuple) -> bytes:
+    value_type, count, value_field = entry
+    if value_type != TIFF_TYPE_ASCII:
+        return b""
+    if count <= 4:
+        return value_field[:count].rstrip(b"\x00")
+    byte_order = "<" if header[0:2] == b"II" else ">"
+    value_offset = struct.unpack(byte_order + "I", value_field)[0]
+    return header[value_offset:value_offset + count].rstrip(b"\x00")
+
+def sniff_tiff_format(header:bytes) -> str:
+    if header[8:12] == CR2_SIGNATURE:
+        return CR2
+
+    entries = read_ifd0(header)
+    if TIFF_TAG_DNG_VERSION in entries:
+        return DNG
+    if TIFF_TAG_MAKE in entries:
+        make = read_ascii_value(header, entries[TIFF_TAG_MAKE]).upper()
+        for raw_make, raw_format in RAW_MAKES:
+            if make.startswith(raw_make):
+                return raw_format
+    return TIFF
+
+def sniff_format(header:bytes) -> str:
+    '''
+    Returns the format of the content starting with header, one of CONTENT_FORMATS, or UNKNOWN
+    '''
+    if header.startswith(JPEG_SIGNATURE):
+        return JPEG
+    if header.startswith(PNG_SIGNATURE):
+        return PNG
+    if header.startswith(TIFF_LITTLE_ENDIAN_SIGNATURE) or header.startswith(TIFF_BIG_ENDIAN_SIGNATURE):
+        return sniff_tiff_format(header)
+    if any([ x in HEIC_BRANDS for x in get_ftyp_brands(header) ]):
+        return HEIC
+    return UNKNOWN
+
+def sniff_object(s3_client, bucket:str, key:str, sniff_bytes:int = DEFAULT_SNIFF_BYTES) -> str:
+    '''
+    Returns the format of the object, read with a ranged GET of its first sniff_bytes bytes
+    '''
+    with timer("ContentSniff"):
+        try:
+            response = s3_client.get_object(Bucket=bucket, Key=key, Range="bytes=0-{}".format(sniff_bytes - 1))
+        except s3_client.exceptions.ClientError as e:
+            # Empty objects have no range to read
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                return UNKNOWN
+            raise
+        header = response["Body"].read()
+    return sniff_format(header)
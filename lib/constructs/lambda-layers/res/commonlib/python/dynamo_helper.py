@@ -1,4 +1,19 @@
 import json
+import gzip
+import base64
+import threading
+import time
+from metrics_serialization import serialize_feature_data, DEFAULT_MAX_BYTES
+
+# SQS limits. The size limit applies to a single message as well as to the sum of a batch
+MAX_BATCH_ENTRIES = 10
+MAX_MESSAGE_SIZE_BYTES = 1024 * 256 # 256 KB
+
+# Bodies above this size are compressed. Leaves room for the message attributes
+COMPRESSION_THRESHOLD_BYTES = 1024 * 192 # 192 KB
+
+CONTENT_ENCODING_ATTRIBUTE = "ContentEncoding"
+GZIP_BASE64_ENCODING = "gzip+base64"
 
 class DynamoEvent:
     bucket:str
@@ -6,16 +21,48 @@ class DynamoEvent:
     bucketArn:str
     featureName:str
     featureData: dict
+    eTag:str = None
+
+def encode_message_body(body:str) -> tuple:
+    '''
+    Returns the message body and its message attributes. Bodies approaching the SQS size limit are
+    gzipped and base64 encoded, which is flagged by the ContentEncoding message attribute
+    '''
+    if len(body.encode('utf-8')) < COMPRESSION_THRESHOLD_BYTES:
+        return body, dict()
+
+    encoded_body = base64.b64encode(gzip.compress(body.encode('utf-8'))).decode('utf-8')
+    return encoded_body, {
+        CONTENT_ENCODING_ATTRIBUTE: {
+            "DataType": "String",
+            "StringValue": GZIP_BASE64_ENCODING
+        }
+    }
 
 class DynamoHelper:
+    '''
+    Buffers the metrics entries and sends them to the metrics queue with send_message_batch, in batches
+    of up to 10 messages. The helper is meant to be created once per lambda container and shared between
+    invocations, with flush called before the handler returns. It is safe to use from multiple threads
+    '''
 
     dynamo_metrics_queue_url: str = "Invalid"
 
-    def __init__(self, dynamo_metrics_queue_url:str, sqs_client) -> None:
+    def __init__(self, dynamo_metrics_queue_url:str, sqs_client, feature_data_max_bytes:int = DEFAULT_MAX_BYTES) -> None:
         self.dynamo_metrics_queue_url = dynamo_metrics_queue_url
         self.sqs_client = sqs_client
+        self.feature_data_max_bytes = feature_data_max_bytes
+        self.lock = threading.Lock()
+        self.entries = []
+        self.entries_size = 0
+        self.entry_count = 0
 
-    def create_entry(self, dynamo_event:DynamoEvent) -> None:
+    def create_entry(self, dynamo_event:DynamoEvent, feature_data_allowlist:list = None, feature_data_serializer = None) -> None:
+        '''
+        The featureData is serialized with feature_data_serializer, the compact schema of the feature, keeping only
+        the fields of feature_data_allowlist when given. The entry is stamped with the time it was created, which tells the
+        metrics writer a redelivery of the entry apart from a later processing of the object
+        '''
         if self.dynamo_metrics_queue_url != "Invalid":
             print("DynamoDB Metrics Enabled. Creating Entry")
 
@@ -24,13 +71,67 @@ class DynamoHelper:
                 "key": dynamo_event.key,
                 "bucketArn": dynamo_event.bucketArn,
                 "featureName": dynamo_event.featureName,
-                "featureData": dynamo_event.featureData
+                "eTag": dynamo_event.eTag,
+                "processedAt": int(time.time() * 1000),
+                "featureData": serialize_feature_data(dynamo_event.featureData, feature_data_serializer,
+                    feature_data_allowlist, self.feature_data_max_bytes)
             }
 
-            self.sqs_client.send_message(
-                QueueUrl=self.dynamo_metrics_queue_url,
-                MessageBody=json.dumps(dynamo_event)
-            )
-        
-    
-    
\ No newline at end of file
+            body, message_attributes = encode_message_body(json.dumps(dynamo_event))
+            entry_size = len(body.encode('utf-8')) + len(json.dumps(message_attributes))
+            if entry_size > MAX_MESSAGE_SIZE_BYTES:
+                print("Entry For File: {} in Bucket: {} Is {} Bytes After Compression, Over The SQS Limit. Dropping".format(
+                    dynamo_event["key"], dynamo_event["bucket"], entry_size))
+                return
+
+            with self.lock:
+                if len(self.entries) == MAX_BATCH_ENTRIES or self.entries_size + entry_size > MAX_MESSAGE_SIZE_BYTES:
+                    self._send_entries()
+
+                entry = {
+                    "Id": str(self.entry_count),
+                    "MessageBody": body
+                }
+                if len(message_attributes) > 0:
+                    entry["MessageAttributes"] = message_attributes
+
+                self.entries.append(entry)
+                self.entries_size += entry_size
+                self.entry_count += 1
+
+    def flush(self) -> None:
+        with self.lock:
+            self._send_entries()
+
+    def _send_entries(self) -> None:
+        # Must be called while holding the lock
+        if len(self.entries) == 0:
+            return
+
+        entries = self.entries
+        self.entries = []
+        self.entries_size = 0
+
+        response = self.sqs_client.send_message_batch(
+            QueueUrl=self.dynamo_metrics_queue_url,
+            Entries=entries
+        )
+
+        failed = response.get("Failed", [])
+        if len(failed) > 0:
+            # Retry the failed entries once. Metrics are best effort, entries that fail again are dropped
+            failed_ids = set([ x["Id"] for x in failed if not x.get("SenderFault", False) ])
+            retry_entries = [ x for x in entries if x["Id"] in failed_ids ]
+            print("Failed To Send {} Metrics Entries. Retrying {}: {}".format(len(failed), len(retry_entries), failed))
+            dropped = [ x for x in failed if x["Id"] not in failed_ids ]
+            if len(retry_entries) > 0:
+                response = self.sqs_client.send_message_batch(
+                    QueueUrl=self.dynamo_metrics_queue_url,
+                    Entries=retry_entries
+                )
+                dropped.extend(response.get("Failed", []))
+            failed = dropped
+            if len(failed) > 0:
+                print("Dropping {} Metrics Entries: {}".format(len(failed), failed))
+
+        print("Sent {} Metrics Entries".format(len(entries) - len(failed)))
@@ -0,0 +1,111 @@
+import json
+import threading
+import time
+from os import environ
+from aws_clients import lazy_table
+
+'''
+    Event Meta Entry Shape:
+
+    {
+        metaId: string - referenced by the metaId of the request
+        meta: string - JSON of {
+            s3Event: object - the S3 event record of the object
+            snsEvent: object - the SNS notification, without its message
+            sqsEvent: object - the SQS record, without its body
+            lambdaEvent: object - the event of the request builder, without its records
+        }
+        expiresAt: number - epoch seconds, the table TTL attribute
+    }
+
+    The requests passed through the state machine only carry the fields the pipeline uses. The full metadata
+    of the events that led to a request is written once by the request builder and can be looked up by its
+    metaId, for troubleshooting and auditing, without being copied through every state transition
+'''
+
+EVENT_META_TABLE_NAME = environ.get("EVENT_META_TABLE_NAME")
+EVENT_META_RETENTION_DAYS = int(environ.get("EVENT_META_RETENTION_DAYS", "7"))
+
+
+def create_meta(s3_event_record:dict, sns_event:dict, sqs_event_record:dict, lambda_event:dict) -> dict:
+    return {
+        "s3Event": s3_event_record,
+        "snsEvent": { k:v for k,v in sns_event.items() if k != 'Message' }, # Grab everything but the s3Event data
+        "sqsEvent": { k:v for k,v in sqs_event_record.items() if k != 'body' }, # Grab everything but the snsEvent data
+        "lambdaEvent": { k:v for k,v in lambda_event.items() if k != 'Records' } # Grab everything but the sqsEvent data
+    }
+
+
+class DynamoEventMetaStore:
+    '''
+    Event meta store backed by a DynamoDB table with metaId as partition key and expiresAt as TTL attribute
+    '''
+
+    def __init__(self, table, retention_days:int = EVENT_META_RETENTION_DAYS) -> None:
+        self.table = table
+        self.retention_days = retention_days
+
+    def put_metas(self, metas:dict) -> None:
+        '''
+        Writes the metas, a dict of metaId to meta, with as few requests as possible
+        '''
+        expires_at = int(time.time()) + (self.retention_days * 24 * 60 * 60)
+        # The batch writer sends the items 25 at a time and resends unprocessed items
+        with self.table.batch_writer() as batch:
+            for meta_id, meta in metas.items():
+                batch.put_item(Item={
+                    "metaId": meta_id,
+                    # Stored as a JSON string, DynamoDB does not accept the floats events may contain
+                    "meta": json.dumps(meta, default=str),
+                    "expiresAt": expires_at
+                })
+
+    def get_meta(self, meta_id:str) -> dict:
+        response = self.table.get_item(Key={ "metaId": meta_id })
+        if "Item" not in response:
+            return None
+        return json.loads(response["Item"]["meta"])
+
+
+class LocalEventMetaStore:
+    '''
+    In memory stand-in for the DynamoEventMetaStore, for local runs and tests
+    '''
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.entries = dict()
+
+    def put_metas(self, metas:dict) -> None:
+        with self.lock:
+            for meta_id, meta in metas.items():
+                self.entries[meta_id] = json.dumps(meta, default=str)
+
+    def get_meta(self, meta_id:str) -> dict:
+        with self.lock:
+            meta = self.entries.get(meta_id)
+        return json.loads(meta) if meta is not None else None
+
+
+def create_event_meta_store():
+    '''
+    Returns a DynamoEventMetaStore when EVENT_META_TABLE_NAME is set, otherwise None
+    '''
+    if EVENT_META_TABLE_NAME is not None:
+        return DynamoEventMetaStore(lazy_table(EVENT_META_TABLE_NAME))
+    return None
+
+def store_metas(event_meta_store, metas:dict) -> bool:
+    '''
+    Metadata is kept on a best effort basis, a failure to store it does not fail the requests. Returns False
+    when it could not be stored
+    '''
+    if event_meta_store is None or len(metas) == 0:
+        return True
+    try:
+        event_meta_store.put_metas(metas)
+        return True
+    except Exception as e:
+        print("Failed To Store The Event Meta Of {} Requests".format(len(metas)))
+        print(e)
+        return False
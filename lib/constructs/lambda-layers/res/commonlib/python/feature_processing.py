@@ -1,9 +1,43 @@
 
 
 import json
-import copy
 import typing
 
+'''
+    Request Shape:
+
+    {
+        bucketName: string
+        bucketArn: string
+        key: string
+        eTag: string | None
+        size: number | None
+        storageClass: string - only set when the request builder checked the storage class of the object
+        metaId: string - id of the event metadata in the event meta store, when it is kept
+        eventRef: {
+            messageId: string - id of the SQS message of the event
+            sequencer: string | None - sequencer of the S3 event, missing from backfill events
+        } - reference to the event in place of the metaId, when the event metadata is not kept
+        force: bool - set when the object is reprocessed regardless of earlier results, see s3_events
+        features: Array<{
+            name: string
+            completed: bool
+            available: bool
+            lambdaArn: string | None
+        }>
+        numberOfFeaturesCompleted: number
+        contentFormat: string - format of the object sniffed from its content, see content_sniffer. Set by the request
+            builder, or by the first feature that needs it
+        contentSha256: string - set by the hash feature
+        objectHeader: string - set by the hash feature for the photo meta feature, see object_scan
+        pendingTags: Dict<string, tag delta> - set by the features when the tag writes are coalesced, see tag_merge
+    }
+
+    The request is passed through every state of the state machine, so it only carries the fields the pipeline
+    uses. Updates copy only the parts of the request they change, the rest is shared with the request they
+    were made from, which must not be modified afterwards
+'''
+
 class FeatureProcessing:
 
     def __init__(self, request_queue_object:dict) -> None:
@@ -17,14 +51,109 @@ class FeatureProcessing:
         return self.request_queue_object
 
     def generate_updated_request_queue_object(self, feature_name:str):
-        current_number_features_completed = self.request_queue_object["numberOfFeaturesCompleted"] + 1
-        local_copy = copy.deepcopy(self.request_queue_object)
+        local_copy = dict(self.request_queue_object)
+        local_copy["features"] = [
+            dict(feature, completed=True) if feature["name"] == feature_name else feature
+            for feature in self.request_queue_object["features"]
+        ]
+
+        # Counted from the completed flags rather then incremented, so the count stays correct regardless
+        # of the order, or parallelism, the features are run in
+        local_copy["numberOfFeaturesCompleted"] = len([ x for x in local_copy["features"] if x["completed"] ])
+        return FeatureProcessing(local_copy)
+
+    @staticmethod
+    def merge_branch_outputs(branch_outputs:list):
+        '''
+        Merges the outputs of features that were run in parallel on the same request into a single request. A
+        feature is completed if it was completed in any of the branches, and the pending tags of all
+        branches are combined
+        '''
+        merged = dict(branch_outputs[0])
+        merged["features"] = [ dict(x) for x in branch_outputs[0]["features"] ]
+        merged["pendingTags"] = dict()
+
+        for branch_output in branch_outputs:
+            for key, value in branch_output.items():
+                if key not in merged:
+                    merged[key] = value
+
+            completed_feature_names = [ x["name"] for x in branch_output["features"] if x["completed"] ]
+            for feature in merged["features"]:
+                if feature["name"] in completed_feature_names:
+                    feature["completed"] = True
+
+            merged["pendingTags"].update(branch_output.get("pendingTags", {}))
+
+        merged["numberOfFeaturesCompleted"] = len([ x for x in merged["features"] if x["completed"] ])
+        return FeatureProcessing(merged)
+
+    def is_feature_completed(self, feature_name:str) -> bool:
+        return any([ x["completed"] for x in self.request_queue_object["features"] if x["name"] == feature_name ])
+
+    def is_forced(self) -> bool:
+        '''
+        Forced requests are processed by the features even if results for the content are in the content index
+        '''
+        return self.request_queue_object.get("force", False)
+
+    def get_completed_feature_names(self) -> list:
+        return [ x["name"] for x in self.request_queue_object["features"] if x["completed"] ]
+
+    def get_content_fingerprint(self) -> tuple:
+        '''
+        Returns a tuple of (eTag, size, completed feature names) to fingerprint the object with, or None if the
+        request does not carry the ETag and size of the object
+        '''
+        if self.request_queue_object.get("eTag") is None or self.request_queue_object.get("size") is None:
+            return None
+        return self.request_queue_object["eTag"], self.request_queue_object["size"], self.get_completed_feature_names()
+
+    def set_content_hash(self, content_hash:str) -> None:
+        '''
+        SHA256 of the object content, used by the following features to look up their results in the content index
+        '''
+        self.request_queue_object["contentSha256"] = content_hash
+
+    def get_content_hash(self) -> str:
+        return self.request_queue_object.get("contentSha256")
+
+    def set_content_format(self, content_format:str) -> None:
+        '''
+        Format of the object sniffed from its first bytes, so the following features do not read them again
+        '''
+        self.request_queue_object["contentFormat"] = content_format
+
+    def get_content_format(self) -> str:
+        return self.request_queue_object.get("contentFormat")
+
+    def set_object_header(self, encoded_header:str) -> None:
+        '''
+        Base64 encoded header of the object captured by the hash feature, see object_scan
+        '''
+        self.request_queue_object["objectHeader"] = encoded_header
+
+    def get_object_header(self) -> str:
+        return self.request_queue_object.get("objectHeader")
+
+    def clear_object_header(self) -> None:
+        self.request_queue_object.pop("objectHeader", None)
+
+    def add_pending_tags(self, feature_name:str, tag_delta:dict) -> None:
+        '''
+        Stores the tag delta of the feature in the payload so the tag writer step can apply the tags of
+        every feature in a single S3 tagging round-trip
+        '''
+        # Replaced rather then updated, the pending tags may be shared with the request this one was made from
+        pending_tags = dict(self.request_queue_object.get("pendingTags", {}))
+        pending_tags[feature_name] = tag_delta
+        self.request_queue_object["pendingTags"] = pending_tags
+
+    def get_pending_tags(self) -> list:
+        return list(self.request_queue_object.get("pendingTags", {}).values())
 
-        for index, feature in enumerate(local_copy["features"]):
-            if feature["name"] == feature_name:
-                local_copy["features"][index]["completed"] = True
-                local_copy["numberOfFeaturesCompleted"] = current_number_features_completed
-                return FeatureProcessing(local_copy)
+    def clear_pending_tags(self) -> None:
+        self.request_queue_object["pendingTags"] = dict()
 
     def send_request_object_to_queue(self, request_queue_url:str, sqs_client) -> None:
         sqs_client.send_message(
@@ -0,0 +1,143 @@
+import time
+import threading
+from os import environ
+
+'''
+    SSM Parameter Store Feature Tree:
+
+    /{prefix}/features - StringList of features
+
+    /{prefix}/features/{feature}/enabled - TRUE|FALSE
+    /{prefix}/features/{feature}/lambda/arn - STRING
+    /{prefix}/features/{feature}/contentFormats - comma separated content formats, only set when the feature does not apply to every object
+    /{prefix}/features/{feature}/settings/{SETTING} - STRING
+
+    The FeatureRegistry loads this whole tree with a single (paginated) get_parameters_by_path call, and the
+    features list, which the path does not include, with a get_parameter call. It keeps them in module scope so
+    warm invocations do not go back to SSM until the TTL expires
+'''
+
+DEFAULT_TTL_SECONDS = float(environ.get("FEATURE_REGISTRY_TTL_SECONDS", "300"))
+
+# Registries are cached per settings prefix in module scope so they survive across warm invocations
+_registries = dict()
+_registries_lock = threading.Lock()
+
+
+class FeatureRegistry:
+
+    def __init__(self, ssm_client, settings_prefix:str, ttl_seconds:float = DEFAULT_TTL_SECONDS) -> None:
+        self.ssm_client = ssm_client
+        self.settings_prefix = settings_prefix
+        self.ttl_seconds = ttl_seconds
+
+        self.features_path = "/{}/features".format(settings_prefix)
+        self.parameters = dict()
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def is_expired(self) -> bool:
+        if self.loaded_at is None:
+            return True
+        return (time.monotonic() - self.loaded_at) >= self.ttl_seconds
+
+    def invalidate(self) -> None:
+        self.loaded_at = None
+
+    def refresh(self) -> dict:
+        print("FeatureRegistry.refresh - Fetching {}".format(self.features_path))
+        parameters = dict()
+        paginator = self.ssm_client.get_paginator('get_parameters_by_path')
+        for page in paginator.paginate(Path=self.features_path, Recursive=True):
+            for parameter in page['Parameters']:
+                parameters[parameter['Name']] = parameter['Value']
+
+        try:
+            parameters[self.features_path] = self.ssm_client.get_parameter(Name=self.features_path)['Parameter']['Value']
+        except self.ssm_client.exceptions.ParameterNotFound:
+            print("FeatureRegistry.refresh - No Features List At {}".format(self.features_path))
+
+        self.parameters = parameters
+        self.loaded_at = time.monotonic()
+        return parameters
+
+    def get_parameters(self) -> dict:
+        if self.is_expired():
+            with self.lock:
+                # another thread may have refreshed while we waited on the lock
+                if self.is_expired():
+                    self.refresh()
+        return self.parameters
+
+    def get_parameter(self, relative_name:str, default=None):
+        name = "{}/{}".format(self.features_path, relative_name)
+        return self.get_parameters().get(name, default)
+
+    def get_feature_names(self) -> list:
+        '''
+        Names of all features that have parameters registered under /{prefix}/features, in the order of the
+        features list. Features missing from the list follow in the order they were returned by SSM
+        '''
+        parameters = self.get_parameters()
+        features_list = parameters.get(self.features_path, "")
+        feature_names = [ x.strip() for x in features_list.split(",") if x.strip() != "" ]
+        registered_names = list()
+        path_prefix = self.features_path + "/"
+        for name in parameters.keys():
+            if not name.startswith(path_prefix):
+                continue
+            feature_name = name[len(path_prefix):].split("/")[0]
+            if feature_name not in registered_names:
+                registered_names.append(feature_name)
+        return [ x for x in feature_names if x in registered_names ] + [ x for x in registered_names if x not in feature_names ]
+
+    def is_feature_enabled(self, feature_name:str) -> bool:
+        return self.get_parameter("{}/enabled".format(feature_name)) == 'TRUE'
+
+    def get_feature_lambda_arn(self, feature_name:str):
+        return self.get_parameter("{}/lambda/arn".format(feature_name))
+
+    def get_feature_content_formats(self, feature_name:str) -> list:
+        '''
+        Content formats the feature applies to, see content_sniffer. None when the feature applies to every object
+        '''
+        content_formats = self.get_parameter("{}/contentFormats".format(feature_name))
+        if content_formats is None:
+            return None
+        return [ x.strip() for x in content_formats.split(",") if x.strip() != "" ]
+
+    def get_feature_setting(self, feature_name:str, setting_name:str, default=None):
+        return self.get_parameter("{}/settings/{}".format(feature_name, setting_name), default)
+
+    def get_feature_states(self, feature_names:list = None) -> dict:
+        '''
+        Bulk lookup of the enabled state and lambda arn of each feature. If feature_names is None, every
+        feature in the registry is returned
+
+        Returns:
+        {
+            featureName: {
+                enabled: bool,
+                lambdaArn: string | None
+            }
+        }
+        '''
+        if feature_names is None:
+            feature_names = self.get_feature_names()
+
+        return {
+            feature_name: {
+                "enabled": self.is_feature_enabled(feature_name),
+                "lambdaArn": self.get_feature_lambda_arn(feature_name)
+            }
+            for feature_name in feature_names
+        }
+
+
+def get_feature_registry(ssm_client, settings_prefix:str, ttl_seconds:float = DEFAULT_TTL_SECONDS) -> FeatureRegistry:
+    with _registries_lock:
+        registry = _registries.get(settings_prefix)
+        if registry is None:
+            registry = FeatureRegistry(ssm_client, settings_prefix, ttl_seconds)
+            _registries[settings_prefix] = registry
+        return registry
@@ -0,0 +1,366 @@
+import abc
+from os import environ
+from feature_registry import get_feature_registry
+from feature_processing import FeatureProcessing
+from batch_processing import is_batch, process_batch, DEFAULT_MAX_WORKERS
+from tag_merge import TagWriter, create_tag_delta
+from dynamo_helper import DynamoHelper, DynamoEvent
+from metrics_serialization import compact_value, DEFAULT_MAX_BYTES
+from content_index import create_content_index, create_result, find_result, store_result
+from s3_range_file import S3RangeFile, DEFAULT_BLOCK_SIZE_BYTES, DEFAULT_MAX_CACHED_BLOCKS
+from object_scan import encode_header, decode_header
+from content_sniffer import sniff_format, sniff_object, DEFAULT_SNIFF_BYTES
+from object_storage import is_object_readable
+from aws_clients import lazy_client
+from instrumentation import log_event, flush_metrics, debug, timer
+import common
+
+'''
+    The flow shared by every feature lambda. A feature only implements Feature.process, which computes the
+    result of a single object from an ObjectView of it. The FeatureRunner of the feature owns the rest:
+
+        enabled check -> batch or single request -> for every object:
+            skip completed features -> skip unsupported content formats -> content index lookup -> open the object
+            -> Feature.process -> content index store -> tags (pending for the tag writer, or applied) -> metrics entry
+        -> metrics flush
+
+    so caching, batching and instrumentation apply to every feature alike. Features do not call S3 themselves,
+    they declare how they read the object (see Feature.get_object_access) and the runner opens it for them.
+    Runners are registered by feature name when the feature module is imported, see register_feature. Features
+    and their runners read the configuration of the lambda from the environment of the feature, which is that of the
+    process in the feature lambda, and is passed in when the feature runs elsewhere, see inline_dispatcher
+'''
+
+CONTENT_SNIFF_BYTES = int(environ.get("CONTENT_SNIFF_BYTES", str(DEFAULT_SNIFF_BYTES)))
+
+# The whole object read once, in order, as the body of a GetObject response
+STREAM_ACCESS = "stream"
+# A seekable file of the object that only fetches the blocks read, see S3RangeFile
+RANGE_ACCESS = "range"
+
+_runners = dict()
+
+
+class ObjectArchived(Exception):
+    '''
+    Raised by a feature when the object is archived and has not been restored. The request is passed on
+    unchanged, the object is processed again once its restore completes
+    '''
+
+
+class ObjectUnreadable(Exception):
+    '''
+    Raised by a feature when the service it passed the object to could not read it. The runner checks whether
+    the object is archived, otherwise the error the exception was raised from is raised again
+    '''
+
+
+class ObjectAccess:
+    '''
+    How the runner opens the object for a feature: STREAM_ACCESS or RANGE_ACCESS, the latter read in blocks
+    of block_size bytes of which max_cached_blocks are kept
+    '''
+
+    def __init__(self, mode:str, block_size:int = DEFAULT_BLOCK_SIZE_BYTES, max_cached_blocks:int = DEFAULT_MAX_CACHED_BLOCKS) -> None:
+        self.mode = mode
+        self.block_size = block_size
+        self.max_cached_blocks = max_cached_blocks
+
+
+class ObjectView:
+    '''
+    Read-only view of the object a feature processes. body is the object as opened by the runner, None when
+    the feature does not read it
+    '''
+
+    def __init__(self, s3_client, request:dict, batch_size:int = 1) -> None:
+        fp = FeatureProcessing(request)
+        self._s3_client = s3_client
+        self.bucket = request["bucketName"]
+        self.bucket_arn = request["bucketArn"]
+        self.key = request["key"]
+        self.size = request.get("size")
+        self.e_tag = request.get("eTag")
+        self.content_format = fp.get_content_format()
+        self.content_hash = fp.get_content_hash()
+        self.forced = fp.is_forced()
+        # Number of objects processed with this one, bounds what can be passed on in the request
+        self.batch_size = batch_size
+        self.encoded_header = fp.get_object_header()
+        self.body = None
+
+    def get_object_header(self) -> bytes:
+        '''
+        Returns the start of the object, as captured by a feature that read the object before, or None
+        '''
+        return decode_header(self.encoded_header) if self.encoded_header is not None else None
+
+    def get_content_format(self) -> str:
+        '''
+        Returns the format of the object, see content_sniffer. Sniffed from the object header when it holds enough of the
+        object, otherwise from a ranged GET of the start of the object, unless the request already carries it
+        '''
+        if self.content_format is None:
+            object_header = self.get_object_header()
+            if object_header is not None and (len(object_header) >= CONTENT_SNIFF_BYTES or len(object_header) == self.size):
+                self.content_format = sniff_format(object_header)
+            else:
+                self.content_format = sniff_object(self._s3_client, self.bucket, self.key, CONTENT_SNIFF_BYTES)
+        return self.content_format
+
+
+class FeatureResult:
+    '''
+    tags are the tags the feature sets on the object, replacing those of owned_keys. No tags are written when tags is None.
+    feature_data is sent to the metrics table, index_data is stored in the content index in its place when given.
+    content_hash and object_header are passed on to the features that follow
+    '''
+
+    def __init__(self, tags:dict = None, owned_keys:list = None, feature_data = None, index_data = None,
+        content_hash:str = None, object_header:bytes = None) -> None:
+        self.tags = tags
+        self.owned_keys = owned_keys if owned_keys is not None else list((tags or dict()).keys())
+        self.feature_data = feature_data if feature_data is not None else dict()
+        self.index_data = index_data
+        self.content_hash = content_hash
+        self.object_header = object_header
+
+
+class Feature(abc.ABC):
+    '''
+    Base class of the features. name is the name of the feature in the feature registry, settings_prefix the
+    prefix of the registry and environment the environment of the lambda of the feature, os.environ when not given.
+    Subclasses implement process
+    '''
+
+    # Content formats the feature applies to, see content_sniffer. None for all of them, the format is then not sniffed
+    content_formats = None
+    # Results are looked up in, and stored to, the content index by the SHA256 of the object
+    content_indexed = False
+    # The object header is dropped from the request after the feature, when no other feature reads it
+    clears_object_header = False
+    # How the feature reads the object, an ObjectAccess. None when it does not read it
+    object_access = None
+
+    def __init__(self, name:str, settings_prefix:str, environment:dict = None) -> None:
+        self.name = name
+        self.settings_prefix = settings_prefix
+        self.environment = dict(environment if environment is not None else environ)
+        self.ssm = lazy_client("ssm")
+
+    def get_setting(self, setting_name:str, default:str = None) -> str:
+        '''
+        Returns the setting of the feature from the feature registry, refreshed with it
+        '''
+        return get_feature_registry(self.ssm, self.settings_prefix).get_feature_setting(self.name, setting_name, default)
+
+    def get_content_formats(self) -> list:
+        return self.content_formats
+
+    def supports(self, view:ObjectView) -> bool:
+        content_formats = self.get_content_formats()
+        return content_formats is None or view.get_content_format() in content_formats
+
+    def get_object_access(self, view:ObjectView) -> ObjectAccess:
+        return self.object_access
+
+    def get_content_index_variant(self) -> str:
+        '''
+        Results that depend on the settings of the feature are indexed per combination of them
+        '''
+        return None
+
+    def serialize_feature_data(self, feature_data, allowlist:list = None):
+        '''
+        Reduces the feature_data of the metrics entry to the compact schema of the feature, keeping only the fields of
+        allowlist when given. See metrics_serialization
+        '''
+        return compact_value(feature_data)
+
+    def get_empty_feature_data(self):
+        '''
+        Feature data of the objects the feature does not apply to
+        '''
+        return dict()
+
+    def before_invocation(self) -> None:
+        pass
+
+    def after_invocation(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def process(self, view:ObjectView) -> FeatureResult:
+        '''
+        Computes the result of the object from view. Reads the object only through view.body
+        '''
+
+
+class FeatureRunner:
+    '''
+    Runs a feature on the requests of the state machine. Reads the configuration of the lambda from the environment
+    of the feature when created
+    '''
+
+    def __init__(self, feature:Feature) -> None:
+        self.feature = feature
+        self.feature_name = feature.name
+        self.settings_prefix = feature.settings_prefix
+        environment = feature.environment
+        self.coalesce_tag_writes = environment.get("COALESCE_TAG_WRITES", "FALSE") == "TRUE"
+        # The fingerprint tag is only read when unchanged objects are skipped
+        self.write_fingerprints = environment.get("SKIP_UNCHANGED_OBJECTS", "FALSE") == "TRUE"
+        self.max_workers = int(environment.get("FEATURE_BATCH_MAX_WORKERS", str(DEFAULT_MAX_WORKERS)))
+        self.s3 = lazy_client("s3")
+        self.ssm = feature.ssm
+        # Shared across invocations. Entries are buffered and sent in batches when the handler exits
+        self.dynamo_helper = DynamoHelper(environment.get("DYNAMODB_METRICS_QUEUE_URL", "Invalid"), lazy_client("sqs"),
+            int(environment.get("METRICS_FEATURE_DATA_MAX_BYTES", str(DEFAULT_MAX_BYTES))))
+        self.content_index = create_content_index(environment.get("CONTENT_INDEX_TABLE_NAME"),
+            environment.get("CONTENT_INDEX_LOCAL_PATH")) if feature.content_indexed else None
+
+    def open_object(self, view:ObjectView) -> None:
+        '''
+        Opens the object as the body of the view, the way the feature reads it
+        '''
+        object_access = self.feature.get_object_access(view)
+        if object_access is None:
+            return
+
+        if object_access.mode == STREAM_ACCESS:
+            # Time to the response headers. The body is read by the feature
+            with timer("S3GetObject"):
+                view.body = self.s3.get_object(Bucket=view.bucket, Key=view.key)["Body"]
+            return
+
+        view.body = S3RangeFile(self.s3, view.bucket, view.key, block_size=object_access.block_size,
+            max_cached_blocks=object_access.max_cached_blocks, size=view.size)
+        # Reads within the header captured by an earlier feature need no request
+        object_header = view.get_object_header()
+        if object_header is not None:
+            view.body.seed(object_header)
+
+    def run_feature(self, view:ObjectView) -> FeatureResult:
+        self.open_object(view)
+        try:
+            return self.feature.process(view)
+        except ObjectUnreadable as e:
+            # Services report archived objects like any other unreadable object, so check which it is
+            if is_object_readable(self.s3, view.bucket, view.key):
+                raise e.__cause__ if e.__cause__ is not None else e
+            raise ObjectArchived()
+        finally:
+            if view.body is not None:
+                view.body.close()
+
+    def compute_result(self, view:ObjectView) -> FeatureResult:
+        '''
+        Returns the result of the feature, from the content index when the content of the object was processed before
+        and the request is not forced. The results of forced requests replace those in the index
+        '''
+        variant = self.feature.get_content_index_variant()
+        indexed_result = find_result(self.content_index, view.content_hash, self.feature_name, variant) if not view.forced else None
+        if indexed_result is not None:
+            print("Content Of File: {} Has Already Been Processed. Copying Its Tags".format(view.key))
+            return FeatureResult(indexed_result["tags"]["tags"], indexed_result["tags"]["ownedKeys"], indexed_result["featureData"])
+
+        result = self.run_feature(view)
+        if result.tags is not None:
+            index_data = result.index_data if result.index_data is not None else result.feature_data
+            store_result(self.content_index, view.content_hash, self.feature_name,
+                create_result(create_tag_delta(result.tags, result.owned_keys), index_data), variant)
+        return result
+
+    def process_object(self, request:dict, batch_size:int = 1) -> dict:
+
+        # Set by the request builder when the fingerprint of the object shows the feature was already applied to its content
+        if FeatureProcessing(request).is_feature_completed(self.feature_name):
+            print("{} Already Applied To File: {} in Bucket: {}. Skipping".format(self.feature_name, request["key"], request["bucketName"]))
+            return request
+
+        view = ObjectView(self.s3, request, batch_size)
+        try:
+            if not self.feature.supports(view):
+                print("File {} Of Format {} Is Not Supported By {}. Can Not Process".format(view.key, view.content_format, self.feature_name))
+                result = FeatureResult(feature_data=self.feature.get_empty_feature_data())
+            else:
+                print("Processing {} For File: {} in Bucket: {}".format(self.feature_name, view.key, view.bucket))
+                result = self.compute_result(view)
+        except (ObjectArchived, self.s3.exceptions.InvalidObjectState):
+            # InvalidObjectState is raised when the object, or the start of it to sniff its format, is read
+            print("File: {} in Bucket: {} Is Archived And Has Not Been Restored. Skipping".format(view.key, view.bucket))
+            return request
+
+        updated_fp = FeatureProcessing(request).generate_updated_request_queue_object(self.feature_name)
+        # Passed on so the following features do not sniff the object again
+        if view.content_format is not None:
+            updated_fp.set_content_format(view.content_format)
+        if result.content_hash is not None:
+            updated_fp.set_content_hash(result.content_hash)
+        if result.object_header is not None and len(result.object_header) > 0:
+            updated_fp.set_object_header(encode_header(result.object_header))
+
+        if result.tags is not None:
+            tag_delta = create_tag_delta(result.tags, result.owned_keys)
+            if self.coalesce_tag_writes:
+                print("Deferring Tags To The Tag Writer")
+                updated_fp.add_pending_tags(self.feature_name, tag_delta)
+            else:
+                print("Now Fetching And Updating Tags")
+                content_fingerprint = updated_fp.get_content_fingerprint() if self.write_fingerprints else None
+                tagset = TagWriter(self.s3).apply(view.bucket, view.key, [tag_delta], content_fingerprint)
+                debug(tagset)
+
+        de = DynamoEvent()
+        de.bucket = view.bucket
+        de.key = view.key
+        de.bucketArn = view.bucket_arn
+        de.featureName = self.feature_name
+        de.eTag = view.e_tag
+        de.featureData = result.feature_data
+        self.dynamo_helper.create_entry(de, common.get_metrics_allowlist(self.ssm, self.settings_prefix, self.feature_name),
+            self.feature.serialize_feature_data)
+
+        if self.feature.clears_object_header:
+            updated_fp.clear_object_header()
+
+        print("Feature Processing Complete. Terminating")
+
+        return updated_fp.get_request_queue_object()
+
+    def lambda_handler(self, event, context):
+
+        if not common.is_feature_enabled(self.ssm, self.settings_prefix, self.feature_name):
+            print("{} Has Been Disabled. Skipping Execution".format(self.feature_name))
+            return event
+
+        log_event(event)
+
+        self.feature.before_invocation()
+        try:
+            if is_batch(event):
+                batch_size = len(event["batch"])
+                return process_batch(event, self.feature_name, lambda request: self.process_object(request, batch_size), self.max_workers)
+
+            return self.process_object(event)
+        finally:
+            self.dynamo_helper.flush()
+            self.feature.after_invocation()
+            flush_metrics()
+
+
+def register_feature(feature:Feature) -> FeatureRunner:
+    '''
+    Creates the runner of the feature and registers it under the name of the feature. Features without a name, as
+    created when their module is imported outside of their lambda, are not registered
+    '''
+    runner = FeatureRunner(feature)
+    if feature.name is not None:
+        _runners[feature.name] = runner
+    return runner
+
+def get_feature_runner(feature_name:str) -> FeatureRunner:
+    return _runners.get(feature_name)
+
+def get_registered_feature_names() -> list:
+    return list(_runners.keys())
@@ -0,0 +1,67 @@
+
+'''
+    Fingerprint Tag Shape:
+
+    PAFingerprint = "<etag>:<size>:<featureName>+<featureName>+..."
+
+    Records the ETag and size of the object content the listed features have been applied to. The tag
+    is written together with the tags of the features, and read by the request builder to avoid starting
+    executions for objects whose content has not changed since it was last processed, such as objects
+    that are re-uploaded or copied onto themselves and replayed S3 events.
+    Only written when unchanged objects are skipped, as it takes one of the 10 tags of the object
+'''
+
+FINGERPRINT_TAG_KEY = "PAFingerprint"
+# Tag values may only hold letters, digits, spaces and + - = . _ : / @
+FEATURE_NAME_SEPARATOR = "+"
+
+
+def normalize_etag(etag:str) -> str:
+    # S3 events carry the ETag without quotes, while the S3 API returns it quoted
+    return str(etag).strip('"') if etag is not None else None
+
+def create_fingerprint(etag:str, size:int, feature_names) -> str:
+    return "{}:{}:{}".format(normalize_etag(etag), size, FEATURE_NAME_SEPARATOR.join(sorted(set(feature_names))))
+
+def parse_fingerprint(fingerprint:str) -> tuple:
+    '''
+    Returns a tuple of (etag, size, set of feature names), or None if the fingerprint is malformed
+    '''
+    parts = fingerprint.split(":")
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None
+    feature_names = set([ x for x in parts[2].split(FEATURE_NAME_SEPARATOR) if x != "" ])
+    return parts[0], int(parts[1]), feature_names
+
+def get_fingerprint_tag(tagset:list) -> str:
+    for tag in tagset:
+        if tag['Key'] == FINGERPRINT_TAG_KEY:
+            return tag['Value']
+    return None
+
+def get_fingerprinted_features(tagset:list, etag:str, size:int) -> set:
+    '''
+    Returns the names of the features that have already been applied to the object content with the given
+    ETag and size, according to the fingerprint tag in the tagset. Empty if the content has changed
+    '''
+    fingerprint = get_fingerprint_tag(tagset)
+    if fingerprint is None or etag is None or size is None:
+        return set()
+
+    parsed_fingerprint = parse_fingerprint(fingerprint)
+    if parsed_fingerprint is None:
+        return set()
+
+    fingerprint_etag, fingerprint_size, feature_names = parsed_fingerprint
+    if fingerprint_etag != normalize_etag(etag) or fingerprint_size != int(size):
+        return set()
+    return feature_names
+
+def update_fingerprint(tagset:list, etag:str, size:int, completed_feature_names) -> str:
+    '''
+    Returns the fingerprint of the object with the completed features added to the ones already fingerprinted
+    for the same content
+    '''
+    feature_names = get_fingerprinted_features(tagset, etag, size)
+    feature_names.update(completed_feature_names)
+    return create_fingerprint(etag, size, feature_names)
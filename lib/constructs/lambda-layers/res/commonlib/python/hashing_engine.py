@@ -0,0 +1,152 @@
+import hashlib
+import base64
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+SUPPORTED_ALGORITHMS = ["md5", "sha1", "sha256", "sha512"]
+DEFAULT_BUFFER_SIZE_BYTES = 1024 * 1024 * 8 # 8 MB
+
+
+class MultiDigestEngine:
+    '''
+    Computes several digests over a stream in a single pass. The stream is read with readinto into two
+    reusable buffers so the next chunk is read while the previous one is being hashed, and each digest is
+    updated on its own worker thread. hashlib releases the GIL for large buffers so the digests are
+    computed in parallel when the lambda has more then one vCPU
+
+    The buffers are reused between calls, so a single engine must not hash more then one stream at a time
+    '''
+
+    def __init__(self, algorithms:list = SUPPORTED_ALGORITHMS, buffer_size:int = DEFAULT_BUFFER_SIZE_BYTES) -> None:
+        unsupported_algorithms = [ x for x in algorithms if x not in SUPPORTED_ALGORITHMS ]
+        if len(unsupported_algorithms) > 0:
+            raise ValueError("Unsupported Hash Algorithms: {}".format(unsupported_algorithms))
+        if len(algorithms) == 0:
+            raise ValueError("At Least One Hash Algorithm Is Required")
+
+        self.algorithms = list(algorithms)
+        self.buffer_size = buffer_size
+        self.buffers = [ bytearray(buffer_size), bytearray(buffer_size) ]
+        self.executor = ThreadPoolExecutor(max_workers=len(self.algorithms))
+
+    def _fill(self, stream, buffer:bytearray) -> int:
+        '''
+        Reads from the stream until the buffer is full or the stream is exhausted. Returns the number of bytes read
+        '''
+        view = memoryview(buffer)
+        filled = 0
+        while filled < self.buffer_size:
+            if hasattr(stream, "readinto"):
+                read_count = stream.readinto(view[filled:])
+            else:
+                chunk = stream.read(self.buffer_size - filled)
+                read_count = len(chunk)
+                view[filled:filled + read_count] = chunk
+
+            if not read_count:
+                break
+            filled += read_count
+
+        return filled
+
+    def hash_stream(self, stream, on_chunk=None) -> dict:
+        '''
+        Hashes the full contents of the stream. on_chunk is an optional callable receiving a memoryview of every
+        chunk read, allowing other consumers to share the single pass over the stream
+
+        Returns a dict of algorithm name to hashlib digest object
+        '''
+        digests = { algorithm: hashlib.new(algorithm) for algorithm in self.algorithms }
+
+        pending = []
+        index = 0
+        read_count = self._fill(stream, self.buffers[index])
+        while read_count:
+            view = memoryview(self.buffers[index])[:read_count]
+            if on_chunk is not None:
+                on_chunk(view)
+
+            # The previous chunk must finish before the digests can be updated again
+            for future in pending:
+                future.result()
+            pending = [ self.executor.submit(digest.update, view) for digest in digests.values() ]
+
+            # Read the next chunk into the other buffer while the current one is hashed
+            index = 1 - index
+            read_count = self._fill(stream, self.buffers[index])
+
+        for future in pending:
+            future.result()
+
+        return digests
+
+    def hash_bytes(self, data:bytes) -> dict:
+        digests = { algorithm: hashlib.new(algorithm) for algorithm in self.algorithms }
+        futures = [ self.executor.submit(digest.update, data) for digest in digests.values() ]
+        for future in futures:
+            future.result()
+        return digests
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
+
+
+class HashingEnginePool:
+    '''
+    Keeps idle engines, and their buffers, across warm invocations. The batch worker threads are created for
+    every invocation, so an engine is borrowed for each object rather than kept per thread. At most max_engines
+    idle engines are kept, as many as objects are hashed at the same time
+    '''
+
+    def __init__(self, buffer_size:int = DEFAULT_BUFFER_SIZE_BYTES, max_engines:int = 1) -> None:
+        self.buffer_size = buffer_size
+        self.max_engines = max_engines
+        self.lock = threading.Lock()
+        self.idle_engines = []
+        self.created_count = 0
+
+    def _take(self, algorithms:list) -> MultiDigestEngine:
+        with self.lock:
+            while len(self.idle_engines) > 0:
+                engine = self.idle_engines.pop()
+                if engine.algorithms == algorithms:
+                    return engine
+                # Left from before the algorithms changed
+                engine.close()
+            self.created_count += 1
+        print("Creating Hashing Engine For Algorithms: {}".format(algorithms))
+        return MultiDigestEngine(algorithms, self.buffer_size)
+
+    def _release(self, engine:MultiDigestEngine) -> None:
+        with self.lock:
+            if len(self.idle_engines) < self.max_engines:
+                self.idle_engines.append(engine)
+                return
+        engine.close()
+
+    @contextlib.contextmanager
+    def engine(self, algorithms:list):
+        '''
+        Lends an engine for the algorithms for the duration of the with block
+        '''
+        engine = self._take(list(algorithms))
+        try:
+            yield engine
+        finally:
+            self._release(engine)
+
+
+def encode_digests(digests:dict) -> dict:
+    '''
+    Converts a dict of algorithm name to digest object into the tag friendly representation of
+    upper case algorithm name to url safe base64 encoded digest
+    '''
+    return {
+        algorithm.upper(): base64.urlsafe_b64encode(digest.digest()).decode('utf-8')
+        for algorithm, digest in digests.items()
+    }
+
+
+def parse_algorithms(algorithms_setting:str) -> list:
+    return [ x.strip().lower() for x in algorithms_setting.split(",") if len(x.strip()) > 0 ]
@@ -0,0 +1,237 @@
+import io
+import struct
+
+try:
+    # Optional, provided by an additional layer. Without it only embedded previews can be used
+    from PIL import Image
+except ImportError:
+    Image = None
+
+'''
+    Prepares images for services with stricter limits then the archive, such as Rekognition which only accepts
+    JPEG and PNG images of up to 5 MB when sent as Bytes.
+
+    Most cameras embed a JPEG preview of the photo in its EXIF data (JPEG) or in a reduced resolution sub image
+    (DNG and other TIFF based raw formats). Previews are located by walking the TIFF structure with seeks, so
+    only the directories and the preview itself are read. When Pillow is available, the preview, or the photo
+    itself when there is no usable preview, is downscaled to a target long edge. JPEG photos are decoded at a
+    reduced scale (Image.draft), which keeps the memory used far below that of the full resolution photo
+'''
+
+DEFAULT_TARGET_LONG_EDGE = 2048
+DEFAULT_MAX_IMAGE_BYTES = 1024 * 1024 * 5 # 5 MB
+
+# Previews smaller then this are thumbnails, not worth analysing unless the target is smaller
+MIN_PREVIEW_LONG_EDGE = 640
+
+JPEG_SOI = b"\xff\xd8"
+# Start Of Frame markers, holding the dimensions of the image. C4, C8 and CC are not frames
+JPEG_SOF_MARKERS = [ x for x in range(0xC0, 0xD0) if x not in [ 0xC4, 0xC8, 0xCC ] ]
+
+TIFF_TAG_NEW_SUBFILE_TYPE = 0x00FE
+TIFF_TAG_COMPRESSION = 0x0103
+TIFF_TAG_STRIP_OFFSETS = 0x0111
+TIFF_TAG_STRIP_BYTE_COUNTS = 0x0117
+TIFF_TAG_SUB_IFDS = 0x014A
+TIFF_TAG_JPEG_INTERCHANGE_FORMAT = 0x0201
+TIFF_TAG_JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+
+# Compression values of JPEG compressed sub images
+TIFF_JPEG_COMPRESSIONS = [ 6, 7 ]
+
+TIFF_TYPE_SIZES = { 1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4 }
+TIFF_MAX_IFDS = 32
+
+
+def get_jpeg_dimensions(data:bytes) -> tuple:
+    '''
+    Returns (width, height) from the first frame header of the JPEG, or None if there is none
+    '''
+    if not data.startswith(JPEG_SOI):
+        return None
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        segment_length = struct.unpack(">H", data[position + 2:position + 4])[0]
+        if marker in JPEG_SOF_MARKERS and position + 9 <= len(data):
+            height, width = struct.unpack(">HH", data[position + 5:position + 9])
+            return width, height
+        position += 2 + segment_length
+    return None
+
+
+class TiffReader:
+    '''
+    Reads the directories of a TIFF structure starting at base_offset of file. Offsets within the structure
+    are relative to base_offset
+    '''
+
+    def __init__(self, file, base_offset:int = 0) -> None:
+        self.file = file
+        self.base_offset = base_offset
+        self.file.seek(base_offset)
+        header = self.file.read(8)
+        if header[:2] == b"II":
+            self.byte_order = "<"
+        elif header[:2] == b"MM":
+            self.byte_order = ">"
+        else:
+            raise ValueError("Not A TIFF Structure")
+        self.first_ifd_offset = struct.unpack(self.byte_order + "I", header[4:8])[0]
+
+    def _read(self, offset:int, length:int) -> bytes:
+        self.file.seek(self.base_offset + offset)
+        return self.file.read(length)
+
+    def read_ifd(self, offset:int) -> tuple:
+        '''
+        Returns a tuple of (entries, next ifd offset). Entries is a dict of tag to list of integer values, only
+        integer typed entries are read
+        '''
+        entry_count = struct.unpack(self.byte_order + "H", self._read(offset, 2))[0]
+        data = self._read(offset + 2, (entry_count * 12) + 4)
+        entries = dict()
+        for index in range(entry_count):
+            tag, value_type, count, value = struct.unpack(self.byte_order + "HHI4s", data[index * 12:(index + 1) * 12])
+            if value_type not in [ 3, 4, 13 ]:
+                continue
+            value_size = TIFF_TYPE_SIZES[value_type] * count
+            raw = value if value_size <= 4 else self._read(struct.unpack(self.byte_order + "I", value)[0], value_size)
+            value_format = "H" if value_type == 3 else "I"
+            entries[tag] = list(struct.unpack(self.byte_order + value_format * count, raw[:value_size]))
+        next_offset = struct.unpack(self.byte_order + "I", data[entry_count * 12:(entry_count * 12) + 4])[0]
+        return entries, next_offset
+
+    def find_previews(self) -> list:
+        '''
+        Returns a list of (offset, length) of the JPEG previews referenced by the directories, offsets
+        being absolute within the file
+        '''
+        previews = []
+        pending = [ self.first_ifd_offset ]
+        visited = set()
+        while len(pending) > 0 and len(visited) < TIFF_MAX_IFDS:
+            offset = pending.pop(0)
+            if offset == 0 or offset in visited:
+                continue
+            visited.add(offset)
+            entries, next_offset = self.read_ifd(offset)
+            pending.append(next_offset)
+            pending.extend(entries.get(TIFF_TAG_SUB_IFDS, []))
+
+            if TIFF_TAG_JPEG_INTERCHANGE_FORMAT in entries and TIFF_TAG_JPEG_INTERCHANGE_FORMAT_LENGTH in entries:
+                previews.append((
+                    self.base_offset + entries[TIFF_TAG_JPEG_INTERCHANGE_FORMAT][0],
+                    entries[TIFF_TAG_JPEG_INTERCHANGE_FORMAT_LENGTH][0]
+                ))
+            # Reduced resolution images stored as a single JPEG strip, as DNG does for its previews
+            elif entries.get(TIFF_TAG_COMPRESSION, [ 0 ])[0] in TIFF_JPEG_COMPRESSIONS and entries.get(TIFF_TAG_NEW_SUBFILE_TYPE, [ 0 ])[0] == 1 \
+                and len(entries.get(TIFF_TAG_STRIP_OFFSETS, [])) == 1 and len(entries.get(TIFF_TAG_STRIP_BYTE_COUNTS, [])) == 1:
+                previews.append((
+                    self.base_offset + entries[TIFF_TAG_STRIP_OFFSETS][0],
+                    entries[TIFF_TAG_STRIP_BYTE_COUNTS][0]
+                ))
+        return previews
+
+
+def find_exif_offset(file) -> int:
+    '''
+    Returns the offset of the TIFF structure of the EXIF data of a JPEG file, or None if it has none
+    '''
+    file.seek(0)
+    if file.read(2) != JPEG_SOI:
+        return None
+    position = 2
+    while True:
+        file.seek(position)
+        marker = file.read(4)
+        if len(marker) < 4 or marker[0] != 0xFF or marker[1] in [ 0xD9, 0xDA ]:
+            return None
+        segment_length = struct.unpack(">H", marker[2:4])[0]
+        if marker[1] == 0xE1 and file.read(6) == b"Exif\x00\x00":
+            return position + 10
+        position += 2 + segment_length
+
+def find_previews(file) -> list:
+    '''
+    Returns a list of (offset, length) of the JPEG previews embedded in a JPEG or TIFF based (DNG) file
+    '''
+    try:
+        file.seek(0)
+        if file.read(2) == JPEG_SOI:
+            exif_offset = find_exif_offset(file)
+            if exif_offset is None:
+                return []
+            return TiffReader(file, exif_offset).find_previews()
+        return TiffReader(file).find_previews()
+    except (ValueError, struct.error) as e:
+        print("Failed To Read The Image Structure: {}".format(e))
+        return []
+
+def get_largest_preview(file, max_bytes:int = DEFAULT_MAX_IMAGE_BYTES, min_long_edge:int = MIN_PREVIEW_LONG_EDGE) -> bytes:
+    '''
+    Returns the largest embedded JPEG preview of at most max_bytes with a long edge of at least min_long_edge,
+    or None if there is none
+    '''
+    for offset, length in sorted(find_previews(file), key=lambda x: x[1], reverse=True):
+        if length > max_bytes:
+            continue
+        file.seek(offset)
+        preview = file.read(length)
+        dimensions = get_jpeg_dimensions(preview)
+        if dimensions is not None and max(dimensions) >= min_long_edge:
+            return preview
+    return None
+
+def downscale_image(file, target_long_edge:int = DEFAULT_TARGET_LONG_EDGE, max_bytes:int = DEFAULT_MAX_IMAGE_BYTES) -> bytes:
+    '''
+    Returns the image as a JPEG with a long edge of at most target_long_edge and a size of at most max_bytes.
+    Requires Pillow
+    '''
+    if Image is None:
+        raise ImportError("Pillow Is Required To Downscale Images")
+
+    with Image.open(file) as image:
+        # For JPEG images, decodes at the smallest scale still at least as large as the target
+        image.draft("RGB", (target_long_edge, target_long_edge))
+        image.thumbnail((target_long_edge, target_long_edge))
+        if image.mode not in [ "RGB", "L" ]:
+            image = image.convert("RGB")
+
+        for quality in [ 90, 80, 70, 60 ]:
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=quality)
+            if output.tell() <= max_bytes:
+                return output.getvalue()
+
+    # Still too large at the lowest quality, so reduce the dimensions instead
+    output.seek(0)
+    return downscale_image(output, int(target_long_edge * 0.75), max_bytes)
+
+def prepare_image(file, target_long_edge:int = DEFAULT_TARGET_LONG_EDGE, max_bytes:int = DEFAULT_MAX_IMAGE_BYTES) -> bytes:
+    '''
+    Returns a JPEG of the image of at most max_bytes, from its largest usable embedded preview or by downscaling
+    the image itself. Returns None when neither is possible
+    '''
+    preview = get_largest_preview(file, max_bytes, min(target_long_edge, MIN_PREVIEW_LONG_EDGE))
+    if preview is not None:
+        if Image is not None and max(get_jpeg_dimensions(preview)) > target_long_edge:
+            return downscale_image(io.BytesIO(preview), target_long_edge, max_bytes)
+        return preview
+
+    if Image is None:
+        print("No Usable Preview Found And Pillow Is Not Available To Downscale The Image")
+        return None
+
+    try:
+        file.seek(0)
+        return downscale_image(file, target_long_edge, max_bytes)
+    except Exception as e:
+        # Raw images without a preview can not be decoded by Pillow
+        print("Failed To Downscale The Image: {}".format(e))
+        return None
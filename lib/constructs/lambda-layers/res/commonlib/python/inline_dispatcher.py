@@ -0,0 +1,116 @@
+import os
+import json
+import threading
+import importlib.util
+from os import environ
+from batch_processing import create_batch, process_batch, DEFAULT_MAX_WORKERS
+from tag_merge import TagWriter
+
+'''
+    Runs the features of small objects in the request builder itself, instead of in an execution of the photo
+    processing state machine. For small photos the state transitions and the invocations of the feature lambdas
+    take longer then the features themselves
+
+    The feature modules are bundled with the request builder under {INLINE_FEATURES_PATH}/{featureName}/lambda_function.py.
+    Every feature is created by the create_feature(environment) of its module with the environment of its lambda, and
+    run by a FeatureRunner of its own through the interface the lambda exposes to the state machine. The environment
+    of the request builder itself is left as is. The objects of an invocation are passed to every feature as a single
+    batch, which the feature processes on its pool of worker threads, and the tags of all the features are applied to
+    each object in a single round-trip at the end, as the tag writer does
+
+    INLINE_FEATURE_ENVIRONMENTS is a JSON object of feature name to the environment of its lambda, in the order the
+    state machine runs the features
+'''
+
+INLINE_MAX_OBJECT_BYTES = int(environ.get("INLINE_MAX_OBJECT_BYTES", "0"))
+INLINE_MAX_WORKERS = int(environ.get("INLINE_MAX_WORKERS", str(DEFAULT_MAX_WORKERS)))
+INLINE_FEATURES_PATH = environ.get("INLINE_FEATURES_PATH", os.path.join(environ.get("LAMBDA_TASK_ROOT", "."), "features"))
+INLINE_FEATURE_ENVIRONMENTS = environ.get("INLINE_FEATURE_ENVIRONMENTS", "{}")
+
+
+
+def load_feature_module(feature_name:str, module_path:str):
+    '''
+    Loads the lambda_function module of a feature under a name of its own, as all the lambdas have the same module name
+    '''
+    spec = importlib.util.spec_from_file_location("{}_lambda_function".format(feature_name.replace("-", "_")), module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class InlineDispatcher:
+    '''
+    feature_module_paths and feature_environments are dicts of feature name to the path of its lambda_function module
+    and to the environment of its lambda. The features are run in the order of feature_environments
+    '''
+
+    def __init__(self, s3_client, feature_module_paths:dict, feature_environments:dict, max_object_bytes:int = INLINE_MAX_OBJECT_BYTES,
+        max_workers:int = INLINE_MAX_WORKERS) -> None:
+        # As the tag writer of the state machine, the fingerprint is only written when the features skip unchanged objects
+        write_fingerprints = any([ x.get("SKIP_UNCHANGED_OBJECTS") == "TRUE" for x in feature_environments.values() ])
+        self.tag_writer = TagWriter(s3_client, write_fingerprints)
+        self.feature_module_paths = feature_module_paths
+        self.feature_environments = feature_environments
+        self.max_object_bytes = max_object_bytes
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.feature_runners = None
+
+    def can_dispatch(self, request:dict) -> bool:
+        '''
+        Returns True when the object is small enough and every feature still to be applied to it can be run inline
+        '''
+        if request.get("size") is None or request["size"] > self.max_object_bytes:
+            return False
+        pending_features = [ x["name"] for x in request["features"] if x["available"] and not x["completed"] ]
+        return all([ x in self.feature_environments for x in pending_features ])
+
+    def get_feature_runners(self) -> list:
+        '''
+        Returns a list of tuples of (feature name, FeatureRunner), created on first use
+        '''
+        # Only imported when objects are dispatched, as the feature modules themselves
+        from feature_runner import FeatureRunner
+        with self.lock:
+            if self.feature_runners is None:
+                feature_runners = []
+                for feature_name, environment in self.feature_environments.items():
+                    # The features run on the worker threads of the dispatcher, and the tags are applied at the end
+                    feature_environment = dict(environment, FEATURE_BATCH_MAX_WORKERS=str(self.max_workers), COALESCE_TAG_WRITES="TRUE")
+                    feature_module = load_feature_module(feature_name, self.feature_module_paths[feature_name])
+                    feature_runners.append((feature_name, FeatureRunner(feature_module.create_feature(feature_environment))))
+                self.feature_runners = feature_runners
+            return self.feature_runners
+
+    def dispatch(self, requests:list) -> list:
+        '''
+        Runs all the features on the requests and applies their tags. Returns the requests of the objects that failed
+        '''
+        batch = create_batch(requests)
+        for feature_name, feature_runner in self.get_feature_runners():
+            if len(batch["batch"]) == 0:
+                break
+            print("Running {} Inline On {} Objects".format(feature_name, len(batch["batch"])))
+            batch = feature_runner.lambda_handler(batch, None)
+
+        if len(batch["batch"]) > 0:
+            batch = process_batch(batch, "inline-tag-writer", self.tag_writer.apply_pending_tags, self.max_workers)
+
+        failed_objects = set([ (x["bucketName"], x["key"]) for x in batch["batchFailures"] ])
+        return [ x for x in requests if (x["bucketName"], x["key"]) in failed_objects ]
+
+
+def create_inline_dispatcher(s3_client):
+    '''
+    Returns an InlineDispatcher of the features bundled under INLINE_FEATURES_PATH when INLINE_MAX_OBJECT_BYTES is set,
+    otherwise None
+    '''
+    feature_environments = json.loads(INLINE_FEATURE_ENVIRONMENTS)
+    if INLINE_MAX_OBJECT_BYTES <= 0 or len(feature_environments) == 0:
+        return None
+    feature_module_paths = {
+        feature_name: os.path.join(INLINE_FEATURES_PATH, feature_name, "lambda_function.py")
+        for feature_name in feature_environments.keys()
+    }
+    return InlineDispatcher(s3_client, feature_module_paths, feature_environments)
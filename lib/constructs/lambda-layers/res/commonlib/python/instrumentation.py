@@ -0,0 +1,177 @@
+import functools
+import json
+import threading
+import time
+from os import environ
+
+'''
+    Timings and log levels for the lambdas.
+
+    Timers record durations of the hot path (S3 reads, hashing, EXIF parsing, Rekognition, tagging) in the
+    metrics of the invocation, which flush() writes to the log as a single CloudWatch Embedded Metric Format
+    line. CloudWatch extracts the metrics from it, so no PutMetricData calls are made:
+
+        with timer("S3GetObject"):
+            ...
+
+        @timed("TagWrite")
+        def apply_tags(...):
+            ...
+
+    log_event replaces print(event): it logs a one line summary of the request at INFO, and the request
+    without its meta at DEBUG, so payload dumps can be turned off with LOG_LEVEL
+'''
+
+LOG_LEVELS = {
+    "DEBUG": 10,
+    "INFO": 20,
+    "WARNING": 30,
+    "ERROR": 40
+}
+
+LOG_LEVEL = LOG_LEVELS.get(environ.get("LOG_LEVEL", "INFO").upper(), LOG_LEVELS["INFO"])
+METRICS_NAMESPACE = environ.get("METRICS_NAMESPACE", "PhotoArchive")
+METRICS_ENABLED = environ.get("METRICS_ENABLED", "TRUE") == "TRUE"
+
+# EMF accepts up to 100 values per metric in a single line
+MAX_VALUES_PER_METRIC = 100
+
+
+def is_log_level_enabled(level:str) -> bool:
+    return LOG_LEVELS[level] >= LOG_LEVEL
+
+def log(level:str, message:str) -> None:
+    if is_log_level_enabled(level):
+        print(message)
+
+def debug(message:str) -> None:
+    log("DEBUG", message)
+
+def info(message:str) -> None:
+    log("INFO", message)
+
+def summarize_request(request) -> str:
+    if isinstance(request, dict) and "batch" in request:
+        return "Batch Of {} Requests ({} Failures)".format(len(request["batch"]), len(request.get("batchFailures", [])))
+    if isinstance(request, list):
+        return "{} Branch Outputs".format(len(request))
+    if isinstance(request, dict) and "key" in request:
+        completed = [ x["name"] for x in request.get("features", []) if x.get("completed") ]
+        return "File: {} in Bucket: {} Completed Features: {}".format(request["key"], request.get("bucketName"), completed)
+    return "Event With Keys {}".format(list(request.keys()) if isinstance(request, dict) else type(request).__name__)
+
+def strip_meta(request):
+    if isinstance(request, list):
+        return [ strip_meta(x) for x in request ]
+    if isinstance(request, dict) and "batch" in request:
+        return dict(request, batch=[ strip_meta(x) for x in request["batch"] ])
+    if isinstance(request, dict):
+        return { key: value for key, value in request.items() if key not in [ "meta", "objectHeader" ] }
+    return request
+
+def log_event(event) -> None:
+    info("Received {}".format(summarize_request(event)))
+    if is_log_level_enabled("DEBUG"):
+        debug(json.dumps(strip_meta(event), default=str))
+
+
+class Metrics:
+    '''
+    Metric values of an invocation, written as a CloudWatch Embedded Metric Format line by flush. Thread safe,
+    so batch workers can record into the same metrics
+    '''
+
+    def __init__(self, namespace:str = METRICS_NAMESPACE, dimensions:dict = None) -> None:
+        self.namespace = namespace
+        self.dimensions = dimensions if dimensions is not None else dict()
+        self.values = dict()
+        self.units = dict()
+        self.lock = threading.Lock()
+
+    def set_dimensions(self, dimensions:dict) -> None:
+        self.dimensions = dimensions
+
+    def put_metric(self, name:str, value:float, unit:str = "Count") -> None:
+        with self.lock:
+            self.values.setdefault(name, []).append(value)
+            self.units[name] = unit
+
+    def create_emf_entries(self) -> list:
+        '''
+        Returns the EMF entries of the recorded values, more then one when a metric has more values then
+        fit in a single entry
+        '''
+        with self.lock:
+            values = { name: list(metric_values) for name, metric_values in self.values.items() }
+            units = dict(self.units)
+
+        entries = []
+        index = 0
+        while any([ len(metric_values) > index for metric_values in values.values() ]):
+            names = [ name for name, metric_values in values.items() if len(metric_values) > index ]
+            entry = {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [{
+                        "Namespace": self.namespace,
+                        "Dimensions": [ list(self.dimensions.keys()) ],
+                        "Metrics": [ { "Name": name, "Unit": units[name] } for name in names ]
+                    }]
+                }
+            }
+            entry.update(self.dimensions)
+            for name in names:
+                entry[name] = values[name][index:index + MAX_VALUES_PER_METRIC]
+            entries.append(entry)
+            index += MAX_VALUES_PER_METRIC
+        return entries
+
+    def flush(self) -> None:
+        if METRICS_ENABLED:
+            for entry in self.create_emf_entries():
+                print(json.dumps(entry))
+        with self.lock:
+            self.values = dict()
+            self.units = dict()
+
+
+# Metrics of the lambda, flushed by the handler when the invocation ends
+metrics = Metrics(dimensions={ "FunctionName": environ.get("AWS_LAMBDA_FUNCTION_NAME", "local") })
+
+
+class timer:
+    '''
+    Records the duration in milliseconds of a block, as a context manager, or of every call of a function, as
+    a decorator, in the given metrics
+    '''
+
+    def __init__(self, name:str, target_metrics:Metrics = None) -> None:
+        self.name = name
+        self.target_metrics = target_metrics
+        self.thread_local = threading.local()
+
+    def __enter__(self):
+        self.thread_local.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        elapsed_milliseconds = (time.perf_counter() - self.thread_local.start) * 1000
+        (self.target_metrics or metrics).put_metric(self.name, round(elapsed_milliseconds, 2), "Milliseconds")
+        return False
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            with self:
+                return function(*args, **kwargs)
+        return timed_function
+
+
+def timed(name:str, target_metrics:Metrics = None):
+    return timer(name, target_metrics)
+
+def put_metric(name:str, value:float, unit:str = "Count") -> None:
+    metrics.put_metric(name, value, unit)
+
+def flush_metrics() -> None:
+    metrics.flush()
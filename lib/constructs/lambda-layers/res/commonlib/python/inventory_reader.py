@@ -0,0 +1,74 @@
+import csv
+import gzip
+import io
+import json
+import urllib.parse
+
+'''
+    Streams the objects listed by an S3 Inventory report (CSV format) without listing the bucket
+
+    Inventory reports are delivered to:
+    <destination bucket>/<prefix>/<source bucket>/<configuration id>/<YYYY-MM-DDTHH-MMZ>/manifest.json
+
+    The manifest lists the gzipped CSV data files of the report and their column schema. Records are read one
+    data file at a time, streaming and decompressing the file as it is read
+'''
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+def get_inventory_prefix(destination_prefix:str, source_bucket:str, configuration_id:str) -> str:
+    return "{}/{}/{}/".format(destination_prefix, source_bucket, configuration_id)
+
+def find_latest_manifest_key(s3_client, destination_bucket:str, inventory_prefix:str) -> str:
+    '''
+    Returns the key of the manifest of the latest inventory report under inventory_prefix, or None if no
+    report has been delivered yet. Only the report folders are listed, not the objects of the bucket
+    '''
+    report_prefixes = []
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=destination_bucket, Prefix=inventory_prefix, Delimiter="/"):
+        report_prefixes.extend([ x["Prefix"] for x in page.get("CommonPrefixes", []) ])
+
+    # Report folders are named by their date, so they sort chronologically. data/ and hive/ hold the files
+    report_prefixes = sorted([ x for x in report_prefixes if x[len(inventory_prefix):][:1].isdigit() ], reverse=True)
+    for report_prefix in report_prefixes:
+        manifest_key = report_prefix + MANIFEST_FILE_NAME
+        try:
+            s3_client.head_object(Bucket=destination_bucket, Key=manifest_key)
+            return manifest_key
+        except s3_client.exceptions.ClientError:
+            # The report is still being delivered
+            continue
+    return None
+
+def read_manifest(s3_client, destination_bucket:str, manifest_key:str) -> dict:
+    response = s3_client.get_object(Bucket=destination_bucket, Key=manifest_key)
+    manifest = json.loads(response["Body"].read())
+    if manifest.get("fileFormat", "CSV") != "CSV":
+        raise Exception("Inventory Format {} Is Not Supported. Only CSV Is".format(manifest.get("fileFormat")))
+    return manifest
+
+def get_schema(manifest:dict) -> list:
+    return [ x.strip() for x in manifest["fileSchema"].split(",") ]
+
+def iterate_records(s3_client, destination_bucket:str, manifest:dict, start_file_index:int = 0, start_row_index:int = 0):
+    '''
+    Yields a tuple of (file index, row index, record) for every object of the report, starting at the given
+    position so that an interrupted run can be resumed. Records are dicts keyed by the schema column names,
+    with the Key decoded
+    '''
+    schema = get_schema(manifest)
+    files = manifest["files"]
+
+    for file_index in range(start_file_index, len(files)):
+        response = s3_client.get_object(Bucket=destination_bucket, Key=files[file_index]["key"])
+        with gzip.GzipFile(fileobj=response["Body"]) as data_file:
+            reader = csv.reader(io.TextIOWrapper(data_file, encoding="utf-8", newline=""))
+            for row_index, row in enumerate(reader):
+                if file_index == start_file_index and row_index < start_row_index:
+                    continue
+                record = dict(zip(schema, row))
+                # Keys are URL encoded in CSV reports
+                record["Key"] = urllib.parse.unquote_plus(record.get("Key", ""))
+                yield file_index, row_index, record
@@ -0,0 +1,133 @@
+import json
+
+'''
+    Serializes the featureData of the metrics entries into compact, JSON safe records of bounded size
+
+    Every feature has its own schema, given by the feature itself. Values are reduced to strings, numbers, booleans, lists and dicts,
+    binary values are dropped, and long strings are truncated. Each schema accepts an optional allowlist of
+    the fields to keep. Finally the record is cut down to a hard byte budget, so that the entry of an object
+    stays under the DynamoDB item size limit of 400 KB with the data of every feature in it
+'''
+
+DEFAULT_MAX_BYTES = 1024 * 64 # 64 KB
+MAX_STRING_LENGTH = 1024
+
+# EXIF fields that carry embedded binary data, dropped even when details=False did not skip them
+EXIF_EXCLUDED_FIELD_MARKERS = [ "Thumbnail", "MakerNote" ]
+
+DEFAULT_LABEL_FIELDS = [ "Name", "Confidence", "Parents" ]
+
+
+def compact_value(value):
+    '''
+    Reduces a value to a JSON safe value. Returns None for values that should be dropped
+    '''
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        return value[:MAX_STRING_LENGTH]
+    if isinstance(value, dict):
+        compacted = { str(k): compact_value(v) for k, v in value.items() }
+        return { k: v for k, v in compacted.items() if v is not None }
+    if isinstance(value, (list, tuple)):
+        return [ x for x in [ compact_value(v) for v in value ] if x is not None ]
+    if hasattr(value, "printable"):
+        # exifread IfdTag
+        return compact_value(str(value.printable))
+    return compact_value(str(value))
+
+def serialize_exif(exif:dict, allowlist:list = None) -> dict:
+    record = dict()
+    for field, value in exif.items():
+        if any(marker in field for marker in EXIF_EXCLUDED_FIELD_MARKERS):
+            continue
+        if allowlist is not None and field not in allowlist:
+            continue
+        compacted = compact_value(value)
+        if compacted is not None:
+            record[field] = compacted
+    return record
+
+def serialize_labels(labels:list, allowlist:list = None) -> list:
+    '''
+    Rekognition labels. By default only the name, the confidence and the names of the parents of each
+    label are kept. Instances (bounding boxes) and categories can be added through the allowlist
+    '''
+    fields = allowlist if allowlist is not None else DEFAULT_LABEL_FIELDS
+    record = []
+    for label in labels:
+        compact_label = dict()
+        for field in fields:
+            if field not in label:
+                continue
+            if field == "Confidence":
+                compact_label[field] = round(float(label[field]), 2)
+            elif field == "Parents":
+                compact_label[field] = [ x["Name"] for x in label[field] ]
+            else:
+                compact_label[field] = compact_value(label[field])
+        record.append(compact_label)
+    return record
+
+def serialize_hashes(hashes:dict, allowlist:list = None) -> dict:
+    return { k: str(v) for k, v in hashes.items() if allowlist is None or k in allowlist }
+
+def get_size(record) -> int:
+    return len(json.dumps(record, separators=(',', ':')).encode('utf-8'))
+
+def enforce_byte_budget(record, max_bytes:int = DEFAULT_MAX_BYTES):
+    '''
+    Cuts the record down to max_bytes of JSON. Fields of a dict, or items of a list, are kept in their
+    order until the budget is used up. Lists are expected to be sorted from most to least relevant
+    '''
+    if get_size(record) <= max_bytes:
+        return record
+
+    if isinstance(record, dict):
+        bounded = dict()
+        size = 2 # {}
+        for field, value in record.items():
+            field_size = get_size({ field: value }) - 1 # includes the separating comma
+            if size + field_size > max_bytes:
+                continue
+            bounded[field] = value
+            size += field_size
+    elif isinstance(record, list):
+        bounded = []
+        size = 2 # []
+        for value in record:
+            value_size = get_size(value) + 1 # includes the separating comma
+            if size + value_size > max_bytes:
+                break
+            bounded.append(value)
+            size += value_size
+    else:
+        bounded = None
+
+    print("metrics_serialization.enforce_byte_budget - Record Of {} Bytes Exceeds The Budget Of {}. Truncated".format(
+        get_size(record), max_bytes))
+    return bounded
+
+def serialize_feature_data(feature_data, serializer = None, allowlist:list = None, max_bytes:int = DEFAULT_MAX_BYTES):
+    '''
+    Serializes the featureData of a metrics entry with serializer, the schema of the feature, see
+    Feature.serialize_feature_data. Without a serializer the data is compacted generically
+    '''
+    if serializer is not None:
+        record = serializer(feature_data, allowlist)
+    else:
+        record = compact_value(feature_data)
+    return enforce_byte_budget(record, max_bytes)
+
+def parse_allowlist(allowlist_string:str) -> list:
+    '''
+    Parses a comma separated allowlist. An empty string means no allowlist
+    '''
+    if allowlist_string is None:
+        return None
+    allowlist = [ x.strip() for x in allowlist_string.split(",") if x.strip() != "" ]
+    return allowlist if len(allowlist) > 0 else None
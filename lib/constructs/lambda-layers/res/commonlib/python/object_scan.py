@@ -0,0 +1,68 @@
+import base64
+from instrumentation import timer
+
+'''
+    Object Scan Result Shape:
+
+    {
+        digests: Dict<string, hashlib digest> - see MultiDigestEngine.hash_stream
+        header: bytes - the first header_size bytes of the object
+        size: number - number of bytes read
+    }
+
+    Reads the body of an object once, as a stream, feeding the hashing engine and capturing the header of the
+    object on the way. The hash feature adds the header to the request as objectHeader so that the photo meta
+    feature can parse the EXIF data from it instead of fetching the same bytes again. Requests pass through
+    Step Functions, which limits them to 256 KB, so the header is kept to a budget shared by all the requests
+    of a batch. The tags the photo meta feature reads are near the start of the EXIF data, the rest of it
+    (mostly the thumbnail) is fetched with ranged GETs when needed, so a few KB are enough
+'''
+
+DEFAULT_HEADER_SIZE_BYTES = 1024 * 8 # 8 KB
+
+# Budget of the raw header bytes of all the requests of a batch. Base64 adds a third on top
+PAYLOAD_HEADER_BUDGET_BYTES = 1024 * 64 # 64 KB
+
+
+class HeaderCapture:
+    '''
+    on_chunk callable of MultiDigestEngine.hash_stream keeping the first max_bytes bytes of the stream
+    '''
+
+    def __init__(self, max_bytes:int) -> None:
+        self.max_bytes = max_bytes
+        self.chunks = []
+        self.captured = 0
+        self.total = 0
+
+    def __call__(self, chunk:memoryview) -> None:
+        self.total += len(chunk)
+        remaining = self.max_bytes - self.captured
+        if remaining > 0:
+            # Copied, the engine reuses the buffer the chunk points into
+            captured_chunk = bytes(chunk[:remaining])
+            self.chunks.append(captured_chunk)
+            self.captured += len(captured_chunk)
+
+    def get_header(self) -> bytes:
+        return b"".join(self.chunks)
+
+
+def get_header_size(header_size:int, batch_size:int) -> int:
+    return max(min(header_size, PAYLOAD_HEADER_BUDGET_BYTES // max(batch_size, 1)), 0)
+
+def scan_stream(stream, hashing_engine, header_size:int = DEFAULT_HEADER_SIZE_BYTES) -> dict:
+    header_capture = HeaderCapture(header_size)
+    with timer("HashStream"):
+        digests = hashing_engine.hash_stream(stream, on_chunk=header_capture)
+    return {
+        "digests": digests,
+        "header": header_capture.get_header(),
+        "size": header_capture.total
+    }
+
+def encode_header(header:bytes) -> str:
+    return base64.b64encode(header).decode('utf-8')
+
+def decode_header(encoded_header:str) -> bytes:
+    return base64.b64decode(encoded_header)
@@ -0,0 +1,61 @@
+
+'''
+    Storage class checks for objects that may have been moved to archive storage by the lifecycle transitions
+    of the main buckets. Archived objects can not be read until they are restored, and reading them fails
+    with an InvalidObjectState error
+'''
+
+# Storage classes that require a restore before the object can be read. GLACIER_IR is readable
+ARCHIVED_STORAGE_CLASSES = [ "GLACIER", "DEEP_ARCHIVE" ]
+
+# Archive access tiers of INTELLIGENT_TIERING, reported by head_object as ArchiveStatus
+ARCHIVED_ACCESS_TIERS = [ "ARCHIVE_ACCESS", "DEEP_ARCHIVE_ACCESS" ]
+
+DEFAULT_RESTORE_DAYS = 7
+DEFAULT_RESTORE_TIER = "Bulk"
+
+
+def is_archived(storage_class:str, archive_status:str = None) -> bool:
+    return storage_class in ARCHIVED_STORAGE_CLASSES or archive_status in ARCHIVED_ACCESS_TIERS
+
+def is_restored(restore_header:str) -> bool:
+    # head_object returns Restore as: ongoing-request="false", expiry-date="Fri, 21 Dec 2012 00:00:00 GMT"
+    return restore_header is not None and 'ongoing-request="false"' in restore_header
+
+def is_restore_ongoing(restore_header:str) -> bool:
+    return restore_header is not None and 'ongoing-request="true"' in restore_header
+
+def get_object_storage_state(head_object_response:dict) -> dict:
+    '''
+    Returns:
+    {
+        storageClass: string - STANDARD when not reported
+        archived: bool - the object is in archive storage
+        readable: bool - the object can be read, either because it is not archived or because it has been restored
+        restoreOngoing: bool
+    }
+    '''
+    storage_class = head_object_response.get("StorageClass", "STANDARD")
+    archived = is_archived(storage_class, head_object_response.get("ArchiveStatus"))
+    restore_header = head_object_response.get("Restore")
+    return {
+        "storageClass": storage_class,
+        "archived": archived,
+        "readable": not archived or is_restored(restore_header),
+        "restoreOngoing": is_restore_ongoing(restore_header)
+    }
+
+def is_object_readable(s3_client, bucket:str, key:str) -> bool:
+    return get_object_storage_state(s3_client.head_object(Bucket=bucket, Key=key))["readable"]
+
+def create_restore_request(storage_class:str, days:int = DEFAULT_RESTORE_DAYS, tier:str = DEFAULT_RESTORE_TIER) -> dict:
+    '''
+    Objects in the archive access tiers of INTELLIGENT_TIERING move back to the frequent access tier when
+    restored, so their restore request must not set the number of days
+    '''
+    if storage_class == "INTELLIGENT_TIERING":
+        return { "GlacierJobParameters": { "Tier": tier } }
+    return {
+        "Days": days,
+        "GlacierJobParameters": { "Tier": tier }
+    }
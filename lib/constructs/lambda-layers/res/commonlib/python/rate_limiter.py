@@ -0,0 +1,299 @@
+import random
+import threading
+import time
+from os import environ
+from aws_clients import lazy_table
+
+'''
+    Rate Limit Counter Entry Shape:
+
+    {
+        counterKey: string - {limiter name}#{epoch second}
+        count: number - calls made during that second by all the lambdas
+        expiresAt: number - epoch seconds, the table TTL attribute
+    }
+
+    Keeps calls to a throttled API, such as Rekognition, under its transactions per second quota. Every call
+    takes a token from a local token bucket, and, when a shared counter is configured, increments the counter
+    of the current second, which coordinates the concurrent lambdas so the fleet as a whole stays under the
+    quota. Throttling errors still returned by the API lower the local rate (and raise it again gradually as
+    calls succeed) and the call is retried with exponential backoff and jitter. Transient errors (5xx responses,
+    connection errors and timeouts) are retried the same way without lowering the rate, as the client is created
+    without botocore retries
+'''
+
+RATE_LIMIT_TABLE_NAME = environ.get("RATE_LIMIT_TABLE_NAME")
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_BACKOFF_SECONDS = 0.2
+DEFAULT_MAX_BACKOFF_SECONDS = 10.0
+
+# Rate is divided by this on every throttle and raised by RATE_INCREASE_RATIO of the quota on every success
+RATE_DECREASE_FACTOR = 2.0
+RATE_INCREASE_RATIO = 0.05
+MIN_RATE_RATIO = 0.05
+
+COUNTER_TTL_SECONDS = 60
+
+THROTTLING_ERROR_CODES = [
+    "ThrottlingException",
+    "ProvisionedThroughputExceededException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "Throttling",
+    "SlowDown"
+]
+
+TRANSIENT_ERROR_CODES = [
+    "InternalError",
+    "InternalFailure",
+    "InternalServerError",
+    "ServiceUnavailable",
+    "ServiceUnavailableException",
+    "RequestTimeout",
+    "RequestTimeoutException"
+]
+
+
+class TokenBucket:
+    '''
+    Thread safe token bucket refilled at rate tokens per second, holding at most capacity tokens
+    '''
+
+    def __init__(self, rate:float, capacity:float = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + ((now - self.updated_at) * self.rate))
+        self.updated_at = now
+
+    def set_rate(self, rate:float) -> None:
+        with self.lock:
+            self._refill()
+            self.rate = rate
+
+    def acquire(self) -> float:
+        '''
+        Takes a token, waiting for one if the bucket is empty. Returns the number of seconds waited
+        '''
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                wait_seconds = (1.0 - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+            waited += wait_seconds
+
+
+class DynamoRateCounter:
+    '''
+    Counter of the calls made per second by all the lambdas, using atomic conditional increments on a DynamoDB
+    table with counterKey as partition key
+    '''
+
+    def __init__(self, table, name:str) -> None:
+        self.table = table
+        self.name = name
+
+    def try_increment(self, second:int, limit:int) -> bool:
+        '''
+        Counts a call in the given second. Returns False, without counting it, if limit calls were already made
+        '''
+        try:
+            self.table.update_item(
+                Key={ "counterKey": "{}#{}".format(self.name, second) },
+                UpdateExpression="ADD #count :one SET expiresAt = if_not_exists(expiresAt, :expiresAt)",
+                ConditionExpression="attribute_not_exists(#count) OR #count < :limit",
+                ExpressionAttributeNames={ "#count": "count" },
+                ExpressionAttributeValues={
+                    ":one": 1,
+                    ":limit": limit,
+                    ":expiresAt": second + COUNTER_TTL_SECONDS
+                }
+            )
+            return True
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+
+class LocalRateCounter:
+    '''
+    In memory stand-in for the DynamoRateCounter, for local runs and tests. Only coordinates the threads of
+    a single process
+    '''
+
+    def __init__(self, name:str) -> None:
+        self.name = name
+        self.counts = dict()
+        self.lock = threading.Lock()
+
+    def try_increment(self, second:int, limit:int) -> bool:
+        with self.lock:
+            # Only the current seconds are of interest
+            for expired_second in [ x for x in self.counts.keys() if x < second - COUNTER_TTL_SECONDS ]:
+                del self.counts[expired_second]
+            if self.counts.get(second, 0) >= limit:
+                return False
+            self.counts[second] = self.counts.get(second, 0) + 1
+            return True
+
+
+class RateLimiter:
+    '''
+    Adaptive rate limiter for calls to an API with a quota of max_tps transactions per second
+    '''
+
+    def __init__(self, max_tps:float, shared_counter = None) -> None:
+        self.max_tps = max_tps
+        self.rate = max_tps
+        self.bucket = TokenBucket(max_tps)
+        self.shared_counter = shared_counter
+        self.lock = threading.Lock()
+
+        self.metrics = {
+            "calls": 0,
+            "throttles": 0,
+            "retries": 0,
+            "waitSeconds": 0.0
+        }
+
+    def set_max_tps(self, max_tps:float) -> None:
+        with self.lock:
+            if max_tps == self.max_tps:
+                return
+            self.max_tps = max_tps
+            self.rate = min(self.rate, max_tps)
+        self.bucket.set_rate(self.rate)
+
+    def acquire(self) -> None:
+        waited = self.bucket.acquire()
+        if self.shared_counter is not None:
+            while True:
+                now = time.time()
+                try:
+                    if self.shared_counter.try_increment(int(now), max(int(self.max_tps), 1)):
+                        break
+                except Exception as e:
+                    # The limit is best effort, the local token bucket and the backoff still apply
+                    print("Shared Rate Counter Unavailable: {}".format(e))
+                    break
+                # The fleet has used the quota of this second
+                wait_seconds = (int(now) + 1 - now) + random.uniform(0, 0.05)
+                time.sleep(wait_seconds)
+                waited += wait_seconds
+        with self.lock:
+            self.metrics["calls"] += 1
+            self.metrics["waitSeconds"] += waited
+
+    def on_success(self) -> None:
+        with self.lock:
+            if self.rate >= self.max_tps:
+                return
+            self.rate = min(self.max_tps, self.rate + (self.max_tps * RATE_INCREASE_RATIO))
+            rate = self.rate
+        self.bucket.set_rate(rate)
+
+    def on_throttle(self) -> None:
+        with self.lock:
+            self.metrics["throttles"] += 1
+            self.rate = max(self.max_tps * MIN_RATE_RATIO, self.rate / RATE_DECREASE_FACTOR)
+            rate = self.rate
+        self.bucket.set_rate(rate)
+
+    def on_retry(self) -> None:
+        with self.lock:
+            self.metrics["retries"] += 1
+
+    def get_metrics(self, reset:bool = False) -> dict:
+        '''
+        Returns the metrics since the limiter was created, or since they were last reset
+        '''
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics["rate"] = round(self.rate, 2)
+            metrics["waitSeconds"] = round(metrics["waitSeconds"], 3)
+            if reset:
+                self.metrics = { name: 0 for name in self.metrics.keys() }
+                self.metrics["waitSeconds"] = 0.0
+            return metrics
+
+
+def is_throttling_error(error:Exception) -> bool:
+    response = getattr(error, "response", None)
+    if not isinstance(response, dict):
+        return False
+    return response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+def is_transient_error(error:Exception) -> bool:
+    from botocore.exceptions import ConnectionError, HTTPClientError
+    if isinstance(error, (ConnectionError, HTTPClientError)):
+        return True
+    response = getattr(error, "response", None)
+    if not isinstance(response, dict):
+        return False
+    if response.get("Error", {}).get("Code") in TRANSIENT_ERROR_CODES:
+        return True
+    return response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500
+
+def get_backoff_seconds(attempt:int, base_seconds:float = DEFAULT_BASE_BACKOFF_SECONDS, max_seconds:float = DEFAULT_MAX_BACKOFF_SECONDS) -> float:
+    # Full jitter
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
+
+
+class RateLimitedClient:
+    '''
+    Wraps a boto3 client so that every call of the methods in method_names goes through the rate limiter and
+    is retried when throttled or when it fails with a transient error. Other attributes are passed through to
+    the client
+    '''
+
+    def __init__(self, client, rate_limiter:RateLimiter, method_names:list, max_attempts:int = DEFAULT_MAX_ATTEMPTS) -> None:
+        self.client = client
+        self.rate_limiter = rate_limiter
+        self.method_names = method_names
+        self.max_attempts = max_attempts
+
+    def __getattr__(self, name:str):
+        attribute = getattr(self.client, name)
+        if name not in self.method_names:
+            return attribute
+
+        def rate_limited_call(*args, **kwargs):
+            for attempt in range(self.max_attempts):
+                self.rate_limiter.acquire()
+                try:
+                    response = attribute(*args, **kwargs)
+                    self.rate_limiter.on_success()
+                    return response
+                except Exception as e:
+                    throttled = is_throttling_error(e)
+                    if not throttled and not is_transient_error(e):
+                        raise
+                    if throttled:
+                        self.rate_limiter.on_throttle()
+                    if attempt == self.max_attempts - 1:
+                        raise
+                    self.rate_limiter.on_retry()
+                    backoff_seconds = get_backoff_seconds(attempt)
+                    reason = "Throttled" if throttled else "Failed With {}".format(type(e).__name__)
+                    print("{} {}. Retrying In {:.2f} Seconds".format(name, reason, backoff_seconds))
+                    time.sleep(backoff_seconds)
+
+        return rate_limited_call
+
+
+def create_shared_counter(name:str, table_name:str = RATE_LIMIT_TABLE_NAME):
+    '''
+    Returns a DynamoRateCounter when RATE_LIMIT_TABLE_NAME is set, otherwise a LocalRateCounter
+    '''
+    if table_name is not None:
+        return DynamoRateCounter(lazy_table(table_name), name)
+    return LocalRateCounter(name)
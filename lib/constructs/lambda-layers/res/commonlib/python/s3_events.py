@@ -0,0 +1,81 @@
+import json
+import urllib.parse
+from datetime import datetime, timezone
+
+'''
+    Builds S3 event notifications in the shape delivered to the bucket event queue (an S3 event wrapped in an
+    SNS notification), so that objects can be fed to the request builder without being uploaded again
+
+    Bucket Event Queue Message Body Shape:
+
+    {
+        Type: "Notification"
+        Subject: string
+        Message: string - JSON of { Records: Array<S3 event record> }
+    }
+
+    Records may carry force: true, which S3 never sets. The objects are then processed even if their content is
+    unchanged, and the features do not copy their results from the content index
+'''
+
+MAX_RECORDS_PER_MESSAGE = 50
+
+
+def create_s3_event_record(bucket_name:str, key:str, etag:str = None, size:int = None, event_name:str = "ObjectCreated:Backfill",
+    region:str = "", force:bool = False) -> dict:
+    s3_object = {
+        # Keys of S3 event records are URL encoded
+        "key": urllib.parse.quote_plus(key, safe="/"),
+    }
+    if etag is not None:
+        s3_object["eTag"] = etag.strip('"')
+    if size is not None:
+        s3_object["size"] = int(size)
+
+    s3_event_record = {
+        "eventVersion": "2.1",
+        "eventSource": "aws:s3",
+        "awsRegion": region,
+        "eventTime": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z",
+        "eventName": event_name,
+        "s3": {
+            "s3SchemaVersion": "1.0",
+            "bucket": {
+                "name": bucket_name,
+                "arn": "arn:aws:s3:::{}".format(bucket_name)
+            },
+            "object": s3_object
+        }
+    }
+    if force:
+        s3_event_record["force"] = True
+    return s3_event_record
+
+def create_event_queue_message(s3_event_records:list, subject:str) -> str:
+    return json.dumps({
+        "Type": "Notification",
+        "Subject": subject,
+        "Message": json.dumps({
+            "Records": s3_event_records
+        })
+    })
+
+def send_s3_event_records(sqs_client, queue_url:str, s3_event_records:list, subject:str) -> int:
+    '''
+    Sends the records to the bucket event queue, MAX_RECORDS_PER_MESSAGE records per message and up to 10
+    messages per request. Returns the number of records sent. Raises if any message could not be sent
+    '''
+    messages = [
+        create_event_queue_message(s3_event_records[index:index + MAX_RECORDS_PER_MESSAGE], subject)
+        for index in range(0, len(s3_event_records), MAX_RECORDS_PER_MESSAGE)
+    ]
+
+    for index in range(0, len(messages), 10):
+        response = sqs_client.send_message_batch(
+            QueueUrl=queue_url,
+            Entries=[ { "Id": str(i), "MessageBody": message } for i, message in enumerate(messages[index:index + 10]) ]
+        )
+        if len(response.get("Failed", [])) > 0:
+            raise Exception("Failed To Send {} Event Messages: {}".format(len(response["Failed"]), response["Failed"]))
+
+    return len(s3_event_records)
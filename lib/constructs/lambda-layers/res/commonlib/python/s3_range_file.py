@@ -0,0 +1,192 @@
+import io
+import re
+from collections import OrderedDict
+
+DEFAULT_BLOCK_SIZE_BYTES = 1024 * 64 # 64 KB
+DEFAULT_MAX_CACHED_BLOCKS = 64
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes \d+-\d+/(\d+)")
+
+
+class S3RangeFile(io.RawIOBase):
+    '''
+    Read only, seekable file object over an S3 object. Byte ranges are fetched on demand with ranged
+    get_object requests, in blocks of block_size bytes, and kept in an LRU cache of max_cached_blocks blocks.
+    Consecutive missing blocks are fetched with a single request.
+
+    This allows parsers that only need the start of a file (such as exifread) to be handed the object
+    without downloading all of it
+    '''
+
+    def __init__(self, s3_client, bucket:str, key:str, block_size:int = DEFAULT_BLOCK_SIZE_BYTES,
+        max_cached_blocks:int = DEFAULT_MAX_CACHED_BLOCKS, size:int = None) -> None:
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.block_size = block_size
+        self.max_cached_blocks = max_cached_blocks
+
+        self.position = 0
+        self.object_size = size
+        self.blocks = OrderedDict()
+        # Start of the object passed to seed, kept whole as it is usually shorter than a block
+        self.header = b""
+
+        # statistics, useful for logging how much of the object was actually fetched
+        self.request_count = 0
+        self.bytes_fetched = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    @property
+    def size(self) -> int:
+        if self.object_size is None:
+            # Fetching the first block also discovers the object size from the Content-Range header
+            self._get_block(0)
+        return self.object_size
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset:int, whence:int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError("Invalid whence ({}, should be 0, 1 or 2)".format(whence))
+
+        if position < 0:
+            raise ValueError("Negative Seek Position {}".format(position))
+
+        self.position = position
+        return self.position
+
+    def _fetch_blocks(self, first_block:int, last_block:int) -> None:
+        start = first_block * self.block_size
+        end = ((last_block + 1) * self.block_size) - 1
+
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Range="bytes={}-{}".format(start, end)
+            )
+        except self.s3_client.exceptions.ClientError as ce:
+            # Requesting a range of an empty object or past its end is an InvalidRange error
+            if ce.response.get('Error', {}).get('Code') == 'InvalidRange':
+                if self.object_size is None:
+                    self.object_size = 0
+                return
+            raise ce
+
+        data = response['Body'].read()
+        self.request_count += 1
+        self.bytes_fetched += len(data)
+
+        if self.object_size is None:
+            content_range = CONTENT_RANGE_PATTERN.match(response.get('ContentRange', ''))
+            self.object_size = int(content_range.group(1)) if content_range is not None else len(data)
+
+        for block_index in range(first_block, last_block + 1):
+            offset = (block_index - first_block) * self.block_size
+            block = data[offset:offset + self.block_size]
+            if len(block) == 0:
+                break
+            self._cache_block(block_index, block)
+
+    def _cache_block(self, block_index:int, block:bytes) -> None:
+        self.blocks[block_index] = block
+        self.blocks.move_to_end(block_index)
+        while len(self.blocks) > self.max_cached_blocks:
+            self.blocks.popitem(last=False)
+
+    def seed(self, data:bytes, offset:int = 0) -> None:
+        '''
+        Caches bytes of the object that were already read elsewhere, such as the header captured while the
+        object was hashed, so reads within them need no request. offset must be aligned to block_size. The
+        last partial block is only cached when data reaches the end of the object, a partial first block is
+        kept as the header of the object
+        '''
+        if offset % self.block_size != 0:
+            raise ValueError("Seed Offset {} Is Not Aligned To The Block Size {}".format(offset, self.block_size))
+        if offset == 0 and len(data) > len(self.header):
+            self.header = data
+
+        first_block = offset // self.block_size
+        for index in range(0, len(data), self.block_size):
+            block = data[index:index + self.block_size]
+            is_last_block = self.object_size is not None and offset + index + len(block) >= self.object_size
+            if len(block) < self.block_size and not is_last_block:
+                break
+            self._cache_block(first_block + (index // self.block_size), block)
+
+    def _get_block(self, block_index:int) -> bytes:
+        if block_index not in self.blocks:
+            self._fetch_blocks(block_index, block_index)
+        else:
+            self.blocks.move_to_end(block_index)
+        return self.blocks.get(block_index, b"")
+
+    def prefetch(self, start:int, length:int) -> None:
+        '''
+        Ensures the blocks covering the byte range are cached, fetching the missing ones with as few
+        requests as possible
+        '''
+        if length <= 0:
+            return
+        first_block = start // self.block_size
+        last_block = (start + length - 1) // self.block_size
+        if self.object_size is not None:
+            last_block = min(last_block, max(self.object_size - 1, 0) // self.block_size)
+
+        missing_start = None
+        for block_index in range(first_block, last_block + 1):
+            if block_index not in self.blocks:
+                if missing_start is None:
+                    missing_start = block_index
+            elif missing_start is not None:
+                self._fetch_blocks(missing_start, block_index - 1)
+                missing_start = None
+        if missing_start is not None:
+            self._fetch_blocks(missing_start, last_block)
+
+    def read(self, size:int = -1) -> bytes:
+        if size is None or size < 0:
+            size = max(self.size - self.position, 0)
+        if size == 0:
+            return b""
+
+        if self.position + size <= len(self.header):
+            data = self.header[self.position:self.position + size]
+            self.position += len(data)
+            return data
+
+        self.prefetch(self.position, size)
+
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            block_index = self.position // self.block_size
+            block_offset = self.position % self.block_size
+            block = self._get_block(block_index)
+            chunk = block[block_offset:block_offset + remaining]
+            if len(chunk) == 0:
+                break # end of the object
+            chunks.append(chunk)
+            self.position += len(chunk)
+            remaining -= len(chunk)
+
+        return b"".join(chunks)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
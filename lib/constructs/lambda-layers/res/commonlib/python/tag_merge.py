@@ -0,0 +1,121 @@
+from fingerprint import FINGERPRINT_TAG_KEY, update_fingerprint
+from feature_processing import FeatureProcessing
+from instrumentation import timed, debug
+
+'''
+    Tag Delta Shape (as carried in the request payload under pendingTags, keyed by feature name):
+
+    {
+        tags: Dict<string, string> - tags the feature sets on the object
+        ownedKeys: Array<string> - tag keys the feature is responsible for. Existing tags with these
+                                   keys are removed before the new tags are applied
+    }
+'''
+
+# S3 object tagging limits
+MAX_TAGS = 10
+MAX_KEY_LENGTH = 128
+MAX_VALUE_LENGTH = 256
+
+
+def create_tag_delta(tags:dict, owned_keys:list) -> dict:
+    return {
+        "tags": { str(key): str(value) for key, value in tags.items() },
+        "ownedKeys": list(owned_keys)
+    }
+
+def merge_tagset(existing_tagset:list, tag_deltas:list) -> list:
+    '''
+    Merges the tag deltas of each feature into the existing tagset of an object. Existing tags not owned by any
+    feature are kept first, then the feature tags are added in the order of the deltas. Keys and values are
+    truncated to the S3 length limits and tags past the S3 limit of 10 tags per object are dropped
+    '''
+    owned_keys = set()
+    for tag_delta in tag_deltas:
+        owned_keys.update(tag_delta.get("ownedKeys", []))
+        owned_keys.update(tag_delta.get("tags", {}).keys())
+
+    merged_tags = dict()
+    for tag in existing_tagset:
+        if tag['Key'] not in owned_keys:
+            merged_tags[tag['Key']] = tag['Value']
+
+    for tag_delta in tag_deltas:
+        for key, value in tag_delta.get("tags", {}).items():
+            merged_tags[key[:MAX_KEY_LENGTH]] = value[:MAX_VALUE_LENGTH]
+
+    tagset = [ { 'Key': key, 'Value': value } for key, value in merged_tags.items() ]
+    if len(tagset) > MAX_TAGS:
+        print("tag_merge.merge_tagset - {} Tags Exceed The Limit Of {}. Dropping: {}".format(
+            len(tagset), MAX_TAGS, [ x['Key'] for x in tagset[MAX_TAGS:] ]))
+        tagset = tagset[:MAX_TAGS]
+
+    return tagset
+
+
+class TagWriter:
+    '''
+    Applies tag deltas to an S3 object with a single get_object_tagging / put_object_tagging round-trip
+    '''
+
+    def __init__(self, s3_client, write_fingerprints:bool = False) -> None:
+        '''
+        write_fingerprints is set when skipping unchanged objects is enabled, the fingerprint tag is only of use then
+        '''
+        self.s3_client = s3_client
+        self.write_fingerprints = write_fingerprints
+
+    @timed("TagWrite")
+    def apply(self, bucket:str, key:str, tag_deltas:list, content_fingerprint:tuple = None) -> list:
+        '''
+        content_fingerprint is an optional tuple of (eTag, size, completed feature names), see
+        FeatureProcessing.get_content_fingerprint. When given, the fingerprint tag of the object is updated
+        in the same round-trip
+        '''
+        get_object_tagging_response = self.s3_client.get_object_tagging(
+            Bucket=bucket,
+            Key=key,
+        )
+
+        existing_tagset = get_object_tagging_response['TagSet']
+        if content_fingerprint is not None:
+            etag, size, completed_feature_names = content_fingerprint
+            fingerprint = update_fingerprint(existing_tagset, etag, size, completed_feature_names)
+            tag_deltas = tag_deltas + [ create_tag_delta({ FINGERPRINT_TAG_KEY: fingerprint }, [ FINGERPRINT_TAG_KEY ]) ]
+
+        tagset = merge_tagset(existing_tagset, tag_deltas)
+
+        self.s3_client.put_object_tagging(
+            Bucket=bucket,
+            Key=key,
+            Tagging={
+                'TagSet': tagset
+            }
+        )
+
+        return tagset
+
+    def apply_pending_tags(self, request:dict) -> dict:
+        '''
+        Applies the pendingTags of the request, and its content fingerprint when write_fingerprints is set, to its object. Returns the request
+        without the pending tags
+        '''
+        fp = FeatureProcessing(request)
+
+        bucket = fp.get_request_queue_object()["bucketName"]
+        key = fp.get_request_queue_object()["key"]
+
+        tag_deltas = fp.get_pending_tags()
+        content_fingerprint = fp.get_content_fingerprint() if self.write_fingerprints else None
+
+        if len(tag_deltas) == 0 and content_fingerprint is None:
+            print("No Pending Tags For File: {} in Bucket: {}. Nothing To Apply".format(key, bucket))
+            return fp.get_request_queue_object()
+
+        print("Applying {} Pending Tag Deltas For File: {} in Bucket: {}".format(len(tag_deltas), key, bucket))
+        tagset = self.apply(bucket, key, tag_deltas, content_fingerprint)
+        debug(tagset)
+
+        fp.clear_pending_tags()
+
+        return fp.get_request_queue_object()
@@ -0,0 +1,32 @@
+import { Construct } from "constructs";
+import {
+    aws_dynamodb as dynamodb,
+} from 'aws-cdk-lib'
+import { RemovalPolicy } from "aws-cdk-lib";
+
+export interface RateLimitTableProps {
+    namePrefix: string
+}
+
+/**
+ * Per second counters of the calls made to throttled APIs by all the lambdas, so that together they stay under
+ * the account quota. Counters expire through the table TTL
+ */
+export class RateLimitTable extends Construct {
+
+    public readonly rateLimitTable: dynamodb.Table
+
+    constructor(scope: Construct, id: string, props: RateLimitTableProps){
+        super(scope, id)
+
+        this.rateLimitTable = new dynamodb.Table(this, 'RateLimitTable', {
+            tableName: `${props.namePrefix}-rate-limit`,
+            partitionKey: { name: 'counterKey', type: dynamodb.AttributeType.STRING },
+            billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+            encryption: dynamodb.TableEncryption.DEFAULT,
+            timeToLiveAttribute: 'expiresAt',
+            // Only holds counters of the last minute
+            removalPolicy: RemovalPolicy.DESTROY
+        })
+    }
+}
@@ -1,20 +1,49 @@
 import { Construct } from "constructs";
-import { Duration, Stack } from "aws-cdk-lib"
+import { AssetHashType, DockerImage, Duration, Stack } from "aws-cdk-lib"
 import {
     aws_lambda as lambda,
     aws_iam as iam,
     aws_sqs as sqs,
+    aws_dynamodb as dynamodb,
 } from "aws-cdk-lib"
 import * as path from 'path'
+import * as fs from 'fs'
 import { ManagedPolicies, ServicePrincipals } from "cdk-constants";
 import { SqsEventSource } from "aws-cdk-lib/aws-lambda-event-sources";
 import { ConfigurationSingletonFactory } from "../../conf/configuration-singleton-factory";
+import { LayerTypes } from "../lambda-layers/lambda-layers";
+import { StateMachineTypes } from "../../enums/state-machine-types";
+import { InlineFeature } from "../features/inline-feature";
 
 
 export interface RequestBuilderFunctionProps{
     eventQueue: sqs.Queue,
     lambdaTimeout: Duration,
-    stateMachineArn: string
+    stateMachineArn: string,
+    bucketArns: Array<string>,
+    deferredRestoreQueue?: sqs.Queue,
+    eventMetaTable?: dynamodb.Table,
+    inlineFeatures?: Array<InlineFeature>,
+    onLayerRequestListener: (layerTypes: Array<LayerTypes>) => Array<lambda.LayerVersion>
+}
+
+/**
+ * Copies the directory, without the python bytecode caches
+ */
+function copyDirectory(source: string, destination: string){
+    fs.mkdirSync(destination, { recursive: true })
+    for(const entry of fs.readdirSync(source)){
+        if(entry == "__pycache__"){
+            continue
+        }
+        const sourcePath = path.join(source, entry)
+        const destinationPath = path.join(destination, entry)
+        if(fs.statSync(sourcePath).isDirectory()){
+            copyDirectory(sourcePath, destinationPath)
+        }else{
+            fs.copyFileSync(sourcePath, destinationPath)
+        }
+    }
 }
 
 export class RequestBuilderFunction extends Construct{
@@ -70,15 +99,82 @@ export class RequestBuilderFunction extends Construct{
           statements: [
             new iam.PolicyStatement({
               actions:[
-                "ssm:GetParameter"
+                "ssm:GetParameter",
+                "ssm:GetParametersByPath"
               ],
               resources: [
+                `arn:aws:ssm:${region}:${account}:parameter/${settings.namePrefix}/features`,
                 `arn:aws:ssm:${region}:${account}:parameter/${settings.namePrefix}/*`
               ]
             })
           ]
         })
 
+        if(settings.skipUnchangedObjects){
+          // Reads the fingerprint tag of the objects with a tag count, reported by the ranged GET of the start of the objects
+          const requestBuilderFunctionRoleS3Policy = new iam.Policy(this, "ServiceRoleS3Policy", {
+            policyName: `${settings.namePrefix}-rbf-service-role-s3-policy`,
+            roles:[
+              requestBuilderFunctionRole
+            ],
+            statements: [
+              new iam.PolicyStatement({
+                actions:[
+                  "s3:GetObject",
+                  "s3:GetObjectTagging"
+                ],
+                resources: props.bucketArns.map((bucketArn) => bucketArn + "/*")
+              })
+            ]
+          })
+        }
+
+        if(settings.sniffContentFormats){
+          // Reads the first bytes of the objects to detect their format
+          const requestBuilderFunctionRoleSniffPolicy = new iam.Policy(this, "ServiceRoleSniffPolicy", {
+            policyName: `${settings.namePrefix}-rbf-service-role-sniff-policy`,
+            roles:[
+              requestBuilderFunctionRole
+            ],
+            statements: [
+              new iam.PolicyStatement({
+                actions:[
+                  "s3:GetObject"
+                ],
+                resources: props.bucketArns.map((bucketArn) => bucketArn + "/*")
+              })
+            ]
+          })
+        }
+
+        if(props.deferredRestoreQueue != undefined){
+          // Reads the storage class of the objects and defers the archived ones
+          const requestBuilderFunctionRoleDeferPolicy = new iam.Policy(this, "ServiceRoleDeferPolicy", {
+            policyName: `${settings.namePrefix}-rbf-service-role-defer-policy`,
+            roles:[
+              requestBuilderFunctionRole
+            ],
+            statements: [
+              new iam.PolicyStatement({
+                actions:[
+                  // Required by the ranged GET of the start of the objects, and by HeadObject for the archived ones
+                  "s3:GetObject"
+                ],
+                resources: props.bucketArns.map((bucketArn) => bucketArn + "/*")
+              }),
+              new iam.PolicyStatement({
+                actions:[
+                  "sqs:SendMessage"
+                ],
+                resources: [ props.deferredRestoreQueue.queueArn ]
+              })
+            ]
+          })
+        }
+
+        // Express executions started synchronously run while the request builder waits for their result
+        const isSyncExecution = settings.stateMachineType == StateMachineTypes.EXPRESS && settings.syncExpressExecutions
+
         const requestBuilderFunctionRoleStateMachineExecutorPolicy = new iam.Policy(this, "StateMachineExecutorPolicy", {
           policyName: `${settings.namePrefix}-rbf-state-machine-executor-policy`,
           roles: [
@@ -87,7 +183,7 @@ export class RequestBuilderFunction extends Construct{
           statements: [
             new iam.PolicyStatement({
               actions:[
-                "states:StartExecution"
+                isSyncExecution ? "states:StartSyncExecution" : "states:StartExecution"
               ],
               resources:[
                 props.stateMachineArn
@@ -97,23 +193,92 @@ export class RequestBuilderFunction extends Construct{
         })
 
 
+        // Small objects are processed by the request builder itself, with the code and permissions of the features
+        const inlineFeatures = settings.inlineDispatchMaxObjectKiloBytes > 0 ? (props.inlineFeatures ?? []) : []
+        const requestBuilderCodePath = path.join(__dirname, './res')
+        let requestBuilderCode = lambda.Code.fromAsset(requestBuilderCodePath)
+        const requestBuilderLayers: Array<lambda.ILayerVersion> = [ ...props.onLayerRequestListener([LayerTypes.COMMONLIBLAYER]) ]
+        if(inlineFeatures.length > 0){
+          // The features are bundled under features/{featureName}, see inline_dispatcher in the commonlib layer
+          requestBuilderCode = lambda.Code.fromAsset(requestBuilderCodePath, {
+            assetHashType: AssetHashType.OUTPUT,
+            bundling: {
+              image: DockerImage.fromRegistry("alpine"),
+              local: {
+                tryBundle(outputDir: string){
+                  copyDirectory(requestBuilderCodePath, outputDir)
+                  for(const inlineFeature of inlineFeatures){
+                    copyDirectory(inlineFeature.codePath, path.join(outputDir, "features", inlineFeature.featureName))
+                  }
+                  return true
+                }
+              }
+            }
+          })
+          for(const inlineFeature of inlineFeatures){
+            inlineFeature.grantPermissions(requestBuilderFunctionRole)
+            for(const layer of inlineFeature.layers){
+              if(!requestBuilderLayers.includes(layer)){
+                requestBuilderLayers.push(layer)
+              }
+            }
+          }
+        }
+
         this.requestBuilderFunction = new lambda.Function(this, "RequestBuilderFunction", {
           functionName: `${settings.namePrefix}-request-builder-function`,
           description: 'Request Builder Function. Creates Initial Processing Request For Photo Archive Dispatcher Lambda From S3 Events.',
           runtime: lambda.Runtime.PYTHON_3_8,
-          memorySize: 128,
+          memorySize: inlineFeatures.length > 0 ? settings.inlineDispatchMemorySize : 128,
           handler: 'lambda_function.lambda_handler',
-          code: lambda.Code.fromAsset(path.join(__dirname, './res')),
+          code: requestBuilderCode,
           timeout: props.lambdaTimeout,
           role: requestBuilderFunctionRole,
+          layers: requestBuilderLayers,
           environment: {
               SETTINGS_PREFIX: settings.namePrefix,
-              STATE_MACHINE_ARN: props.stateMachineArn
+              STATE_MACHINE_ARN: props.stateMachineArn,
+              FEATURE_REGISTRY_TTL_SECONDS: settings.featureRegistryCacheTtlSeconds.toString(),
+              START_EXECUTION_MAX_WORKERS: settings.requestBuilderMaxConcurrentExecutionStarts.toString(),
+              FEATURE_BATCH_SIZE: settings.featureBatchSize.toString(),
+              SKIP_UNCHANGED_OBJECTS: settings.skipUnchangedObjects ? "TRUE" : "FALSE",
+              SNIFF_CONTENT_FORMATS: settings.sniffContentFormats ? "TRUE" : "FALSE",
+              STATE_MACHINE_TYPE: settings.stateMachineType
           }
         })
+        if(inlineFeatures.length > 0){
+          const inlineFeatureEnvironments: { [featureName: string]: { [key: string]: string } } = {}
+          for(const inlineFeature of inlineFeatures){
+            inlineFeatureEnvironments[inlineFeature.featureName] = inlineFeature.environment
+          }
+          this.requestBuilderFunction.addEnvironment("INLINE_MAX_OBJECT_BYTES", (settings.inlineDispatchMaxObjectKiloBytes * 1024).toString())
+          this.requestBuilderFunction.addEnvironment("INLINE_MAX_WORKERS", settings.inlineDispatchMaxWorkers.toString())
+          this.requestBuilderFunction.addEnvironment("INLINE_FEATURE_ENVIRONMENTS", Stack.of(this).toJsonString(inlineFeatureEnvironments))
+        }
+        if(isSyncExecution){
+          this.requestBuilderFunction.addEnvironment("SYNC_EXECUTIONS", "TRUE")
+          this.requestBuilderFunction.addEnvironment("SYNC_EXECUTION_MAX_ATTEMPTS", settings.syncExecutionMaxAttempts.toString())
+        }
+        if(props.deferredRestoreQueue != undefined){
+          this.requestBuilderFunction.addEnvironment("DEFERRED_RESTORE_QUEUE_URL", props.deferredRestoreQueue.queueUrl)
+        }
+        if(props.eventMetaTable != undefined){
+          props.eventMetaTable.grantWriteData(requestBuilderFunctionRole)
+          this.requestBuilderFunction.addEnvironment("EVENT_META_TABLE_NAME", props.eventMetaTable.tableName)
+          this.requestBuilderFunction.addEnvironment("EVENT_META_RETENTION_DAYS", settings.eventMetaRetentionDays.toString())
+        }
+
+        // Synchronous executions run up to 5 minutes each, while the request builder waits for them. The batches are capped to
+        // what the concurrent execution starts can run at once, the executions left when the lambda runs out of time are
+        // returned to the queue
+        const eventSourceBatchSize = isSyncExecution ?
+          Math.min(settings.requestBuilderBatchSize, settings.requestBuilderMaxConcurrentExecutionStarts * settings.featureBatchSize) :
+          settings.requestBuilderBatchSize
 
         this.requestBuilderFunction.addEventSource(new SqsEventSource(props.eventQueue, {
-            batchSize: 1
+            batchSize: eventSourceBatchSize,
+            maxBatchingWindow: eventSourceBatchSize > 10 ? Duration.seconds(settings.requestBuilderMaxBatchingWindowSeconds) : undefined,
+            reportBatchItemFailures: true
         }))
 
 
@@ -1,15 +1,51 @@
 
-import boto3
 import json
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from os import environ
-
-ssm = boto3.client("ssm")
-sqs = boto3.client("sqs")
-sf = boto3.client('stepfunctions')
+from feature_registry import get_feature_registry
+from batch_processing import create_batch, is_batch
+from fingerprint import get_fingerprinted_features
+from object_storage import get_object_storage_state
+from content_sniffer import sniff_format, DEFAULT_SNIFF_BYTES
+from event_meta_store import create_event_meta_store, create_meta, store_metas
+from inline_dispatcher import create_inline_dispatcher
+from aws_clients import lazy_client
 
 STATE_MACHINE_ARN = environ.get('STATE_MACHINE_ARN')
 SETTINGS_PREFIX = environ.get('SETTINGS_PREFIX', 'pt')
+START_EXECUTION_MAX_WORKERS = int(environ.get('START_EXECUTION_MAX_WORKERS', '10'))
+FEATURE_BATCH_SIZE = int(environ.get('FEATURE_BATCH_SIZE', '1'))
+SKIP_UNCHANGED_OBJECTS = environ.get('SKIP_UNCHANGED_OBJECTS', 'FALSE') == 'TRUE'
+# The format of the objects is sniffed from their first bytes, features that do not apply to it are not run
+SNIFF_CONTENT_FORMATS = environ.get('SNIFF_CONTENT_FORMATS', 'FALSE') == 'TRUE'
+# Archived objects are sent to this queue to be restored instead of being processed
+DEFERRED_RESTORE_QUEUE_URL = environ.get('DEFERRED_RESTORE_QUEUE_URL', 'Invalid')
+STATE_MACHINE_TYPE = environ.get('STATE_MACHINE_TYPE', 'STANDARD')
+# Express executions can be started synchronously, the request builder then waits for their result
+SYNC_EXECUTIONS = STATE_MACHINE_TYPE == 'EXPRESS' and environ.get('SYNC_EXECUTIONS', 'FALSE') == 'TRUE'
+SYNC_EXECUTION_MAX_ATTEMPTS = int(environ.get('SYNC_EXECUTION_MAX_ATTEMPTS', '2'))
+SYNC_EXECUTION_RETRY_DELAY_SECONDS = float(environ.get('SYNC_EXECUTION_RETRY_DELAY_SECONDS', '1'))
+# Express executions run for at most 5 minutes
+EXPRESS_EXECUTION_MAX_SECONDS = 300
+# Synchronous executions are only started, or retried, while the lambda has the time to wait for them to end
+SYNC_EXECUTION_TIME_BUDGET_MILLIS = (EXPRESS_EXECUTION_MAX_SECONDS + 30) * 1000
+
+ssm = lazy_client("ssm")
+sqs = lazy_client("sqs")
+s3 = lazy_client("s3", max_pool_connections=START_EXECUTION_MAX_WORKERS)
+# Connection pool sized to match the thread pool starting the executions
+sf = lazy_client('stepfunctions', max_pool_connections=START_EXECUTION_MAX_WORKERS)
+# StartSyncExecution returns when the execution ends. Failed calls are not retried by the client, as the execution
+# may have run, the objects that failed are run again by dispatch_sync_execution instead
+sf_sync = lazy_client('stepfunctions', max_pool_connections=START_EXECUTION_MAX_WORKERS,
+    read_timeout=EXPRESS_EXECUTION_MAX_SECONDS + 10, retries={ "mode": "standard", "total_max_attempts": 1 })
+
+feature_registry = get_feature_registry(ssm, SETTINGS_PREFIX)
+event_meta_store = create_event_meta_store()
+# Small objects are processed by the request builder itself when set
+inline_dispatcher = create_inline_dispatcher(s3)
 
 def valid_event(s3_event) -> bool:
     if "Records" not in s3_event:
@@ -23,18 +59,6 @@ def valid_event(s3_event) -> bool:
 
     return True
 
-def get_feature_lambda_arn_if_enabled(feature_ssm_name:str):
-    feature_enabled_reponse = ssm.get_parameter(
-        Name="/{}/features/{}/enabled".format(SETTINGS_PREFIX, feature_ssm_name)
-    )
-    if feature_enabled_reponse["Parameter"]["Value"] == "TRUE":
-        feature_lambda_arn_response = ssm.get_parameter(
-            Name="/{}/features/{}/lambda/arn".format(SETTINGS_PREFIX, feature_ssm_name)
-        )
-        return feature_lambda_arn_response["Parameter"]["Value"]
-
-    return None
-
 def generate_available_features() -> list:
     '''
     SSM Parameter Store Feature Data:
@@ -49,17 +73,15 @@ def generate_available_features() -> list:
 
     /pa/features/rekogntaglambda/enabled - TRUE|FALSE
     /pa/features/rekogntaglambda/lambda/arn - STRING
+
+    The whole tree is loaded once by the FeatureRegistry and cached across warm invocations
     '''
 
     available_features = []
 
-    features_list_response = ssm.get_parameter(
-        Name="/{}/features".format(SETTINGS_PREFIX)
-    )
-    features_list = features_list_response["Parameter"]["Value"].split(",")
-
-    for feature in features_list:
-        feature_lambda_arn = get_feature_lambda_arn_if_enabled(feature)
+    feature_states = feature_registry.get_feature_states()
+    for feature, feature_state in feature_states.items():
+        feature_lambda_arn = feature_state["lambdaArn"] if feature_state["enabled"] else None
 
         available_features.append({
             "name": feature,
@@ -71,56 +93,405 @@ def generate_available_features() -> list:
     return available_features
 
 
+def build_payloads(event, sqs_event_record, available_features:list) -> list:
+    '''
+    Builds the state machine payloads for every S3 record within the SQS message. Returns a list of
+    tuples of (execution name, payload, event meta). Execution names are derived from the SQS message id so
+    that a redelivered message does not start duplicate executions
+    '''
+    sns_event = json.loads(sqs_event_record['body'])
+
+    s3_event = json.loads(sns_event['Message'])
+
+    # validate the event
+    print("Validating Event")
+    if not valid_event(s3_event):
+        print("Event Is Not Valid. Cant Process")
+        return []
+
+    payloads = []
+    for index, s3_event_record in enumerate(s3_event['Records']):
+
+        event_source = s3_event_record['eventSource']
+        event_region = s3_event_record['awsRegion']
+        event_time = s3_event_record['eventTime']
+        event_name = s3_event_record['eventName']
+
+        bucket_name = s3_event_record['s3']['bucket']['name']
+        bucket_arn = s3_event_record['s3']['bucket']['arn']
+        key = urllib.parse.unquote_plus(s3_event_record['s3']['object']['key'], encoding='utf-8')
+
+        print("{} - {}@{} in {} - {}/{}".format(event_source, event_name, event_time, event_region, bucket_name, key))
+        
+        execution_name = "{}-{}".format(sqs_event_record['messageId'], index)
+
+        # then build out the payload. The event metadata is kept out of it, see event_meta_store
+        payload = {
+            "bucketName": bucket_name,
+            "bucketArn": bucket_arn,
+            "key": key,
+            "eTag": s3_event_record['s3']['object'].get('eTag'),
+            "size": s3_event_record['s3']['object'].get('size'),
+            "features": [ dict(x) for x in available_features ],
+            "numberOfFeaturesCompleted": 0
+        }
+        if event_meta_store is not None:
+            payload["metaId"] = execution_name
+        else:
+            # Without the event meta store the events are only referenced, by the SQS message and the S3 sequencer
+            payload["eventRef"] = { "messageId": sqs_event_record['messageId'] }
+            if 'sequencer' in s3_event_record['s3']['object']:
+                payload["eventRef"]["sequencer"] = s3_event_record['s3']['object']['sequencer']
+        if s3_event_record.get('force', False):
+            payload["force"] = True
+
+        payloads.append((execution_name, payload, create_meta(s3_event_record, sns_event, sqs_event_record, event)))
+
+    return payloads
+
+def read_object_start(payload:dict) -> dict:
+    '''
+    Reads the start of the object with a single ranged GET, whose response also reports the storage class of the
+    object and its number of tags, so the object is deferred, fingerprinted and sniffed with one request. Returns:
+    {
+        storageState: dict - see get_object_storage_state
+        tagCount: number - None when unknown
+        header: bytes - the start of the object, None when it can not be read
+    }
+    '''
+    object_start = {
+        "storageState": None,
+        "tagCount": None,
+        "header": None
+    }
+    # A single byte is enough for the storage class and tag count
+    read_bytes = DEFAULT_SNIFF_BYTES if SNIFF_CONTENT_FORMATS else 1
+    try:
+        get_object_response = s3.get_object(
+            Bucket=payload["bucketName"],
+            Key=payload["key"],
+            Range="bytes=0-{}".format(read_bytes - 1)
+        )
+    except s3.exceptions.InvalidObjectState:
+        # Archived and not restored. The storage class is only reported by head_object then
+        object_start["storageState"] = get_object_storage_state(s3.head_object(
+            Bucket=payload["bucketName"],
+            Key=payload["key"]
+        ))
+        return object_start
+    except s3.exceptions.ClientError as e:
+        # Empty objects have no range to read
+        if e.response.get("Error", {}).get("Code") != "InvalidRange":
+            raise
+        object_start["header"] = b""
+        return object_start
+
+    object_start["storageState"] = get_object_storage_state(get_object_response)
+    # Only reported when the object has tags
+    object_start["tagCount"] = get_object_response.get("TagCount", 0)
+    object_start["header"] = get_object_response["Body"].read()
+    return object_start
+
+def apply_fingerprint(payload:dict, tag_count:int) -> bool:
+    '''
+    Marks the features the fingerprint tag of the object shows were already applied to its current content
+    as completed. Returns False when every available feature is completed, so no execution is needed
+    '''
+    if payload["eTag"] is None or payload["size"] is None or tag_count == 0:
+        return True
+
+    try:
+        get_object_tagging_response = s3.get_object_tagging(
+            Bucket=payload["bucketName"],
+            Key=payload["key"]
+        )
+    except Exception as e:
+        # Process the object as usual, the features report any actual problem with it
+        print("Failed To Read The Fingerprint Of File: {} in Bucket: {}".format(payload["key"], payload["bucketName"]))
+        print(e)
+        return True
+
+    fingerprinted_features = get_fingerprinted_features(get_object_tagging_response['TagSet'], payload["eTag"], payload["size"])
+    for feature in payload["features"]:
+        if feature["name"] in fingerprinted_features:
+            feature["completed"] = True
+    payload["numberOfFeaturesCompleted"] = len([ x for x in payload["features"] if x["completed"] ])
+
+    pending_features = [ x["name"] for x in payload["features"] if x["available"] and not x["completed"] ]
+    if len(pending_features) == 0:
+        print("File: {} in Bucket: {} Is Unchanged Since It Was Processed. Skipping".format(payload["key"], payload["bucketName"]))
+        return False
+    return True
+
+def apply_storage_state(payload:dict, storage_state:dict) -> bool:
+    '''
+    Records the storage class of the object in the payload. Returns False when the object is archived and has
+    not been restored, so it can not be processed yet
+    '''
+    if storage_state is None:
+        return True
+
+    payload["storageClass"] = storage_state["storageClass"]
+    if not storage_state["readable"]:
+        print("File: {} in Bucket: {} Is Archived In {}. Deferring Until Restored".format(payload["key"], payload["bucketName"], storage_state["storageClass"]))
+        return False
+    return True
+
+def apply_content_format(payload:dict, header:bytes) -> bool:
+    '''
+    Sniffs the format of the object from its header and marks the features that do not apply to it as completed, so
+    they return without reading the object. The format is kept in the payload for the features that do apply. Returns
+    False when no available feature applies to the object, so no execution is needed
+    '''
+    if header is None:
+        return True
+
+    content_format = sniff_format(header)
+    payload["contentFormat"] = content_format
+    for feature in payload["features"]:
+        content_formats = feature_registry.get_feature_content_formats(feature["name"])
+        if content_formats is not None and content_format not in content_formats:
+            feature["completed"] = True
+    payload["numberOfFeaturesCompleted"] = len([ x for x in payload["features"] if x["completed"] ])
+
+    pending_features = [ x["name"] for x in payload["features"] if x["available"] and not x["completed"] ]
+    if len(pending_features) == 0:
+        print("No Feature Applies To File: {} in Bucket: {} Of Format {}. Skipping".format(payload["key"], payload["bucketName"], content_format))
+        return False
+    return True
+
+def prepare_payload(payload:dict) -> str:
+    '''
+    Returns START when an execution should be started for the payload, DEFER when the object has to be restored
+    first and SKIP when there is nothing to process
+    '''
+    skip_unchanged = SKIP_UNCHANGED_OBJECTS and not payload.get("force", False)
+    defer_archived = DEFERRED_RESTORE_QUEUE_URL != "Invalid"
+    if not (skip_unchanged or defer_archived or SNIFF_CONTENT_FORMATS):
+        return "START"
+
+    try:
+        object_start = read_object_start(payload)
+    except Exception as e:
+        # Process the object as usual, the features report any actual problem with it
+        print("Failed To Read The Start Of File: {} in Bucket: {}".format(payload["key"], payload["bucketName"]))
+        print(e)
+        return "START"
+
+    if defer_archived and not apply_storage_state(payload, object_start["storageState"]):
+        return "DEFER"
+    if skip_unchanged and not apply_fingerprint(payload, object_start["tagCount"]):
+        return "SKIP"
+    if SNIFF_CONTENT_FORMATS and not apply_content_format(payload, object_start["header"]):
+        return "SKIP"
+    return "START"
+
+def defer_payloads(payloads:list) -> None:
+    '''
+    Sends the archived objects to the deferred restore queue. They are processed again when the
+    s3:ObjectRestore:Completed event of each arrives
+    '''
+    messages = [
+        json.dumps({
+            "bucketName": payload["bucketName"],
+            "key": payload["key"],
+            "storageClass": payload["storageClass"]
+        })
+        for payload in payloads
+    ]
+    for index in range(0, len(messages), 10):
+        response = sqs.send_message_batch(
+            QueueUrl=DEFERRED_RESTORE_QUEUE_URL,
+            Entries=[ { "Id": str(i), "MessageBody": message } for i, message in enumerate(messages[index:index + 10]) ]
+        )
+        if len(response.get("Failed", [])) > 0:
+            raise Exception("Failed To Defer {} Objects: {}".format(len(response["Failed"]), response["Failed"]))
+
+def batch_executions(executions:list, batch_size:int) -> list:
+    '''
+    Groups the executions into batch executions of up to batch_size objects each. Every batch execution
+    keeps the ids of all the SQS messages its objects came from, so that a failure to start it returns
+    all of them to the queue
+    '''
+    batched_executions = []
+    for index in range(0, len(executions), batch_size):
+        batch = executions[index:index + batch_size]
+        message_ids = list(dict.fromkeys([ message_id for message_ids, _, _ in batch for message_id in message_ids ]))
+        execution_name = "{}-{}".format(batch[0][1], len(batch))
+        batched_executions.append((message_ids, execution_name, create_batch([ payload for _, _, payload in batch ])))
+    return batched_executions
+
+def start_execution(execution_name:str, payload:dict):
+    try:
+        response = sf.start_execution(
+            stateMachineArn=STATE_MACHINE_ARN,
+            name=execution_name,
+            input=json.dumps(payload)
+        )
+        print("State Machine {} Started. Execution ARN: {}".format(STATE_MACHINE_ARN, response['executionArn']))
+        return response['executionArn']
+    except sf.exceptions.ExecutionAlreadyExists:
+        # The SQS message was redelivered and its execution has already been started
+        print("Execution {} Already Exists. Skipping".format(execution_name))
+        return None
+
+def run_sync_execution(execution_name:str, payload:dict) -> list:
+    '''
+    Runs an Express execution and waits for it to end. Returns the requests of the objects that failed, all of
+    them when the execution did not succeed and those in the batchFailures of its output when it did
+    '''
+    requests = payload["batch"] if is_batch(payload) else [ payload ]
+    try:
+        response = sf_sync.start_sync_execution(
+            stateMachineArn=STATE_MACHINE_ARN,
+            name=execution_name,
+            input=json.dumps(payload)
+        )
+    except Exception as e:
+        print("Failed To Run Execution {}".format(execution_name))
+        print(e)
+        return requests
+
+    # Unlike StartExecution, a failed execution is reported in the response rather then raised
+    if response["status"] != "SUCCEEDED":
+        print("Execution {} Ended With Status {}. Error: {} Cause: {}".format(execution_name, response["status"], response.get("error"), response.get("cause")))
+        return requests
+
+    print("Execution {} Succeeded. Billed Duration: {} ms".format(execution_name, response.get("billingDetails", {}).get("billedDurationInMilliseconds")))
+    output = json.loads(response.get("output", "{}"))
+    if not is_batch(output) or len(output["batchFailures"]) == 0:
+        return []
+    failed_objects = set([ (x["bucketName"], x["key"]) for x in output["batchFailures"] ])
+    return [ x for x in requests if (x["bucketName"], x["key"]) in failed_objects ]
+
+def has_sync_execution_time(context) -> bool:
+    return context.get_remaining_time_in_millis() >= SYNC_EXECUTION_TIME_BUDGET_MILLIS
+
+def dispatch_sync_execution(execution_name:str, payload:dict, context) -> list:
+    '''
+    Runs the execution, then runs the objects that failed again, from their original request, until they succeed or
+    SYNC_EXECUTION_MAX_ATTEMPTS is reached. Returns the requests of the objects that still failed. Executions that
+    could outlast the lambda are not run, their objects are returned as failed to be delivered again
+    '''
+    if not has_sync_execution_time(context):
+        print("Not Enough Time Left To Run Execution {}. Returning Its Objects To The Queue".format(execution_name))
+        return payload["batch"] if is_batch(payload) else [ payload ]
+
+    failed_requests = run_sync_execution(execution_name, payload)
+    attempt = 1
+    while len(failed_requests) > 0 and attempt < SYNC_EXECUTION_MAX_ATTEMPTS:
+        time.sleep(SYNC_EXECUTION_RETRY_DELAY_SECONDS * attempt)
+        if not has_sync_execution_time(context):
+            print("Not Enough Time Left To Retry Execution {}. Returning Its Failed Objects To The Queue".format(execution_name))
+            break
+        attempt += 1
+        print("Retrying {} Failed Objects Of Execution {}. Attempt {} Of {}".format(len(failed_requests), execution_name, attempt, SYNC_EXECUTION_MAX_ATTEMPTS))
+        retry_payload = create_batch(failed_requests) if is_batch(payload) else failed_requests[0]
+        failed_requests = run_sync_execution("{}-{}".format(execution_name, attempt), retry_payload)
+    return failed_requests
+
+def dispatch_execution(execution_name:str, payload:dict, context) -> list:
+    '''
+    Starts the execution. Returns the requests of the objects that failed, which are only known for synchronous
+    executions, asynchronous ones report their failures in the logs of the state machine
+    '''
+    if SYNC_EXECUTIONS:
+        return dispatch_sync_execution(execution_name, payload, context)
+    start_execution(execution_name, payload)
+    return []
+
+
 def lambda_handler(event, context):
 
     sqs_event_records = event['Records']
+    print("Processing {} SQS Messages".format(len(sqs_event_records)))
+
+    # SSM is only consulted when the feature registry cache has expired
+    available_features = generate_available_features()
+
+    failed_message_ids = set()
+    executions = []
+    metas = dict()
     for sqs_event_record in sqs_event_records:
-        sns_event = json.loads(sqs_event_record['body'])
+        message_id = sqs_event_record['messageId']
+        try:
+            for execution_name, payload, meta in build_payloads(event, sqs_event_record, available_features):
+                executions.append(([ message_id ], execution_name, payload))
+                metas[execution_name] = meta
+        except Exception as e:
+            print("Failed To Build Payloads For Message {}".format(message_id))
+            print(e)
+            failed_message_ids.add(message_id)
 
-        s3_event = json.loads(sns_event['Message'])
+    if (SKIP_UNCHANGED_OBJECTS or DEFERRED_RESTORE_QUEUE_URL != "Invalid" or SNIFF_CONTENT_FORMATS) and len(executions) > 0:
+        print("Reading The Start Of {} Objects".format(len(executions)))
+        with ThreadPoolExecutor(max_workers=START_EXECUTION_MAX_WORKERS) as executor:
+            actions = list(executor.map(prepare_payload, [ payload for _, _, payload in executions ]))
 
-        # validate the event
-        print("Validating Event")
-        if not valid_event(s3_event):
-            print("Event Is Not Valid. Cant Process")
-            print(event)
-            return
-        
-        print("Processing Event Records")
-        for s3_event_record in s3_event['Records']:
-
-            event_source = s3_event_record['eventSource']
-            event_region = s3_event_record['awsRegion']
-            event_time = s3_event_record['eventTime']
-            event_name = s3_event_record['eventName']
-
-            bucket_name = s3_event_record['s3']['bucket']['name']
-            bucket_arn = s3_event_record['s3']['bucket']['arn']
-            key = urllib.parse.unquote_plus(s3_event_record['s3']['object']['key'], encoding='utf-8')
-
-            print("{} - {}@{} in {} - {}/{}".format(event_source, event_name, event_time, event_region, bucket_name, key))
-            
-            # then build out the payload
-            payload = {
-                "meta": {
-                    "s3Event": s3_event_record,
-                    "snsEvent": {k:v for k,v in sns_event.items() if k != 'Message'}, # Grab everything but the s3Event data
-                    "sqsEvent": {k:v for k,v in sqs_event_record.items() if k != 'body'}, # Grab everything but the snsEvent data
-                    "lambdaEvent": {k:v for k,v in event.items() if k != 'Records'} # Grab everything but the sqsEvent data
-                },
-                "bucketName": bucket_name,
-                "bucketArn": bucket_arn,
-                "key": key,
-                "features": generate_available_features(),
-                "numberOfFeaturesCompleted": 0
-            }
-
-            response = sf.start_execution(
-                stateMachineArn=STATE_MACHINE_ARN,
-                input=json.dumps(payload)
-            )
-            print("State Machine {} Started. Execution ARN: {}".format(STATE_MACHINE_ARN, response['executionArn']))
-
-
-    print("Processing Complete. Terminating")
+        deferred_executions = [ execution for execution, action in zip(executions, actions) if action == "DEFER" ]
+        if len(deferred_executions) > 0:
+            print("Deferring {} Archived Objects".format(len(deferred_executions)))
+            try:
+                defer_payloads([ payload for _, _, payload in deferred_executions ])
+            except Exception as e:
+                print("Failed To Defer Archived Objects")
+                print(e)
+                for message_ids, _, _ in deferred_executions:
+                    failed_message_ids.update(message_ids)
+
+        executions = [ execution for execution, action in zip(executions, actions) if action == "START" ]
+
+    # Only the metadata of the objects that are processed is kept
+    store_metas(event_meta_store, { execution_name: metas[execution_name] for _, execution_name, _ in executions })
+
+    # The messages of every object, to return only those of the objects that failed in synchronous executions
+    # or inline
+    object_message_ids = dict()
+    for message_ids, _, payload in executions:
+        object_message_ids.setdefault((payload["bucketName"], payload["key"]), []).extend(message_ids)
+
+    inline_requests = []
+    if inline_dispatcher is not None:
+        inline_requests = [ payload for _, _, payload in executions if inline_dispatcher.can_dispatch(payload) ]
+        executions = [ execution for execution in executions if not inline_dispatcher.can_dispatch(execution[2]) ]
+
+    if FEATURE_BATCH_SIZE > 1:
+        executions = batch_executions(executions, FEATURE_BATCH_SIZE)
+
+    print("Starting {} State Machine Executions".format(len(executions)))
+    with ThreadPoolExecutor(max_workers=START_EXECUTION_MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(dispatch_execution, execution_name, payload, context): message_ids
+            for message_ids, execution_name, payload in executions
+        }
+        for future in as_completed(futures):
+            message_ids = futures[future]
+            try:
+                failed_requests = future.result()
+            except Exception as e:
+                print("Failed To Start Execution For Messages {}".format(message_ids))
+                print(e)
+                failed_message_ids.update(message_ids)
+                continue
+            for request in failed_requests:
+                print("File: {} in Bucket: {} Failed To Process".format(request["key"], request["bucketName"]))
+                failed_message_ids.update(object_message_ids[(request["bucketName"], request["key"])])
+
+    if len(inline_requests) > 0:
+        print("Processing {} Small Objects Inline".format(len(inline_requests)))
+        try:
+            failed_requests = inline_dispatcher.dispatch(inline_requests)
+        except Exception as e:
+            print("Failed To Process {} Objects Inline".format(len(inline_requests)))
+            print(e)
+            failed_requests = inline_requests
+        for request in failed_requests:
+            print("File: {} in Bucket: {} Failed To Process".format(request["key"], request["bucketName"]))
+            failed_message_ids.update(object_message_ids[(request["bucketName"], request["key"])])
+
+    print("Processing Complete. {} Messages Failed. Terminating".format(len(failed_message_ids)))
 
+    # Only the failed messages are returned to the queue for redelivery
+    return {
+        "batchItemFailures": [ { "itemIdentifier": message_id } for message_id in failed_message_ids ]
+    }
@@ -0,0 +1,61 @@
+import json
+from os import environ
+from object_storage import create_restore_request, DEFAULT_RESTORE_DAYS, DEFAULT_RESTORE_TIER
+from aws_clients import lazy_client
+
+'''
+    Deferred Restore Queue Message Body Shape:
+
+    {
+        bucketName: string
+        key: string
+        storageClass: string
+    }
+
+    The request builder sends archived objects that have not been restored to the deferred restore queue instead
+    of processing them. This function requests their restore, in batches and with a reserved concurrency so that
+    a backfill over cold data does not turn into a storm of restore requests. Once S3 has restored an object it
+    sends an s3:ObjectRestore:Completed event to the bucket event queue and the object is processed like a new
+    upload
+'''
+
+RESTORE_DAYS = int(environ.get("RESTORE_DAYS", str(DEFAULT_RESTORE_DAYS)))
+RESTORE_TIER = environ.get("RESTORE_TIER", DEFAULT_RESTORE_TIER)
+
+# Returned by restore_object when the object needs no restore request. Both mean the object will be, or is, readable
+RESTORE_NOT_REQUIRED_ERROR_CODES = [ "RestoreAlreadyInProgress", "ObjectAlreadyInActiveTierError" ]
+
+s3 = lazy_client("s3")
+
+
+def restore_object(bucket_name:str, key:str, storage_class:str) -> None:
+    try:
+        s3.restore_object(
+            Bucket=bucket_name,
+            Key=key,
+            RestoreRequest=create_restore_request(storage_class, RESTORE_DAYS, RESTORE_TIER)
+        )
+        print("Requested {} Restore Of File: {} in Bucket: {}".format(RESTORE_TIER, key, bucket_name))
+    except s3.exceptions.ClientError as e:
+        error_code = e.response.get("Error", {}).get("Code")
+        if error_code not in RESTORE_NOT_REQUIRED_ERROR_CODES:
+            raise
+        print("File: {} in Bucket: {} Needs No Restore Request: {}".format(key, bucket_name, error_code))
+
+def lambda_handler(event, context):
+    print("Restoring {} Objects".format(len(event["Records"])))
+
+    failed_message_ids = []
+    for record in event["Records"]:
+        try:
+            request = json.loads(record["body"])
+            restore_object(request["bucketName"], request["key"], request.get("storageClass"))
+        except Exception as e:
+            print("Failed To Restore Object Of Message {}".format(record["messageId"]))
+            print(e)
+            failed_message_ids.append(record["messageId"])
+
+    # Only the failed messages are returned to the queue
+    return {
+        "batchItemFailures": [ { "itemIdentifier": message_id } for message_id in failed_message_ids ]
+    }
@@ -0,0 +1,99 @@
+import { Construct } from "constructs";
+import { Duration } from "aws-cdk-lib"
+import {
+    aws_lambda as lambda,
+    aws_iam as iam,
+    aws_sqs as sqs,
+} from "aws-cdk-lib"
+import * as path from 'path'
+import { ManagedPolicies, ServicePrincipals } from "cdk-constants";
+import { SqsEventSource } from "aws-cdk-lib/aws-lambda-event-sources";
+import { LayerTypes } from "../lambda-layers/lambda-layers";
+import { ConfigurationSingletonFactory } from "../../conf/configuration-singleton-factory";
+
+export interface RestoreFunctionProps{
+    bucketArns: Array<string>,
+    lambdaTimeout: Duration,
+    onLayerRequestListener: (layerTypes: Array<LayerTypes>) => Array<lambda.LayerVersion>
+}
+
+/**
+ * Restore Function. Requests the restore of the archived objects the request builder sends to the deferred restore queue.
+ * Restored objects are processed when their s3:ObjectRestore:Completed event arrives on the bucket event queue
+ */
+export class RestoreFunction extends Construct{
+
+    public readonly deferredRestoreQueue: sqs.Queue
+    public readonly restoreFunction: lambda.Function
+
+    constructor(scope: Construct, id:string, props: RestoreFunctionProps){
+        super(scope, id)
+
+        const settings = ConfigurationSingletonFactory.getConcreteSettings()
+
+        this.deferredRestoreQueue = new sqs.Queue(this, "DeferredRestoreQueue", {
+            queueName: `${settings.namePrefix}-deferred-restore-queue`,
+            encryption: sqs.QueueEncryption.UNENCRYPTED,
+            visibilityTimeout: Duration.minutes(props.lambdaTimeout.toMinutes() * 6)
+        })
+
+        const restoreFunctionRole = new iam.Role(this, "RFServiceRole", {
+            roleName: `${settings.namePrefix}-rf-service-role`,
+            description: "Service Role For Restore Function",
+            assumedBy: new iam.ServicePrincipal(ServicePrincipals.LAMBDA)
+          })
+
+        restoreFunctionRole.addManagedPolicy(
+          iam.ManagedPolicy.fromAwsManagedPolicyName(
+            ManagedPolicies.AWS_LAMBDA_BASIC_EXECUTION_ROLE
+          )
+        )
+
+        const restoreFunctionRolePolicy = new iam.Policy(this, "RFServiceRolePolicy", {
+          policyName: `${settings.namePrefix}-rf-service-role-policy`,
+          roles:[
+            restoreFunctionRole
+          ],
+          statements: [
+            new iam.PolicyStatement({
+              actions:[
+                "s3:RestoreObject"
+              ],
+              resources: props.bucketArns.map((bucketArn) => bucketArn + "/*")
+            }),
+            new iam.PolicyStatement({
+              actions:[
+                "sqs:DeleteMessage",
+                "sqs:ReceiveMessage",
+                "sqs:GetQueueAttributes"
+              ],
+              resources: [ this.deferredRestoreQueue.queueArn ]
+            })
+          ],
+        })
+
+        this.restoreFunction = new lambda.Function(this, `RFFunction`, {
+          functionName: `${settings.namePrefix}-restore-function`,
+          description: 'Restore Function. Requests the restore of archived photos so they can be processed.',
+          runtime: lambda.Runtime.PYTHON_3_8,
+          memorySize: 128,
+          handler: 'lambda_function.lambda_handler',
+          code: lambda.Code.fromAsset(path.join(__dirname, './res')),
+          timeout: props.lambdaTimeout,
+          role: restoreFunctionRole,
+          layers: props.onLayerRequestListener([LayerTypes.COMMONLIBLAYER]),
+          environment:{
+            RESTORE_DAYS: settings.restoreDays.toString(),
+            RESTORE_TIER: settings.restoreTier
+          }
+        })
+
+        this.restoreFunction.addEventSource(new SqsEventSource(this.deferredRestoreQueue, {
+            batchSize: settings.restoreBatchSize,
+            maxBatchingWindow: settings.restoreBatchSize > 10 ? Duration.seconds(30) : undefined,
+            // Bounds the rate of restore requests, the rest of the deferred objects wait in the queue
+            maxConcurrency: Math.max(settings.restoreMaxConcurrency, 2),
+            reportBatchItemFailures: true
+        }))
+    }
+}
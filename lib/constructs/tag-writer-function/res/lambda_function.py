@@ -0,0 +1,53 @@
+from os import environ
+from feature_processing import FeatureProcessing
+from batch_processing import is_batch, process_batch, merge_batch_branch_outputs, DEFAULT_MAX_WORKERS
+from tag_merge import TagWriter
+from aws_clients import lazy_client
+from instrumentation import log_event, flush_metrics
+
+s3 = lazy_client('s3')
+
+FEATURE_BATCH_MAX_WORKERS = int(environ.get("FEATURE_BATCH_MAX_WORKERS", str(DEFAULT_MAX_WORKERS)))
+# The fingerprint tag is only written when the request builder reads it to skip unchanged objects
+SKIP_UNCHANGED_OBJECTS = environ.get("SKIP_UNCHANGED_OBJECTS", "FALSE") == "TRUE"
+
+'''
+    Final step of the photo processing state machine. The features store their tags as deltas in the
+    payload under pendingTags, this function merges all of them and applies them to the object with a
+    single get_object_tagging / put_object_tagging round-trip
+
+    When the features are run in parallel, the event is the list of outputs of each feature branch. These
+    are merged into a single request first
+
+    When the state machine is processing a batch of objects, the tags of every object of the batch are
+    applied concurrently
+'''
+
+def merge_requests(requests:list) -> dict:
+    return FeatureProcessing.merge_branch_outputs(requests).get_request_queue_object()
+
+def apply_pending_tags(request:dict) -> dict:
+    return TagWriter(s3, SKIP_UNCHANGED_OBJECTS).apply_pending_tags(request)
+
+def lambda_handler(event, context):
+
+    log_event(event)
+
+    if isinstance(event, list):
+        print("Merging Outputs Of {} Feature Branches".format(len(event)))
+        if is_batch(event[0]):
+            event = merge_batch_branch_outputs(event, merge_requests)
+        else:
+            event = merge_requests(event)
+
+    try:
+        if is_batch(event):
+            updated_event = process_batch(event, "tag-writer", apply_pending_tags, FEATURE_BATCH_MAX_WORKERS)
+        else:
+            updated_event = apply_pending_tags(event)
+    finally:
+        flush_metrics()
+
+    print("Tags Applied. Terminating")
+
+    return updated_event
@@ -0,0 +1,75 @@
+import { Construct } from "constructs";
+import { Duration } from "aws-cdk-lib"
+import {
+    aws_lambda as lambda,
+    aws_iam as iam,
+} from "aws-cdk-lib"
+import * as path from 'path'
+import { ManagedPolicies, ServicePrincipals } from "cdk-constants";
+import { LayerTypes } from "../lambda-layers/lambda-layers";
+import { ConfigurationSingletonFactory } from "../../conf/configuration-singleton-factory";
+
+export interface TagWriterFunctionProps{
+    bucketArns: Array<string>,
+    lambdaTimeout: Duration,
+    onLayerRequestListener: (layerTypes: Array<LayerTypes>) => Array<lambda.LayerVersion>
+}
+
+export class TagWriterFunction extends Construct{
+
+    public readonly tagWriterFunction: lambda.Function
+
+    constructor(scope: Construct, id:string, props: TagWriterFunctionProps){
+        super(scope, id)
+
+        const settings = ConfigurationSingletonFactory.getConcreteSettings()
+
+        const tagWriterFunctionRole = new iam.Role(this, "TWFServiceRole", {
+            roleName: `${settings.namePrefix}-twf-service-role`,
+            description: "Service Role For Tag Writer Function",
+            assumedBy: new iam.ServicePrincipal(ServicePrincipals.LAMBDA)
+          })
+
+        tagWriterFunctionRole.addManagedPolicy(
+          iam.ManagedPolicy.fromAwsManagedPolicyName(
+            ManagedPolicies.AWS_LAMBDA_BASIC_EXECUTION_ROLE
+          )
+        )
+
+        const bucketArnsSub = props.bucketArns.map((bucketArn) => bucketArn + "/*")
+        const mergedBucketArns = props.bucketArns.concat(bucketArnsSub)
+        const tagWriterFunctionRoleS3Policy = new iam.Policy(this, "TWFServiceRoleS3Policy", {
+          policyName: `${settings.namePrefix}-twf-service-role-s3-policy`,
+          roles:[
+            tagWriterFunctionRole
+          ],
+          statements: [
+            new iam.PolicyStatement({
+              actions:[
+                "s3:PutObjectTagging",
+                "s3:GetObjectTagging"
+              ],
+              resources: mergedBucketArns
+            })
+          ],
+        })
+
+        this.tagWriterFunction = new lambda.Function(this, `TWFFunction`, {
+          functionName: `${settings.namePrefix}-tag-writer-function`,
+          description: 'Tag Writer Function. Applies the merged tags of all features to S3 resources in a single request.',
+          runtime: lambda.Runtime.PYTHON_3_8,
+          memorySize: 128,
+          handler: 'lambda_function.lambda_handler',
+          code: lambda.Code.fromAsset(path.join(__dirname, './res')),
+          timeout: props.lambdaTimeout,
+          role: tagWriterFunctionRole,
+          layers: props.onLayerRequestListener([LayerTypes.COMMONLIBLAYER]),
+          environment:{
+            FEATURE_BATCH_MAX_WORKERS: settings.featureBatchMaxWorkers.toString(),
+            SKIP_UNCHANGED_OBJECTS: settings.skipUnchangedObjects ? "TRUE" : "FALSE",
+            LOG_LEVEL: settings.logLevel,
+            METRICS_NAMESPACE: settings.metricsNamespace
+          }
+        })
+    }
+}
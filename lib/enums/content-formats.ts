@@ -0,0 +1,14 @@
+
+/**
+ * Formats the features detect from the first bytes of the objects, see content_sniffer in the commonlib layer
+ */
+export enum ContentFormats {
+    JPEG = "jpeg",
+    PNG = "png",
+    HEIC = "heic",
+    TIFF = "tiff",
+    NEF = "nef",
+    CR2 = "cr2",
+    ARW = "arw",
+    DNG = "dng"
+}
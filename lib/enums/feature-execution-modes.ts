@@ -0,0 +1,5 @@
+
+export enum FeatureExecutionModes {
+    SEQUENTIAL = "SEQUENTIAL",
+    PARALLEL = "PARALLEL"
+}
@@ -0,0 +1,5 @@
+
+export enum StateMachineTypes {
+    STANDARD = "STANDARD",
+    EXPRESS = "EXPRESS"
+}
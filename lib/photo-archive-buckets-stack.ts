@@ -68,6 +68,10 @@ export class PhotoArchiveBucketsStack extends CPANestedStack {
     for(const mainBucket of this.mainBucketNames.mainBucketNames){
       const bucket = s3.Bucket.fromBucketName(this, `import-${mainBucket}`, mainBucket)
       bucket.addEventNotification(s3.EventType.OBJECT_CREATED, new s3n.SnsDestination(topic))
+      if(settings.deferArchivedObjects){
+        // Deferred archived photos are processed once restored
+        bucket.addEventNotification(s3.EventType.OBJECT_RESTORE_COMPLETED, new s3n.SnsDestination(topic))
+      }
     }
 
   }
@@ -25,7 +25,9 @@ export class PhotoArchiveDynamoStack extends CPANestedStack{
 
         this.dynamoMetricsTable = new DynamoMetricsTable(this, "DynamoMetricsTable", {
             lambdaTimeout: props.lambdaTimeout,
-            namePrefix: settings.namePrefix
+            namePrefix: settings.namePrefix,
+            batchSize: settings.dynamoMetricsBatchSize,
+            maxBatchingWindowSeconds: settings.dynamoMetricsMaxBatchingWindowSeconds
         })
 
         this.dynamoQueue = this.dynamoMetricsTable.dynamoQueue
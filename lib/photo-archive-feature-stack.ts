@@ -13,6 +13,10 @@ import { PhotoRekogTagFunction } from "./constructs/features/photo-rekog-tag-fun
 import { Features } from "./enums/features";
 import { PhotoArchiveLambdaLayerStack } from "./photo-archive-lambda-layer-stack";
 import { CPANestedStack } from "./constructs/cpa-nested-stack";
+import { LayerTypes } from "./constructs/lambda-layers/lambda-layers";
+import { RateLimitTable } from "./constructs/rate-limit-table/rate-limit-table";
+import { ContentIndexTable } from "./constructs/content-index-table/content-index-table";
+import { InlineFeature } from "./constructs/features/inline-feature";
 
 export interface PhotoArchiveFeatureNestedStackProps extends NestedStackProps{
     lambdaTimeout: Duration,
@@ -24,6 +28,9 @@ export class PhotoArchiveFeatureStack extends CPANestedStack{
 
     public readonly lambdaMap: Map<Features, string> = new Map()
     public readonly  featureLambdas = new Array<lambda.Function>()
+    // In the order the state machine runs the features
+    public readonly inlineFeatures = new Array<InlineFeature>()
+    public readonly layerFinder: (layerTypes: Array<LayerTypes>) => Array<lambda.LayerVersion>
 
     constructor(scope: Construct, id: string, props: PhotoArchiveFeatureNestedStackProps){
         super(scope, id, props)
@@ -42,6 +49,15 @@ export class PhotoArchiveFeatureStack extends CPANestedStack{
         })
         //Tags.of(photoArchiveLambdaLayerStack).add('SubStackName', photoArchiveLambdaLayerStack.stackName)
         const layerFinder = photoArchiveLambdaLayerStack.layerFinder
+        this.layerFinder = layerFinder
+
+        // Content index, shared by the features that look up the results of identical photos
+        let contentIndexTable: ContentIndexTable | undefined = undefined
+        if(settings.enableContentIndex){
+            contentIndexTable = new ContentIndexTable(this, 'ContentIndexTable', {
+                namePrefix: settings.namePrefix
+            })
+        }
         
 
         // DispatchLambda -> HashingFunction (FeatureLambda)
@@ -54,6 +70,7 @@ export class PhotoArchiveFeatureStack extends CPANestedStack{
             })
             this.lambdaMap.set(Features.HASH_TAG, hashFunction.hashTagFunction.functionArn)
             this.featureLambdas.push(hashFunction.hashTagFunction)
+            this.inlineFeatures.push(hashFunction.inlineFeature)
         }
       
         // DispatchLambda -> PhotoMetaFunction (FeatureLambda)
@@ -62,22 +79,35 @@ export class PhotoArchiveFeatureStack extends CPANestedStack{
                 bucketArns: mainBucketArns,
                 lambdaTimeout: props.lambdaTimeout,
                 onLayerRequestListener: layerFinder,
-                dynamoMetricsQueue: props.dynamoQueue
+                dynamoMetricsQueue: props.dynamoQueue,
+                contentIndexTable: contentIndexTable?.contentIndexTable
             })
             this.lambdaMap.set(Features.PHOTO_META_TAG, photoMetaTaggerFunction.photoMetaFunction.functionArn)
             this.featureLambdas.push(photoMetaTaggerFunction.photoMetaFunction)
+            this.inlineFeatures.push(photoMetaTaggerFunction.inlineFeature)
         }
     
         // DispatchLambda -> RekogFunction (FeatureLambda)
         if(settings.features.includes(Features.PHOTO_REKOG_TAG)){
+            // Shared count of the Rekognition calls of all the concurrent executions
+            let rateLimitTable: RateLimitTable | undefined = undefined
+            if(settings.enableSharedRateLimit){
+                rateLimitTable = new RateLimitTable(this, 'RateLimitTable', {
+                    namePrefix: settings.namePrefix
+                })
+            }
+
             const rekogFunction = new PhotoRekogTagFunction(this, Features.PHOTO_REKOG_TAG, {
                 bucketArns: mainBucketArns,
                 lambdaTimeout: props.lambdaTimeout,
                 onLayerRequestListener: layerFinder,
-                dynamoMetricsQueue: props.dynamoQueue
+                dynamoMetricsQueue: props.dynamoQueue,
+                contentIndexTable: contentIndexTable?.contentIndexTable,
+                rateLimitTable: rateLimitTable?.rateLimitTable
             })
             this.lambdaMap.set(Features.PHOTO_REKOG_TAG, rekogFunction.rekogFunction.functionArn)
             this.featureLambdas.push(rekogFunction.rekogFunction)
+            this.inlineFeatures.push(rekogFunction.inlineFeature)
 
         }
 
@@ -5,12 +5,19 @@ import { ConfigurationSingletonFactory } from './conf/configuration-singleton-fa
 import { PhotoArchiveDynamoStack } from './photo-archive-dynamo-stack';
 import { PhotoArchiveBucketsStack } from './photo-archive-buckets-stack';
 import { PhotoArchiveFeatureStack } from './photo-archive-feature-stack';
+import { TagWriterFunction } from './constructs/tag-writer-function/tag-writer-function';
+import { FeatureExecutionModes } from './enums/feature-execution-modes';
+import { StateMachineTypes } from './enums/state-machine-types';
+import { BackfillFunction } from './constructs/backfill-function/backfill-function';
+import { RestoreFunction } from './constructs/restore-function/restore-function';
+import { EventMetaTable } from './constructs/event-meta-table/event-meta-table';
 
 import {
   aws_stepfunctions as sfn,
   aws_stepfunctions_tasks as tasks,
   aws_iam as iam,
   aws_logs as logs,
+  aws_xray as xray,
 } from 'aws-cdk-lib'
 
 export interface PhotoArchiveStackProps extends StackProps {
@@ -84,36 +91,129 @@ export class PhotoArchiveStack extends Stack {
       })
     })
 
-    const definition = smTasks.shift()
-    if(definition != undefined){
-      let chain = sfn.Chain.start(definition)
-      for(const smtask of smTasks){
-        chain = chain.next(smtask)
+    const isParallelExecution = settings.featureExecutionMode == FeatureExecutionModes.PARALLEL
+    let tagWriterTask: tasks.LambdaInvoke | undefined = undefined
+
+    // Tags of all the features are applied by a single final step. In parallel execution mode this step also
+    // merges the outputs of the feature branches, so it is always required
+    if((settings.coalesceFeatureTagWrites || isParallelExecution) && smTasks.length > 0){
+      const tagWriterFunction = new TagWriterFunction(this, "TagWriterFunction", {
+        bucketArns: mainBucketNames.map((mainBucketName) => `arn:aws:s3:::${mainBucketName}`),
+        lambdaTimeout: defaultLambdaTimeout,
+        onLayerRequestListener: photoArchiveFeatureStack.layerFinder
+      })
+      tagWriterTask = new tasks.LambdaInvoke(this, 'invoke-tag-writer-function', {
+        lambdaFunction: tagWriterFunction.tagWriterFunction,
+        outputPath: '$.Payload'
+      })
+    }
+
+    let definition: sfn.Chain | undefined = undefined
+    if(smTasks.length > 0){
+      if(isParallelExecution){
+        // Features are independent of each other, so they all run at once on the same input
+        const parallelFeatures = new sfn.Parallel(this, 'parallel-features', {
+          comment: 'Runs all features in parallel. Outputs are merged by the tag writer function'
+        })
+        for(const smtask of smTasks){
+          parallelFeatures.branch(smtask)
+        }
+        definition = sfn.Chain.start(parallelFeatures).next(tagWriterTask!!)
+      }else{
+        let chain = sfn.Chain.start(smTasks[0])
+        for(const smtask of smTasks.slice(1)){
+          chain = chain.next(smtask)
+        }
+        if(tagWriterTask != undefined){
+          chain = chain.next(tagWriterTask)
+        }
+        definition = chain
       }
     }
 
+    const stateMachineName = 'photo-processing-state-machine'
+    const isExpressStateMachine = settings.stateMachineType == StateMachineTypes.EXPRESS
+    const stateMachineLogLevel = sfn.LogLevel[settings.stateMachineLogLevel as keyof typeof sfn.LogLevel]
+
     const stateMachine = new sfn.StateMachine(this, 'PhotoProcessingStateMachine', {
       comment: 'Photo Processing State Machine',
-      stateMachineName: 'photo-processing-state-machine',
+      stateMachineName: stateMachineName,
+      stateMachineType: isExpressStateMachine ? sfn.StateMachineType.EXPRESS : sfn.StateMachineType.STANDARD,
       definitionBody: definition != undefined ? sfn.DefinitionBody.fromChainable(definition) : undefined,
 
-      tracingEnabled: true,
-      logs: {
+      tracingEnabled: settings.stateMachineTracingEnabled,
+      logs: stateMachineLogLevel != sfn.LogLevel.OFF ? {
         destination: new logs.LogGroup(this, 'photo-processing-state-machine-logs'),
-        level: sfn.LogLevel.ALL
-      }
+        level: stateMachineLogLevel
+      } : undefined
     })
+
+    // Only a sample of the executions is traced, as X-Ray bills per trace
+    if(settings.stateMachineTracingEnabled){
+      new xray.CfnSamplingRule(this, 'PhotoProcessingStateMachineSamplingRule', {
+        samplingRule: {
+          ruleName: `${settings.namePrefix}-sm-sampling-rule`,
+          priority: 100,
+          fixedRate: settings.stateMachineTracingSampleRate,
+          reservoirSize: 1,
+          serviceName: stateMachineName,
+          serviceType: 'AWS::StepFunctions::StateMachine',
+          host: '*',
+          httpMethod: '*',
+          urlPath: '*',
+          resourceArn: '*',
+          version: 1
+        }
+      })
+    }
   
+    // Archived photos: RequestBuilderFunction -> DeferredRestoreQueue -> RestoreFunction. Once restored, S3 sends
+    // an s3:ObjectRestore:Completed event to the EventQueue and the photo is processed
+    let restoreFunction: RestoreFunction | undefined = undefined
+    if(settings.deferArchivedObjects){
+      restoreFunction = new RestoreFunction(this, "RestoreFunction", {
+        bucketArns: mainBucketNames.map((mainBucketName) => `arn:aws:s3:::${mainBucketName}`),
+        lambdaTimeout: defaultLambdaTimeout,
+        onLayerRequestListener: photoArchiveFeatureStack.layerFinder
+      })
+    }
+
+    // Event metadata is kept out of the state machine payloads
+    let eventMetaTable: EventMetaTable | undefined = undefined
+    if(settings.storeEventMeta){
+      eventMetaTable = new EventMetaTable(this, 'EventMetaTable', {
+        namePrefix: settings.namePrefix
+      })
+    }
+
     // EventQueue -> ReqestBuilderFunction -> Trigger the State Machine
     const requestBuilderFunction = new RequestBuilderFunction(this, "RequestBuilderFunction", {
       stateMachineArn: stateMachine.stateMachineArn,
+      bucketArns: mainBucketNames.map((mainBucketName) => `arn:aws:s3:::${mainBucketName}`),
       eventQueue: bucketEventQueue,
-      lambdaTimeout: defaultLambdaTimeout
+      deferredRestoreQueue: restoreFunction?.deferredRestoreQueue,
+      eventMetaTable: eventMetaTable?.eventMetaTable,
+      inlineFeatures: photoArchiveFeatureStack.inlineFeatures,
+      lambdaTimeout: defaultLambdaTimeout,
+      onLayerRequestListener: photoArchiveFeatureStack.layerFinder
     })
 
+    // Inventory -> BackfillFunction -> EventQueue. Processes the photos already in the archive buckets
+    if(settings.enableInventoryOfArchiveBuckets){
+      const backfillFunction = new BackfillFunction(this, "BackfillFunction", {
+        mainBucketNames: mainBucketNames,
+        loggingBucketName: photoArchiveBucketsNestedStack.mainBucketNames.loggingBucketName,
+        eventQueue: bucketEventQueue,
+        onLayerRequestListener: photoArchiveFeatureStack.layerFinder
+      })
+    }
+
 
     if(settings.enableDynamoMetricsTable){
-      photoArchiveDynamoStack?.setDynamoQueuePolicyToAllowLambdas(featureLambdas)
+      // The request builder sends the metrics of the objects it processes inline
+      const metricsLambdas = settings.inlineDispatchMaxObjectKiloBytes > 0 ?
+        featureLambdas.concat([ requestBuilderFunction.requestBuilderFunction ]) : featureLambdas
+      photoArchiveDynamoStack?.setDynamoQueuePolicyToAllowLambdas(metricsLambdas)
       photoArchiveDynamoStack?.node.addDependency(photoArchiveFeatureStack)
     }
 
@@ -0,0 +1,55 @@
+import sys
+import os
+import io
+import time
+import hashlib
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../lib/constructs/lambda-layers/res/commonlib/python"))
+
+from hashing_engine import MultiDigestEngine, SUPPORTED_ALGORITHMS
+
+'''
+    Compares the throughput of the original hash-tag implementation (100 KB reads, digests updated one
+    after another on one thread) against the MultiDigestEngine
+
+    Usage: python test/hashing_benchmark.py [size in MB] [buffer size in MB]
+'''
+
+def sequential_hash(stream) -> dict:
+    buffer_size_bytes = 1024 * 100
+    digests = { algorithm: hashlib.new(algorithm) for algorithm in SUPPORTED_ALGORITHMS }
+    buffer = stream.read(buffer_size_bytes)
+    while buffer:
+        for digest in digests.values():
+            digest.update(buffer)
+        buffer = stream.read(buffer_size_bytes)
+    return digests
+
+def benchmark(name:str, hash_function, data:bytes, rounds:int = 3) -> dict:
+    best_seconds = None
+    result = None
+    for _ in range(rounds):
+        stream = io.BytesIO(data)
+        start = time.perf_counter()
+        result = hash_function(stream)
+        elapsed = time.perf_counter() - start
+        best_seconds = elapsed if best_seconds is None else min(best_seconds, elapsed)
+
+    megabytes = len(data) / (1024 * 1024)
+    print("{:<32} {:>8.3f}s {:>10.1f} MB/s".format(name, best_seconds, megabytes / best_seconds))
+    return { algorithm: digest.hexdigest() for algorithm, digest in result.items() }
+
+
+size_megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+buffer_megabytes = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+print("Hashing {} MB With {} CPUs".format(size_megabytes, os.cpu_count()))
+data = os.urandom(size_megabytes * 1024 * 1024)
+
+sequential_digests = benchmark("sequential (100 KB reads)", sequential_hash, data)
+
+engine = MultiDigestEngine(SUPPORTED_ALGORITHMS, buffer_megabytes * 1024 * 1024)
+engine_digests = benchmark("MultiDigestEngine ({} MB buffer)".format(buffer_megabytes), engine.hash_stream, data)
+
+assert sequential_digests == engine_digests, "Digests Do Not Match"
+print("Digests Match")
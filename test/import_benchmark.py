@@ -0,0 +1,61 @@
+import sys
+import os
+import json
+import statistics
+import subprocess
+
+'''
+    Measures the cold start import time of every lambda module: the time to import its lambda_function
+    module in a fresh interpreter, with the commonlib layer on the path as in the lambda runtime. No AWS
+    calls are made, credentials are not required
+
+    Usage: python test/import_benchmark.py [rounds]
+'''
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+COMMONLIB_PATH = os.path.join(ROOT, "lib/constructs/lambda-layers/res/commonlib/python")
+
+LAMBDA_MODULES = {
+    "feature-hash-tag": "lib/constructs/features/hash-tag-function/res",
+    "feature-photo-meta-tag": "lib/constructs/features/photo-meta-tag-function/res",
+    "feature-photo-rekog-tag": "lib/constructs/features/photo-rekog-tag-function/res",
+    "request-builder": "lib/constructs/request-builder-function/res",
+    "tag-writer": "lib/constructs/tag-writer-function/res",
+    "restore": "lib/constructs/restore-function/res",
+    "backfill": "lib/constructs/backfill-function/res",
+}
+
+IMPORT_SCRIPT = '''
+import sys
+import time
+import json
+start = time.perf_counter()
+import lambda_function
+elapsed = time.perf_counter() - start
+print(json.dumps({ "milliseconds": elapsed * 1000, "boto3Imported": "boto3" in sys.modules }))
+'''
+
+def measure(module_path:str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join([ os.path.join(ROOT, module_path), COMMONLIB_PATH ]),
+        "PYTHONDONTWRITEBYTECODE": "1",
+        "AWS_DEFAULT_REGION": env.get("AWS_DEFAULT_REGION", "us-east-1"),
+        "FEATURE_NAME": "benchmark",
+        "SETTINGS_PREFIX": "benchmark"
+    })
+    output = subprocess.run([ sys.executable, "-c", IMPORT_SCRIPT ], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+print("{:<26} {:>12} {:>12} {:>16}".format("module", "median ms", "min ms", "boto3 imported"))
+for name, module_path in LAMBDA_MODULES.items():
+    try:
+        results = [ measure(module_path) for _ in range(rounds) ]
+    except subprocess.CalledProcessError as e:
+        print("{:<26} failed: {}".format(name, e.stderr.strip().splitlines()[-1] if e.stderr else e))
+        continue
+    milliseconds = [ x["milliseconds"] for x in results ]
+    print("{:<26} {:>12.1f} {:>12.1f} {:>16}".format(name, statistics.median(milliseconds), min(milliseconds), str(results[0]["boto3Imported"])))
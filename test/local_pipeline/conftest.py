@@ -0,0 +1,23 @@
+import os
+import pytest
+from corpus import create_corpus
+
+'''
+    Usage: python -m pytest test/local_pipeline [--benchmark-only | --benchmark-skip]
+
+    The size of the benchmark corpus is set with the LOCAL_PIPELINE_PHOTO_COUNT and LOCAL_PIPELINE_PHOTO_KILOBYTES
+    environment variables
+'''
+
+PHOTO_COUNT = int(os.environ.get("LOCAL_PIPELINE_PHOTO_COUNT", "20"))
+PHOTO_SIZE_BYTES = int(os.environ.get("LOCAL_PIPELINE_PHOTO_KILOBYTES", "2048")) * 1024
+
+
+@pytest.fixture(scope="session")
+def corpus() -> list:
+    return create_corpus(PHOTO_COUNT, PHOTO_SIZE_BYTES)
+
+@pytest.fixture(scope="session")
+def small_corpus() -> list:
+    # Includes files that are not photos
+    return create_corpus(6, 1024 * 256, other_file_ratio=0.3, seed=1)
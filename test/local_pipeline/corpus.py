@@ -0,0 +1,198 @@
+import io
+import os
+import sys
+import struct
+import random
+
+try:
+    # Optional. Without it the photos hold EXIF data and filler instead of a decodable image
+    from PIL import Image
+except ImportError:
+    Image = None
+
+'''
+    Generates a synthetic photo corpus: JPEG photos with the EXIF tags read by the photo meta feature, of a
+    configurable size, plus an optional share of files that are not photos. Photos are deterministic for a
+    given seed, so benchmark runs process identical bytes
+
+    When Pillow is available, each photo holds a real, decodable image (random blocks of color) followed by
+    filler up to the requested size, decoders stop at the end of image marker and ignore the filler
+
+    Usage: python test/local_pipeline/corpus.py <output directory> [photo count] [size in KB]
+'''
+
+DEFAULT_PHOTO_SIZE_BYTES = 1024 * 1024 * 2 # 2 MB
+DEFAULT_IMAGE_DIMENSIONS = (1024, 768)
+
+CAMERAS = [
+    ("Canon", "Canon EOS R5", "RF24-105mm F4 L IS USM"),
+    ("NIKON CORPORATION", "NIKON Z 6_2", "NIKKOR Z 24-70mm f/4 S"),
+    ("SONY", "ILCE-7M4", "FE 35mm F1.8"),
+    ("FUJIFILM", "X-T4", "XF16-80mmF4 R OIS WR"),
+    ("Apple", "iPhone 14 Pro", "iPhone 14 Pro back triple camera 6.86mm f/1.78")
+]
+
+TIFF_ASCII = 2
+TIFF_SHORT = 3
+TIFF_LONG = 4
+TIFF_RATIONAL = 5
+
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_X_RESOLUTION = 0x011A
+TAG_Y_RESOLUTION = 0x011B
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_EXPOSURE_TIME = 0x829A
+TAG_ISO = 0x8827
+TAG_APERTURE_VALUE = 0x9202
+TAG_FOCAL_LENGTH = 0x920A
+TAG_LENS_MODEL = 0xA434
+
+
+class SyntheticPhoto:
+
+    def __init__(self, key:str, body:bytes, exif:dict) -> None:
+        self.key = key
+        self.body = body
+        self.exif = exif
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+def encode_ifd(entries:list, ifd_offset:int) -> bytes:
+    '''
+    Encodes a little endian TIFF directory at ifd_offset of the TIFF structure. entries is a list of
+    (tag, type, values), values longer then 4 bytes are stored right after the directory
+    '''
+    entries = sorted(entries, key=lambda x: x[0])
+    data_offset = ifd_offset + 2 + (len(entries) * 12) + 4
+    directory = struct.pack("<H", len(entries))
+    data = b""
+    for tag, value_type, values in entries:
+        if value_type == TIFF_ASCII:
+            raw = values.encode("ascii") + b"\x00"
+            count = len(raw)
+        elif value_type == TIFF_SHORT:
+            raw = struct.pack("<" + "H" * len(values), *values)
+            count = len(values)
+        elif value_type == TIFF_LONG:
+            raw = struct.pack("<" + "I" * len(values), *values)
+            count = len(values)
+        else:
+            raw = b"".join([ struct.pack("<II", numerator, denominator) for numerator, denominator in values ])
+            count = len(values)
+
+        if len(raw) <= 4:
+            directory += struct.pack("<HHI", tag, value_type, count) + raw.ljust(4, b"\x00")
+        else:
+            directory += struct.pack("<HHII", tag, value_type, count, data_offset + len(data))
+            data += raw
+            # Values start on word boundaries
+            if len(data) % 2 == 1:
+                data += b"\x00"
+    return directory + struct.pack("<I", 0) + data
+
+def create_exif_segment(exif:dict) -> bytes:
+    '''
+    Returns the APP1 segment holding the EXIF data of the photo
+    '''
+    ifd0_entries = [
+        (TAG_MAKE, TIFF_ASCII, exif["make"]),
+        (TAG_MODEL, TIFF_ASCII, exif["model"]),
+        (TAG_X_RESOLUTION, TIFF_RATIONAL, [ (72, 1) ]),
+        (TAG_Y_RESOLUTION, TIFF_RATIONAL, [ (72, 1) ]),
+        (TAG_DATETIME, TIFF_ASCII, exif["dateTime"]),
+        (TAG_EXIF_IFD, TIFF_LONG, [ 0 ])
+    ]
+    exif_entries = [
+        (TAG_EXPOSURE_TIME, TIFF_RATIONAL, [ exif["exposureTime"] ]),
+        (TAG_ISO, TIFF_SHORT, [ exif["iso"] ]),
+        (TAG_APERTURE_VALUE, TIFF_RATIONAL, [ exif["apertureValue"] ]),
+        (TAG_FOCAL_LENGTH, TIFF_RATIONAL, [ exif["focalLength"] ]),
+        (TAG_LENS_MODEL, TIFF_ASCII, exif["lensModel"])
+    ]
+
+    # The offset of the EXIF directory is only known once IFD0 is encoded
+    ifd0 = encode_ifd(ifd0_entries, 8)
+    exif_ifd_offset = 8 + len(ifd0)
+    ifd0 = encode_ifd(ifd0_entries[:-1] + [ (TAG_EXIF_IFD, TIFF_LONG, [ exif_ifd_offset ]) ], 8)
+    tiff = b"II*\x00" + struct.pack("<I", 8) + ifd0 + encode_ifd(exif_entries, exif_ifd_offset)
+
+    payload = b"Exif\x00\x00" + tiff
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+def create_image(random_generator:random.Random, dimensions:tuple) -> bytes:
+    '''
+    Returns a JPEG of random blocks of color, or a minimal JPEG structure without image data when Pillow
+    is not available
+    '''
+    if Image is None:
+        return b"\xff\xd8\xff\xd9"
+
+    block_size = 64
+    small = Image.new("RGB", (max(1, dimensions[0] // block_size), max(1, dimensions[1] // block_size)))
+    small.putdata([
+        (random_generator.randrange(256), random_generator.randrange(256), random_generator.randrange(256))
+        for _ in range(small.width * small.height)
+    ])
+    output = io.BytesIO()
+    small.resize(dimensions, Image.BILINEAR).save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+def create_exif(random_generator:random.Random) -> dict:
+    make, model, lens_model = random_generator.choice(CAMERAS)
+    return {
+        "make": make,
+        "model": model,
+        "lensModel": lens_model,
+        "dateTime": "20{:02d}:{:02d}:{:02d} {:02d}:{:02d}:{:02d}".format(
+            random_generator.randrange(10, 24), random_generator.randrange(1, 13), random_generator.randrange(1, 29),
+            random_generator.randrange(24), random_generator.randrange(60), random_generator.randrange(60)),
+        "exposureTime": (1, random_generator.choice([ 30, 60, 125, 250, 500, 1000 ])),
+        "iso": random_generator.choice([ 100, 200, 400, 800, 1600, 3200 ]),
+        "apertureValue": (random_generator.choice([ 200, 300, 400, 500, 600 ]), 100),
+        "focalLength": (random_generator.choice([ 24, 35, 50, 70, 105 ]), 1)
+    }
+
+def create_photo(key:str, random_generator:random.Random, size_bytes:int = DEFAULT_PHOTO_SIZE_BYTES,
+    dimensions:tuple = DEFAULT_IMAGE_DIMENSIONS) -> SyntheticPhoto:
+    exif = create_exif(random_generator)
+    image = create_image(random_generator, dimensions)
+    # The EXIF segment goes right after the start of image marker, where readers look for it
+    body = image[:2] + create_exif_segment(exif) + image[2:]
+    if len(body) < size_bytes:
+        body += random_generator.randbytes(size_bytes - len(body))
+    return SyntheticPhoto(key, body, exif)
+
+def create_corpus(photo_count:int, size_bytes:int = DEFAULT_PHOTO_SIZE_BYTES, other_file_ratio:float = 0.0,
+    dimensions:tuple = DEFAULT_IMAGE_DIMENSIONS, seed:int = 0) -> list:
+    '''
+    Returns photo_count SyntheticPhotos. other_file_ratio of them are text files instead of photos, which the
+    photo features skip
+    '''
+    random_generator = random.Random(seed)
+    corpus = []
+    for index in range(photo_count):
+        if random_generator.random() < other_file_ratio:
+            body = random_generator.randbytes(max(1, size_bytes // 16))
+            corpus.append(SyntheticPhoto("notes/note-{:05d}.txt".format(index), body, None))
+            continue
+        key = "photos/{:04d}/IMG_{:05d}.jpg".format(2010 + (index % 14), index)
+        corpus.append(create_photo(key, random_generator, size_bytes, dimensions))
+    return corpus
+
+
+if __name__ == "__main__":
+    output_directory = sys.argv[1]
+    photo_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    size_bytes = int(sys.argv[3]) * 1024 if len(sys.argv) > 3 else DEFAULT_PHOTO_SIZE_BYTES
+
+    for photo in create_corpus(photo_count, size_bytes):
+        path = os.path.join(output_directory, photo.key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as photo_file:
+            photo_file.write(photo.body)
+    print("Wrote {} Photos To {}".format(photo_count, output_directory))
@@ -0,0 +1,810 @@
+import io
+import re
+import json
+import time
+import uuid
+import hashlib
+import threading
+from types import SimpleNamespace
+from botocore.exceptions import ClientError
+
+'''
+    In-process stand-ins for the AWS services used by the lambdas: S3, SQS, SSM, Step Functions, DynamoDB and
+    Rekognition. They implement the subset of each API the lambdas call, with the limits and errors of the real
+    service where the lambdas depend on them (tag and batch limits, ranges, archived objects, conditional
+    writes), and count the calls made to them
+
+    Errors are raised as botocore ClientErrors carrying the error code of the real service, and are exposed
+    under client.exceptions like those of a boto3 client
+'''
+
+REGION = "us-east-1"
+ACCOUNT_ID = "000000000000"
+
+S3_MAX_TAGS = 10
+S3_MAX_TAG_KEY_LENGTH = 128
+S3_MAX_TAG_VALUE_LENGTH = 256
+ARCHIVED_STORAGE_CLASSES = [ "GLACIER", "DEEP_ARCHIVE" ]
+
+SQS_MAX_BATCH_ENTRIES = 10
+SQS_MAX_MESSAGE_SIZE_BYTES = 1024 * 256 # 256 KB
+
+SSM_MAX_RESULTS_PER_PAGE = 10
+
+REKOGNITION_MAX_IMAGE_BYTES = 1024 * 1024 * 5 # 5 MB
+REKOGNITION_MAX_S3_OBJECT_BYTES = 1024 * 1024 * 15 # 15 MB
+REKOGNITION_LABELS = [
+    "Landscape", "Nature", "Outdoors", "Mountain", "Sky", "Water", "Tree", "Person", "Portrait", "Animal",
+    "Dog", "Cat", "Bird", "City", "Building", "Architecture", "Car", "Beach", "Sunset", "Food"
+]
+
+RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)")
+# Characters allowed in the keys and values of S3 object tags
+TAG_PATTERN = re.compile(r"^[\w\s+\-=.:/@]*$")
+
+
+def create_exceptions(*error_codes) -> SimpleNamespace:
+    '''
+    Returns the exceptions namespace of a fake client, with a ClientError subclass per error code
+    '''
+    exceptions = { "ClientError": ClientError }
+    for error_code in error_codes:
+        exceptions[error_code] = type(error_code, (ClientError,), dict())
+    return SimpleNamespace(**exceptions)
+
+def raise_error(exceptions:SimpleNamespace, error_code:str, message:str, operation_name:str):
+    exception_type = getattr(exceptions, error_code, ClientError)
+    raise exception_type({ "Error": { "Code": error_code, "Message": message } }, operation_name)
+
+
+class CallCounter:
+
+    def __init__(self) -> None:
+        self.call_counts = dict()
+        self.lock = threading.Lock()
+
+    def count_call(self, operation_name:str) -> None:
+        with self.lock:
+            self.call_counts[operation_name] = self.call_counts.get(operation_name, 0) + 1
+
+    def reset_call_counts(self) -> None:
+        with self.lock:
+            self.call_counts = dict()
+
+
+class FakeS3(CallCounter):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.exceptions = create_exceptions("NoSuchKey", "NoSuchBucket", "InvalidObjectState", "InvalidRange",
+            "InvalidTag", "RestoreAlreadyInProgress")
+        self.objects = dict()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.objects = dict()
+        self.reset_call_counts()
+
+    def _get_object_entry(self, bucket:str, key:str, operation_name:str) -> dict:
+        entry = self.objects.get((bucket, key))
+        if entry is None:
+            raise_error(self.exceptions, "NoSuchKey", "The specified key does not exist.", operation_name)
+        return entry
+
+    def put_object(self, Bucket:str, Key:str, Body:bytes, StorageClass:str = "STANDARD", **kwargs) -> dict:
+        self.count_call("PutObject")
+        etag = '"{}"'.format(hashlib.md5(Body).hexdigest())
+        with self.lock:
+            self.objects[(Bucket, Key)] = {
+                "body": bytes(Body),
+                "etag": etag,
+                "storageClass": StorageClass,
+                "restored": False,
+                "tagSet": []
+            }
+        return { "ETag": etag }
+
+    def head_object(self, Bucket:str, Key:str, **kwargs) -> dict:
+        self.count_call("HeadObject")
+        entry = self._get_object_entry(Bucket, Key, "HeadObject")
+        response = {
+            "ContentLength": len(entry["body"]),
+            "ETag": entry["etag"]
+        }
+        # S3 omits the storage class of STANDARD objects
+        if entry["storageClass"] != "STANDARD":
+            response["StorageClass"] = entry["storageClass"]
+        if entry["restored"]:
+            response["Restore"] = 'ongoing-request="false", expiry-date="Fri, 21 Dec 2040 00:00:00 GMT"'
+        return response
+
+    def get_object(self, Bucket:str, Key:str, Range:str = None, **kwargs) -> dict:
+        self.count_call("GetObject")
+        entry = self._get_object_entry(Bucket, Key, "GetObject")
+        if entry["storageClass"] in ARCHIVED_STORAGE_CLASSES and not entry["restored"]:
+            raise_error(self.exceptions, "InvalidObjectState", "The operation is not valid for the object's storage class", "GetObject")
+
+        body = entry["body"]
+        response = { "ETag": entry["etag"] }
+        # As head_object, plus the number of tags when the object has any
+        if entry["storageClass"] != "STANDARD":
+            response["StorageClass"] = entry["storageClass"]
+        if entry["restored"]:
+            response["Restore"] = 'ongoing-request="false", expiry-date="Fri, 21 Dec 2040 00:00:00 GMT"'
+        if len(entry["tagSet"]) > 0:
+            response["TagCount"] = len(entry["tagSet"])
+        if Range is None:
+            response["ContentLength"] = len(body)
+            response["Body"] = io.BytesIO(body)
+            return response
+
+        match = RANGE_PATTERN.match(Range)
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) != "" else len(body) - 1, len(body) - 1)
+        if start >= len(body):
+            raise_error(self.exceptions, "InvalidRange", "The requested range is not satisfiable", "GetObject")
+        response["ContentLength"] = end - start + 1
+        response["ContentRange"] = "bytes {}-{}/{}".format(start, end, len(body))
+        response["Body"] = io.BytesIO(body[start:end + 1])
+        return response
+
+    def get_object_tagging(self, Bucket:str, Key:str, **kwargs) -> dict:
+        self.count_call("GetObjectTagging")
+        entry = self._get_object_entry(Bucket, Key, "GetObjectTagging")
+        with self.lock:
+            return { "TagSet": [ dict(x) for x in entry["tagSet"] ] }
+
+    def put_object_tagging(self, Bucket:str, Key:str, Tagging:dict, **kwargs) -> dict:
+        self.count_call("PutObjectTagging")
+        entry = self._get_object_entry(Bucket, Key, "PutObjectTagging")
+        tagset = Tagging["TagSet"]
+        if len(tagset) > S3_MAX_TAGS:
+            raise_error(self.exceptions, "BadRequest", "Object tags cannot be greater than 10", "PutObjectTagging")
+        for tag in tagset:
+            if len(tag["Key"]) > S3_MAX_TAG_KEY_LENGTH or len(tag["Value"]) > S3_MAX_TAG_VALUE_LENGTH:
+                raise_error(self.exceptions, "InvalidTag", "The TagValue you have provided is too long", "PutObjectTagging")
+            if not TAG_PATTERN.match(tag["Key"]) or not TAG_PATTERN.match(tag["Value"]):
+                raise_error(self.exceptions, "InvalidTag", "The TagValue you have provided is invalid", "PutObjectTagging")
+        with self.lock:
+            entry["tagSet"] = [ dict(x) for x in tagset ]
+        return dict()
+
+    def restore_object(self, Bucket:str, Key:str, RestoreRequest:dict = None, **kwargs) -> dict:
+        '''
+        Restores are completed immediately
+        '''
+        self.count_call("RestoreObject")
+        entry = self._get_object_entry(Bucket, Key, "RestoreObject")
+        with self.lock:
+            entry["restored"] = True
+        return dict()
+
+    def get_tags(self, bucket:str, key:str) -> dict:
+        with self.lock:
+            return { x["Key"]: x["Value"] for x in self.objects[(bucket, key)]["tagSet"] }
+
+
+class FakeSQS(CallCounter):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.exceptions = create_exceptions("QueueDoesNotExist", "TooManyEntriesInBatchRequest", "BatchRequestTooLong")
+        self.queues = dict()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.queues = dict()
+        self.reset_call_counts()
+
+    def create_queue_url(self, queue_name:str) -> str:
+        return "https://sqs.{}.amazonaws.com/{}/{}".format(REGION, ACCOUNT_ID, queue_name)
+
+    def _enqueue(self, queue_url:str, body:str, message_attributes:dict) -> str:
+        message_id = str(uuid.uuid4())
+        with self.lock:
+            self.queues.setdefault(queue_url, []).append({
+                "MessageId": message_id,
+                "Body": body,
+                "MessageAttributes": message_attributes or dict()
+            })
+        return message_id
+
+    def send_message(self, QueueUrl:str, MessageBody:str, MessageAttributes:dict = None, **kwargs) -> dict:
+        self.count_call("SendMessage")
+        if len(MessageBody.encode('utf-8')) > SQS_MAX_MESSAGE_SIZE_BYTES:
+            raise_error(self.exceptions, "InvalidParameterValue", "Message must be shorter than 262144 bytes", "SendMessage")
+        return { "MessageId": self._enqueue(QueueUrl, MessageBody, MessageAttributes) }
+
+    def send_message_batch(self, QueueUrl:str, Entries:list, **kwargs) -> dict:
+        self.count_call("SendMessageBatch")
+        if len(Entries) > SQS_MAX_BATCH_ENTRIES:
+            raise_error(self.exceptions, "TooManyEntriesInBatchRequest", "Maximum number of entries per request are 10", "SendMessageBatch")
+        batch_size = sum([ len(x["MessageBody"].encode('utf-8')) + len(json.dumps(x.get("MessageAttributes", {}))) for x in Entries ])
+        if batch_size > SQS_MAX_MESSAGE_SIZE_BYTES:
+            raise_error(self.exceptions, "BatchRequestTooLong", "Batch requests cannot be longer than 262144 bytes", "SendMessageBatch")
+
+        return {
+            "Successful": [
+                { "Id": x["Id"], "MessageId": self._enqueue(QueueUrl, x["MessageBody"], x.get("MessageAttributes")) }
+                for x in Entries
+            ],
+            "Failed": []
+        }
+
+    def receive_lambda_records(self, queue_url:str, max_records:int = None) -> list:
+        '''
+        Removes the messages from the queue and returns them as the records of an SQS event source mapping event
+        '''
+        with self.lock:
+            messages = self.queues.get(queue_url, [])
+            count = len(messages) if max_records is None else min(max_records, len(messages))
+            received = messages[:count]
+            self.queues[queue_url] = messages[count:]
+        return [ create_sqs_record(x["Body"], x["MessageId"], x["MessageAttributes"], queue_url) for x in received ]
+
+    def get_queue_length(self, queue_url:str) -> int:
+        with self.lock:
+            return len(self.queues.get(queue_url, []))
+
+
+def create_sqs_record(body:str, message_id:str = None, message_attributes:dict = None, queue_url:str = "") -> dict:
+    '''
+    Returns a record as delivered to a lambda by an SQS event source mapping. Message attributes are renamed to
+    their lower camel case event shape
+    '''
+    return {
+        "messageId": message_id or str(uuid.uuid4()),
+        "receiptHandle": str(uuid.uuid4()),
+        "body": body,
+        "attributes": {
+            "ApproximateReceiveCount": "1",
+            "SentTimestamp": str(int(time.time() * 1000))
+        },
+        "messageAttributes": {
+            name: { "stringValue": value.get("StringValue"), "dataType": value.get("DataType") }
+            for name, value in (message_attributes or dict()).items()
+        },
+        "eventSource": "aws:sqs",
+        "eventSourceARN": "arn:aws:sqs:{}:{}:{}".format(REGION, ACCOUNT_ID, queue_url.split("/")[-1]),
+        "awsRegion": REGION
+    }
+
+
+class FakeSSMPaginator:
+
+    def __init__(self, ssm) -> None:
+        self.ssm = ssm
+
+    def paginate(self, Path:str, Recursive:bool = False, **kwargs):
+        next_token = None
+        while True:
+            page = self.ssm.get_parameters_by_path(Path=Path, Recursive=Recursive, NextToken=next_token)
+            yield page
+            next_token = page.get("NextToken")
+            if next_token is None:
+                return
+
+
+class FakeSSM(CallCounter):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.exceptions = create_exceptions("ParameterNotFound", "ParameterVersionNotFound", "InvalidKeyId", "ParameterAlreadyExists")
+        self.parameters = dict()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.parameters = dict()
+        self.reset_call_counts()
+
+    def put_parameter(self, Name:str, Value:str, Type:str = "String", Overwrite:bool = False, **kwargs) -> dict:
+        self.count_call("PutParameter")
+        with self.lock:
+            if Name in self.parameters and not Overwrite:
+                raise_error(self.exceptions, "ParameterAlreadyExists", "The parameter already exists.", "PutParameter")
+            self.parameters[Name] = Value
+        return { "Version": 1 }
+
+    def get_parameter(self, Name:str, **kwargs) -> dict:
+        self.count_call("GetParameter")
+        with self.lock:
+            if Name not in self.parameters:
+                raise_error(self.exceptions, "ParameterNotFound", "Parameter {} not found.".format(Name), "GetParameter")
+            return { "Parameter": { "Name": Name, "Value": self.parameters[Name], "Type": "String" } }
+
+    def get_parameters_by_path(self, Path:str, Recursive:bool = False, NextToken:str = None, **kwargs) -> dict:
+        self.count_call("GetParametersByPath")
+        path_prefix = Path.rstrip("/") + "/"
+        with self.lock:
+            names = sorted([
+                x for x in self.parameters.keys()
+                if x.startswith(path_prefix) and (Recursive or "/" not in x[len(path_prefix):])
+            ])
+            start = int(NextToken) if NextToken is not None else 0
+            page = {
+                "Parameters": [
+                    { "Name": x, "Value": self.parameters[x], "Type": "String" }
+                    for x in names[start:start + SSM_MAX_RESULTS_PER_PAGE]
+                ]
+            }
+        if start + SSM_MAX_RESULTS_PER_PAGE < len(names):
+            page["NextToken"] = str(start + SSM_MAX_RESULTS_PER_PAGE)
+        return page
+
+    def get_paginator(self, operation_name:str) -> FakeSSMPaginator:
+        if operation_name != "get_parameters_by_path":
+            raise NotImplementedError("Paginator Of {} Is Not Implemented".format(operation_name))
+        return FakeSSMPaginator(self)
+
+
+class FakeStepFunctions(CallCounter):
+    '''
+    Records the executions started. The harness runs the state machine itself, asynchronous executions once
+    the request builder is done and synchronous ones with sync_executor, a function of the input of the
+    execution returning its output, while the request builder waits
+    '''
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.exceptions = create_exceptions("ExecutionAlreadyExists", "StateMachineDoesNotExist", "InvalidExecutionInput")
+        self.execution_names = set()
+        self.pending_executions = []
+        self.completed_executions = []
+        self.sync_executor = None
+
+    def reset(self) -> None:
+        with self.lock:
+            self.execution_names = set()
+            self.pending_executions = []
+            self.completed_executions = []
+            self.sync_executor = None
+        self.reset_call_counts()
+
+    def start_execution(self, stateMachineArn:str, name:str, input:str, **kwargs) -> dict:
+        self.count_call("StartExecution")
+        with self.lock:
+            if name in self.execution_names:
+                raise_error(self.exceptions, "ExecutionAlreadyExists", "Execution Already Exists: '{}'".format(name), "StartExecution")
+            self.execution_names.add(name)
+            self.pending_executions.append({ "name": name, "input": input })
+        return {
+            "executionArn": "{}:{}".format(stateMachineArn.replace(":stateMachine:", ":execution:"), name),
+            "startDate": time.time()
+        }
+
+    def start_sync_execution(self, stateMachineArn:str, name:str, input:str, **kwargs) -> dict:
+        # Only Express state machines run synchronously, their execution names are not unique
+        self.count_call("StartSyncExecution")
+        response = {
+            "executionArn": "{}:{}".format(stateMachineArn.replace(":stateMachine:", ":express:"), name),
+            "stateMachineArn": stateMachineArn,
+            "name": name,
+            "startDate": time.time(),
+            "input": input
+        }
+        try:
+            output = self.sync_executor(json.loads(input))
+        except Exception as e:
+            # A failed execution is reported in the response
+            return dict(response, stopDate=time.time(), status="FAILED", error=type(e).__name__, cause=str(e))
+
+        with self.lock:
+            self.completed_executions.append({ "name": name, "input": input, "output": output })
+        stop_date = time.time()
+        return dict(response, stopDate=stop_date, status="SUCCEEDED", output=json.dumps(output), billingDetails={
+            "billedMemoryUsedInMB": 64,
+            "billedDurationInMilliseconds": max(100, int((stop_date - response["startDate"]) * 1000))
+        })
+
+    def take_pending_executions(self) -> list:
+        with self.lock:
+            executions = self.pending_executions
+            self.pending_executions = []
+        return executions
+
+    def take_completed_executions(self) -> list:
+        with self.lock:
+            executions = self.completed_executions
+            self.completed_executions = []
+        return executions
+
+
+class DynamoExpression:
+    '''
+    Evaluates the subset of the DynamoDB expression syntax used by the lambdas: comparisons, AND, OR, NOT,
+    parentheses and the attribute_exists, attribute_not_exists, contains, if_not_exists and list_append functions
+    '''
+
+    TOKEN_PATTERN = re.compile(r"\s*(<>|<=|>=|[=<>(),]|[#:]?[A-Za-z_][A-Za-z0-9_]*)")
+
+    def __init__(self, expression:str, names:dict, values:dict) -> None:
+        self.tokens = self.tokenize(expression)
+        self.position = 0
+        self.names = names or dict()
+        self.values = values or dict()
+
+    @classmethod
+    def tokenize(cls, expression:str) -> list:
+        tokens = []
+        position = 0
+        while position < len(expression.rstrip()):
+            match = cls.TOKEN_PATTERN.match(expression, position)
+            if match is None:
+                raise ValueError("Invalid Expression: {}".format(expression))
+            tokens.append(match.group(1))
+            position = match.end()
+        return tokens
+
+    def peek(self) -> str:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, expected:str = None) -> str:
+        token = self.peek()
+        if expected is not None and token != expected:
+            raise ValueError("Expected {} But Found {}".format(expected, token))
+        self.position += 1
+        return token
+
+    def name(self, token:str) -> str:
+        return self.names[token] if token.startswith("#") else token
+
+    def evaluate_condition(self, item:dict) -> bool:
+        result = self.parse_or(item)
+        if self.peek() is not None:
+            raise ValueError("Unexpected Token {}".format(self.peek()))
+        return result
+
+    def parse_or(self, item:dict) -> bool:
+        result = self.parse_and(item)
+        while self.peek() == "OR":
+            self.take()
+            right = self.parse_and(item)
+            result = result or right
+        return result
+
+    def parse_and(self, item:dict) -> bool:
+        result = self.parse_not(item)
+        while self.peek() == "AND":
+            self.take()
+            right = self.parse_not(item)
+            result = result and right
+        return result
+
+    def parse_not(self, item:dict) -> bool:
+        if self.peek() == "NOT":
+            self.take()
+            return not self.parse_not(item)
+        return self.parse_comparison(item)
+
+    def parse_comparison(self, item:dict) -> bool:
+        if self.peek() == "(":
+            self.take()
+            result = self.parse_or(item)
+            self.take(")")
+            return result
+
+        left = self.parse_operand(item)
+        operator = self.peek()
+        if operator not in [ "=", "<>", "<", "<=", ">", ">=" ]:
+            return bool(left)
+        self.take()
+        right = self.parse_operand(item)
+        if left is None or right is None:
+            return False
+        return {
+            "=": lambda: left == right,
+            "<>": lambda: left != right,
+            "<": lambda: left < right,
+            "<=": lambda: left <= right,
+            ">": lambda: left > right,
+            ">=": lambda: left >= right
+        }[operator]()
+
+    def parse_operand(self, item:dict):
+        token = self.take()
+        if self.peek() == "(":
+            self.take()
+            arguments = [ self.tokens[self.position] ]
+            self.position += 1
+            while self.peek() == ",":
+                self.take()
+                arguments.append(self.take())
+            self.take(")")
+            return self.call_function(token, arguments, item)
+        if token.startswith(":"):
+            return self.values[token]
+        return item.get(self.name(token))
+
+    def call_function(self, function_name:str, arguments:list, item:dict):
+        if function_name == "attribute_exists":
+            return self.name(arguments[0]) in item
+        if function_name == "attribute_not_exists":
+            return self.name(arguments[0]) not in item
+        if function_name == "contains":
+            container = item.get(self.name(arguments[0]))
+            value = self.values[arguments[1]] if arguments[1].startswith(":") else item.get(self.name(arguments[1]))
+            return container is not None and value in container
+        raise ValueError("Unsupported Function {}".format(function_name))
+
+    def evaluate_value(self, item:dict):
+        '''
+        Evaluates the value of a SET action: a value, an attribute, if_not_exists or list_append
+        '''
+        token = self.take()
+        if token in [ "if_not_exists", "list_append" ]:
+            self.take("(")
+            first = self.evaluate_value(item)
+            self.take(",")
+            second = self.evaluate_value(item)
+            self.take(")")
+            if token == "if_not_exists":
+                return first if first is not None else second
+            return list(first) + list(second)
+        if token.startswith(":"):
+            return self.values[token]
+        return item.get(self.name(token))
+
+
+def split_top_level(expression:str, separator:str = ",") -> list:
+    parts = []
+    depth = 0
+    current = ""
+    for character in expression:
+        if character == "(":
+            depth += 1
+        elif character == ")":
+            depth -= 1
+        if character == separator and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += character
+    if current.strip() != "":
+        parts.append(current.strip())
+    return parts
+
+def apply_update_expression(item:dict, update_expression:str, names:dict, values:dict) -> dict:
+    '''
+    Applies the SET, ADD and REMOVE clauses of an update expression to a copy of the item
+    '''
+    updated_item = dict(item)
+    clauses = re.split(r"\b(SET|ADD|REMOVE)\b", update_expression)
+    for index in range(1, len(clauses), 2):
+        action = clauses[index]
+        for part in split_top_level(clauses[index + 1]):
+            if action == "SET":
+                path, value_expression = part.split("=", 1)
+                value = DynamoExpression(value_expression, names, values).evaluate_value(item)
+                updated_item[names.get(path.strip(), path.strip())] = value
+            elif action == "ADD":
+                path, value_name = part.split()
+                attribute_name = names.get(path, path)
+                value = values[value_name]
+                if isinstance(value, (set, frozenset)):
+                    updated_item[attribute_name] = set(updated_item.get(attribute_name, set())) | set(value)
+                else:
+                    updated_item[attribute_name] = updated_item.get(attribute_name, 0) + value
+            elif action == "REMOVE":
+                updated_item.pop(names.get(part, part), None)
+    return updated_item
+
+
+class FakeDynamoTable(CallCounter):
+
+    def __init__(self, name:str, key_names:list, exceptions:SimpleNamespace) -> None:
+        super().__init__()
+        self.name = name
+        self.key_names = key_names
+        self.items = dict()
+        # Resources expose the exceptions of their client under meta.client
+        self.meta = SimpleNamespace(client=SimpleNamespace(exceptions=exceptions))
+
+    def _get_item_key(self, item:dict, operation_name:str) -> tuple:
+        if self.key_names is None:
+            raise_error(self.meta.client.exceptions, "ResourceNotFoundException", "Requested resource not found: Table: {} not found".format(self.name), operation_name)
+        return tuple([ item[x] for x in self.key_names ])
+
+    def _check_condition(self, item:dict, condition_expression:str, names:dict, values:dict, operation_name:str) -> None:
+        if condition_expression is None:
+            return
+        if not DynamoExpression(condition_expression, names, values).evaluate_condition(item):
+            raise_error(self.meta.client.exceptions, "ConditionalCheckFailedException", "The conditional request failed", operation_name)
+
+    def get_item(self, Key:dict, **kwargs) -> dict:
+        self.count_call("GetItem")
+        with self.lock:
+            item = self.items.get(self._get_item_key(Key, "GetItem"))
+        return { "Item": dict(item) } if item is not None else dict()
+
+    def put_item(self, Item:dict, ConditionExpression:str = None, ExpressionAttributeNames:dict = None,
+        ExpressionAttributeValues:dict = None, **kwargs) -> dict:
+        self.count_call("PutItem")
+        with self.lock:
+            item_key = self._get_item_key(Item, "PutItem")
+            self._check_condition(self.items.get(item_key, dict()), ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues, "PutItem")
+            self.items[item_key] = dict(Item)
+        return dict()
+
+    def update_item(self, Key:dict, UpdateExpression:str, ConditionExpression:str = None, ExpressionAttributeNames:dict = None,
+        ExpressionAttributeValues:dict = None, **kwargs) -> dict:
+        self.count_call("UpdateItem")
+        names = ExpressionAttributeNames or dict()
+        values = ExpressionAttributeValues or dict()
+        with self.lock:
+            item_key = self._get_item_key(Key, "UpdateItem")
+            existing_item = self.items.get(item_key, dict())
+            self._check_condition(existing_item, ConditionExpression, names, values, "UpdateItem")
+            updated_item = apply_update_expression(existing_item, UpdateExpression, names, values)
+            updated_item.update(Key)
+            self.items[item_key] = updated_item
+        return dict()
+
+    def batch_writer(self):
+        return FakeBatchWriter(self)
+
+    def scan_items(self) -> list:
+        with self.lock:
+            return [ dict(x) for x in self.items.values() ]
+
+
+class FakeBatchWriter:
+    '''
+    Buffers the items put and writes them 25 at a time, the BatchWriteItem limit, like the boto3 batch writer
+    '''
+
+    MAX_BATCH_ITEMS = 25
+
+    def __init__(self, table:FakeDynamoTable) -> None:
+        self.table = table
+        self.items = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.flush()
+        return False
+
+    def put_item(self, Item:dict) -> None:
+        self.items.append(dict(Item))
+        if len(self.items) == self.MAX_BATCH_ITEMS:
+            self.flush()
+
+    def flush(self) -> None:
+        if len(self.items) == 0:
+            return
+        self.table.count_call("BatchWriteItem")
+        with self.table.lock:
+            for item in self.items:
+                self.table.items[self.table._get_item_key(item, "BatchWriteItem")] = item
+        self.items = []
+
+
+class FakeDynamoDB:
+    '''
+    Stands in for the DynamoDB service resource. Tables have to be created with their key attributes before use,
+    operations on other tables fail with ResourceNotFoundException
+    '''
+
+    def __init__(self) -> None:
+        self.exceptions = create_exceptions("ConditionalCheckFailedException", "ProvisionedThroughputExceededException",
+            "ResourceNotFoundException")
+        self.tables = dict()
+        self.lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.tables = dict()
+
+    def create_table(self, name:str, key_names:list) -> FakeDynamoTable:
+        with self.lock:
+            self.tables[name] = FakeDynamoTable(name, key_names, self.exceptions)
+            return self.tables[name]
+
+    def Table(self, name:str) -> FakeDynamoTable:
+        with self.lock:
+            if name not in self.tables:
+                self.tables[name] = FakeDynamoTable(name, None, self.exceptions)
+            return self.tables[name]
+
+
+class FakeRekognition(CallCounter):
+    '''
+    Returns labels derived from the content of the image, so identical photos get identical labels. latency_seconds
+    simulates the time taken by the service, and every throttle_every-th call is throttled when it is set
+    '''
+
+    def __init__(self, s3:FakeS3, latency_seconds:float = 0.0, throttle_every:int = 0) -> None:
+        super().__init__()
+        self.exceptions = create_exceptions("InvalidS3ObjectException", "InvalidImageFormatException", "ImageTooLargeException",
+            "InvalidParameterException", "ThrottlingException", "ProvisionedThroughputExceededException")
+        self.s3 = s3
+        self.latency_seconds = latency_seconds
+        self.throttle_every = throttle_every
+        self.call_index = 0
+
+    def reset(self) -> None:
+        with self.lock:
+            self.call_index = 0
+        self.reset_call_counts()
+
+    def _read_image(self, image:dict) -> bytes:
+        if "Bytes" in image:
+            if len(image["Bytes"]) > REKOGNITION_MAX_IMAGE_BYTES:
+                raise_error(self.exceptions, "ImageTooLargeException", "Image size is too large.", "DetectLabels")
+            return image["Bytes"]
+
+        s3_object = image["S3Object"]
+        try:
+            response = self.s3.get_object(Bucket=s3_object["Bucket"], Key=s3_object["Name"])
+        except ClientError:
+            raise_error(self.exceptions, "InvalidS3ObjectException", "Unable to get object metadata from S3. Check object key, region and/or access permissions.", "DetectLabels")
+        if response["ContentLength"] > REKOGNITION_MAX_S3_OBJECT_BYTES:
+            raise_error(self.exceptions, "ImageTooLargeException", "Image size is too large.", "DetectLabels")
+        return response["Body"].read()
+
+    def detect_labels(self, Image:dict, MaxLabels:int = 1000, MinConfidence:float = 55.0, **kwargs) -> dict:
+        self.count_call("DetectLabels")
+        with self.lock:
+            self.call_index += 1
+            throttled = self.throttle_every > 0 and self.call_index % self.throttle_every == 0
+        if throttled:
+            raise_error(self.exceptions, "ThrottlingException", "Rate exceeded", "DetectLabels")
+
+        image_bytes = self._read_image(Image)
+        if not (image_bytes.startswith(b"\xff\xd8") or image_bytes.startswith(b"\x89PNG")):
+            raise_error(self.exceptions, "InvalidImageFormatException", "Request has unsupported image format", "DetectLabels")
+        if self.latency_seconds > 0:
+            time.sleep(self.latency_seconds)
+
+        digest = hashlib.sha1(image_bytes).digest()
+        label_names = list(dict.fromkeys([ REKOGNITION_LABELS[x % len(REKOGNITION_LABELS)] for x in digest ]))
+        labels = []
+        for index, (name, value) in enumerate(zip(label_names[:MaxLabels], digest)):
+            confidence = 99.9 - (index * 4.5) - ((value % 10) / 10)
+            if confidence < MinConfidence:
+                break
+            labels.append({
+                "Name": name,
+                "Confidence": round(confidence, 3),
+                "Instances": [],
+                "Parents": []
+            })
+        return {
+            "Labels": labels,
+            "LabelModelVersion": "3.0"
+        }
+
+
+class LocalAws:
+    '''
+    The fake services of a local run, sharing their state: Rekognition reads the objects of the fake S3
+    '''
+
+    def __init__(self) -> None:
+        self.s3 = FakeS3()
+        self.sqs = FakeSQS()
+        self.ssm = FakeSSM()
+        self.stepfunctions = FakeStepFunctions()
+        self.dynamodb = FakeDynamoDB()
+        self.rekognition = FakeRekognition(self.s3)
+
+    def get_clients(self) -> dict:
+        return {
+            "s3": self.s3,
+            "sqs": self.sqs,
+            "ssm": self.ssm,
+            "stepfunctions": self.stepfunctions,
+            "rekognition": self.rekognition
+        }
+
+    def reset(self) -> None:
+        for client in self.get_clients().values():
+            client.reset()
+        self.dynamodb.reset()
+
+    def get_call_counts(self) -> dict:
+        return {
+            service_name: dict(client.call_counts)
+            for service_name, client in self.get_clients().items()
+        }
@@ -0,0 +1,369 @@
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import contextlib
+import importlib.util
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+COMMONLIB_PATH = os.path.join(ROOT, "lib/constructs/lambda-layers/res/commonlib/python")
+
+# As in the lambda runtime, the layer is on the path. Set before the layer modules are first imported, as they
+# read their configuration from the environment at import
+sys.path.insert(0, COMMONLIB_PATH)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import aws_clients
+from event_meta_store import DynamoEventMetaStore
+from inline_dispatcher import InlineDispatcher
+from feature_runner import get_feature_runner
+from s3_events import create_s3_event_record, create_event_queue_message
+from fakes import LocalAws, create_sqs_record, REGION, ACCOUNT_ID
+
+'''
+    Runs the photo processing pipeline in-process against the fake AWS services of fakes.py, the way it runs
+    when deployed:
+
+        S3 event -> EventQueue -> RequestBuilderFunction -> state machine:
+            SEQUENTIAL: hash -> photo meta -> photo rekog [-> tag writer]
+            PARALLEL: (hash | photo meta | photo rekog) -> tag writer
+            EXPRESS state machines started synchronously run while the request builder waits
+            Objects under the inline threshold are processed by the request builder itself
+        -> DynamoMetricsQueue -> DynamoDB metrics sink
+
+    Every lambda is loaded from its res directory with the environment its construct gives it, and the layer
+    resolves its clients to the fakes (see aws_clients.register_client). Payloads are passed between the steps
+    as JSON, like Step Functions does, and are checked against its payload size limit
+
+    Usage: python test/local_pipeline/harness.py [photo count] [size in KB] [SEQUENTIAL|PARALLEL]
+'''
+
+HASH_FEATURE = "feature-hash-tag"
+META_FEATURE = "feature-photo-meta-tag"
+REKOG_FEATURE = "feature-photo-rekog-tag"
+FEATURE_NAMES = [ HASH_FEATURE, META_FEATURE, REKOG_FEATURE ]
+
+FEATURE_MODULE_PATHS = {
+    HASH_FEATURE: "lib/constructs/features/hash-tag-function/res/lambda_function.py",
+    META_FEATURE: "lib/constructs/features/photo-meta-tag-function/res/lambda_function.py",
+    REKOG_FEATURE: "lib/constructs/features/photo-rekog-tag-function/res/lambda_function.py"
+}
+REQUEST_BUILDER_MODULE_PATH = "lib/constructs/request-builder-function/res/lambda_function.py"
+TAG_WRITER_MODULE_PATH = "lib/constructs/tag-writer-function/res/lambda_function.py"
+METRICS_SINK_MODULE_PATH = "lib/constructs/dynamo-metrics-table/res/lambda_function.py"
+
+BUCKET_NAME = "local-photo-archive"
+STATE_MACHINE_ARN = "arn:aws:states:{}:{}:stateMachine:photo-processing-state-machine".format(REGION, ACCOUNT_ID)
+METRICS_TABLE_NAME = "local-photo-archive-metrics"
+EVENT_META_TABLE_NAME = "local-photo-archive-event-meta"
+
+# Step Functions limit on the size of the input and output of a state
+MAX_PAYLOAD_BYTES = 1024 * 256 # 256 KB
+# Records per event of the SQS event sources
+EVENT_QUEUE_BATCH_SIZE = 10
+METRICS_QUEUE_BATCH_SIZE = 10
+# S3 event records per message of the event queue, one per S3 notification
+RECORDS_PER_EVENT_MESSAGE = 1
+
+# Set high so the rate limiter of the rekognition feature does not throttle the benchmarks
+DEFAULT_REKOG_MAX_TPS = 100000
+
+# The fakes are shared by the pipelines of the process, the clients of the layer are resolved to them once
+local_aws = LocalAws()
+for service_name, client in local_aws.get_clients().items():
+    aws_clients.register_client(service_name, client)
+aws_clients.register_resource("dynamodb", local_aws.dynamodb)
+
+
+class LambdaContext:
+
+    def __init__(self, function_name:str) -> None:
+        self.function_name = function_name
+        self.function_version = "$LATEST"
+        self.invoked_function_arn = "arn:aws:lambda:{}:{}:function:{}".format(REGION, ACCOUNT_ID, function_name)
+        self.memory_limit_in_mb = 512
+        self.aws_request_id = str(uuid.uuid4())
+        self.deadline = time.monotonic() + 900
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+def load_lambda_module(module_path:str, module_name:str, environment:dict):
+    '''
+    Loads the lambda_function module at module_path under module_name, so the lambdas, which all have the same
+    module name, can be loaded side by side. environment is only set while the module is imported, which is when
+    the lambdas read it
+    '''
+    previous_environment = dict(os.environ)
+    os.environ.update(environment)
+    try:
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, module_path))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    finally:
+        os.environ.clear()
+        os.environ.update(previous_environment)
+
+def to_state_input(payload) -> dict:
+    '''
+    Serializes the payload passed between two states, as Step Functions does
+    '''
+    state_input = json.dumps(payload)
+    if len(state_input.encode('utf-8')) > MAX_PAYLOAD_BYTES:
+        raise Exception("State Payload Of {} Bytes Is Over The Step Functions Limit".format(len(state_input.encode('utf-8'))))
+    return json.loads(state_input)
+
+
+class LocalPipeline:
+    '''
+    The lambdas of a pipeline configuration. Creating a pipeline resets the fakes, so only the last created
+    pipeline of a process should be used
+    '''
+
+    def __init__(self, execution_mode:str = "SEQUENTIAL", coalesce_tag_writes:bool = True, feature_batch_size:int = 1,
+        feature_names:list = FEATURE_NAMES, object_header_kilobytes:int = 8, enable_metrics_table:bool = True,
+        skip_unchanged_objects:bool = False, store_event_meta:bool = True, state_machine_type:str = "STANDARD", sync_executions:bool = True,
+        inline_max_object_kilobytes:int = 0, sniff_content_formats:bool = False, feature_settings:dict = None, quiet:bool = True) -> None:
+        self.execution_mode = execution_mode
+        self.sync_executions = state_machine_type == "EXPRESS" and sync_executions
+        self.feature_names = [ x for x in FEATURE_NAMES if x in feature_names ]
+        self.use_tag_writer = (coalesce_tag_writes or execution_mode == "PARALLEL") and len(self.feature_names) > 0
+        self.skip_unchanged_objects = skip_unchanged_objects
+        self.quiet = quiet
+        self.aws = local_aws
+        self.aws.reset()
+
+        # Registries of the layer are cached per settings prefix, a new prefix starts from a fresh registry
+        self.settings_prefix = "local{}".format(uuid.uuid4().hex[:8])
+        self.event_queue_url = self.aws.sqs.create_queue_url("photo-archive-event-queue")
+        self.metrics_queue_url = self.aws.sqs.create_queue_url("photo-archive-dynamo-metrics-queue") if enable_metrics_table else "Invalid"
+        self.aws.dynamodb.create_table(METRICS_TABLE_NAME, [ "hash" ])
+        self.aws.dynamodb.create_table(EVENT_META_TABLE_NAME, [ "metaId" ])
+        self.register_features(feature_settings or dict())
+
+        feature_environment = {
+            "SETTINGS_PREFIX": self.settings_prefix,
+            "DYNAMODB_METRICS_QUEUE_URL": self.metrics_queue_url,
+            "COALESCE_TAG_WRITES": "TRUE" if self.use_tag_writer else "FALSE",
+            "SKIP_UNCHANGED_OBJECTS": "TRUE" if skip_unchanged_objects else "FALSE"
+        }
+        self.feature_modules = dict()
+        self.feature_environments = dict()
+        for feature_name in self.feature_names:
+            environment = dict(feature_environment, FEATURE_NAME=feature_name)
+            # As set by the hash feature construct, the header is only of use to the photo meta feature running after it
+            if feature_name == HASH_FEATURE and execution_mode == "SEQUENTIAL" and META_FEATURE in self.feature_names:
+                environment["OBJECT_HEADER_SIZE_BYTES"] = str(object_header_kilobytes * 1024)
+            if feature_name == REKOG_FEATURE:
+                environment["REKOG_MAX_TPS"] = str(DEFAULT_REKOG_MAX_TPS)
+            self.feature_environments[feature_name] = environment
+            self.feature_modules[feature_name] = load_lambda_module(FEATURE_MODULE_PATHS[feature_name],
+                "{}_lambda_function".format(feature_name.replace("-", "_")), environment)
+        self.register_content_formats()
+
+        self.request_builder = load_lambda_module(REQUEST_BUILDER_MODULE_PATH, "request_builder_lambda_function", {
+            "STATE_MACHINE_ARN": STATE_MACHINE_ARN,
+            "SETTINGS_PREFIX": self.settings_prefix,
+            "FEATURE_BATCH_SIZE": str(feature_batch_size),
+            "SKIP_UNCHANGED_OBJECTS": "TRUE" if skip_unchanged_objects else "FALSE",
+            "SNIFF_CONTENT_FORMATS": "TRUE" if sniff_content_formats else "FALSE",
+            "STATE_MACHINE_TYPE": state_machine_type,
+            "SYNC_EXECUTIONS": "TRUE" if self.sync_executions else "FALSE",
+            "SYNC_EXECUTION_RETRY_DELAY_SECONDS": "0"
+        })
+        # The request builder runs synchronous executions from a pool of threads, they are run one at a time as the
+        # lambdas share the module state and the output redirection of the process
+        self.execution_lock = threading.Lock()
+        if self.sync_executions:
+            self.aws.stepfunctions.sync_executor = self.run_sync_execution
+        # Layer modules read their environment once per process, so the store is set on the lambda instead
+        self.request_builder.event_meta_store = DynamoEventMetaStore(self.aws.dynamodb.Table(EVENT_META_TABLE_NAME)) if store_event_meta else None
+        self.request_builder.inline_dispatcher = None
+        if inline_max_object_kilobytes > 0:
+            self.request_builder.inline_dispatcher = InlineDispatcher(self.aws.s3,
+                { x: os.path.join(ROOT, FEATURE_MODULE_PATHS[x]) for x in self.feature_names }, self.feature_environments,
+                max_object_bytes=inline_max_object_kilobytes * 1024)
+        self.tag_writer = load_lambda_module(TAG_WRITER_MODULE_PATH, "tag_writer_lambda_function", {
+            "SKIP_UNCHANGED_OBJECTS": "TRUE" if skip_unchanged_objects else "FALSE"
+        })
+        self.metrics_sink = load_lambda_module(METRICS_SINK_MODULE_PATH, "metrics_sink_lambda_function", {
+            "DYNAMODB_TABLE_NAME": METRICS_TABLE_NAME
+        })
+        # The metrics sink creates its table with boto3 directly rather then through the layer
+        self.metrics_sink.table = self.aws.dynamodb.Table(METRICS_TABLE_NAME)
+
+    def register_features(self, feature_settings:dict) -> None:
+        '''
+        Publishes the parameters of the features as the feature stack does. feature_settings is a dict of
+        feature name to a dict of setting name to value
+        '''
+        default_settings = { REKOG_FEATURE: { "REKOG_MAX_TPS": str(DEFAULT_REKOG_MAX_TPS) } }
+        self.aws.ssm.put_parameter(Name="/{}/features".format(self.settings_prefix), Value=",".join(self.feature_names),
+            Type="StringList", Overwrite=True)
+        for feature_name in self.feature_names:
+            feature_path = "/{}/features/{}".format(self.settings_prefix, feature_name)
+            self.aws.ssm.put_parameter(Name="{}/enabled".format(feature_path), Value="TRUE", Overwrite=True)
+            self.aws.ssm.put_parameter(Name="{}/lambda/arn".format(feature_path),
+                Value="arn:aws:lambda:{}:{}:function:{}".format(REGION, ACCOUNT_ID, feature_name), Overwrite=True)
+            settings = dict(default_settings.get(feature_name, dict()), **feature_settings.get(feature_name, dict()))
+            for setting_name, value in settings.items():
+                self.aws.ssm.put_parameter(Name="{}/settings/{}".format(feature_path, setting_name), Value=str(value), Overwrite=True)
+
+    def register_content_formats(self) -> None:
+        '''
+        Publishes the content formats of the features that do not apply to every object, as the feature constructs do
+        '''
+        for feature_name in self.feature_names:
+            content_formats = get_feature_runner(feature_name).feature.get_content_formats()
+            if content_formats is not None:
+                self.aws.ssm.put_parameter(Name="/{}/features/{}/contentFormats".format(self.settings_prefix, feature_name),
+                    Value=",".join(content_formats), Overwrite=True)
+
+    def output(self):
+        # The lambdas log every step, which would dominate the timings of small photos
+        if self.quiet:
+            return contextlib.redirect_stdout(open(os.devnull, "w"))
+        return contextlib.nullcontext()
+
+    def upload(self, corpus:list) -> list:
+        '''
+        Puts the photos in the archive bucket. Returns their S3 event records
+        '''
+        records = []
+        for index, photo in enumerate(corpus):
+            response = self.aws.s3.put_object(Bucket=BUCKET_NAME, Key=photo.key, Body=photo.body)
+            record = create_s3_event_record(BUCKET_NAME, photo.key, response["ETag"], photo.size, "ObjectCreated:Put", REGION)
+            # Unlike the backfill events, the events of S3 are ordered per key by their sequencer
+            record["s3"]["object"]["sequencer"] = "{:016X}".format(index)
+            records.append(record)
+        return records
+
+    def create_event_queue_events(self, s3_event_records:list) -> list:
+        '''
+        Returns the events delivered to the request builder for the records, as the event queue delivers them
+        '''
+        sqs_records = [
+            create_sqs_record(create_event_queue_message(s3_event_records[index:index + RECORDS_PER_EVENT_MESSAGE], "Amazon S3 Notification"),
+                queue_url=self.event_queue_url)
+            for index in range(0, len(s3_event_records), RECORDS_PER_EVENT_MESSAGE)
+        ]
+        return [
+            { "Records": sqs_records[index:index + EVENT_QUEUE_BATCH_SIZE] }
+            for index in range(0, len(sqs_records), EVENT_QUEUE_BATCH_SIZE)
+        ]
+
+    def run_request_builder(self, events:list) -> list:
+        '''
+        Runs the request builder on the events. Returns the inputs of the asynchronous executions it started
+        '''
+        with self.output():
+            for event in events:
+                response = self.request_builder.lambda_handler(event, LambdaContext("RequestBuilderFunction"))
+                if len(response["batchItemFailures"]) > 0:
+                    raise Exception("Request Builder Failed For Messages {}".format(response["batchItemFailures"]))
+        return [ json.loads(x["input"]) for x in self.aws.stepfunctions.take_pending_executions() ]
+
+    def run_feature(self, feature_name:str, state_input):
+        with self.output():
+            return to_state_input(self.feature_modules[feature_name].lambda_handler(to_state_input(state_input), LambdaContext(feature_name)))
+
+    def run_features(self, state_input):
+        '''
+        Runs the features of the state machine on the input of an execution. Returns the input of the tag writer,
+        or the output of the last feature when there is no tag writer
+        '''
+        if self.execution_mode == "PARALLEL":
+            return [ self.run_feature(feature_name, state_input) for feature_name in self.feature_names ]
+
+        for feature_name in self.feature_names:
+            state_input = self.run_feature(feature_name, state_input)
+        return state_input
+
+    def run_tag_writer(self, state_input):
+        with self.output():
+            return to_state_input(self.tag_writer.lambda_handler(to_state_input(state_input), LambdaContext("TagWriterFunction")))
+
+    def run_execution(self, execution_input):
+        state_output = self.run_features(execution_input)
+        if self.use_tag_writer:
+            state_output = self.run_tag_writer(state_output)
+        return state_output
+
+    def run_sync_execution(self, execution_input):
+        with self.execution_lock:
+            return self.run_execution(execution_input)
+
+    def run_metrics_sink(self) -> int:
+        '''
+        Delivers the messages of the metrics queue to the metrics sink. Returns the number of messages delivered
+        '''
+        if self.metrics_queue_url == "Invalid":
+            return 0
+        message_count = 0
+        with self.output():
+            while self.aws.sqs.get_queue_length(self.metrics_queue_url) > 0:
+                sqs_records = self.aws.sqs.receive_lambda_records(self.metrics_queue_url, METRICS_QUEUE_BATCH_SIZE)
+                response = self.metrics_sink.lambda_handler({ "Records": sqs_records }, LambdaContext("DynamoMetricsFunction"))
+                if len(response["batchItemFailures"]) > 0:
+                    raise Exception("Metrics Sink Failed For Messages {}".format(response["batchItemFailures"]))
+                message_count += len(sqs_records)
+        return message_count
+
+    def run(self, corpus:list) -> dict:
+        '''
+        Runs the whole pipeline on the corpus. Returns the outputs of the executions and the seconds spent
+        in each stage
+        '''
+        timings = dict()
+
+        start = time.perf_counter()
+        events = self.create_event_queue_events(self.upload(corpus))
+        execution_inputs = self.run_request_builder(events)
+        timings["requestBuilder"] = time.perf_counter() - start
+
+        # Synchronous executions have already run
+        start = time.perf_counter()
+        outputs = [ x["output"] for x in self.aws.stepfunctions.take_completed_executions() ]
+        outputs += [ self.run_execution(x) for x in execution_inputs ]
+        timings["stateMachine"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        metrics_message_count = self.run_metrics_sink()
+        timings["metricsSink"] = time.perf_counter() - start
+
+        return {
+            "outputs": outputs,
+            "metricsMessageCount": metrics_message_count,
+            "timings": timings
+        }
+
+    def get_tags(self, key:str) -> dict:
+        return self.aws.s3.get_tags(BUCKET_NAME, key)
+
+    def get_event_meta(self, meta_id:str) -> dict:
+        return self.request_builder.event_meta_store.get_meta(meta_id)
+
+    def get_metrics_entries(self) -> list:
+        return self.aws.dynamodb.Table(METRICS_TABLE_NAME).scan_items()
+
+
+if __name__ == "__main__":
+    from corpus import create_corpus
+
+    photo_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    size_bytes = int(sys.argv[2]) * 1024 if len(sys.argv) > 2 else 1024 * 1024 * 2
+    execution_mode = sys.argv[3] if len(sys.argv) > 3 else "SEQUENTIAL"
+
+    corpus = create_corpus(photo_count, size_bytes)
+    pipeline = LocalPipeline(execution_mode=execution_mode)
+    result = pipeline.run(corpus)
+
+    total_bytes = sum([ x.size for x in corpus ])
+    print("{:<16} {:>10} {:>12} {:>12}".format("stage", "seconds", "photos/s", "MB/s"))
+    for stage, seconds in result["timings"].items():
+        print("{:<16} {:>10.3f} {:>12.1f} {:>12.1f}".format(stage, seconds, photo_count / seconds, total_bytes / (1024 * 1024) / seconds))
+    print("AWS Calls: {}".format(json.dumps(pipeline.aws.get_call_counts())))
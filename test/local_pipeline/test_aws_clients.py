@@ -0,0 +1,36 @@
+import harness
+import aws_clients
+from aws_clients import LazyProxy, lazy_client
+
+'''
+    Checks that the clients of the lambdas are only created when they are first used
+'''
+
+
+class Factory:
+
+    def __init__(self) -> None:
+        self.call_count = 0
+
+    def __call__(self):
+        self.call_count += 1
+        return harness.local_aws.s3
+
+
+def test_proxies_create_their_target_once():
+    factory = Factory()
+    proxy = LazyProxy(factory)
+    assert factory.call_count == 0
+
+    assert proxy.exceptions is harness.local_aws.s3.exceptions
+    proxy.reset_call_counts()
+    assert factory.call_count == 1
+
+def test_registered_clients_replace_the_service_clients():
+    assert lazy_client("s3", read_timeout=1).exceptions is harness.local_aws.s3.exceptions
+    assert aws_clients.get_client("sqs") is harness.local_aws.sqs
+
+def test_lambdas_create_no_clients_when_imported():
+    backfill = harness.load_lambda_module("lib/constructs/backfill-function/res/lambda_function.py", "backfill_lambda_function", {})
+
+    assert all([ x._target is None for x in [ backfill.s3, backfill.sqs, backfill.lambda_client ] ])
@@ -0,0 +1,113 @@
+import io
+import csv
+import gzip
+import json
+import time
+import urllib.parse
+import harness
+from harness import LocalPipeline, LambdaContext
+
+'''
+    Checks the backfill of a bucket from its S3 Inventory report
+'''
+
+LOGGING_BUCKET_NAME = "local-photo-archive-logging"
+INVENTORY_PREFIX = "{0}-inventory/{0}/{0}-inventory-configuration/".format(harness.BUCKET_NAME)
+MANIFEST_KEY = INVENTORY_PREFIX + "2024-01-07T01-00Z/manifest.json"
+BACKFILL_MODULE_PATH = "lib/constructs/backfill-function/res/lambda_function.py"
+FILE_SCHEMA = "Bucket, Key, Size, ETag, StorageClass"
+
+
+class LambdaInvocations:
+
+    def __init__(self) -> None:
+        self.invocations = []
+
+    def invoke(self, FunctionName:str, InvocationType:str, Payload:bytes) -> dict:
+        self.invocations.append(json.loads(Payload))
+        return { "StatusCode": 202 }
+
+
+def put_inventory(pipeline:LocalPipeline, corpus:list, rows_per_file:int, archived_keys:list = ()) -> None:
+    '''
+    Puts the inventory report of the corpus in the logging bucket, with rows_per_file objects in each data file
+    '''
+    rows = []
+    for photo in corpus:
+        head = pipeline.aws.s3.head_object(Bucket=harness.BUCKET_NAME, Key=photo.key)
+        storage_class = "GLACIER" if photo.key in archived_keys else "STANDARD"
+        rows.append([ harness.BUCKET_NAME, urllib.parse.quote_plus(photo.key), str(photo.size), head["ETag"].strip('"'), storage_class ])
+
+    files = []
+    for index in range(0, len(rows), rows_per_file):
+        data = io.StringIO()
+        csv.writer(data).writerows(rows[index:index + rows_per_file])
+        key = INVENTORY_PREFIX + "data/{}.csv.gz".format(index)
+        pipeline.aws.s3.put_object(Bucket=LOGGING_BUCKET_NAME, Key=key, Body=gzip.compress(data.getvalue().encode("utf-8")))
+        files.append({ "key": key })
+
+    manifest = { "fileFormat": "CSV", "fileSchema": FILE_SCHEMA, "files": files }
+    pipeline.aws.s3.put_object(Bucket=LOGGING_BUCKET_NAME, Key=MANIFEST_KEY, Body=json.dumps(manifest).encode("utf-8"))
+
+def load_backfill(pipeline:LocalPipeline):
+    backfill = harness.load_lambda_module(BACKFILL_MODULE_PATH, "backfill_lambda_function", {
+        "EVENT_QUEUE_URL": pipeline.event_queue_url,
+        "LOGGING_BUCKET_NAME": LOGGING_BUCKET_NAME,
+        "BACKFILL_MAX_OBJECTS_PER_SECOND": "1000"
+    })
+    backfill.lambda_client = LambdaInvocations()
+    return backfill
+
+def run_request_builder(pipeline:LocalPipeline) -> list:
+    events = [ { "Records": pipeline.aws.sqs.receive_lambda_records(pipeline.event_queue_url) } ]
+    return pipeline.run_request_builder(events)
+
+
+def test_backfill_filters_objects(small_corpus):
+    pipeline = LocalPipeline()
+    pipeline.upload(small_corpus)
+    photos = [ x for x in small_corpus if x.key.endswith(".jpg") ]
+    archived_keys = [ photos[0].key ]
+    put_inventory(pipeline, small_corpus, rows_per_file=4, archived_keys=archived_keys)
+    backfill = load_backfill(pipeline)
+
+    with pipeline.output():
+        checkpoint = backfill.lambda_handler({
+            "bucketName": harness.BUCKET_NAME,
+            "manifestKey": MANIFEST_KEY,
+            "extensions": [ ".JPG" ],
+            "storageClasses": [ "STANDARD" ],
+            "force": True
+        }, LambdaContext("BackfillFunction"))
+
+    expected_keys = [ x.key for x in photos if x.key not in archived_keys ]
+    assert checkpoint["completed"]
+    assert checkpoint["sentCount"] == len(expected_keys)
+    execution_inputs = run_request_builder(pipeline)
+    assert sorted([ x["key"] for x in execution_inputs ]) == sorted(expected_keys)
+    # The objects keep their ETag and size, and are processed regardless of earlier results
+    assert all([ x["force"] and x["size"] > 0 and x["eTag"] is not None for x in execution_inputs ])
+
+def test_backfill_continues_from_its_checkpoint(small_corpus):
+    pipeline = LocalPipeline()
+    pipeline.upload(small_corpus)
+    put_inventory(pipeline, small_corpus, rows_per_file=4)
+    backfill = load_backfill(pipeline)
+    event = { "bucketName": harness.BUCKET_NAME, "manifestKey": MANIFEST_KEY }
+
+    # Out of time before the first object
+    context = LambdaContext("BackfillFunction")
+    context.deadline = time.monotonic() + 30
+    with pipeline.output():
+        checkpoint = backfill.lambda_handler(event, context)
+    assert (checkpoint["fileIndex"], checkpoint["rowIndex"], checkpoint["completed"]) == (0, 0, False)
+    assert len(backfill.lambda_client.invocations) == 1
+    continuation_event = backfill.lambda_client.invocations[0]
+    assert continuation_event["checkpoint"] == checkpoint
+
+    with pipeline.output():
+        checkpoint = backfill.lambda_handler(continuation_event, LambdaContext("BackfillFunction"))
+        # A completed backfill is not resumed
+        assert backfill.lambda_handler(dict(event, resume=True), LambdaContext("BackfillFunction")) == checkpoint
+    assert checkpoint["completed"]
+    assert sorted([ x["key"] for x in run_request_builder(pipeline) ]) == sorted([ x.key for x in small_corpus ])
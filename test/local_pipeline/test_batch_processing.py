@@ -0,0 +1,57 @@
+import threading
+import harness
+from batch_processing import create_batch, process_batch, merge_batch_branch_outputs, is_batch
+from feature_processing import FeatureProcessing
+
+'''
+    Checks the processing of the objects of a batch and the merging of the batches of parallel features
+'''
+
+FEATURE_NAME = "feature-custom"
+
+
+def create_request(key:str, completed:list = ()) -> dict:
+    return {
+        "bucketName": harness.BUCKET_NAME,
+        "key": key,
+        "features": [ { "name": x, "completed": x in completed } for x in [ "hash", "meta" ] ],
+        "numberOfFeaturesCompleted": len(completed)
+    }
+
+
+def test_failed_objects_are_moved_to_the_failures():
+    batch = create_batch([ create_request("photo{}.jpg".format(x)) for x in range(5) ])
+    thread_names = set()
+
+    def process_object(request:dict) -> dict:
+        thread_names.add(threading.current_thread().name)
+        if request["key"] == "photo1.jpg":
+            raise Exception("Simulated Failure")
+        return dict(request, processed=True)
+
+    output = process_batch(batch, FEATURE_NAME, process_object, max_workers=2)
+
+    # Results keep the order of the batch
+    assert is_batch(output)
+    assert [ x["key"] for x in output["batch"] ] == [ "photo0.jpg", "photo2.jpg", "photo3.jpg", "photo4.jpg" ]
+    assert all([ x["processed"] for x in output["batch"] ])
+    assert output["batchFailures"] == [ {
+        "bucketName": harness.BUCKET_NAME,
+        "key": "photo1.jpg",
+        "featureName": FEATURE_NAME,
+        "error": "Simulated Failure"
+    } ]
+    assert len(thread_names) <= 2
+
+def test_branch_outputs_are_merged_per_object():
+    hash_output = create_batch([ create_request("photo0.jpg", [ "hash" ]), create_request("photo1.jpg", [ "hash" ]) ])
+    meta_output = create_batch([ create_request("photo0.jpg", [ "meta" ]) ])
+    meta_output["batchFailures"] = [ { "bucketName": harness.BUCKET_NAME, "key": "photo1.jpg", "featureName": "meta", "error": "Failed" } ]
+
+    merged = merge_batch_branch_outputs([ hash_output, meta_output ],
+        lambda requests: FeatureProcessing.merge_branch_outputs(requests).get_request_queue_object())
+
+    # An object that failed in any branch is only a failure
+    assert [ x["key"] for x in merged["batch"] ] == [ "photo0.jpg" ]
+    assert merged["batch"][0]["numberOfFeaturesCompleted"] == 2
+    assert [ x["key"] for x in merged["batchFailures"] ] == [ "photo1.jpg" ]
@@ -0,0 +1,55 @@
+import struct
+import random
+import pytest
+import harness
+from corpus import encode_ifd, create_photo, TIFF_ASCII, TIFF_SHORT, TAG_MAKE
+from content_sniffer import sniff_format, sniff_object, JPEG, PNG, HEIC, TIFF, NEF, CR2, ARW, DNG, UNKNOWN
+
+'''
+    Checks the formats detected from the first bytes of the objects
+'''
+
+TAG_DNG_VERSION = 0xC612
+
+
+def create_tiff(entries:list, signature:bytes = b"") -> bytes:
+    '''
+    Returns a little endian TIFF header followed by IFD0, with an optional signature between the two as CR2 has
+    '''
+    ifd_offset = 8 + len(signature)
+    return b"II*\x00" + struct.pack("<I", ifd_offset) + signature + encode_ifd(entries, ifd_offset)
+
+def create_ftyp(major_brand:bytes, compatible_brands:list) -> bytes:
+    payload = major_brand + struct.pack(">I", 0) + b"".join(compatible_brands)
+    return struct.pack(">I", len(payload) + 8) + b"ftyp" + payload
+
+
+@pytest.mark.parametrize("header, content_format", [
+    (b"\xff\xd8\xff\xe0" + bytes(64), JPEG),
+    (b"\x89PNG\r\n\x1a\n" + bytes(64), PNG),
+    (create_ftyp(b"heic", [ b"mif1", b"heic" ]), HEIC),
+    (create_ftyp(b"mif1", [ b"mif1", b"heix" ]), HEIC),
+    # AVIF shares the container, but not the brands
+    (create_ftyp(b"avif", [ b"mif1", b"avif" ]), UNKNOWN),
+    (create_tiff([ (TAG_MAKE, TIFF_ASCII, "Canon") ]), TIFF),
+    (create_tiff([ (TAG_MAKE, TIFF_ASCII, "NIKON CORPORATION") ]), NEF),
+    (create_tiff([ (TAG_MAKE, TIFF_ASCII, "SONY") ]), ARW),
+    (create_tiff([ (TAG_MAKE, TIFF_ASCII, "Canon") ], signature=b"CR\x02\x00"), CR2),
+    (create_tiff([ (TAG_MAKE, TIFF_ASCII, "NIKON CORPORATION"), (TAG_DNG_VERSION, TIFF_SHORT, [ 1, 4 ]) ]), DNG),
+    (b"MM\x00*" + struct.pack(">I", 8) + bytes(16), TIFF),
+    (b"Not a photo", UNKNOWN),
+    (b"", UNKNOWN)
+])
+def test_sniff_format(header, content_format):
+    assert sniff_format(header) == content_format
+
+def test_sniff_object():
+    pipeline = harness.LocalPipeline()
+    photo = create_photo("photo.bin", random.Random(0), 1024 * 64)
+    pipeline.aws.s3.put_object(Bucket=harness.BUCKET_NAME, Key=photo.key, Body=photo.body)
+    pipeline.aws.s3.put_object(Bucket=harness.BUCKET_NAME, Key="empty.jpg", Body=b"")
+
+    # Read with a single ranged GET
+    assert sniff_object(pipeline.aws.s3, harness.BUCKET_NAME, photo.key) == JPEG
+    assert pipeline.aws.s3.call_counts["GetObject"] == 1
+    assert sniff_object(pipeline.aws.s3, harness.BUCKET_NAME, "empty.jpg") == UNKNOWN
@@ -0,0 +1,77 @@
+import json
+import gzip
+import base64
+import random
+import harness
+from fakes import FakeSQS
+from dynamo_helper import DynamoHelper, DynamoEvent, CONTENT_ENCODING_ATTRIBUTE, GZIP_BASE64_ENCODING, MAX_BATCH_ENTRIES
+
+'''
+    Checks the batching of the metrics entries sent to the metrics queue by the DynamoHelper
+'''
+
+FEATURE_NAME = "feature-custom"
+
+
+def create_helper(feature_data_max_bytes:int = 1024 * 64) -> tuple:
+    sqs = FakeSQS()
+    queue_url = sqs.create_queue_url("metrics")
+    return DynamoHelper(queue_url, sqs, feature_data_max_bytes), sqs, queue_url
+
+def create_event(key:str, feature_data:dict) -> DynamoEvent:
+    de = DynamoEvent()
+    de.bucket = harness.BUCKET_NAME
+    de.key = key
+    de.bucketArn = "arn:aws:s3:::{}".format(harness.BUCKET_NAME)
+    de.featureName = FEATURE_NAME
+    de.featureData = feature_data
+    de.eTag = "etag"
+    return de
+
+def create_random_feature_data(size:int, seed:int) -> dict:
+    # Random strings, that do not compress, of the maximum string length
+    rng = random.Random(seed)
+    return { "field{}".format(x): rng.randbytes(384).hex() for x in range(size // 768) }
+
+
+def test_entries_are_sent_in_batches():
+    helper, sqs, queue_url = create_helper()
+    for x in range(MAX_BATCH_ENTRIES * 2 + 5):
+        helper.create_entry(create_event("photo{}.jpg".format(x), { "index": x }))
+    # Full batches are sent as entries are created
+    assert sqs.call_counts["SendMessageBatch"] == 2
+
+    helper.flush()
+    assert sqs.call_counts["SendMessageBatch"] == 3
+    assert sqs.get_queue_length(queue_url) == MAX_BATCH_ENTRIES * 2 + 5
+    assert sqs.call_counts.get("SendMessage", 0) == 0
+
+def test_batches_stay_under_the_size_limit():
+    helper, sqs, queue_url = create_helper(feature_data_max_bytes=1024 * 1024)
+    for x in range(4):
+        helper.create_entry(create_event("photo{}.jpg".format(x), create_random_feature_data(1024 * 100, x)))
+    helper.flush()
+
+    # Two entries of about 100 KB fit in a batch of 256 KB
+    assert sqs.call_counts["SendMessageBatch"] == 2
+    assert sqs.get_queue_length(queue_url) == 4
+
+def test_large_entries_are_compressed():
+    helper, sqs, queue_url = create_helper(feature_data_max_bytes=1024 * 1024)
+    feature_data = { "field{}".format(x): "value" * 200 for x in range(300) }
+    helper.create_entry(create_event("photo.jpg", feature_data))
+    helper.flush()
+
+    record = sqs.receive_lambda_records(queue_url)[0]
+    assert record["messageAttributes"][CONTENT_ENCODING_ATTRIBUTE]["stringValue"] == GZIP_BASE64_ENCODING
+    entry = json.loads(gzip.decompress(base64.b64decode(record["body"])))
+    assert entry["key"] == "photo.jpg"
+    assert len(entry["featureData"]) == len(feature_data)
+
+def test_entries_are_not_created_without_a_queue():
+    sqs = FakeSQS()
+    helper = DynamoHelper("Invalid", sqs)
+    helper.create_entry(create_event("photo.jpg", { "index": 0 }))
+    helper.flush()
+
+    assert sqs.call_counts.get("SendMessageBatch", 0) == 0
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import struct
+import random
+import subprocess
+import harness
+from corpus import encode_ifd, create_photo, TIFF_ASCII, TIFF_SHORT, TAG_MAKE
+from content_sniffer import sniff_format, PNG, HEIC
+
+'''
+    Checks that the exifread of the layer the photo meta feature runs with reads the EXIF data of every format the
+    feature is applied to. The tests run with the installed exifread, so the layer is imported by a separate process
+'''
+
+LAYER_PYTHON_PATH = os.path.join(harness.ROOT, "lib/constructs/lambda-layers/res/exifread/exifread_layer.zip/python")
+LAYER_EXIFREAD_VERSION = "2.3.2"
+TAG_DNG_VERSION = 0xC612
+
+READ_MAKES_SCRIPT = """
+import sys, json, exifread
+makes = dict()
+for path in sys.argv[1:]:
+    with open(path, "rb") as photo_file:
+        tags = exifread.process_file(photo_file, details=False)
+    makes[path] = str(tags["Image Make"]) if "Image Make" in tags else None
+print(json.dumps({ "version": exifread.__version__, "makes": makes }))
+"""
+
+
+def create_tiff(make:str, entries:list = (), signature:bytes = b"") -> bytes:
+    ifd_offset = 8 + len(signature)
+    return b"II*\x00" + struct.pack("<I", ifd_offset) + signature + \
+        encode_ifd([ (TAG_MAKE, TIFF_ASCII, make) ] + list(entries), ifd_offset)
+
+def create_ftyp(major_brand:bytes, compatible_brands:list) -> bytes:
+    payload = major_brand + struct.pack(">I", 0) + b"".join(compatible_brands)
+    return struct.pack(">I", len(payload) + 8) + b"ftyp" + payload
+
+def read_makes_with_layer(tmp_path, photos:dict) -> dict:
+    '''
+    Returns the Make tag the exifread of the layer reads from each of the photos, None when it reads no Make tag
+    '''
+    paths = dict()
+    for name, body in photos.items():
+        paths[name] = str(tmp_path / name)
+        with open(paths[name], "wb") as photo_file:
+            photo_file.write(body)
+
+    output = subprocess.run([ sys.executable, "-c", READ_MAKES_SCRIPT ] + list(paths.values()),
+        env=dict(os.environ, PYTHONPATH=LAYER_PYTHON_PATH), capture_output=True, text=True, check=True).stdout
+    result = json.loads(output)
+    assert result["version"] == LAYER_EXIFREAD_VERSION
+    return { name: result["makes"][path] for name, path in paths.items() }
+
+
+def test_layer_reads_the_photo_meta_formats(tmp_path):
+    pipeline = harness.LocalPipeline(feature_names=[ harness.META_FEATURE ])
+    photo_content_formats = pipeline.feature_modules[harness.META_FEATURE].PHOTO_CONTENT_FORMATS
+    photos = {
+        "photo.jpg": create_photo("photo.jpg", random.Random(0)).body,
+        "photo.tif": create_tiff("Canon"),
+        "photo.nef": create_tiff("NIKON CORPORATION"),
+        "photo.arw": create_tiff("SONY"),
+        "photo.cr2": create_tiff("Canon", signature=b"CR\x02\x00"),
+        "photo.dng": create_tiff("NIKON CORPORATION", [ (TAG_DNG_VERSION, TIFF_SHORT, [ 1, 4 ]) ])
+    }
+    assert sorted([ sniff_format(x) for x in photos.values() ]) == sorted(photo_content_formats)
+
+    makes = read_makes_with_layer(tmp_path, photos)
+    assert None not in makes.values(), makes
+
+def test_layer_does_not_read_png_and_heif_brands(tmp_path):
+    # 2.3.2 has no PNG support and only reads HEIC files of the heic major brand
+    photos = {
+        "photo.png": b"\x89PNG\r\n\x1a\n" + bytes(64),
+        "photo.heic": create_ftyp(b"mif1", [ b"mif1", b"heix" ]) + bytes(64)
+    }
+    assert [ sniff_format(x) for x in photos.values() ] == [ PNG, HEIC ]
+
+    assert read_makes_with_layer(tmp_path, photos) == { "photo.png": None, "photo.heic": None }
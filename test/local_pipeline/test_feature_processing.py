@@ -0,0 +1,46 @@
+import harness
+from feature_processing import FeatureProcessing
+from tag_merge import create_tag_delta
+
+'''
+    Checks the updates of the requests passed between the features
+'''
+
+
+def create_request() -> dict:
+    return {
+        "bucketName": harness.BUCKET_NAME,
+        "key": "photo.jpg",
+        "features": [ { "name": x, "completed": False } for x in [ "hash", "meta", "rekog" ] ],
+        "numberOfFeaturesCompleted": 0
+    }
+
+
+def test_updates_do_not_modify_the_original_request():
+    request = create_request()
+    fp = FeatureProcessing(request).generate_updated_request_queue_object("meta")
+    fp.add_pending_tags("meta", create_tag_delta({ "Camera": "Canon" }, [ "Camera" ]))
+
+    assert fp.get_completed_feature_names() == [ "meta" ]
+    assert fp.get_request_queue_object()["numberOfFeaturesCompleted"] == 1
+    assert fp.has_more_processing()
+    assert request == create_request()
+
+def test_parallel_branch_outputs_are_merged():
+    request = create_request()
+    branch_outputs = []
+    for feature_name in [ "hash", "meta", "rekog" ]:
+        fp = FeatureProcessing(request).generate_updated_request_queue_object(feature_name)
+        fp.add_pending_tags(feature_name, create_tag_delta({ feature_name: "value" }, [ feature_name ]))
+        if feature_name == "hash":
+            fp.set_content_hash("sha256")
+        branch_outputs.append(fp.get_request_queue_object())
+
+    merged = FeatureProcessing.merge_branch_outputs(branch_outputs)
+
+    assert merged.get_completed_feature_names() == [ "hash", "meta", "rekog" ]
+    assert merged.get_request_queue_object()["numberOfFeaturesCompleted"] == 3
+    assert not merged.has_more_processing()
+    assert [ x["tags"] for x in merged.get_pending_tags() ] == [ { "hash": "value" }, { "meta": "value" }, { "rekog": "value" } ]
+    # Fields set by a single branch are kept
+    assert merged.get_content_hash() == "sha256"
@@ -0,0 +1,50 @@
+import time
+import harness
+from fakes import FakeSSM
+from feature_registry import FeatureRegistry
+
+'''
+    Checks the order of the features and the caching of the SSM feature tree in the FeatureRegistry
+'''
+
+SETTINGS_PREFIX = "registry"
+
+
+def create_ssm(feature_names:list, features_list:list = None) -> FakeSSM:
+    ssm = FakeSSM()
+    for feature_name in feature_names:
+        ssm.put_parameter(Name="/{}/features/{}/enabled".format(SETTINGS_PREFIX, feature_name), Value="TRUE")
+    if features_list is not None:
+        ssm.put_parameter(Name="/{}/features".format(SETTINGS_PREFIX), Value=",".join(features_list), Type="StringList")
+    return ssm
+
+
+def test_features_are_in_the_order_of_the_features_list():
+    # SSM returns the parameters sorted by name
+    ssm = create_ssm([ "b-feature", "a-feature", "c-feature" ], [ "c-feature", "a-feature" ])
+    registry = FeatureRegistry(ssm, SETTINGS_PREFIX)
+
+    # Features missing from the list follow the listed ones
+    assert registry.get_feature_names() == [ "c-feature", "a-feature", "b-feature" ]
+
+def test_features_without_a_features_list():
+    ssm = create_ssm([ "b-feature", "a-feature" ])
+    registry = FeatureRegistry(ssm, SETTINGS_PREFIX)
+
+    assert registry.get_feature_names() == [ "a-feature", "b-feature" ]
+
+def test_parameters_are_cached_until_the_ttl_expires():
+    ssm = create_ssm([ "a-feature" ], [ "a-feature" ])
+    registry = FeatureRegistry(ssm, SETTINGS_PREFIX, ttl_seconds=60)
+    assert registry.is_feature_enabled("a-feature")
+
+    ssm.put_parameter(Name="/{}/features/a-feature/enabled".format(SETTINGS_PREFIX), Value="FALSE", Overwrite=True)
+    assert registry.is_feature_enabled("a-feature")
+    assert registry.get_feature_names() == [ "a-feature" ]
+    assert ssm.call_counts["GetParametersByPath"] == 1
+    assert ssm.call_counts["GetParameter"] == 1
+
+    # Expired parameters are fetched again
+    registry.loaded_at = time.monotonic() - 60
+    assert not registry.is_feature_enabled("a-feature")
+    assert ssm.call_counts["GetParametersByPath"] == 2
@@ -0,0 +1,41 @@
+import harness
+from fakes import TAG_PATTERN
+from fingerprint import FINGERPRINT_TAG_KEY, create_fingerprint, parse_fingerprint, get_fingerprinted_features, update_fingerprint
+
+'''
+    Checks the fingerprint tag the request builder skips unchanged objects with
+'''
+
+
+def create_tagset(fingerprint:str) -> list:
+    return [ { 'Key': 'User', 'Value': 'kept' }, { 'Key': FINGERPRINT_TAG_KEY, 'Value': fingerprint } ]
+
+
+def test_fingerprint_round_trip():
+    fingerprint = create_fingerprint('"etag"', 1024, [ "feature-b", "feature-a", "feature-a" ])
+
+    assert fingerprint == "etag:1024:feature-a+feature-b"
+    assert parse_fingerprint(fingerprint) == ("etag", 1024, { "feature-a", "feature-b" })
+    # The fingerprint is a valid S3 tag value
+    assert TAG_PATTERN.fullmatch(fingerprint) is not None
+
+def test_malformed_fingerprints():
+    assert parse_fingerprint("etag:size:feature-a") is None
+    assert parse_fingerprint("etag") is None
+    assert get_fingerprinted_features(create_tagset("malformed"), "etag", 1024) == set()
+
+def test_changed_content_has_no_fingerprinted_features():
+    tagset = create_tagset("etag:1024:feature-a")
+
+    # The quotes the S3 API returns the ETag with are ignored
+    assert get_fingerprinted_features(tagset, '"etag"', "1024") == { "feature-a" }
+    assert get_fingerprinted_features(tagset, "changed", 1024) == set()
+    assert get_fingerprinted_features(tagset, "etag", 2048) == set()
+    assert get_fingerprinted_features([], "etag", 1024) == set()
+
+def test_update_fingerprint():
+    tagset = create_tagset("etag:1024:feature-a")
+
+    # Features are added to the ones applied to the same content, and replace the ones of changed content
+    assert update_fingerprint(tagset, "etag", 1024, [ "feature-b" ]) == "etag:1024:feature-a+feature-b"
+    assert update_fingerprint(tagset, "changed", 1024, [ "feature-b" ]) == "changed:1024:feature-b"
@@ -0,0 +1,63 @@
+import io
+import random
+import hashlib
+import pytest
+import harness
+from hashing_engine import MultiDigestEngine, HashingEnginePool, SUPPORTED_ALGORITHMS, parse_algorithms
+
+'''
+    Checks the digests of the single pass hashing engine against hashlib, and the reuse of the pooled engines
+'''
+
+BUFFER_SIZE = 1024
+
+
+class ChunkedStream:
+    '''
+    Stream without readinto returning short reads, as a network stream does
+    '''
+
+    def __init__(self, data:bytes, chunk_size:int) -> None:
+        self.stream = io.BytesIO(data)
+        self.chunk_size = chunk_size
+
+    def read(self, size:int) -> bytes:
+        return self.stream.read(min(size, self.chunk_size))
+
+
+@pytest.mark.parametrize("size", [ 0, 1, BUFFER_SIZE, BUFFER_SIZE * 5 + 7 ])
+def test_digests_match_hashlib(size):
+    data = random.Random(size).randbytes(size)
+    engine = MultiDigestEngine(SUPPORTED_ALGORITHMS, BUFFER_SIZE)
+    expected = { x: hashlib.new(x, data).hexdigest() for x in SUPPORTED_ALGORITHMS }
+
+    chunks = []
+    digests = engine.hash_stream(io.BytesIO(data), on_chunk=lambda x: chunks.append(bytes(x)))
+    assert { x: digest.hexdigest() for x, digest in digests.items() } == expected
+    # Every chunk is passed on once, in order
+    assert b"".join(chunks) == data
+
+    digests = engine.hash_stream(ChunkedStream(data, 100))
+    assert { x: digest.hexdigest() for x, digest in digests.items() } == expected
+    engine.close()
+
+def test_unsupported_algorithms():
+    with pytest.raises(ValueError):
+        MultiDigestEngine([ "crc32" ])
+    with pytest.raises(ValueError):
+        MultiDigestEngine([])
+    assert parse_algorithms(" MD5, sha256,") == [ "md5", "sha256" ]
+
+def test_pooled_engines_are_reused():
+    pool = HashingEnginePool(BUFFER_SIZE, max_engines=2)
+    with pool.engine([ "md5" ]) as first_engine:
+        with pool.engine([ "md5" ]) as second_engine:
+            assert first_engine is not second_engine
+    with pool.engine([ "md5" ]) as engine:
+        assert engine in [ first_engine, second_engine ]
+    assert pool.created_count == 2
+
+    # Engines of other algorithms are replaced
+    with pool.engine([ "sha256" ]) as engine:
+        assert engine.algorithms == [ "sha256" ]
+    assert pool.created_count == 3
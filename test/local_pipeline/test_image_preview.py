@@ -0,0 +1,67 @@
+import io
+import struct
+import random
+import pytest
+import harness
+from corpus import encode_ifd, create_image, TIFF_SHORT, TIFF_LONG
+from image_preview import prepare_image, find_previews, get_jpeg_dimensions, TIFF_TAG_NEW_SUBFILE_TYPE, TIFF_TAG_COMPRESSION, \
+    TIFF_TAG_STRIP_OFFSETS, TIFF_TAG_STRIP_BYTE_COUNTS, TIFF_TAG_JPEG_INTERCHANGE_FORMAT, TIFF_TAG_JPEG_INTERCHANGE_FORMAT_LENGTH
+
+'''
+    Checks the embedded previews and the downscaled images prepared for Rekognition
+'''
+
+pytest.importorskip("PIL")
+
+
+def create_raw(preview:bytes, thumbnail:bytes) -> bytes:
+    '''
+    Returns a TIFF based raw file, as DNG is, with the preview as a reduced resolution JPEG strip in IFD0 and the
+    thumbnail as the JPEG of IFD1
+    '''
+    ifd0_entries = [
+        (TIFF_TAG_NEW_SUBFILE_TYPE, TIFF_LONG, [ 1 ]),
+        (TIFF_TAG_COMPRESSION, TIFF_SHORT, [ 7 ]),
+        (TIFF_TAG_STRIP_OFFSETS, TIFF_LONG, [ 0 ]),
+        (TIFF_TAG_STRIP_BYTE_COUNTS, TIFF_LONG, [ len(preview) ])
+    ]
+    ifd1_entries = [
+        (TIFF_TAG_JPEG_INTERCHANGE_FORMAT, TIFF_LONG, [ 0 ]),
+        (TIFF_TAG_JPEG_INTERCHANGE_FORMAT_LENGTH, TIFF_LONG, [ len(thumbnail) ])
+    ]
+    ifd0_size = len(encode_ifd(ifd0_entries, 8))
+    ifd1_offset = 8 + ifd0_size
+    preview_offset = ifd1_offset + len(encode_ifd(ifd1_entries, ifd1_offset))
+    thumbnail_offset = preview_offset + len(preview)
+
+    ifd0 = bytearray(encode_ifd(ifd0_entries[:2] + [ (TIFF_TAG_STRIP_OFFSETS, TIFF_LONG, [ preview_offset ]) ] + ifd0_entries[3:], 8))
+    # Links IFD0 to IFD1
+    ifd0[2 + len(ifd0_entries) * 12:6 + len(ifd0_entries) * 12] = struct.pack("<I", ifd1_offset)
+    ifd1 = encode_ifd([ (TIFF_TAG_JPEG_INTERCHANGE_FORMAT, TIFF_LONG, [ thumbnail_offset ]) ] + ifd1_entries[1:], ifd1_offset)
+    return b"II*\x00" + struct.pack("<I", 8) + bytes(ifd0) + ifd1 + preview + thumbnail
+
+
+def test_largest_preview_is_used():
+    preview = create_image(random.Random(0), (1600, 1200))
+    thumbnail = create_image(random.Random(1), (160, 120))
+    raw = create_raw(preview, thumbnail)
+
+    assert len(find_previews(io.BytesIO(raw))) == 2
+    assert prepare_image(io.BytesIO(raw)) == preview
+
+def test_large_previews_are_downscaled():
+    preview = create_image(random.Random(0), (1600, 1200))
+    raw = create_raw(preview, create_image(random.Random(1), (160, 120)))
+
+    image = prepare_image(io.BytesIO(raw), target_long_edge=800)
+    assert get_jpeg_dimensions(image) == (800, 600)
+
+def test_photos_without_a_preview_are_downscaled():
+    photo = create_image(random.Random(0), (4000, 3000))
+    image = prepare_image(io.BytesIO(photo), target_long_edge=1024, max_bytes=1024 * 64)
+
+    assert max(get_jpeg_dimensions(image)) <= 1024
+    assert len(image) <= 1024 * 64
+
+def test_undecodable_images():
+    assert prepare_image(io.BytesIO(b"II*\x00" + bytes(64))) is None
@@ -0,0 +1,60 @@
+import harness
+from instrumentation import Metrics, timer, timed, summarize_request, strip_meta, MAX_VALUES_PER_METRIC
+
+'''
+    Checks the timers and the CloudWatch Embedded Metric Format entries of the instrumentation
+'''
+
+
+def test_timers_record_milliseconds():
+    metrics = Metrics(dimensions={ "FunctionName": "test" })
+    with timer("Block", metrics):
+        pass
+
+    @timed("Function", metrics)
+    def function(value):
+        return value
+
+    assert [ function(x) for x in range(3) ] == [ 0, 1, 2 ]
+    entry = metrics.create_emf_entries()[0]
+    assert len(entry["Block"]) == 1
+    assert len(entry["Function"]) == 3
+    assert entry["FunctionName"] == "test"
+    assert entry["_aws"]["CloudWatchMetrics"][0]["Metrics"] == [
+        { "Name": "Block", "Unit": "Milliseconds" },
+        { "Name": "Function", "Unit": "Milliseconds" }
+    ]
+
+def test_metrics_are_split_into_entries_of_100_values():
+    metrics = Metrics(dimensions={ "FunctionName": "test" })
+    for x in range(MAX_VALUES_PER_METRIC + 10):
+        metrics.put_metric("Many", x)
+    metrics.put_metric("Bytes", 1024, "Bytes")
+
+    entries = metrics.create_emf_entries()
+    assert len(entries) == 2
+    assert entries[0]["Many"] == list(range(MAX_VALUES_PER_METRIC))
+    assert entries[0]["Bytes"] == [ 1024 ]
+    # Only metrics with values left are declared in the following entries
+    assert entries[1]["Many"] == list(range(MAX_VALUES_PER_METRIC, MAX_VALUES_PER_METRIC + 10))
+    assert [ x["Name"] for x in entries[1]["_aws"]["CloudWatchMetrics"][0]["Metrics"] ] == [ "Many" ]
+
+def test_flush_resets_the_metrics():
+    metrics = Metrics()
+    metrics.put_metric("Count", 1)
+    metrics.flush()
+
+    assert metrics.create_emf_entries() == []
+
+def test_requests_are_summarized_without_meta():
+    request = {
+        "bucketName": "bucket",
+        "key": "photo.jpg",
+        "features": [ { "name": "hash", "completed": True }, { "name": "meta", "completed": False } ],
+        "objectHeader": "header",
+        "meta": { "event": "large" }
+    }
+
+    assert summarize_request(request) == "File: photo.jpg in Bucket: bucket Completed Features: ['hash']"
+    assert summarize_request({ "batch": [ request ] }) == "Batch Of 1 Requests (0 Failures)"
+    assert strip_meta({ "batch": [ request ] }) == { "batch": [ { "bucketName": "bucket", "key": "photo.jpg", "features": request["features"] } ] }
@@ -0,0 +1,57 @@
+import harness
+from metrics_serialization import serialize_feature_data, serialize_exif, serialize_labels, serialize_hashes, enforce_byte_budget, get_size, \
+    parse_allowlist, MAX_STRING_LENGTH
+
+'''
+    Checks the compact, size bounded featureData of the metrics entries
+'''
+
+
+class ExifTag:
+
+    def __init__(self, printable:str) -> None:
+        self.printable = printable
+
+
+def test_exif_binary_fields_are_dropped():
+    exif = {
+        "Image Make": ExifTag("Canon"),
+        "JPEGThumbnail": b"\xff\xd8",
+        "EXIF MakerNote": ExifTag("binary"),
+        "EXIF UserComment": "c" * (MAX_STRING_LENGTH * 2)
+    }
+    record = serialize_feature_data(exif, serialize_exif)
+
+    assert record == { "Image Make": "Canon", "EXIF UserComment": "c" * MAX_STRING_LENGTH }
+
+def test_labels_are_compacted():
+    labels = [ {
+        "Name": "Dog",
+        "Confidence": 98.7654,
+        "Parents": [ { "Name": "Animal" } ],
+        "Instances": [ { "BoundingBox": { "Width": 0.5 } } ]
+    } ]
+
+    assert serialize_feature_data(labels, serialize_labels) == [ { "Name": "Dog", "Confidence": 98.77, "Parents": [ "Animal" ] } ]
+    assert serialize_feature_data(labels, serialize_labels, [ "Name", "Instances" ]) == [
+        { "Name": "Dog", "Instances": [ { "BoundingBox": { "Width": 0.5 } } ] }
+    ]
+
+def test_allowlist():
+    hashes = { "sha256": "a", "md5": "b" }
+
+    assert serialize_feature_data(hashes, serialize_hashes, parse_allowlist(" sha256, ")) == { "sha256": "a" }
+    assert parse_allowlist("") is None
+
+def test_records_are_bounded():
+    record = { "field{}".format(x): "v" * 100 for x in range(100) }
+    bounded = enforce_byte_budget(record, 1024)
+
+    assert get_size(bounded) <= 1024
+    # Fields are kept in their order
+    assert list(bounded.keys()) == [ "field{}".format(x) for x in range(len(bounded)) ]
+
+    labels = [ { "Name": "label{}".format(x) } for x in range(100) ]
+    bounded = serialize_feature_data(labels, serialize_labels, max_bytes=512)
+    assert get_size(bounded) <= 512
+    assert bounded == labels[:len(bounded)]
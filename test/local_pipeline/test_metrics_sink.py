@@ -0,0 +1,64 @@
+import json
+import harness
+from fakes import create_sqs_record
+
+'''
+    Checks the idempotency of the DynamoDB metrics writer against redelivered messages and reprocessed objects
+'''
+
+BUCKET_NAME = harness.BUCKET_NAME
+KEY = "photo.jpg"
+
+
+def create_record(feature_name:str, feature_data:dict, processed_at:int, e_tag:str = "etag", message_id:str = None) -> dict:
+    return create_sqs_record(json.dumps({
+        "bucket": BUCKET_NAME,
+        "key": KEY,
+        "bucketArn": "arn:aws:s3:::{}".format(BUCKET_NAME),
+        "featureName": feature_name,
+        "featureData": feature_data,
+        "eTag": e_tag,
+        "processedAt": processed_at
+    }), message_id)
+
+def write_records(pipeline:harness.LocalPipeline, sqs_records:list) -> dict:
+    response = pipeline.metrics_sink.lambda_handler({ "Records": sqs_records }, harness.LambdaContext("DynamoMetricsFunction"))
+    assert response["batchItemFailures"] == []
+    entries = pipeline.get_metrics_entries()
+    assert len(entries) == 1
+    return entries[0]
+
+
+def test_batch_is_written_with_one_update():
+    pipeline = harness.LocalPipeline()
+    table = pipeline.aws.dynamodb.Table(harness.METRICS_TABLE_NAME)
+    entry = write_records(pipeline, [
+        create_record("hash", { "size": 1 }, 1000),
+        create_record("meta", { "make": "Canon" }, 1000),
+        # A duplicate within the batch
+        create_record("hash", { "size": 1 }, 1000)
+    ])
+
+    assert table.call_counts["UpdateItem"] == 1
+    assert sorted(entry["featuresApplied"]) == [ "hash", "meta" ]
+    assert entry["featureData_meta"] == { "make": "Canon" }
+
+def test_redelivery_is_skipped():
+    pipeline = harness.LocalPipeline()
+    sqs_record = create_record("hash", { "size": 1 }, 1000)
+    write_records(pipeline, [ sqs_record ])
+    entry = write_records(pipeline, [ sqs_record, create_record("meta", { "make": "Canon" }, 1000) ])
+
+    assert sorted(entry["featuresApplied"]) == [ "hash", "meta" ]
+
+def test_reprocessing_overwrites_feature_data():
+    pipeline = harness.LocalPipeline()
+    write_records(pipeline, [ create_record("hash", { "size": 1 }, 1000) ])
+    entry = write_records(pipeline, [ create_record("hash", { "size": 2 }, 2000, e_tag="changed") ])
+
+    assert entry["featuresApplied"] == [ "hash" ]
+    assert entry["featureData_hash"] == { "size": 2 }
+
+    # A late redelivery of the first processing does not overwrite the later one
+    entry = write_records(pipeline, [ create_record("hash", { "size": 1 }, 1000) ])
+    assert entry["featureData_hash"] == { "size": 2 }
@@ -0,0 +1,33 @@
+import io
+import random
+import hashlib
+import harness
+from hashing_engine import MultiDigestEngine
+from object_scan import scan_stream, get_header_size, encode_header, decode_header, PAYLOAD_HEADER_BUDGET_BYTES
+
+'''
+    Checks the header captured while the objects are hashed, which the following features read instead of the object
+'''
+
+BUFFER_SIZE = 1024
+
+
+def test_header_is_captured_in_the_hashing_pass():
+    data = random.Random(0).randbytes(BUFFER_SIZE * 3 + 10)
+    result = scan_stream(io.BytesIO(data), MultiDigestEngine([ "sha256" ], BUFFER_SIZE), header_size=BUFFER_SIZE + 100)
+
+    assert result["header"] == data[:BUFFER_SIZE + 100]
+    assert result["size"] == len(data)
+    assert result["digests"]["sha256"].hexdigest() == hashlib.sha256(data).hexdigest()
+    assert decode_header(encode_header(result["header"])) == result["header"]
+
+def test_small_objects_are_captured_whole():
+    data = b"small object"
+    result = scan_stream(io.BytesIO(data), MultiDigestEngine([ "md5" ], BUFFER_SIZE), header_size=BUFFER_SIZE)
+
+    assert result["header"] == data
+
+def test_header_size_is_shared_by_the_batch():
+    assert get_header_size(1024 * 8, 1) == 1024 * 8
+    assert get_header_size(1024 * 8, 32) == PAYLOAD_HEADER_BUDGET_BYTES // 32
+    assert get_header_size(0, 4) == 0
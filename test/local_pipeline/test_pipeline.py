@@ -0,0 +1,395 @@
+import os
+import json
+import time
+import pytest
+from harness import LocalPipeline, LambdaContext, load_lambda_module, FEATURE_NAMES, HASH_FEATURE, REKOG_FEATURE, BUCKET_NAME, \
+    EVENT_META_TABLE_NAME
+from corpus import SyntheticPhoto
+from feature_runner import Feature, get_feature_runner
+from fingerprint import FINGERPRINT_TAG_KEY
+from content_index import LocalContentIndex
+from s3_events import create_s3_event_record
+
+'''
+    Checks the results of the whole pipeline on a small corpus, in every execution mode
+'''
+
+RESTORE_MODULE_PATH = "lib/constructs/restore-function/res/lambda_function.py"
+
+HASH_TAG_KEYS = [ "MD5", "SHA1", "SHA256", "SHA512" ]
+META_TAG_KEYS = [ "Camera and Lense Information", "Photo Information", "Photo Date" ]
+REKOG_TAG_KEYS = [ "DetectedInPhoto" ]
+
+
+def is_photo(photo) -> bool:
+    return photo.exif is not None
+
+def assert_tags(pipeline:LocalPipeline, corpus:list) -> None:
+    for photo in corpus:
+        tags = pipeline.get_tags(photo.key)
+        assert all([ x in tags for x in HASH_TAG_KEYS ])
+        if not pipeline.skip_unchanged_objects:
+            # Only written when it is read
+            assert FINGERPRINT_TAG_KEY not in tags
+        elif is_photo(photo):
+            assert tags[FINGERPRINT_TAG_KEY].endswith("+".join(FEATURE_NAMES))
+        if is_photo(photo):
+            assert all([ x in tags for x in META_TAG_KEYS + REKOG_TAG_KEYS ])
+            assert tags["Camera and Lense Information"] == "{} {} - {}".format(photo.exif["make"], photo.exif["model"], photo.exif["lensModel"])
+            assert tags["Photo Date"] == photo.exif["dateTime"]
+            assert tags["DetectedInPhoto"] != ""
+        else:
+            assert not any([ x in tags for x in META_TAG_KEYS + REKOG_TAG_KEYS ])
+
+def assert_metrics_entries(pipeline:LocalPipeline, corpus:list) -> None:
+    entries = { x["key"]: x for x in pipeline.get_metrics_entries() }
+    assert sorted(entries.keys()) == sorted([ x.key for x in corpus ])
+    for entry in entries.values():
+        assert sorted(entry["featuresApplied"]) == sorted(FEATURE_NAMES)
+        # The featureData is serialized with the schema of the feature, which drops the instances of the labels
+        assert all([ "Instances" not in x for x in entry.get("featureData_{}".format(REKOG_FEATURE), []) ])
+
+
+def test_sequential(small_corpus):
+    pipeline = LocalPipeline(execution_mode="SEQUENTIAL")
+    result = pipeline.run(small_corpus)
+
+    assert len(result["outputs"]) == len(small_corpus)
+    for output in result["outputs"]:
+        assert output["numberOfFeaturesCompleted"] == len(FEATURE_NAMES)
+        # The event metadata is kept out of the payload
+        assert "meta" not in output
+        assert pipeline.get_event_meta(output["metaId"])["s3Event"]["s3"]["bucket"]["name"] == output["bucketName"]
+        # Only the photo meta feature reads the header, it is dropped after it
+        assert "objectHeader" not in output
+        assert output.get("pendingTags", {}) == {}
+    assert_tags(pipeline, small_corpus)
+    assert_metrics_entries(pipeline, small_corpus)
+
+    # The photo meta feature reads the EXIF data from the header captured by the hash feature
+    photo_count = len([ x for x in small_corpus if is_photo(x) ])
+    assert pipeline.aws.s3.call_counts["GetObject"] == len(small_corpus) + photo_count
+
+def test_parallel(small_corpus):
+    pipeline = LocalPipeline(execution_mode="PARALLEL")
+    result = pipeline.run(small_corpus)
+
+    assert len(result["outputs"]) == len(small_corpus)
+    assert_tags(pipeline, small_corpus)
+    assert_metrics_entries(pipeline, small_corpus)
+    # Tags of all the features are written by the tag writer in a single round-trip
+    assert pipeline.aws.s3.call_counts["PutObjectTagging"] == len(small_corpus)
+
+def test_feature_batches(small_corpus):
+    pipeline = LocalPipeline(feature_batch_size=4)
+    result = pipeline.run(small_corpus)
+
+    assert len(result["outputs"]) == 2
+    assert sum([ len(x["batch"]) for x in result["outputs"] ]) == len(small_corpus)
+    assert all([ len(x["batchFailures"]) == 0 for x in result["outputs"] ])
+    assert_tags(pipeline, small_corpus)
+
+def test_events_are_referenced_without_the_event_meta_store(small_corpus):
+    pipeline = LocalPipeline(store_event_meta=False)
+    result = pipeline.run(small_corpus)
+
+    sequencers = []
+    for output in result["outputs"]:
+        assert "metaId" not in output
+        assert output["eventRef"]["messageId"] != ""
+        sequencers.append(output["eventRef"]["sequencer"])
+    assert len(set(sequencers)) == len(small_corpus)
+    assert pipeline.aws.dynamodb.Table(EVENT_META_TABLE_NAME).scan_items() == []
+
+def test_redelivered_messages_start_no_executions(small_corpus):
+    pipeline = LocalPipeline(feature_batch_size=4)
+    events = pipeline.create_event_queue_events(pipeline.upload(small_corpus))
+    assert len(pipeline.run_request_builder(events)) == 2
+
+    # The execution names come from the message ids, so the executions of redelivered messages already exist
+    assert pipeline.run_request_builder(events) == []
+    assert pipeline.aws.stepfunctions.call_counts["StartExecution"] == 4
+
+def test_tags_written_by_each_feature(small_corpus):
+    pipeline = LocalPipeline(coalesce_tag_writes=False)
+    pipeline.run(small_corpus)
+
+    assert_tags(pipeline, small_corpus)
+    # The photo features do not tag files that are not photos
+    photo_count = len([ x for x in small_corpus if is_photo(x) ])
+    assert pipeline.aws.s3.call_counts["PutObjectTagging"] == len(small_corpus) + (photo_count * (len(FEATURE_NAMES) - 1))
+
+def test_unchanged_objects_are_skipped(small_corpus):
+    pipeline = LocalPipeline(skip_unchanged_objects=True)
+    s3_event_records = pipeline.upload(small_corpus)
+    for execution_input in pipeline.run_request_builder(pipeline.create_event_queue_events(s3_event_records)):
+        pipeline.run_execution(execution_input)
+
+    assert_tags(pipeline, small_corpus)
+
+    # The same objects are notified again, their fingerprints show they are unchanged
+    assert pipeline.run_request_builder(pipeline.create_event_queue_events(s3_event_records)) == []
+
+def test_request_builder_reads_objects_once(small_corpus):
+    pipeline = LocalPipeline(skip_unchanged_objects=True, sniff_content_formats=True)
+    s3_event_records = pipeline.upload(small_corpus)
+    execution_inputs = pipeline.run_request_builder(pipeline.create_event_queue_events(s3_event_records))
+
+    # The ranged GET of the start of the objects shows they have no tags, so no fingerprint to read
+    assert pipeline.aws.s3.call_counts["GetObject"] == len(small_corpus)
+    assert pipeline.aws.s3.call_counts.get("GetObjectTagging", 0) == 0
+    assert pipeline.aws.s3.call_counts.get("HeadObject", 0) == 0
+
+    for execution_input in execution_inputs:
+        pipeline.run_execution(execution_input)
+    pipeline.aws.s3.reset_call_counts()
+    assert pipeline.run_request_builder(pipeline.create_event_queue_events(s3_event_records)) == []
+    assert pipeline.aws.s3.call_counts["GetObject"] == len(small_corpus)
+    assert pipeline.aws.s3.call_counts["GetObjectTagging"] == len(small_corpus)
+
+def test_archived_objects_are_deferred(small_corpus):
+    pipeline = LocalPipeline()
+    deferred_restore_queue_url = pipeline.aws.sqs.create_queue_url("photo-archive-deferred-restore-queue")
+    pipeline.request_builder.DEFERRED_RESTORE_QUEUE_URL = deferred_restore_queue_url
+    s3_event_records = pipeline.upload(small_corpus)
+    archived_keys = [ x.key for x in small_corpus[:2] ]
+    for photo in small_corpus[:2]:
+        pipeline.aws.s3.put_object(Bucket=BUCKET_NAME, Key=photo.key, Body=photo.body, StorageClass="DEEP_ARCHIVE")
+
+    execution_inputs = pipeline.run_request_builder(pipeline.create_event_queue_events(s3_event_records))
+    assert sorted([ x["key"] for x in execution_inputs ]) == sorted([ x.key for x in small_corpus[2:] ])
+    assert pipeline.aws.sqs.get_queue_length(deferred_restore_queue_url) == len(archived_keys)
+    # Only the archived objects need a HEAD request for their storage class
+    assert pipeline.aws.s3.call_counts["GetObject"] == len(small_corpus)
+    assert pipeline.aws.s3.call_counts["HeadObject"] == len(archived_keys)
+
+def test_identical_content_is_copied_from_the_content_index(small_corpus):
+    pipeline = LocalPipeline()
+    get_feature_runner(REKOG_FEATURE).content_index = LocalContentIndex()
+    pipeline.run(small_corpus)
+    detect_labels_count = pipeline.aws.rekognition.call_counts["DetectLabels"]
+
+    # The same photos uploaded under other keys get the labels of the first upload
+    copies = [ SyntheticPhoto("copy/{}".format(x.key), x.body, x.exif) for x in small_corpus ]
+    pipeline.run(copies)
+    assert pipeline.aws.rekognition.call_counts["DetectLabels"] == detect_labels_count
+    for photo in small_corpus:
+        assert pipeline.get_tags("copy/{}".format(photo.key)) == pipeline.get_tags(photo.key)
+
+def test_deferred_objects_are_processed_once_restored(small_corpus):
+    pipeline = LocalPipeline()
+    deferred_restore_queue_url = pipeline.aws.sqs.create_queue_url("photo-archive-deferred-restore-queue")
+    pipeline.request_builder.DEFERRED_RESTORE_QUEUE_URL = deferred_restore_queue_url
+    restore_function = load_lambda_module(RESTORE_MODULE_PATH, "restore_lambda_function", {})
+    for photo in small_corpus:
+        pipeline.aws.s3.put_object(Bucket=BUCKET_NAME, Key=photo.key, Body=photo.body, StorageClass="GLACIER")
+    s3_event_records = [ create_s3_event_record(BUCKET_NAME, x.key) for x in small_corpus ]
+    assert pipeline.run_request_builder(pipeline.create_event_queue_events(s3_event_records)) == []
+
+    # A deleted object fails alone
+    sqs_records = pipeline.aws.sqs.receive_lambda_records(deferred_restore_queue_url)
+    pipeline.aws.s3.objects.pop((BUCKET_NAME, small_corpus[0].key))
+    with pipeline.output():
+        response = restore_function.lambda_handler({ "Records": sqs_records }, LambdaContext("RestoreFunction"))
+    deleted_message_ids = [ x["messageId"] for x in sqs_records if json.loads(x["body"])["key"] == small_corpus[0].key ]
+    assert response["batchItemFailures"] == [ { "itemIdentifier": deleted_message_ids[0] } ]
+    assert pipeline.aws.s3.call_counts["RestoreObject"] == len(small_corpus)
+
+    # S3 notifies the restored objects, they are processed like new uploads
+    execution_inputs = pipeline.run_request_builder(pipeline.create_event_queue_events(s3_event_records[1:]))
+    assert sorted([ x["key"] for x in execution_inputs ]) == sorted([ x.key for x in small_corpus[1:] ])
+    for execution_input in execution_inputs:
+        pipeline.run_execution(execution_input)
+    assert_tags(pipeline, small_corpus[1:])
+
+def test_forced_objects_are_reprocessed(small_corpus):
+    pipeline = LocalPipeline(skip_unchanged_objects=True)
+    get_feature_runner(REKOG_FEATURE).content_index = LocalContentIndex()
+    s3_event_records = pipeline.upload(small_corpus)
+    for execution_input in pipeline.run_request_builder(pipeline.create_event_queue_events(s3_event_records)):
+        pipeline.run_execution(execution_input)
+    detect_labels_count = pipeline.aws.rekognition.call_counts["DetectLabels"]
+
+    # Forced objects are neither skipped as unchanged nor copied from the content index
+    for s3_event_record in s3_event_records:
+        s3_event_record["force"] = True
+    execution_inputs = pipeline.run_request_builder(pipeline.create_event_queue_events(s3_event_records))
+    assert len(execution_inputs) == len(small_corpus)
+    for execution_input in execution_inputs:
+        pipeline.run_execution(execution_input)
+    assert pipeline.aws.rekognition.call_counts["DetectLabels"] == detect_labels_count * 2
+    assert_tags(pipeline, small_corpus)
+
+def test_hashing_engines_are_reused(small_corpus):
+    pipeline = LocalPipeline(feature_batch_size=4)
+    for _ in range(3):
+        pipeline.run(small_corpus)
+
+    # The batch workers of every invocation borrow the engines of the earlier ones, at most one per worker is created
+    hashing_engines = get_feature_runner(HASH_FEATURE).feature.hashing_engines
+    assert 0 < hashing_engines.created_count <= 4
+
+def test_archived_objects_are_passed_on(small_corpus):
+    pipeline = LocalPipeline()
+    photos = [ x for x in small_corpus if is_photo(x) ]
+    s3_event_records = pipeline.upload(photos)
+    for photo in photos:
+        pipeline.aws.s3.put_object(Bucket=BUCKET_NAME, Key=photo.key, Body=photo.body, StorageClass="GLACIER")
+
+    for execution_input in pipeline.run_request_builder(pipeline.create_event_queue_events(s3_event_records)):
+        # Sniffing the format fails first, unless the request carries it
+        for state_input in [ execution_input, dict(execution_input, contentFormat="jpeg") ]:
+            for feature_name in FEATURE_NAMES:
+                # Whether the feature reads the object itself or Rekognition reads it
+                assert pipeline.run_feature(feature_name, state_input) == state_input
+    assert pipeline.aws.s3.call_counts.get("PutObjectTagging", 0) == 0
+
+def test_rekognition_throttling(small_corpus):
+    pipeline = LocalPipeline()
+    pipeline.aws.rekognition.throttle_every = 2
+    try:
+        pipeline.run(small_corpus)
+    finally:
+        pipeline.aws.rekognition.throttle_every = 0
+
+    # Throttled calls are retried by the rate limited client
+    assert_tags(pipeline, small_corpus)
+
+def test_express_sync_executions(small_corpus):
+    pipeline = LocalPipeline(state_machine_type="EXPRESS", feature_batch_size=4)
+    result = pipeline.run(small_corpus)
+
+    # The executions ran while the request builder waited for them
+    assert pipeline.aws.stepfunctions.call_counts.get("StartExecution", 0) == 0
+    assert pipeline.aws.stepfunctions.call_counts["StartSyncExecution"] == len(result["outputs"])
+    assert sum([ len(x["batch"]) for x in result["outputs"] ]) == len(small_corpus)
+    assert_tags(pipeline, small_corpus)
+    assert_metrics_entries(pipeline, small_corpus)
+
+def test_express_sync_execution_retries(small_corpus):
+    pipeline = LocalPipeline(state_machine_type="EXPRESS", feature_batch_size=4)
+    failed_key = small_corpus[0].key
+    run_sync_execution = pipeline.aws.stepfunctions.sync_executor
+
+    def fail_once(execution_input):
+        # The first execution of the object fails in the hash feature, moving it to the batchFailures
+        if failed_key in [ x["key"] for x in execution_input["batch"] ] and len(execution_input["batch"]) > 1:
+            failed_request = [ x for x in execution_input["batch"] if x["key"] == failed_key ][0]
+            execution_input = dict(execution_input, batch=[ x for x in execution_input["batch"] if x["key"] != failed_key ], batchFailures=[ {
+                "bucketName": failed_request["bucketName"],
+                "key": failed_key,
+                "featureName": "feature-hash-tag",
+                "error": "Simulated Failure"
+            } ])
+        return run_sync_execution(execution_input)
+
+    pipeline.aws.stepfunctions.sync_executor = fail_once
+    pipeline.run(small_corpus)
+
+    # Only the failed object was run again, in an execution of its own
+    assert pipeline.aws.stepfunctions.call_counts["StartSyncExecution"] == 3
+    assert_tags(pipeline, small_corpus)
+
+def test_express_sync_execution_failures(small_corpus):
+    pipeline = LocalPipeline(state_machine_type="EXPRESS")
+
+    def fail(execution_input):
+        if execution_input["key"] == small_corpus[0].key:
+            raise Exception("Simulated Failure")
+        return pipeline.run_sync_execution(execution_input)
+
+    pipeline.aws.stepfunctions.sync_executor = fail
+    events = pipeline.create_event_queue_events(pipeline.upload(small_corpus))
+    with pipeline.output():
+        responses = [ pipeline.request_builder.lambda_handler(x, LambdaContext("RequestBuilderFunction")) for x in events ]
+
+    # The object was run up to the maximum number of attempts, then only its message was returned to the queue
+    failed_message_ids = [ x["itemIdentifier"] for response in responses for x in response["batchItemFailures"] ]
+    assert failed_message_ids == [ events[0]["Records"][0]["messageId"] ]
+    assert pipeline.aws.stepfunctions.call_counts["StartSyncExecution"] == len(small_corpus) + 1
+
+def test_express_sync_executions_stop_before_timeout(small_corpus):
+    pipeline = LocalPipeline(state_machine_type="EXPRESS", feature_batch_size=4)
+    events = pipeline.create_event_queue_events(pipeline.upload(small_corpus))
+    # Less time left than an execution can take
+    context = LambdaContext("RequestBuilderFunction")
+    context.deadline = time.monotonic() + pipeline.request_builder.EXPRESS_EXECUTION_MAX_SECONDS
+    with pipeline.output():
+        responses = [ pipeline.request_builder.lambda_handler(x, context) for x in events ]
+
+    # No execution was started, every message is returned to the queue
+    failed_message_ids = [ x["itemIdentifier"] for response in responses for x in response["batchItemFailures"] ]
+    assert sorted(failed_message_ids) == sorted([ x["messageId"] for event in events for x in event["Records"] ])
+    assert pipeline.aws.stepfunctions.call_counts.get("StartSyncExecution", 0) == 0
+
+def test_inline_dispatch(small_corpus):
+    pipeline = LocalPipeline(inline_max_object_kilobytes=1024)
+    result = pipeline.run(small_corpus)
+
+    # Every object is under the threshold, no execution is started
+    assert len(result["outputs"]) == 0
+    assert pipeline.aws.stepfunctions.call_counts.get("StartExecution", 0) == 0
+    assert_tags(pipeline, small_corpus)
+    assert_metrics_entries(pipeline, small_corpus)
+    # The tags of all the features are applied in a single round-trip
+    assert pipeline.aws.s3.call_counts["PutObjectTagging"] == len(small_corpus)
+
+    # The features are created with the environment of their lambda, the one of the process is left as is
+    for feature_name, feature_runner in pipeline.request_builder.inline_dispatcher.get_feature_runners():
+        assert feature_runner.feature.environment["FEATURE_NAME"] == feature_name
+        assert feature_runner.coalesce_tag_writes
+    assert "FEATURE_NAME" not in os.environ
+
+def test_inline_dispatch_threshold(small_corpus):
+    pipeline = LocalPipeline(inline_max_object_kilobytes=min([ x.size for x in small_corpus ]) // 1024 - 1)
+    result = pipeline.run(small_corpus)
+
+    # Larger objects still go to the state machine
+    assert len(result["outputs"]) == len(small_corpus)
+    assert_tags(pipeline, small_corpus)
+
+def test_feature_runners_are_registered(small_corpus):
+    pipeline = LocalPipeline()
+
+    # Every feature module registers the runner its lambda_handler is bound to
+    for feature_name in FEATURE_NAMES:
+        runner = get_feature_runner(feature_name)
+        assert runner.feature_name == feature_name
+        assert pipeline.feature_modules[feature_name].lambda_handler == runner.lambda_handler
+
+def test_features_must_implement_process():
+    class IncompleteFeature(Feature):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteFeature("feature-incomplete", "local")
+
+def test_content_formats_are_sniffed(small_corpus):
+    pipeline = LocalPipeline(sniff_content_formats=True)
+    result = pipeline.run(small_corpus)
+
+    assert len(result["outputs"]) == len(small_corpus)
+    for output in result["outputs"]:
+        assert output["contentFormat"] == ("jpeg" if output["key"].endswith(".jpg") else "unknown")
+    assert_tags(pipeline, small_corpus)
+
+    # The photo features are not run on the files that are not photos
+    entries = { x["key"]: x for x in pipeline.get_metrics_entries() }
+    for photo in small_corpus:
+        expected_features = FEATURE_NAMES if is_photo(photo) else [ HASH_FEATURE ]
+        assert sorted(entries[photo.key]["featuresApplied"]) == sorted(expected_features)
+    # The request builder reads the start of every object once
+    photo_count = len([ x for x in small_corpus if is_photo(x) ])
+    assert pipeline.aws.s3.call_counts["GetObject"] == (2 * len(small_corpus)) + photo_count
+
+def test_misnamed_files_are_routed_by_content(small_corpus):
+    photo = [ x for x in small_corpus if is_photo(x) ][0]
+    other_file = [ x for x in small_corpus if not is_photo(x) ][0]
+    corpus = [
+        SyntheticPhoto("misnamed/photo.txt", photo.body, photo.exif),
+        SyntheticPhoto("misnamed/note.jpg", other_file.body, None)
+    ]
+    pipeline = LocalPipeline()
+    pipeline.run(corpus)
+
+    assert_tags(pipeline, corpus)
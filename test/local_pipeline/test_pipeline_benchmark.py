@@ -0,0 +1,116 @@
+import pytest
+from harness import LocalPipeline, HASH_FEATURE, META_FEATURE, REKOG_FEATURE, METRICS_TABLE_NAME
+
+pytest.importorskip("pytest_benchmark")
+
+'''
+    Throughput of every stage of the pipeline, and of the pipeline as a whole, on the synthetic corpus. Every
+    benchmark reports photos per second and bytes per second in its extra info, compare runs with:
+
+        python -m pytest test/local_pipeline --benchmark-only --benchmark-autosave
+        python -m pytest test/local_pipeline --benchmark-only --benchmark-compare
+
+    The input of each stage is produced once by running the stages before it
+'''
+
+ROUNDS = 3
+
+
+def report_throughput(benchmark, corpus:list) -> None:
+    # Not available when benchmarks are disabled
+    if benchmark.stats is None:
+        return
+    seconds = benchmark.stats.stats.mean
+    benchmark.extra_info["photos"] = len(corpus)
+    benchmark.extra_info["bytes"] = sum([ x.size for x in corpus ])
+    benchmark.extra_info["photosPerSecond"] = round(len(corpus) / seconds, 2)
+    benchmark.extra_info["bytesPerSecond"] = round(benchmark.extra_info["bytes"] / seconds)
+
+
+@pytest.fixture(scope="module")
+def stage_inputs(corpus) -> dict:
+    '''
+    The pipeline and the input of each of its stages
+    '''
+    pipeline = LocalPipeline(execution_mode="SEQUENTIAL")
+    s3_event_records = pipeline.upload(corpus)
+    execution_inputs = pipeline.run_request_builder(pipeline.create_event_queue_events(s3_event_records))
+    hash_outputs = [ pipeline.run_feature(HASH_FEATURE, x) for x in execution_inputs ]
+    meta_outputs = [ pipeline.run_feature(META_FEATURE, x) for x in hash_outputs ]
+    rekog_outputs = [ pipeline.run_feature(REKOG_FEATURE, x) for x in meta_outputs ]
+    metrics_records = pipeline.aws.sqs.receive_lambda_records(pipeline.metrics_queue_url)
+    return {
+        "pipeline": pipeline,
+        "s3EventRecords": s3_event_records,
+        HASH_FEATURE: execution_inputs,
+        META_FEATURE: hash_outputs,
+        REKOG_FEATURE: meta_outputs,
+        "tagWriter": rekog_outputs,
+        "metricsRecords": metrics_records
+    }
+
+def drain_metrics_queue(pipeline:LocalPipeline) -> None:
+    pipeline.aws.sqs.receive_lambda_records(pipeline.metrics_queue_url)
+
+
+def test_request_builder(benchmark, corpus, stage_inputs):
+    pipeline = stage_inputs["pipeline"]
+
+    def setup():
+        # New message ids every round, so the executions are not already started
+        return (pipeline.create_event_queue_events(stage_inputs["s3EventRecords"]),), dict()
+
+    execution_inputs = benchmark.pedantic(pipeline.run_request_builder, setup=setup, rounds=ROUNDS)
+    assert len(execution_inputs) == len(corpus)
+    report_throughput(benchmark, corpus)
+
+@pytest.mark.parametrize("feature_name", [ HASH_FEATURE, META_FEATURE, REKOG_FEATURE ])
+def test_feature(benchmark, corpus, stage_inputs, feature_name):
+    pipeline = stage_inputs["pipeline"]
+
+    def run_feature():
+        return [ pipeline.run_feature(feature_name, x) for x in stage_inputs[feature_name] ]
+
+    def setup():
+        drain_metrics_queue(pipeline)
+        return tuple(), dict()
+
+    outputs = benchmark.pedantic(run_feature, setup=setup, rounds=ROUNDS)
+    assert len(outputs) == len(corpus)
+    report_throughput(benchmark, corpus)
+
+def test_tag_writer(benchmark, corpus, stage_inputs):
+    pipeline = stage_inputs["pipeline"]
+
+    def run_tag_writer():
+        return [ pipeline.run_tag_writer(x) for x in stage_inputs["tagWriter"] ]
+
+    outputs = benchmark.pedantic(run_tag_writer, rounds=ROUNDS)
+    assert len(outputs) == len(corpus)
+    report_throughput(benchmark, corpus)
+
+def test_metrics_sink(benchmark, corpus, stage_inputs):
+    pipeline = stage_inputs["pipeline"]
+
+    def run_metrics_sink(sqs_records:list):
+        for index in range(0, len(sqs_records), 10):
+            response = pipeline.metrics_sink.lambda_handler({ "Records": sqs_records[index:index + 10] }, None)
+            assert len(response["batchItemFailures"]) == 0
+
+    def setup():
+        # Every round writes the entries to an empty table
+        pipeline.metrics_sink.table = pipeline.aws.dynamodb.create_table(METRICS_TABLE_NAME, [ "hash" ])
+        return (stage_inputs["metricsRecords"],), dict()
+
+    with pipeline.output():
+        benchmark.pedantic(run_metrics_sink, setup=setup, rounds=ROUNDS)
+    assert len(pipeline.get_metrics_entries()) == len(corpus)
+    report_throughput(benchmark, corpus)
+
+@pytest.mark.parametrize("execution_mode", [ "SEQUENTIAL", "PARALLEL" ])
+def test_end_to_end(benchmark, corpus, execution_mode):
+    pipeline = LocalPipeline(execution_mode=execution_mode)
+
+    result = benchmark.pedantic(pipeline.run, args=(corpus,), rounds=ROUNDS)
+    assert len(result["outputs"]) == len(corpus)
+    report_throughput(benchmark, corpus)
@@ -0,0 +1,112 @@
+import time
+import pytest
+import harness
+import rate_limiter
+from botocore.exceptions import ReadTimeoutError
+from fakes import FakeDynamoDB, create_exceptions, raise_error
+from rate_limiter import TokenBucket, RateLimiter, RateLimitedClient, DynamoRateCounter, LocalRateCounter, MIN_RATE_RATIO
+
+'''
+    Checks the token bucket, the adaptive rate, the shared counters and the retries of the rate limited client
+'''
+
+MAX_TPS = 100
+
+
+class ThrottledClient:
+    '''
+    Client whose detect_labels call fails with the given errors before succeeding
+    '''
+
+    def __init__(self, error_codes:list) -> None:
+        self.exceptions = create_exceptions("ThrottlingException", "InvalidImageFormatException")
+        self.error_codes = list(error_codes)
+        self.call_count = 0
+
+    def detect_labels(self, **kwargs) -> dict:
+        self.call_count += 1
+        if len(self.error_codes) > 0 and self.error_codes[0] == "ReadTimeout":
+            self.error_codes.pop(0)
+            raise ReadTimeoutError(endpoint_url="https://rekognition.us-east-1.amazonaws.com")
+        if len(self.error_codes) > 0:
+            raise_error(self.exceptions, self.error_codes.pop(0), "Simulated Error", "DetectLabels")
+        return { "Labels": [] }
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "get_backoff_seconds", lambda attempt: 0.0)
+
+
+def test_token_bucket_paces_calls():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    waited = sum([ bucket.acquire() for x in range(6) ])
+
+    # The first token is in the bucket, the next 5 are refilled at 50 per second
+    assert time.monotonic() - start >= 0.09
+    assert waited > 0
+
+def test_rate_adapts_to_throttling():
+    limiter = RateLimiter(MAX_TPS)
+    for x in range(10):
+        limiter.on_throttle()
+    assert limiter.rate == MAX_TPS * MIN_RATE_RATIO
+
+    limiter.on_success()
+    assert limiter.rate > MAX_TPS * MIN_RATE_RATIO
+    for x in range(100):
+        limiter.on_success()
+    assert limiter.rate == MAX_TPS
+    assert limiter.get_metrics(reset=True)["throttles"] == 10
+    assert limiter.get_metrics()["throttles"] == 0
+
+def test_throttled_calls_are_retried():
+    client = ThrottledClient([ "ThrottlingException", "ThrottlingException" ])
+    limiter = RateLimiter(MAX_TPS)
+    rate_limited_client = RateLimitedClient(client, limiter, [ "detect_labels" ])
+
+    assert rate_limited_client.detect_labels(Image={}) == { "Labels": [] }
+    assert client.call_count == 3
+    metrics = limiter.get_metrics()
+    assert (metrics["calls"], metrics["throttles"], metrics["retries"]) == (3, 2, 2)
+    # Other attributes are passed through
+    assert rate_limited_client.exceptions is client.exceptions
+
+def test_transient_errors_are_retried():
+    client = ThrottledClient([ "InternalServerError", "ReadTimeout" ])
+    limiter = RateLimiter(MAX_TPS)
+    rate_limited_client = RateLimitedClient(client, limiter, [ "detect_labels" ])
+
+    assert rate_limited_client.detect_labels(Image={}) == { "Labels": [] }
+    assert client.call_count == 3
+    # The rate is only lowered by throttling
+    metrics = limiter.get_metrics()
+    assert (metrics["throttles"], metrics["retries"], metrics["rate"]) == (0, 2, MAX_TPS)
+
+def test_other_errors_are_not_retried():
+    client = ThrottledClient([ "InvalidImageFormatException" ])
+    rate_limited_client = RateLimitedClient(client, RateLimiter(MAX_TPS), [ "detect_labels" ])
+
+    with pytest.raises(client.exceptions.InvalidImageFormatException):
+        rate_limited_client.detect_labels(Image={})
+    assert client.call_count == 1
+
+def test_calls_stop_after_the_max_attempts():
+    client = ThrottledClient([ "ThrottlingException" ] * 5)
+    rate_limited_client = RateLimitedClient(client, RateLimiter(MAX_TPS), [ "detect_labels" ], max_attempts=3)
+
+    with pytest.raises(client.exceptions.ThrottlingException):
+        rate_limited_client.detect_labels(Image={})
+    assert client.call_count == 3
+
+@pytest.mark.parametrize("create_counter", [
+    lambda: LocalRateCounter("rekognition"),
+    lambda: DynamoRateCounter(FakeDynamoDB().create_table("rate-limit", [ "counterKey" ]), "rekognition")
+])
+def test_shared_counters_limit_calls_per_second(create_counter):
+    counter = create_counter()
+
+    assert [ counter.try_increment(1000, 2) for x in range(3) ] == [ True, True, False ]
+    # Each second has its own count
+    assert counter.try_increment(1001, 2)
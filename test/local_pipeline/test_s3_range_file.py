@@ -0,0 +1,75 @@
+import io
+import random
+import harness
+from s3_range_file import S3RangeFile
+
+'''
+    Checks the byte ranges S3RangeFile fetches for the reads made on it
+'''
+
+KEY = "object.bin"
+BLOCK_SIZE = 1024
+
+
+def create_object(size:int) -> tuple:
+    pipeline = harness.LocalPipeline()
+    body = random.Random(0).randbytes(size)
+    pipeline.aws.s3.put_object(Bucket=harness.BUCKET_NAME, Key=KEY, Body=body)
+    pipeline.aws.s3.reset_call_counts()
+    return pipeline.aws.s3, body
+
+
+def test_reads_within_the_seeded_header_need_no_request():
+    s3, body = create_object(BLOCK_SIZE * 8)
+    object_file = S3RangeFile(s3, harness.BUCKET_NAME, KEY, block_size=BLOCK_SIZE, size=len(body))
+    # A header shorter than a block
+    object_file.seed(body[:BLOCK_SIZE // 2])
+
+    assert object_file.read(16) == body[:16]
+    object_file.seek(100)
+    assert object_file.read(100) == body[100:200]
+    assert object_file.request_count == 0
+
+    # Reads past the header fetch the blocks
+    assert object_file.read(BLOCK_SIZE) == body[200:200 + BLOCK_SIZE]
+    assert object_file.request_count == 1
+
+def test_consecutive_missing_blocks_are_fetched_together():
+    s3, body = create_object(BLOCK_SIZE * 8)
+    object_file = S3RangeFile(s3, harness.BUCKET_NAME, KEY, block_size=BLOCK_SIZE, size=len(body))
+
+    object_file.seek(BLOCK_SIZE * 2)
+    assert object_file.read(16) == body[BLOCK_SIZE * 2:BLOCK_SIZE * 2 + 16]
+    # Blocks 1 to 4, of which 2 is cached, take two requests
+    object_file.seek(BLOCK_SIZE + 10)
+    assert object_file.read(BLOCK_SIZE * 3) == body[BLOCK_SIZE + 10:BLOCK_SIZE * 4 + 10]
+    assert object_file.request_count == 3
+    assert object_file.bytes_fetched == BLOCK_SIZE * 4
+
+def test_size_is_read_from_the_content_range():
+    s3, body = create_object(BLOCK_SIZE * 2 + 100)
+    object_file = S3RangeFile(s3, harness.BUCKET_NAME, KEY, block_size=BLOCK_SIZE)
+
+    object_file.seek(-50, io.SEEK_END)
+    assert object_file.tell() == len(body) - 50
+    # Reads past the end of the object return what is left
+    assert object_file.read(BLOCK_SIZE) == body[-50:]
+    assert object_file.read(BLOCK_SIZE) == b""
+    assert object_file.request_count == 2
+
+def test_empty_objects():
+    s3, body = create_object(0)
+    object_file = S3RangeFile(s3, harness.BUCKET_NAME, KEY, block_size=BLOCK_SIZE)
+
+    assert object_file.size == 0
+    assert object_file.read() == b""
+
+def test_least_recently_used_blocks_are_evicted():
+    s3, body = create_object(BLOCK_SIZE * 4)
+    object_file = S3RangeFile(s3, harness.BUCKET_NAME, KEY, block_size=BLOCK_SIZE, max_cached_blocks=2, size=len(body))
+
+    for block_index in [ 0, 1, 0, 2 ]:
+        object_file.seek(block_index * BLOCK_SIZE)
+        object_file.read(1)
+    assert list(object_file.blocks.keys()) == [ 0, 2 ]
+    assert object_file.request_count == 3
@@ -0,0 +1,60 @@
+import harness
+from fakes import FakeS3
+from fingerprint import FINGERPRINT_TAG_KEY
+from tag_merge import TagWriter, create_tag_delta, merge_tagset, MAX_TAGS, MAX_KEY_LENGTH, MAX_VALUE_LENGTH
+
+'''
+    Checks the merging of the tag deltas of the features into the tagset of the objects
+'''
+
+BUCKET_NAME = "tag-merge"
+KEY = "photo.jpg"
+
+
+def to_tags(tagset:list) -> dict:
+    return { x['Key']: x['Value'] for x in tagset }
+
+
+def test_owned_keys_are_replaced():
+    existing_tagset = [ { 'Key': 'User', 'Value': 'kept' }, { 'Key': 'Labels', 'Value': 'old' }, { 'Key': 'Stale', 'Value': 'old' } ]
+    tagset = merge_tagset(existing_tagset, [ create_tag_delta({ 'Labels': 'new' }, [ 'Labels', 'Stale' ]) ])
+
+    assert to_tags(tagset) == { 'User': 'kept', 'Labels': 'new' }
+
+def test_tags_are_truncated_to_the_s3_limits():
+    tagset = merge_tagset([], [ create_tag_delta({ 'K' * 200: 'V' * 300 }, []) ])
+
+    assert to_tags(tagset) == { 'K' * MAX_KEY_LENGTH: 'V' * MAX_VALUE_LENGTH }
+
+def test_tags_past_the_limit_are_dropped():
+    existing_tagset = [ { 'Key': 'User{}'.format(x), 'Value': 'kept' } for x in range(4) ]
+    tag_deltas = [ create_tag_delta({ 'Feature{}'.format(x): 'value' }, []) for x in range(8) ]
+    tagset = merge_tagset(existing_tagset, tag_deltas)
+
+    # The tags of the object are kept first, then the feature tags in the order of the deltas
+    assert len(tagset) == MAX_TAGS
+    assert [ x['Key'] for x in tagset ] == [ 'User{}'.format(x) for x in range(4) ] + [ 'Feature{}'.format(x) for x in range(6) ]
+
+def test_pending_tags_are_applied_in_one_round_trip():
+    s3 = FakeS3()
+    s3.put_object(Bucket=BUCKET_NAME, Key=KEY, Body=b"photo")
+    s3.reset_call_counts()
+    request = {
+        "bucketName": BUCKET_NAME,
+        "key": KEY,
+        "eTag": "etag",
+        "size": 5,
+        "features": [ { "name": "hash", "completed": True }, { "name": "meta", "completed": True } ],
+        "pendingTags": {
+            "hash": create_tag_delta({ 'Hash': 'abc' }, [ 'Hash' ]),
+            "meta": create_tag_delta({ 'Camera': 'Canon' }, [ 'Camera' ])
+        }
+    }
+
+    request = TagWriter(s3, write_fingerprints=True).apply_pending_tags(request)
+
+    assert request["pendingTags"] == {}
+    assert s3.call_counts["GetObjectTagging"] == 1
+    assert s3.call_counts["PutObjectTagging"] == 1
+    tags = to_tags(s3.get_object_tagging(Bucket=BUCKET_NAME, Key=KEY)['TagSet'])
+    assert tags == { 'Hash': 'abc', 'Camera': 'Canon', FINGERPRINT_TAG_KEY: 'etag:5:hash+meta' }